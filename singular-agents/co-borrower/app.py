@@ -2,21 +2,31 @@
 FastAPI Production API for Loan Approval AI - PRODUCTION READY
 CORRECTED: Added file validation, better error handling, health checks
 """
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, status
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, UploadFile, File, Form, Header, HTTPException, BackgroundTasks, status
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 import uvicorn
+import asyncio
+import json
 import os
 import logging
+import time
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, Optional
 from datetime import datetime
 from werkzeug.utils import secure_filename
 import hashlib
 
 from main import LoanApprovalEngine
+from deadline import Deadline, DeadlineExpired
+from extraction_cache import extraction_cache
+from jobs import JobManager, JobStatus, JobStoreFull, create_job_store
+from scheduler import Admission, Overloaded, scheduler
+from processors.pdf_source import (
+    PDFSource, PDFValidationError, StreamingPDFReader, UPLOAD_CHUNK_SIZE
+)
 from schemas import LoanApplicationAnalysis
 from utils import save_json, create_session_id, setup_logging
 from config import Config
@@ -49,6 +59,12 @@ app.add_middleware(GZipMiddleware, minimum_size=1000)
 # Initialize engine (singleton)
 engine = None
 
+# Background analysis jobs
+job_manager = JobManager(create_job_store())
+_job_tasks = set()
+TERMINAL_EVENT_STATUSES = {JobStatus.COMPLETED.value, JobStatus.FAILED.value}
+SSE_KEEPALIVE_SECONDS = 15
+
 
 @app.on_event("startup")
 async def startup_event():
@@ -118,6 +134,171 @@ def save_upload(file: UploadFile, session_id: str, prefix: str) -> str:
     return str(filepath)
 
 
+async def read_upload(file: UploadFile) -> PDFSource:
+    """
+    Read an upload once, in chunks, validating and hashing as it streams
+
+    Size and %PDF signature checks fail fast without buffering the rest
+    of the body. The result is handed to the chains without touching disk.
+    """
+    if not file.filename.lower().endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+
+    reader = StreamingPDFReader(file.filename, Config.MAX_FILE_SIZE_BYTES)
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            reader.feed(chunk)
+        source = reader.finish()
+    except PDFValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    logger.info(
+        f"   📥 Received: {file.filename} ({source.size_bytes / (1024 * 1024):.2f}MB, in memory)")
+    return source
+
+
+async def receive_documents(
+    session_id: str,
+    uploaded_files: list,
+    salary_slips_pdf: UploadFile,
+    bank_statement_pdf: UploadFile,
+    itr_pdf_1: UploadFile,
+    itr_pdf_2: Optional[UploadFile],
+    form16_pdf: Optional[UploadFile]
+) -> Dict[str, Any]:
+    """
+    Read or save all uploads
+
+    Returns:
+        Engine keyword arguments (PDFSource objects or saved paths); saved
+        paths are appended to uploaded_files for cleanup
+    """
+    if Config.ZERO_DISK_UPLOADS:
+        # Read uploads into memory - nothing is written to UPLOAD_DIR
+        logger.info("📥 Reading uploaded documents...")
+
+        documents = {
+            "salary_slip_pdf": await read_upload(salary_slips_pdf),
+            "bank_statement_pdf": await read_upload(bank_statement_pdf),
+            "itr_pdf_1": await read_upload(itr_pdf_1),
+            "itr_pdf_2": await read_upload(itr_pdf_2) if itr_pdf_2 else None,
+            "form16_pdf": await read_upload(form16_pdf) if form16_pdf else None,
+        }
+
+    else:
+        # Save uploaded files with validation
+        logger.info("💾 Saving uploaded documents...")
+
+        documents = {"itr_pdf_2": None, "form16_pdf": None}
+        for key, upload, prefix in (
+            ("salary_slip_pdf", salary_slips_pdf, "salary"),
+            ("bank_statement_pdf", bank_statement_pdf, "bank"),
+            ("itr_pdf_1", itr_pdf_1, "itr1"),
+            ("itr_pdf_2", itr_pdf_2, "itr2"),
+            ("form16_pdf", form16_pdf, "form16"),
+        ):
+            if upload:
+                documents[key] = await asyncio.to_thread(save_upload, upload, session_id, prefix)
+                uploaded_files.append(documents[key])
+
+    logger.info("   ✅ All documents received\n")
+    return documents
+
+
+def request_deadline(timeout_header: Optional[str], timeout_field: Optional[float]) -> Deadline:
+    """
+    Deadline of one analysis, counted from now
+
+    A client may ask for less than REQUEST_DEADLINE_SECONDS with the
+    X-Request-Timeout header or the timeout_seconds form field (seconds;
+    the smaller wins), never for more.
+    """
+    requested = [t for t in (timeout_field,) if t is not None]
+    if timeout_header is not None:
+        try:
+            requested.append(float(timeout_header))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="X-Request-Timeout must be a number of seconds")
+    if any(t <= 0 for t in requested):
+        raise HTTPException(status_code=400, detail="Request timeout must be positive")
+
+    if Config.REQUEST_DEADLINE_SECONDS > 0:
+        requested.append(Config.REQUEST_DEADLINE_SECONDS)
+    return Deadline.after(min(requested, default=None))
+
+
+def admit_analysis() -> Admission:
+    """Admit one analysis, or refuse it with 429 / 503 and Retry-After when saturated"""
+    try:
+        return scheduler.admit()
+    except Overloaded as e:
+        logger.warning(f"⚠️  Analysis rejected: {e}")
+        detail = ("Too many analyses in progress. Please retry later." if e.status_code == 429
+                  else "Service is saturated. Please retry later.")
+        raise HTTPException(status_code=e.status_code, detail=detail,
+                            headers={"Retry-After": str(e.retry_after)})
+
+
+def build_analysis_response(result: LoanApplicationAnalysis, session_id: str,
+                            processing_time: float, documents: Dict[str, Any]) -> dict:
+    """Shape an analysis into the /api/analyze response body"""
+    return {
+        "status": "success",
+        "session_id": session_id,
+        "processing_time_seconds": round(processing_time, 2),
+        "timestamp": datetime.now().isoformat(),
+
+        # Extraction results
+        "extracted_data": {
+            "itr": result.itr_data.model_dump(mode='json') if result.itr_data else None,
+            "bank_statement": result.bank_data.model_dump(mode='json') if result.bank_data else None,
+            "salary_slips": result.salary_data.model_dump(mode='json') if result.salary_data else None
+        },
+
+        # Calculations
+        "foir": result.foir_result.model_dump(mode='json') if result.foir_result else None,
+        "cibil": result.cibil_estimate.model_dump(mode='json') if result.cibil_estimate else None,
+
+        # Quality metrics
+        "quality": {
+            "overall_confidence": round(result.overall_confidence * 100, 2),
+            "data_sources_used": result.data_sources_used,
+            "missing_data": result.missing_data
+        },
+
+        # Issues and warnings
+        "errors": result.errors,
+        "analysis_status": result.status,
+        "timed_out_stages": result.timed_out_stages,
+
+        # Documents processed
+        "documents_processed": {
+            "salary_slips": True,
+            "bank_statement": True,
+            "itr_1": True,
+            "itr_2": documents.get("itr_pdf_2") is not None,
+            "form16": documents.get("form16_pdf") is not None
+        }
+    }
+
+
+async def save_result(response: dict, session_id: str) -> None:
+    """
+    Write an analysis response to RESULTS_DIR off the event loop
+
+    The analysis is already done by then, so a full cpu queue or a failed
+    write only loses the copy on disk: it is logged, never raised.
+    """
+    result_path = Config.RESULTS_DIR / f"analysis_{session_id}.json"
+    try:
+        await scheduler.cpu.run_admitted(save_json, response, str(result_path))
+    except Exception as e:
+        logger.warning(f"   ⚠️  Could not save {result_path.name}: {e}")
+
+
 def cleanup_files(filepaths: list):
     """Delete temporary files"""
     for filepath in filepaths:
@@ -180,6 +361,10 @@ async def health():
                 "multi_document_support": True,
                 "estimated_time": "60-120 seconds"
             },
+            "cache": extraction_cache.stats(),
+            "jobs": await asyncio.to_thread(job_manager.store.stats),
+            "llm": engine.llm_stats(),
+            "scheduler": scheduler.stats(),
             "timestamp": datetime.now().isoformat()
         }
     except Exception as e:
@@ -219,6 +404,20 @@ async def api_info():
                     "itr_pdf_2 (previous year)",
                     "form16_pdf (cross-validation)"
                 ]
+            },
+            "jobs": {
+                "method": "POST",
+                "path": "/api/jobs",
+                "description": "Submit an analysis to run in the background (202 + job_id)",
+                "status": "GET /api/jobs/{job_id}",
+                "result": "GET /api/jobs/{job_id}/result",
+                "events": "GET /api/jobs/{job_id}/events (Server-Sent Events)"
+            },
+            "bank_statements": {
+                "method": "POST",
+                "path": "/api/bank/statements",
+                "description": "Merge one more bank statement into the account's metrics, "
+                               "extracting only that statement"
             }
         },
         "features": [
@@ -260,7 +459,12 @@ async def analyze_loan_application(
     itr_pdf_2: Optional[UploadFile] = File(
         None, description="ITR document year 2 (optional)"),
     form16_pdf: Optional[UploadFile] = File(
-        None, description="Form 16 (optional)")
+        None, description="Form 16 (optional)"),
+    bypass_cache: bool = Form(
+        False, description="Re-extract documents even if cached results exist"),
+    timeout_seconds: Optional[float] = Form(
+        None, description="Deadline for this analysis (at most REQUEST_DEADLINE_SECONDS)"),
+    x_request_timeout: Optional[str] = Header(None)
 ):
     """
     Analyze loan application with all documents
@@ -273,6 +477,10 @@ async def analyze_loan_application(
     **Optional Documents:**
     - itr_pdf_2: ITR document for previous year
     - form16_pdf: Form 16 for cross-validation
+    - bypass_cache: Skip the extraction cache for this request
+    - timeout_seconds (or X-Request-Timeout header): Deadline for this
+      analysis; extractions still running then are abandoned and a partial
+      result is returned
 
     **Returns:**
     Complete loan analysis including:
@@ -289,8 +497,11 @@ async def analyze_loan_application(
     logger.info(f"{'='*80}")
 
     uploaded_files = []
+    admission = None
 
     try:
+        deadline = request_deadline(x_request_timeout, timeout_seconds)
+
         # Check if engine is ready
         if engine is None:
             raise HTTPException(
@@ -298,39 +509,17 @@ async def analyze_loan_application(
                 detail="Service not ready. Please try again."
             )
 
-        # Save uploaded files with validation
-        logger.info("💾 Saving uploaded documents...")
-
-        salary_path = save_upload(salary_slips_pdf, session_id, "salary")
-        uploaded_files.append(salary_path)
-
-        bank_path = save_upload(bank_statement_pdf, session_id, "bank")
-        uploaded_files.append(bank_path)
+        # Turn the request away before reading uploads if the process is saturated
+        admission = admit_analysis()
 
-        itr1_path = save_upload(itr_pdf_1, session_id, "itr1")
-        uploaded_files.append(itr1_path)
-
-        itr2_path = None
-        if itr_pdf_2:
-            itr2_path = save_upload(itr_pdf_2, session_id, "itr2")
-            uploaded_files.append(itr2_path)
-
-        form16_path = None
-        if form16_pdf:
-            form16_path = save_upload(form16_pdf, session_id, "form16")
-            uploaded_files.append(form16_path)
-
-        logger.info("   ✅ All documents saved\n")
+        documents = await receive_documents(
+            session_id, uploaded_files, salary_slips_pdf, bank_statement_pdf,
+            itr_pdf_1, itr_pdf_2, form16_pdf)
 
         # Process application
         logger.info("📄 Processing loan application...")
-        result = engine.process_loan_application(
-            salary_slip_pdf=salary_path,
-            bank_statement_pdf=bank_path,
-            itr_pdf_1=itr1_path,
-            itr_pdf_2=itr2_path,
-            form16_pdf=form16_path
-        )
+        result = await engine.aprocess_loan_application(
+            **documents, bypass_cache=bypass_cache, deadline=deadline)
 
         # Schedule cleanup
         background_tasks.add_task(cleanup_files, uploaded_files)
@@ -341,47 +530,10 @@ async def analyze_loan_application(
         logger.info(f"\n✅ REQUEST COMPLETE - {processing_time:.2f}s")
         logger.info(f"{'='*80}\n")
 
-        # Build response
-        response = {
-            "status": "success",
-            "session_id": session_id,
-            "processing_time_seconds": round(processing_time, 2),
-            "timestamp": datetime.now().isoformat(),
-
-            # Extraction results
-            "extracted_data": {
-                "itr": result.itr_data.model_dump(mode='json') if result.itr_data else None,
-                "bank_statement": result.bank_data.model_dump(mode='json') if result.bank_data else None,
-                "salary_slips": result.salary_data.model_dump(mode='json') if result.salary_data else None
-            },
-
-            # Calculations
-            "foir": result.foir_result.model_dump(mode='json') if result.foir_result else None,
-            "cibil": result.cibil_estimate.model_dump(mode='json') if result.cibil_estimate else None,
-
-            # Quality metrics
-            "quality": {
-                "overall_confidence": round(result.overall_confidence * 100, 2),
-                "data_sources_used": result.data_sources_used,
-                "missing_data": result.missing_data
-            },
-
-            # Issues and warnings
-            "errors": result.errors,
-
-            # Documents processed
-            "documents_processed": {
-                "salary_slips": True,
-                "bank_statement": True,
-                "itr_1": True,
-                "itr_2": itr_pdf_2 is not None,
-                "form16": form16_pdf is not None
-            }
-        }
+        response = build_analysis_response(result, session_id, processing_time, documents)
 
         # Save result to disk
-        result_path = Config.RESULTS_DIR / f"analysis_{session_id}.json"
-        save_json(response, str(result_path))
+        await save_result(response, session_id)
 
         return JSONResponse(status_code=200, content=response)
 
@@ -407,6 +559,292 @@ async def analyze_loan_application(
             }
         )
 
+    finally:
+        if admission is not None:
+            admission.release()
+
+
+# ============================================================================
+# ASYNC JOBS
+# ============================================================================
+
+@app.post("/api/jobs", status_code=202)
+async def submit_analysis_job(
+    salary_slips_pdf: UploadFile = File(...,
+                                        description="Combined salary slips (3 months)"),
+    bank_statement_pdf: UploadFile = File(...,
+                                          description="Bank statement (6 months)"),
+    itr_pdf_1: UploadFile = File(..., description="ITR document year 1"),
+    itr_pdf_2: Optional[UploadFile] = File(
+        None, description="ITR document year 2 (optional)"),
+    form16_pdf: Optional[UploadFile] = File(
+        None, description="Form 16 (optional)"),
+    bypass_cache: bool = Form(
+        False, description="Re-extract documents even if cached results exist"),
+    timeout_seconds: Optional[float] = Form(
+        None, description="Deadline for this analysis (at most REQUEST_DEADLINE_SECONDS)"),
+    x_request_timeout: Optional[str] = Header(None)
+):
+    """
+    Submit a loan analysis to run in the background
+
+    Takes the same documents as /api/analyze and returns 202 with a job id
+    immediately. Follow progress at /api/jobs/{job_id}/events (Server-Sent
+    Events) or poll /api/jobs/{job_id}; fetch the analysis from
+    /api/jobs/{job_id}/result once the job has completed. The deadline
+    counts from submission, and the job holds its admission until it ends.
+    """
+    if engine is None:
+        raise HTTPException(status_code=503, detail="Service not ready. Please try again.")
+    deadline = request_deadline(x_request_timeout, timeout_seconds)
+    admission = admit_analysis()
+
+    try:
+        job = await job_manager.acreate()
+    except JobStoreFull as e:
+        admission.release()
+        logger.warning(f"⚠️  Job rejected: {e}")
+        raise HTTPException(status_code=429, detail="Too many analyses in progress. Please retry later.",
+                            headers={"Retry-After": "30"})
+
+    session_id = create_session_id()
+    uploaded_files = []
+    logger.info(f"📥 NEW JOB {job.job_id} - Session: {session_id}")
+
+    task = None
+    error = "Upload failed"
+    try:
+        documents = await receive_documents(
+            session_id, uploaded_files, salary_slips_pdf, bank_statement_pdf,
+            itr_pdf_1, itr_pdf_2, form16_pdf)
+        task = asyncio.create_task(run_analysis_job(
+            job.job_id, session_id, documents, bypass_cache, uploaded_files, deadline, admission))
+        # Keep a reference so the task is not garbage-collected mid-run
+        _job_tasks.add(task)
+        task.add_done_callback(_job_tasks.discard)
+    except HTTPException as he:
+        error = str(he.detail)
+        raise
+    except Exception as e:
+        logger.error(f"❌ JOB {job.job_id} upload failed: {e}", exc_info=True)
+        error = f"Upload failed: {e}"
+        return JSONResponse(
+            status_code=500,
+            content={
+                "status": "error",
+                "job_id": job.job_id,
+                "session_id": session_id,
+                "error": str(e),
+                "error_type": type(e).__name__,
+                "timestamp": datetime.now().isoformat()
+            }
+        )
+    finally:
+        # Until the task owns them, a failed or disconnected upload frees
+        # the admission, its files and the job slot here
+        if task is None:
+            admission.release()
+            cleanup_files(uploaded_files)
+            await job_manager.aset_status(job.job_id, JobStatus.FAILED, error=error)
+
+    return JSONResponse(status_code=202, content={
+        "job_id": job.job_id,
+        "session_id": session_id,
+        "status": JobStatus.QUEUED.value,
+        "status_url": f"/api/jobs/{job.job_id}",
+        "events_url": f"/api/jobs/{job.job_id}/events",
+        "result_url": f"/api/jobs/{job.job_id}/result",
+    })
+
+
+async def run_analysis_job(job_id: str, session_id: str, documents: Dict[str, Any],
+                           bypass_cache: bool, uploaded_files: list,
+                           deadline: Optional[Deadline] = None,
+                           admission: Optional[Admission] = None):
+    """Background body of a submitted job"""
+    start_time = datetime.now()
+    await job_manager.aset_status(job_id, JobStatus.RUNNING)
+    try:
+        result = await engine.aprocess_loan_application(
+            **documents, bypass_cache=bypass_cache,
+            progress=job_manager.progress_callback(job_id), deadline=deadline)
+
+        processing_time = (datetime.now() - start_time).total_seconds()
+        response = build_analysis_response(result, session_id, processing_time, documents)
+        response["job_id"] = job_id
+
+        await save_result(response, session_id)
+
+        await job_manager.aset_status(job_id, JobStatus.COMPLETED, result=response)
+        logger.info(f"✅ JOB {job_id} COMPLETE - {processing_time:.2f}s")
+
+    except Exception as e:
+        logger.error(f"❌ JOB {job_id} FAILED: {e}", exc_info=True)
+        await job_manager.aset_status(job_id, JobStatus.FAILED, error=str(e))
+
+    finally:
+        cleanup_files(uploaded_files)
+        if admission is not None:
+            admission.release()
+
+
+async def _get_job_or_404(job_id: str):
+    job = await job_manager.aget(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """Job status with the latest progress event for each stage"""
+    return (await _get_job_or_404(job_id)).summary()
+
+
+@app.get("/api/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    """Analysis result - 202 while the job is still running"""
+    job = await _get_job_or_404(job_id)
+    if job.status == JobStatus.COMPLETED:
+        return JSONResponse(status_code=200, content=job.result)
+    if job.status == JobStatus.FAILED:
+        return JSONResponse(status_code=500, content={
+            "status": "error",
+            "job_id": job_id,
+            "error": job.error,
+        })
+    return JSONResponse(status_code=202, content=job.summary())
+
+
+@app.get("/api/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, last_event_id: Optional[str] = Header(None)):
+    """
+    Server-Sent Events stream of per-stage progress
+
+    Every event carries its sequence number as the SSE id, so a reconnecting
+    client (Last-Event-ID) resumes where it left off. The stream ends after
+    the job's terminal event.
+    """
+    await _get_job_or_404(job_id)
+    try:
+        after_seq = int(last_event_id) if last_event_id else 0
+    except ValueError:
+        after_seq = 0
+
+    async def event_stream():
+        seq = after_seq
+        last_sent = time.monotonic()
+        while True:
+            events = await job_manager.wait(job_id, seq)
+            for event in events:
+                seq = event["seq"]
+                yield f"id: {seq}\nevent: {event['stage']}\ndata: {json.dumps(event, default=str)}\n\n"
+                last_sent = time.monotonic()
+                if event["stage"] == "job" and event["status"] in TERMINAL_EVENT_STATUSES:
+                    return
+
+            if not events:
+                job = await job_manager.aget(job_id)
+                if job is None or (job.finished and not await job_manager.aevents_since(job_id, seq)):
+                    return
+                if time.monotonic() - last_sent >= SSE_KEEPALIVE_SECONDS:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+                    last_sent = time.monotonic()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ============================================================================
+# INCREMENTAL BANK STATEMENTS
+# ============================================================================
+
+@app.post("/api/bank/statements", response_model=dict)
+async def update_bank_statement(
+    bank_statement_pdf: UploadFile = File(...,
+                                          description="New bank statement (e.g. the latest month)"),
+    account_id: Optional[str] = Form(
+        None, description="Account the statement belongs to (default: the extracted account number)"),
+    employer_name: Optional[str] = Form(
+        None, description="Employer, for salary detection; must match earlier statements"),
+    bypass_cache: bool = Form(
+        False, description="Re-extract the statement even if a cached result exists"),
+    timeout_seconds: Optional[float] = Form(
+        None, description="Deadline for this update (at most REQUEST_DEADLINE_SECONDS)"),
+    x_request_timeout: Optional[str] = Header(None)
+):
+    """
+    Add one more statement to an account's bank metrics
+
+    Only the uploaded statement is extracted; its rows are merged into the
+    per-account state kept from earlier statements (rows already merged
+    from an overlapping statement are skipped). The returned bank_statement
+    lists this statement's transactions, with metrics over every statement
+    merged so far.
+    """
+    start_time = datetime.now()
+    session_id = create_session_id()
+    uploaded_files = []
+    admission = None
+    logger.info(f"📥 BANK STATEMENT UPDATE - Session: {session_id}")
+
+    try:
+        deadline = request_deadline(x_request_timeout, timeout_seconds)
+        if engine is None:
+            raise HTTPException(status_code=503, detail="Service not ready. Please try again.")
+        admission = admit_analysis()
+
+        if Config.ZERO_DISK_UPLOADS:
+            statement = await read_upload(bank_statement_pdf)
+        else:
+            statement = await scheduler.cpu.run(save_upload, bank_statement_pdf, session_id, "bank")
+            uploaded_files.append(statement)
+
+        bank = await engine.aupdate_bank_statement(
+            statement, account_id=account_id, employer_name=employer_name,
+            bypass_cache=bypass_cache, deadline=deadline)
+
+        processing_time = (datetime.now() - start_time).total_seconds()
+        logger.info(f"✅ BANK STATEMENT UPDATE COMPLETE - {processing_time:.2f}s")
+        return JSONResponse(status_code=200, content={
+            "status": "success",
+            "session_id": session_id,
+            "processing_time_seconds": round(processing_time, 2),
+            "timestamp": datetime.now().isoformat(),
+            "bank_statement": bank.model_dump(mode='json'),
+        })
+
+    except HTTPException:
+        raise
+
+    except DeadlineExpired as e:
+        raise HTTPException(status_code=504, detail=str(e))
+
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    except Exception as e:
+        logger.error(f"\n❌ ERROR: {e}", exc_info=True)
+        return JSONResponse(
+            status_code=500,
+            content={
+                "status": "error",
+                "session_id": session_id,
+                "error": str(e),
+                "error_type": type(e).__name__,
+                "timestamp": datetime.now().isoformat()
+            }
+        )
+
+    finally:
+        cleanup_files(uploaded_files)
+        if admission is not None:
+            admission.release()
+
 
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
@@ -0,0 +1,136 @@
+"""
+Daily end-of-day balance series for bank statements.
+Balances are forward-filled over every calendar day of the statement period,
+so average and minimum balances are exact day-weighted figures rather than
+per-transaction approximations.
+"""
+from __future__ import annotations
+from datetime import date
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Monthly balance percentiles reported alongside average / minimum
+BALANCE_PERCENTILES = (10, 50, 90)
+
+# Statement period bounds further than this from the first/last transaction
+# are treated as extraction errors and ignored
+MAX_PERIOD_SLACK_DAYS = 31
+
+
+class DailyBalanceSeries:
+    """One end-of-day balance per calendar day from start (an ordinal)"""
+
+    __slots__ = ("start", "balance")
+
+    def __init__(self, start: int, balance: np.ndarray):
+        self.start = start
+        self.balance = balance
+
+    def __len__(self) -> int:
+        return int(self.balance.size)
+
+    @property
+    def end(self) -> int:
+        return self.start + len(self) - 1
+
+    @classmethod
+    def from_transactions(cls, day: np.ndarray, debit: np.ndarray, credit: np.ndarray,
+                          balance: np.ndarray, period_start: Optional[date] = None,
+                          period_end: Optional[date] = None) -> Optional["DailyBalanceSeries"]:
+        """
+        Build the series from date-sorted transaction columns
+
+        Args:
+            day: date.toordinal() per row, non-decreasing (statement order within a day)
+            debit, credit, balance: Row amounts and running balance after the row
+            period_start, period_end: Statement period, if known
+
+        Returns:
+            DailyBalanceSeries, or None without transactions
+        """
+        if day.size == 0:
+            return None
+
+        first, last = int(day[0]), int(day[-1])
+        start = first
+        if period_start is not None and 0 <= first - period_start.toordinal() <= MAX_PERIOD_SLACK_DAYS:
+            start = period_start.toordinal()
+        end = last
+        if period_end is not None and 0 <= period_end.toordinal() - last <= MAX_PERIOD_SLACK_DAYS:
+            end = period_end.toordinal()
+
+        # Balance before the first row, from the row itself
+        opening = float(balance[0] + debit[0] - credit[0])
+
+        # Last row of each day carries the end-of-day balance
+        rel = day - start
+        last_of_day = np.flatnonzero(np.r_[rel[1:] != rel[:-1], True])
+        row = np.full(end - start + 1, -1, dtype=np.int64)
+        row[rel[last_of_day]] = last_of_day
+        row = np.maximum.accumulate(row)
+
+        eod = np.where(row >= 0, balance[np.maximum(row, 0)], opening)
+        return cls(start, eod.astype(np.float64))
+
+    def _months(self):
+        """Per-month arrays: (labels, day counts, means, minimums, closing, percentiles)"""
+        days = np.datetime64(date.fromordinal(self.start), "D") + np.arange(len(self))
+        values = self.balance
+        months = days.astype("datetime64[M]")
+
+        # Days are in order, so each month is one contiguous run
+        bounds = np.flatnonzero(np.r_[True, months[1:] != months[:-1]])
+        counts = np.diff(np.r_[bounds, values.size])
+        sums = np.add.reduceat(values, bounds)
+        mins = np.minimum.reduceat(values, bounds)
+        closing = values[bounds + counts - 1]
+
+        # One sort orders every month's values; percentiles interpolate linearly
+        ranked = values[np.lexsort((values, months))]
+        pct: Dict[int, np.ndarray] = {}
+        for p in BALANCE_PERCENTILES:
+            h = (counts - 1) * (p / 100.0)
+            lo = np.floor(h).astype(np.int64)
+            hi = np.minimum(lo + 1, counts - 1)
+            a, b = ranked[bounds + lo], ranked[bounds + hi]
+            pct[p] = a + (b - a) * (h - lo)
+
+        return months[bounds], counts, sums / counts, mins, closing, pct
+
+    def monthly(self) -> List[Dict]:
+        """Average, minimum, percentile and closing balance for each calendar month"""
+        if not len(self):
+            return []
+        return self._monthly_rows(*self._months())
+
+    @staticmethod
+    def _monthly_rows(labels, counts, means, mins, closing, pct) -> List[Dict]:
+        return [
+            {
+                "month": str(labels[i]),
+                "days": int(counts[i]),
+                "average_balance": round(float(means[i]), 2),
+                "minimum_balance": round(float(mins[i]), 2),
+                **{f"p{p}_balance": round(float(pct[p][i]), 2) for p in BALANCE_PERCENTILES},
+                "closing_balance": round(float(closing[i]), 2),
+            }
+            for i in range(labels.size)
+        ]
+
+    def summary(self) -> Dict:
+        """
+        Statement-level balance figures
+
+        average_monthly_balance is the mean of the monthly averages (AMB),
+        minimum_balance the lowest end-of-day balance.
+        """
+        if not len(self):
+            return {"average_monthly_balance": 0.0, "minimum_balance": 0.0, "monthly_balances": []}
+        months = self._months()
+        means, mins = months[2], months[3]
+        return {
+            "average_monthly_balance": round(float(means.mean()), 2),
+            "minimum_balance": round(float(mins.min()), 2),
+            "monthly_balances": self._monthly_rows(*months),
+        }
@@ -2,15 +2,25 @@
 Deterministic bank metrics computation from transaction list.
 Computes EMI, salary credits, average balance WITHOUT relying on LLM.
 CORRECTED: Added edge case handling
+
+compute_bank_metrics runs on a columnar TxnTable (NumPy arrays, narrations
+classified once per distinct text).
 """
 from __future__ import annotations
 from dataclasses import dataclass
 from datetime import datetime, date
-from typing import List, Dict, Optional, Tuple
-import re
-import math
+from typing import List, Dict, Optional, Union
 from collections import defaultdict
 
+import numpy as np
+
+from balance_series import DailyBalanceSeries
+from date_parser import DateParser
+from narration_classifier import (  # noqa: F401 - keyword regexes re-exported
+    EMI_KEYWORDS, SALARY_KEYWORDS, SALARY_TAGS, NarrationTag, classifier_for,
+    normalize_narration,
+)
+
 DATE_FORMATS = ["%d-%m-%Y", "%d/%m/%Y", "%Y-%m-%d", "%d-%b-%Y", "%d %b %Y"]
 
 
@@ -27,6 +37,15 @@ def _parse_date(s: str) -> Optional[date]:
     return None
 
 
+def _date_cell(t: Dict) -> str:
+    return t.get("date") or t.get("txn_date") or ""
+
+
+def _date_parser(raw_txns: Optional[List[Dict]]) -> DateParser:
+    """Parser tuned to this statement's date format (same results as _parse_date)"""
+    return DateParser.sniff(DATE_FORMATS, (_date_cell(t) for t in raw_txns or []))
+
+
 def _month_key(d: date) -> str:
     """Convert date to YYYY-MM month key"""
     return f"{d.year:04d}-{d.month:02d}"
@@ -34,7 +53,7 @@ def _month_key(d: date) -> str:
 
 def _norm_text(s: str) -> str:
     """Normalize text for matching"""
-    return re.sub(r"\s+", " ", (s or "")).strip().upper()
+    return normalize_narration(s)
 
 
 def _safe_float(x) -> float:
@@ -70,8 +89,9 @@ class Txn:
 def _to_txns(raw_txns: List[Dict]) -> List[Txn]:
     """Convert raw transaction dicts to Txn objects"""
     out: List[Txn] = []
+    parse_date = _date_parser(raw_txns)
     for t in raw_txns or []:
-        d = _parse_date(t.get("date") or t.get("txn_date") or "")
+        d = parse_date(_date_cell(t))
         if not d:
             continue
         out.append(
@@ -87,48 +107,23 @@ def _to_txns(raw_txns: List[Dict]) -> List[Txn]:
     return out
 
 
-# EMI detection keywords
-EMI_KEYWORDS = re.compile(
-    r"\bEMI\b|NACH|ECS|ACH|AUTO\s*DEBIT|INSTAL|INSTALL|LOAN|FINANCE|HOME\s*FIN|PL\b|HL\b",
-    re.IGNORECASE
-)
-
-SALARY_KEYWORDS = re.compile(r"\bSALARY\b|\bPAYROLL\b", re.IGNORECASE)
+_SALARY_BITS = int(SALARY_TAGS)
+_EMI_BIT = int(NarrationTag.EMI)
 
 
 def detect_salary_credits(txns: List[Txn], employer_name: Optional[str] = None) -> List[Txn]:
     """Detect salary credits using keywords and employer name"""
-    employer_tokens = []
-    if employer_name:
-        # Keep meaningful tokens to match in narration
-        toks = [t for t in re.split(
-            r"[^A-Za-z0-9]+", employer_name.upper()) if len(t) >= 4]
-        employer_tokens = toks[:6]
-
-    hits: List[Txn] = []
-    for t in txns:
-        if t.credit <= 0:
-            continue
-        nar = _norm_text(t.narration)
-
-        if SALARY_KEYWORDS.search(nar):
-            hits.append(t)
-            continue
-
-        if employer_tokens and any(tok in nar for tok in employer_tokens):
-            hits.append(t)
-
-    return hits
+    credits = [t for t in txns if t.credit > 0]
+    tags = classifier_for(employer_name).classify_batch([t.narration for t in credits])
+    return [t for t, tag in zip(credits, tags.tolist()) if tag & _SALARY_BITS]
 
 
 def detect_emi_debits(txns: List[Txn]) -> List[Txn]:
     """Detect EMI debits using keywords and recurrence patterns"""
-    # Step 1: keyword-based candidates
-    candidates = [t for t in txns if t.debit >
-                  0 and EMI_KEYWORDS.search(t.narration or "")]
-    if not candidates:
-        candidates = [t for t in txns if t.debit > 0 and re.search(
-            r"NACH|ECS|ACH", t.narration or "", re.I)]
+    # Step 1: keyword-based candidates (NACH/ECS/ACH mandates are EMI keywords too)
+    debits = [t for t in txns if t.debit > 0]
+    tags = classifier_for().classify_batch([t.narration for t in debits])
+    candidates = [t for t, tag in zip(debits, tags.tolist()) if tag & _EMI_BIT]
 
     # Step 2: strengthen by recurrence (same rounded debit amount across months)
     by_amount_months: Dict[int, set] = defaultdict(set)
@@ -163,114 +158,70 @@ def detect_emi_debits(txns: List[Txn]) -> List[Txn]:
     return uniq
 
 
-def weighted_average_balance(txns: List[Txn]) -> Tuple[float, float]:
-    """
-    Approx avg daily balance using transaction balances weighted by days until next txn.
-    CORRECTED: Added edge case handling
-    """
-    if not txns:
-        return 0.0, 0.0
-
-    # Filter out invalid balances
-    valid_txns = [t for t in txns if t.balance >= 0]
-    if not valid_txns:
-        return 0.0, 0.0
-
-    # Handle single transaction
-    if len(valid_txns) == 1:
-        bal = valid_txns[0].balance
-        return round(bal, 2), round(bal, 2)
-
-    total_days = 0
-    weighted_sum = 0.0
-    min_bal = math.inf
-
-    for i in range(len(valid_txns)):
-        cur = valid_txns[i]
-        min_bal = min(min_bal, cur.balance)
-        start = cur.txn_date
-
-        # Calculate days until next transaction
-        if i + 1 < len(valid_txns):
-            end = valid_txns[i + 1].txn_date
-            days = max(1, (end - start).days)
-        else:
-            # Last transaction - assume 1 day
-            days = 1
+def _empty_metrics() -> Dict:
+    """Metrics for a statement with no usable transactions"""
+    return {
+        "total_credits": 0.0,
+        "total_debits": 0.0,
+        "credit_count": 0,
+        "debit_count": 0,
+        "average_monthly_balance": 0.0,
+        "minimum_balance": 0.0,
+        "monthly_balances": [],
+        "salary_credits_detected": 0,
+        "average_monthly_salary": 0.0,
+        "salary_consistency_months": 0,
+        "last_salary_date": None,
+        "total_emi_debits": 0.0,
+        "average_monthly_emi": 0.0,
+        "emi_transactions": [],
+        "unique_loan_accounts": 0,
+        "average_monthly_spending": 0.0,
+    }
 
-        total_days += days
-        weighted_sum += cur.balance * days
 
-    avg = (weighted_sum / total_days) if total_days else 0.0
-    return round(avg, 2), round(min_bal if min_bal != math.inf else 0.0, 2)
+PeriodBound = Union[str, date, None]
+
+
+def _period_date(value: PeriodBound) -> Optional[date]:
+    """Statement period bound as a date (header strings are YYYY-MM-DD or statement style)"""
+    if isinstance(value, date):
+        return value
+    return _parse_date(value) if value else None
 
 
 def compute_bank_metrics(
     raw_transactions: List[Dict],
     employer_name: Optional[str] = None,
+    period_start: PeriodBound = None,
+    period_end: PeriodBound = None,
 ) -> Dict:
     """
     Compute precise bank metrics from transaction list.
     Returns dict with all required BankStatementData fields.
-    CORRECTED: Added validation and edge case handling
-    """
-    txns = _to_txns(raw_transactions)
-
-    # Handle empty transactions
-    if not txns:
-        return {
-            "total_credits": 0.0,
-            "total_debits": 0.0,
-            "credit_count": 0,
-            "debit_count": 0,
-            "average_monthly_balance": 0.0,
-            "minimum_balance": 0.0,
-            "salary_credits_detected": 0,
-            "average_monthly_salary": 0.0,
-            "salary_consistency_months": 0,
-            "last_salary_date": None,
-            "total_emi_debits": 0.0,
-            "average_monthly_emi": 0.0,
-            "emi_transactions": [],
-            "unique_loan_accounts": 0,
-            "average_monthly_spending": 0.0,
-        }
 
-    totals = {
-        "total_credits": round(sum(t.credit for t in txns), 2),
-        "total_debits": round(sum(t.debit for t in txns), 2),
-        "credit_count": sum(1 for t in txns if t.credit > 0),
-        "debit_count": sum(1 for t in txns if t.debit > 0),
-    }
+    period_start / period_end (statement_period_start / _end) extend the
+    daily balance series to the whole statement period.
 
-    avg_bal, min_bal = weighted_average_balance(txns)
+    Output is identical to the row-at-a-time reference engine in
+    tests/bank_metrics_reference.py.
+    """
+    table = TxnTable.from_raw(raw_transactions)
 
-    # Salary detection
-    salary_hits = detect_salary_credits(txns, employer_name=employer_name)
-    salary_by_month: Dict[str, List[Txn]] = defaultdict(list)
-    for t in salary_hits:
-        salary_by_month[_month_key(t.txn_date)].append(t)
+    # Handle empty transactions
+    if not len(table):
+        return _empty_metrics()
 
-    salary_months = sorted(salary_by_month.keys())
-    salary_amounts = []
-    last_salary_date = None
-    for m in salary_months:
-        # Choose the largest credit in that month as the salary credit
-        mx = max(salary_by_month[m], key=lambda x: x.credit)
-        salary_amounts.append(mx.credit)
-        last_salary_date = mx.txn_date
+    return table.metrics(employer_name=employer_name, period_start=_period_date(period_start),
+                         period_end=_period_date(period_end))
 
-    avg_monthly_salary = round(
-        sum(salary_amounts) / len(salary_amounts), 2) if salary_amounts else 0.0
 
-    # EMI detection
-    emi_hits = detect_emi_debits(txns)
+def _emi_fields(emi_hits: List[Txn], all_months: List[str]) -> Dict:
+    """EMI metrics from detected EMI debits, averaged over the statement months"""
     emi_by_month: Dict[str, float] = defaultdict(float)
     for t in emi_hits:
         emi_by_month[_month_key(t.txn_date)] += t.debit
 
-    # Use statement months in data for averaging
-    all_months = sorted({_month_key(t.txn_date) for t in txns})
     if all_months:
         avg_monthly_emi = round(
             sum(emi_by_month.get(m, 0.0)
@@ -279,48 +230,262 @@ def compute_bank_metrics(
     else:
         avg_monthly_emi = 0.0
 
-    emi_transactions = [
-        {
-            "date": t.txn_date.isoformat(),
-            "narration": t.narration,
-            "amount": round(t.debit, 2),
-            "balance": round(t.balance, 2),
+    return {
+        "total_emi_debits": round(sum(t.debit for t in emi_hits), 2),
+        "average_monthly_emi": avg_monthly_emi,
+        "emi_transactions": [
+            {
+                "date": t.txn_date.isoformat(),
+                "narration": t.narration,
+                "amount": round(t.debit, 2),
+                "balance": round(t.balance, 2),
+            }
+            for t in emi_hits
+        ],
+        "unique_loan_accounts": max(0, len({int(round(t.debit)) for t in emi_hits})),
+    }
+
+
+# ============================================================================
+# COLUMNAR ENGINE
+# ============================================================================
+
+def _seq_sum(values: np.ndarray) -> float:
+    """Left-to-right float sum, bit-identical to builtin sum() (np.sum is pairwise)"""
+    if values.size == 0:
+        return 0.0
+    return float(np.cumsum(values)[-1])
+
+
+def _group_sums(groups: np.ndarray, values: np.ndarray, size: int) -> np.ndarray:
+    """Per-group sums accumulated in input order, like a defaultdict(float) loop"""
+    return np.bincount(groups, weights=values, minlength=size)
+
+
+class TxnTable:
+    """
+    Transactions as NumPy columns, sorted by date.
+
+    Narrations are interned twice: raw_id indexes distinct raw texts and
+    norm_id distinct _norm_text values (de-duplication keys); raw_norm maps
+    one to the other. The classifier runs once per distinct narration rather
+    than once per row per detector.
+    """
+
+    __slots__ = ("day", "month", "debit", "credit", "balance", "narration",
+                 "raw_id", "raw_texts", "norm_id", "norm_texts", "raw_norm")
+
+    def __init__(self, day: np.ndarray, month: np.ndarray, debit: np.ndarray,
+                 credit: np.ndarray, balance: np.ndarray, narration: List[str],
+                 raw_id: np.ndarray, raw_texts: List[str],
+                 norm_id: np.ndarray, norm_texts: List[str], raw_norm: np.ndarray):
+        self.day = day            # date.toordinal()
+        self.month = month        # year * 12 + month - 1
+        self.debit = debit
+        self.credit = credit
+        self.balance = balance
+        self.narration = narration
+        self.raw_id = raw_id
+        self.raw_texts = raw_texts
+        self.norm_id = norm_id
+        self.norm_texts = norm_texts
+        self.raw_norm = raw_norm
+
+    def __len__(self) -> int:
+        return len(self.narration)
+
+    @classmethod
+    def from_raw(cls, raw_txns: List[Dict]) -> "TxnTable":
+        """Build from raw transaction dicts, with the same parsing rules as _to_txns"""
+        dates: List[date] = []
+        narrations: List[str] = []
+        debits: List[float] = []
+        credits: List[float] = []
+        balances: List[float] = []
+        parse_date = _date_parser(raw_txns)
+        for t in raw_txns or []:
+            d = parse_date(_date_cell(t))
+            if not d:
+                continue
+            dates.append(d)
+            narrations.append(t.get("narration") or t.get("particulars") or "")
+            debits.append(_safe_float(t.get("debit")))
+            credits.append(_safe_float(t.get("credit")))
+            balances.append(_safe_float(t.get("balance")))
+
+        n = len(dates)
+        day = np.fromiter((d.toordinal() for d in dates), dtype=np.int64, count=n)
+        month = np.fromiter((d.year * 12 + d.month - 1 for d in dates), dtype=np.int64, count=n)
+
+        # Stable, like list.sort(key=txn_date)
+        order = np.argsort(day, kind="stable")
+        narration = [narrations[i] for i in order]
+
+        raw_index: Dict[str, int] = {}
+        raw_id = np.fromiter((raw_index.setdefault(x, len(raw_index)) for x in narration),
+                             dtype=np.int64, count=n)
+        raw_texts = list(raw_index)
+
+        norm_index: Dict[str, int] = {}
+        raw_to_norm = np.fromiter(
+            (norm_index.setdefault(_norm_text(x), len(norm_index)) for x in raw_texts),
+            dtype=np.int64, count=len(raw_texts))
+        norm_texts = list(norm_index)
+
+        return cls(
+            day=day[order],
+            month=month[order],
+            debit=np.asarray(debits, dtype=np.float64)[order],
+            credit=np.asarray(credits, dtype=np.float64)[order],
+            balance=np.asarray(balances, dtype=np.float64)[order],
+            narration=narration,
+            raw_id=raw_id,
+            raw_texts=raw_texts,
+            norm_id=raw_to_norm[raw_id],
+            norm_texts=norm_texts,
+            raw_norm=raw_to_norm,
+        )
+
+    # ------------------------------------------------------------------ pieces
+
+    def row_tags(self, employer_name: Optional[str] = None) -> np.ndarray:
+        """NarrationTag bits per row; rows without a debit or credit are left untagged"""
+        ids = np.unique(self.raw_id[(self.debit > 0) | (self.credit > 0)])
+        text_tags = np.zeros(len(self.raw_texts), dtype=np.uint8)
+        text_tags[ids] = classifier_for(employer_name).classify_batch(
+            [self.raw_texts[i] for i in ids],
+            [self.norm_texts[j] for j in self.raw_norm[ids]])
+        return text_tags[self.raw_id]
+
+    def balance_series(self, period_start: Optional[date] = None,
+                       period_end: Optional[date] = None) -> Optional[DailyBalanceSeries]:
+        """End-of-day balances over the statement period (None when empty)"""
+        return DailyBalanceSeries.from_transactions(
+            self.day, self.debit, self.credit, self.balance, period_start, period_end)
+
+    def salary_hits(self, tags: np.ndarray) -> np.ndarray:
+        """Row indexes of salary credits (detect_salary_credits)"""
+        return np.flatnonzero((self.credit > 0) & (tags & _SALARY_BITS != 0))
+
+    def emi_hits(self, amounts: np.ndarray, tags: np.ndarray) -> np.ndarray:
+        """Row indexes of EMI debits (detect_emi_debits), in the same order"""
+        candidates = np.flatnonzero((self.debit > 0) & (tags & _EMI_BIT != 0))
+        if candidates.size == 0:
+            return candidates
+
+        # Recurrence: same rounded amount in 3+ distinct months
+        cand_amt = amounts[candidates]
+        uniq_amt, first_pos, amt_group = np.unique(
+            cand_amt, return_index=True, return_inverse=True)
+        amt_month = np.unique(np.stack([amt_group, self.month[candidates]]), axis=1)
+        months_per_amt = np.bincount(amt_month[0], minlength=uniq_amt.size)
+
+        # The row engine iterates a set of recurring amounts built in first-seen
+        # order; rebuilding that set the same way reproduces its iteration order
+        first_seen = np.argsort(first_pos, kind="stable")
+        recurring_amounts = {int(uniq_amt[g]) for g in first_seen if months_per_amt[g] >= 3}
+
+        if recurring_amounts:
+            by_group = np.argsort(amt_group, kind="stable")
+            bounds = np.concatenate([[0], np.cumsum(np.bincount(amt_group, minlength=uniq_amt.size))])
+            group_of = {int(a): g for g, a in enumerate(uniq_amt)}
+            strong = np.concatenate([
+                candidates[by_group[bounds[group_of[a]]:bounds[group_of[a] + 1]]]
+                for a in recurring_amounts])
+        else:
+            strong = candidates
+
+        # Deduplicate by (date, amount, narration), keeping the first seen
+        keys = np.stack([self.day[strong], amounts[strong], self.norm_id[strong]], axis=1)
+        _, first = np.unique(keys, axis=0, return_index=True)
+        uniq = strong[np.sort(first)]
+
+        return uniq[np.argsort(self.day[uniq], kind="stable")]
+
+    # ----------------------------------------------------------------- metrics
+
+    def metrics(self, employer_name: Optional[str] = None, period_start: Optional[date] = None,
+                period_end: Optional[date] = None) -> Dict:
+        """All compute_bank_metrics fields for a non-empty table"""
+        debit_rows = self.debit > 0
+        amounts = np.zeros(len(self), dtype=np.int64)
+        amounts[debit_rows] = np.rint(self.debit[debit_rows]).astype(np.int64)
+
+        totals = {
+            "total_credits": round(_seq_sum(self.credit), 2),
+            "total_debits": round(_seq_sum(self.debit), 2),
+            "credit_count": int(np.count_nonzero(self.credit > 0)),
+            "debit_count": int(np.count_nonzero(debit_rows)),
         }
-        for t in emi_hits
-    ]
 
-    # Spending = non-EMI debits average per month
-    emi_keys = {
-        (t.txn_date, int(round(t.debit)), _norm_text(t.narration))
-        for t in emi_hits
-    }
-    non_emi_debits = [
-        t for t in txns
-        if t.debit > 0 and (t.txn_date, int(round(t.debit)), _norm_text(t.narration)) not in emi_keys
-    ]
-    spend_by_month: Dict[str, float] = defaultdict(float)
-    for t in non_emi_debits:
-        spend_by_month[_month_key(t.txn_date)] += t.debit
-
-    avg_monthly_spending = round(
-        (sum(spend_by_month.get(m, 0.0)
-         for m in all_months) / len(all_months)) if all_months else 0.0, 2
-    )
+        balances = self.balance_series(period_start, period_end).summary()
+
+        # Months relative to the first one, for bincount group-bys
+        month0 = int(self.month.min())
+        rel_month = self.month - month0
+        all_months = np.unique(rel_month)
+        n_bins = int(rel_month.max()) + 1
+
+        # Salary: largest credit per month, first row wins ties
+        tags = self.row_tags(employer_name)
+        salary_rows = self.salary_hits(tags)
+        avg_monthly_salary = 0.0
+        last_salary_date = None
+        salary_months = 0
+        if salary_rows.size:
+            sal_month = rel_month[salary_rows]
+            order = np.lexsort((salary_rows, -self.credit[salary_rows], sal_month))
+            sorted_months = sal_month[order]
+            first_in_month = np.concatenate([[True], sorted_months[1:] != sorted_months[:-1]])
+            best = salary_rows[order[first_in_month]]
+            salary_months = int(best.size)
+            avg_monthly_salary = round(_seq_sum(self.credit[best]) / best.size, 2)
+            last_salary_date = date.fromordinal(int(self.day[best[-1]]))
+
+        # EMI
+        emi_rows = self.emi_hits(amounts, tags)
+        emi_by_month = _group_sums(rel_month[emi_rows], self.debit[emi_rows], n_bins)
+        avg_monthly_emi = round(_seq_sum(emi_by_month[all_months]) / all_months.size, 2)
+
+        emi_transactions = [
+            {
+                "date": date.fromordinal(int(self.day[i])).isoformat(),
+                "narration": self.narration[i],
+                "amount": round(float(self.debit[i]), 2),
+                "balance": round(float(self.balance[i]), 2),
+            }
+            for i in emi_rows
+        ]
+
+        # Spending = non-EMI debits; a debit sharing an EMI's key is excluded too
+        debit_idx = np.flatnonzero(debit_rows)
+        if emi_rows.size:
+            keys = np.concatenate([
+                np.stack([self.day[emi_rows], amounts[emi_rows], self.norm_id[emi_rows]], axis=1),
+                np.stack([self.day[debit_idx], amounts[debit_idx], self.norm_id[debit_idx]], axis=1),
+            ])
+            _, key_id = np.unique(keys, axis=0, return_inverse=True)
+            key_id = key_id.reshape(-1)
+            is_emi_key = np.isin(key_id[emi_rows.size:], key_id[:emi_rows.size])
+            spend_rows = debit_idx[~is_emi_key]
+        else:
+            spend_rows = debit_idx
+        spend_by_month = _group_sums(rel_month[spend_rows], self.debit[spend_rows], n_bins)
+        avg_monthly_spending = round(_seq_sum(spend_by_month[all_months]) / all_months.size, 2)
 
-    return {
-        **totals,
-        "average_monthly_balance": avg_bal,
-        "minimum_balance": min_bal,
+        return {
+            **totals,
+            **balances,
 
-        "salary_credits_detected": sum(len(v) for v in salary_by_month.values()),
-        "average_monthly_salary": avg_monthly_salary,
-        "salary_consistency_months": len(salary_months),
-        "last_salary_date": last_salary_date.isoformat() if last_salary_date else None,
+            "salary_credits_detected": int(salary_rows.size),
+            "average_monthly_salary": avg_monthly_salary,
+            "salary_consistency_months": salary_months,
+            "last_salary_date": last_salary_date.isoformat() if last_salary_date else None,
 
-        "total_emi_debits": round(sum(t.debit for t in emi_hits), 2),
-        "average_monthly_emi": avg_monthly_emi,
-        "emi_transactions": emi_transactions,
-        "unique_loan_accounts": max(0, len({int(round(t.debit)) for t in emi_hits})),
+            "total_emi_debits": round(_seq_sum(self.debit[emi_rows]), 2),
+            "average_monthly_emi": avg_monthly_emi,
+            "emi_transactions": emi_transactions,
+            "unique_loan_accounts": int(np.unique(amounts[emi_rows]).size),
 
-        "average_monthly_spending": avg_monthly_spending,
-    }
+            "average_monthly_spending": avg_monthly_spending,
+        }
@@ -0,0 +1,388 @@
+"""
+Incremental bank metrics.
+A compact per-account state (running totals, month aggregates, EMI
+candidates, closed months' balance figures and the open month's daily
+balances) is persisted between statements. Appending a new month merges
+only its rows into the state, so old pages never need re-extracting.
+State files hold no account number: the account id is stored as its
+digest, and long digit runs in narrations are masked.
+"""
+from __future__ import annotations
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from balance_series import DailyBalanceSeries
+from bank_metrics import (
+    PeriodBound, Txn, _emi_fields, _empty_metrics, _month_key, _norm_text,
+    _period_date, _to_txns, detect_emi_debits,
+)
+from config import Config
+from narration_classifier import SALARY_TAGS, NarrationTag, classifier_for, employer_tokens
+
+logger = logging.getLogger(__name__)
+
+# Bump when the persisted layout changes; older states are discarded
+STATE_VERSION = 2
+
+# Digit runs this long in a stored narration (account, card, reference
+# numbers) keep only their last MASK_KEEP_DIGITS digits
+MASK_MIN_DIGITS = 6
+MASK_KEEP_DIGITS = 4
+_DIGIT_RUN = re.compile(rf"\d{{{MASK_MIN_DIGITS},}}")
+
+_SALARY_BITS = int(SALARY_TAGS)
+_EMI_BIT = int(NarrationTag.EMI)
+
+
+class BankMetricsState:
+    """
+    Everything compute_bank_metrics needs from statements already seen.
+
+    Days are date ordinals and months "YYYY-MM" keys. Rows older than the
+    last seen day are treated as re-sent history and dropped, as are rows
+    on that day identical to ones already merged, so overlapping statements
+    can be appended safely. Metrics equal those of compute_bank_metrics on
+    all rows at once (average spending up to float rounding; EMI narrations
+    are masked as stored).
+    """
+
+    def __init__(self, account_id: str, employer_name: Optional[str] = None):
+        self.account_id = account_id
+        self.employer_tokens: List[str] = employer_tokens(employer_name)
+        self.statements = 0
+        self.updated_at = 0.0
+
+        self.first_day: Optional[int] = None
+        self.last_day: Optional[int] = None
+        # (debit, credit, balance, narration digest) of rows on last_day
+        self.last_day_rows: List[list] = []
+
+        # Unrounded running totals, accumulated in row order
+        self.total_credits = 0.0
+        self.total_debits = 0.0
+        self.credit_count = 0
+        self.debit_count = 0
+
+        # month -> spend (debits that are not EMI candidates), salary_count,
+        # salary_max and salary_day (largest salary credit, earliest on ties)
+        self.months: Dict[str, Dict[str, Any]] = {}
+        # EMI keyword debits as [day, debit, credit, balance, masked narration];
+        # recurrence is re-evaluated over all of them on every update
+        self.emi_candidates: List[list] = []
+
+        # Closed months: monthly_balances rows and their unrounded averages
+        self.balance_rows: List[Dict] = []
+        self.balance_means: List[float] = []
+        # End-of-day balances from the start of the last transaction month
+        self.tail_start: Optional[int] = None
+        self.tail: List[float] = []
+
+    # ------------------------------------------------------------------ update
+
+    def apply(self, raw_transactions: List[Dict], employer_name: Optional[str] = None,
+              period_start: PeriodBound = None, period_end: PeriodBound = None) -> int:
+        """
+        Merge one statement's transactions into the state
+
+        Args:
+            raw_transactions: Transaction dicts, as for compute_bank_metrics
+            employer_name: Must match the name the state was built with
+            period_start, period_end: Statement period, if known
+
+        Returns:
+            int: Number of new transactions merged (a statement adding none
+            is not counted in `statements`)
+        """
+        tokens = employer_tokens(employer_name)
+        if self.statements and employer_name is not None and tokens != self.employer_tokens:
+            raise ValueError(
+                "Employer name differs from the stored account state; "
+                "rebuild it from the full statements")
+        if not self.statements:
+            self.employer_tokens = tokens
+
+        txns = self._new_rows(_to_txns(raw_transactions))
+        if not txns:
+            return 0
+        self.statements += 1
+        self.updated_at = time.time()
+
+        # Totals continue the same left-to-right sums
+        for t in txns:
+            self.total_credits += t.credit
+            self.total_debits += t.debit
+        self.credit_count += sum(1 for t in txns if t.credit > 0)
+        self.debit_count += sum(1 for t in txns if t.debit > 0)
+
+        # Salary and EMI tags, as detect_salary_credits / detect_emi_debits
+        salary = classifier_for(" ".join(self.employer_tokens)).classify_batch(
+            [t.narration for t in txns]).tolist()
+        emi = classifier_for().classify_batch([t.narration for t in txns]).tolist()
+
+        for t, sal_bits, emi_bits in zip(txns, salary, emi):
+            agg = self.months.setdefault(_month_key(t.txn_date), {
+                "spend": 0.0, "salary_count": 0, "salary_max": None, "salary_day": None})
+            if t.credit > 0 and sal_bits & _SALARY_BITS:
+                agg["salary_count"] += 1
+                if agg["salary_max"] is None or t.credit > agg["salary_max"]:
+                    agg["salary_max"] = t.credit
+                    agg["salary_day"] = t.txn_date.toordinal()
+            if t.debit > 0:
+                if emi_bits & _EMI_BIT:
+                    self.emi_candidates.append(
+                        [t.txn_date.toordinal(), t.debit, t.credit, t.balance,
+                         mask_narration(t.narration)])
+                else:
+                    agg["spend"] += t.debit
+
+        self._merge_balances(txns, _period_date(period_start), _period_date(period_end))
+
+        days = [t.txn_date.toordinal() for t in txns]
+        if self.first_day is None:
+            self.first_day = days[0]
+        if days[-1] != self.last_day:
+            self.last_day_rows = []
+        self.last_day = days[-1]
+        self.last_day_rows += [_fingerprint(t) for t, d in zip(txns, days) if d == self.last_day]
+        return len(txns)
+
+    def _new_rows(self, txns: List[Txn]) -> List[Txn]:
+        """Drop rows already merged from an earlier, overlapping statement"""
+        if self.last_day is None:
+            return txns
+        seen = Counter(tuple(r) for r in self.last_day_rows)
+        out = []
+        for t in txns:
+            day = t.txn_date.toordinal()
+            if day < self.last_day:
+                continue
+            if day == self.last_day:
+                key = tuple(_fingerprint(t))
+                if seen[key]:
+                    seen[key] -= 1
+                    continue
+            out.append(t)
+        if len(out) < len(txns):
+            logger.info(f"   ♻️  Skipped {len(txns) - len(out)} already merged transactions")
+        return out
+
+    def _merge_balances(self, txns: List[Txn], period_start: Optional[date],
+                        period_end: Optional[date]) -> None:
+        """Extend the daily series and close every month before the new last one"""
+        day = np.array([t.txn_date.toordinal() for t in txns], dtype=np.int64)
+        new = DailyBalanceSeries.from_transactions(
+            day,
+            np.array([t.debit for t in txns], dtype=np.float64),
+            np.array([t.credit for t in txns], dtype=np.float64),
+            np.array([t.balance for t in txns], dtype=np.float64),
+            period_start if self.tail_start is None else None, period_end)
+
+        if self.tail_start is None:
+            start, values = new.start, new.balance
+        else:
+            # Until the first new row the previous end-of-day balance carries over
+            start = self.tail_start
+            tail = np.asarray(self.tail, dtype=np.float64)
+            first = int(day[0]) - start
+            end = new.end - start + 1
+            values = np.empty(max(tail.size, end))
+            values[:tail.size] = tail
+            values[tail.size:first] = tail[-1]
+            values[first:end] = new.balance
+            values[end:] = new.balance[-1]
+
+        # The month of the last transaction stays open for the next statement
+        last = date.fromordinal(int(day[-1]))
+        tail_start = max(start, date(last.year, last.month, 1).toordinal())
+        closed = tail_start - start
+        if closed:
+            months = DailyBalanceSeries(start, values[:closed])._months()
+            self.balance_rows += DailyBalanceSeries._monthly_rows(*months)
+            self.balance_means += months[2].tolist()
+        self.tail_start = tail_start
+        self.tail = values[closed:].tolist()
+
+    # ----------------------------------------------------------------- metrics
+
+    def metrics(self) -> Dict:
+        """Current metrics, with the same fields as compute_bank_metrics"""
+        if self.last_day is None:
+            return _empty_metrics()
+
+        all_months = sorted(self.months)
+
+        # Balances: closed months as stored, open ones from the daily tail
+        open_months = DailyBalanceSeries(self.tail_start, np.asarray(self.tail))._months()
+        rows = self.balance_rows + DailyBalanceSeries._monthly_rows(*open_months)
+        means = np.array(self.balance_means + open_months[2].tolist())
+
+        # Salary: the largest credit of each month
+        salary_months = [m for m in all_months if self.months[m]["salary_count"]]
+        salary_amounts = [self.months[m]["salary_max"] for m in salary_months]
+        last_salary_date = (date.fromordinal(self.months[salary_months[-1]]["salary_day"])
+                            if salary_months else None)
+
+        # EMI: recurrence over every candidate seen so far
+        candidates = [
+            Txn(txn_date=date.fromordinal(d), narration=n, debit=dr, credit=cr, balance=b)
+            for d, dr, cr, b, n in self.emi_candidates
+        ]
+        emi_hits = detect_emi_debits(candidates)
+
+        # Spending: non-candidate debits plus candidates that are not EMIs
+        emi_keys = {(t.txn_date, int(round(t.debit)), _norm_text(t.narration)) for t in emi_hits}
+        spend = {m: agg["spend"] for m, agg in self.months.items()}
+        for t in candidates:
+            if (t.txn_date, int(round(t.debit)), _norm_text(t.narration)) not in emi_keys:
+                spend[_month_key(t.txn_date)] += t.debit
+
+        return {
+            "total_credits": round(self.total_credits, 2),
+            "total_debits": round(self.total_debits, 2),
+            "credit_count": self.credit_count,
+            "debit_count": self.debit_count,
+
+            "average_monthly_balance": round(float(means.mean()), 2),
+            "minimum_balance": min(r["minimum_balance"] for r in rows),
+            "monthly_balances": rows,
+
+            "salary_credits_detected": sum(agg["salary_count"] for agg in self.months.values()),
+            "average_monthly_salary": round(
+                sum(salary_amounts) / len(salary_amounts), 2) if salary_amounts else 0.0,
+            "salary_consistency_months": len(salary_months),
+            "last_salary_date": last_salary_date.isoformat() if last_salary_date else None,
+
+            **_emi_fields(emi_hits, all_months),
+
+            "average_monthly_spending": round(
+                sum(spend[m] for m in all_months) / len(all_months), 2),
+        }
+
+    # ------------------------------------------------------------- persistence
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serialisable snapshot (floats round-trip exactly); no account number"""
+        return {"version": STATE_VERSION, "account": account_digest(self.account_id),
+                **{k: getattr(self, k) for k in _FIELDS}}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], account_id: str) -> "BankMetricsState":
+        """Restore a snapshot of `account_id` written by to_dict"""
+        if data.get("version") != STATE_VERSION:
+            raise ValueError(f"Unsupported bank state version: {data.get('version')}")
+        if data.get("account") != account_digest(account_id):
+            raise ValueError("Bank state belongs to a different account")
+        state = cls(account_id)
+        for k in _FIELDS:
+            setattr(state, k, data[k])
+        return state
+
+
+_FIELDS = (
+    "employer_tokens", "statements", "updated_at", "first_day", "last_day",
+    "last_day_rows", "total_credits", "total_debits", "credit_count", "debit_count",
+    "months", "emi_candidates", "balance_rows", "balance_means", "tail_start", "tail",
+)
+
+
+def _fingerprint(t: Txn) -> list:
+    """Identity of a row within its day, for overlap de-duplication"""
+    narration = hashlib.sha256(_norm_text(t.narration).encode("utf-8")).hexdigest()[:16]
+    return [t.debit, t.credit, t.balance, narration]
+
+
+def account_digest(account_id: str) -> str:
+    """Stored in place of the account id, in file names and state files"""
+    return hashlib.sha256(account_id.encode("utf-8")).hexdigest()
+
+
+def mask_narration(narration: str) -> str:
+    """Narration with account-number-like digit runs masked"""
+    return _DIGIT_RUN.sub(
+        lambda m: "X" * (len(m.group()) - MASK_KEEP_DIGITS) + m.group()[-MASK_KEEP_DIGITS:],
+        narration)
+
+
+class BankStateStore:
+    """
+    One JSON file per account, written atomically
+
+    Updates to an account are serialised across API worker processes by
+    an flock on its own lock file, next to the state file.
+    """
+
+    def __init__(self, state_dir: Path):
+        self.state_dir = Path(state_dir)
+        self.state_dir.mkdir(exist_ok=True, parents=True)
+        self._locks: Dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+
+    def _path(self, account_id: str) -> Path:
+        # Hashed so account numbers never appear in file names
+        return self.state_dir / f"{account_digest(account_id)}.json"
+
+    @contextmanager
+    def locked(self, account_id: str) -> Iterator[None]:
+        """Serialise load / apply / save for one account across threads and processes"""
+        with self._guard:
+            lock = self._locks.setdefault(account_id, threading.Lock())
+        with lock, open(self._path(account_id).with_suffix(".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def load(self, account_id: str) -> Optional[BankMetricsState]:
+        """Stored state for an account, or None"""
+        path = self._path(account_id)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return BankMetricsState.from_dict(json.load(f), account_id)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"⚠️  Ignoring unreadable bank state {path.name[:12]}: {e}")
+            return None
+
+    def save(self, state: BankMetricsState) -> None:
+        path = self._path(state.account_id)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(state.to_dict(), f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except Exception:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    def delete(self, account_id: str) -> bool:
+        """Forget an account; the next statement starts a fresh state"""
+        try:
+            self._path(account_id).unlink()
+            return True
+        except FileNotFoundError:
+            return False
+
+
+# Process-wide instance used by the bank chain
+bank_state_store = BankStateStore(Config.BANK_STATE_DIR)
+
+
+def account_key(account_number: Optional[str]) -> Optional[str]:
+    """Whitespace-free account number, or None when it was not extracted"""
+    key = "".join((account_number or "").split())
+    return key if key and key.upper() != "NOTFOUND" else None
@@ -0,0 +1,113 @@
+"""
+Benchmark: row-at-a-time vs columnar bank metrics
+
+Generates synthetic statements (salary credits, recurring NACH/EMI debits,
+UPI/card spends, duplicate rows, unparseable dates) and times
+compute_bank_metrics_rows (tests/bank_metrics_reference.py) against compute_bank_metrics, checking both
+return identical output.
+
+Usage:
+    python benchmarks/bench_bank_metrics.py [--rows 1000 10000 100000] [--repeats 3]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tests"))
+os.environ.setdefault("GEMINI_API_KEY", "AIza-benchmark")
+
+from bank_metrics import TxnTable, compute_bank_metrics  # noqa: E402
+from bank_metrics_reference import compute_bank_metrics_rows  # noqa: E402
+
+DATE_STYLES = ["%d-%m-%Y", "%d/%m/%Y", "%Y-%m-%d", "%d-%b-%Y", "%d %b %Y"]
+
+SPEND_NARRATIONS = [
+    "UPI/{n}/SWIGGY/food", "POS {n} AMAZON PAY", "ATM WDL {n} MUMBAI",
+    "IMPS/P2A/{n}/RENT", "upi/{n}/bigbasket", "NEFT-{n}-ELECTRICITY BOARD",
+    "CHQ PAID {n}", "Card   txn  {n}  FLIPKART",
+]
+EMI_NARRATIONS = [
+    "NACH DR HDFC LOAN {n}", "ACH D- BAJAJ FINANCE {n}", "EMI  ICICI HL {n}",
+    "ECS TATA CAPITAL PL", "AUTO DEBIT LIC INSTALMENT",
+]
+
+
+def synthetic_statement(rows: int, seed: int = 0, months: int = 12):
+    """Raw transaction dicts as the bank chain produces them"""
+    rng = random.Random(seed)
+    start = date(2023, 4, 1)
+    emi_amounts = [rng.choice([4999.5, 12000.0, 8450.25, 23100.0]) for _ in range(3)]
+    balance = rng.uniform(5_000, 200_000)
+    out = []
+    for i in range(rows):
+        d = start + timedelta(days=rng.randrange(months * 30))
+        kind = rng.random()
+        debit = credit = 0.0
+        if kind < 0.03:
+            credit = rng.choice([85_000.0, 85_000.0, 92_500.5])
+            narration = rng.choice(["SALARY CREDIT ACME CORP", "NEFT ACME CORPORATION LTD",
+                                    "payroll  june", "Salary"])
+        elif kind < 0.08:
+            debit = rng.choice(emi_amounts)
+            narration = rng.choice(EMI_NARRATIONS).format(n=rng.randrange(3))
+        elif kind < 0.2:
+            credit = round(rng.uniform(10, 50_000), 2)
+            narration = f"UPI/CR/{rng.randrange(10**6)}/FRIEND"
+        else:
+            debit = round(rng.uniform(1, 20_000), 2)
+            narration = rng.choice(SPEND_NARRATIONS).format(n=rng.randrange(10**4))
+        balance += credit - debit
+        row = {
+            "date": d.strftime(rng.choice(DATE_STYLES)),
+            "narration": narration,
+            "debit": debit,
+            "credit": credit,
+            "balance": round(balance, 2),
+        }
+        if kind > 0.999:
+            row["date"] = "31/02/2024"  # unparseable - dropped by both engines
+        if kind > 0.995 and out:
+            row = dict(out[-1])  # duplicated row
+        out.append(row)
+    return out
+
+
+def best_of(fn, repeats: int) -> float:
+    runs = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - t0)
+    return min(runs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'rows engine':>12} {'columnar':>10} {'(build':>8} {'metrics)':>9} {'speed-up':>9}")
+    for rows in args.rows:
+        raw = synthetic_statement(rows, seed=rows)
+        employer = "Acme Corporation"
+        assert compute_bank_metrics(raw, employer) == compute_bank_metrics_rows(raw, employer)
+
+        t_rows = best_of(lambda: compute_bank_metrics_rows(raw, employer), args.repeats)
+        t_cols = best_of(lambda: compute_bank_metrics(raw, employer), args.repeats)
+        t_build = best_of(lambda: TxnTable.from_raw(raw), args.repeats)
+        table = TxnTable.from_raw(raw)
+        t_metrics = best_of(lambda: table.metrics(employer), args.repeats)
+        print(f"{rows:>8} {t_rows * 1000:>10.1f}ms {t_cols * 1000:>8.1f}ms "
+              f"{t_build * 1000:>7.1f}ms {t_metrics * 1000:>7.1f}ms {t_rows / t_cols:>8.1f}x")
+
+    print(f"\nbest of {args.repeats} runs; outputs of both engines asserted identical")
+
+
+if __name__ == "__main__":
+    main()
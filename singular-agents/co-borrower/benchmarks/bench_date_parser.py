@@ -0,0 +1,85 @@
+"""
+Benchmark: strptime format loop vs sniffed DateParser
+
+Parses the date column of synthetic statements - one date style throughout,
+a style the format list tries last, and a mixed/dirty column - and reports
+rows/s for bank_metrics._parse_date and a fresh DateParser per statement.
+
+Usage:
+    python benchmarks/bench_date_parser.py [--rows 10000 100000] [--repeats 3]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("GEMINI_API_KEY", "AIza-benchmark")
+
+from bank_metrics import DATE_FORMATS, _parse_date  # noqa: E402
+from date_parser import DateParser  # noqa: E402
+
+OUTLIERS = ["", "31/02/2024", "N/A", " 05-03-2024 ", "5 mar  2024", "2024-3-5"]
+
+
+def date_column(rows: int, styles, seed: int = 0, outlier_rate: float = 0.0,
+                span_days: int = 365):
+    rng = random.Random(seed)
+    start = date(1800, 1, 1) if span_days > 365 else date(2023, 4, 1)
+    out = []
+    for _ in range(rows):
+        if rng.random() < outlier_rate:
+            out.append(rng.choice(OUTLIERS))
+            continue
+        d = start + timedelta(days=rng.randrange(span_days))
+        out.append(d.strftime(rng.choice(styles)))
+    return out
+
+
+def best_of(fn, repeats: int) -> float:
+    runs = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - t0)
+    return min(runs)
+
+
+def parse_with_sniffing(column):
+    parse = DateParser.sniff(DATE_FORMATS, column)
+    return [parse(s) for s in column]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    cases = [
+        ("dd-mm-yyyy", ["%d-%m-%Y"], 0.0, 365),
+        ("dd Mon yyyy (last format)", ["%d %b %Y"], 0.0, 365),
+        ("mixed + 2% outliers", DATE_FORMATS, 0.02, 365),
+        # Nearly every string distinct: the regex fast path without memo hits
+        ("distinct dd Mon yyyy", ["%d %b %Y"], 0.0, 80_000),
+    ]
+    print(f"{'column':<28} {'rows':>8} {'strptime rows/s':>16} {'sniffed rows/s':>15} {'speed-up':>9}")
+    for rows in args.rows:
+        for label, styles, outlier_rate, span_days in cases:
+            column = date_column(rows, styles, seed=rows, outlier_rate=outlier_rate,
+                                 span_days=span_days)
+            assert parse_with_sniffing(column) == [_parse_date(s) for s in column]
+
+            t_old = best_of(lambda: [_parse_date(s) for s in column], args.repeats)
+            t_new = best_of(lambda: parse_with_sniffing(column), args.repeats)
+            print(f"{label:<28} {rows:>8} {rows / t_old:>16,.0f} {rows / t_new:>15,.0f} "
+                  f"{t_old / t_new:>8.1f}x")
+
+    print(f"\nbest of {args.repeats} runs; parsed dates asserted identical to strptime")
+
+
+if __name__ == "__main__":
+    main()
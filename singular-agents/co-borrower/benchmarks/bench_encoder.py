@@ -0,0 +1,152 @@
+"""
+Benchmark: page image encoding strategies
+
+Renders every PDF under testingdata/ (or --pdf) once and encodes each page
+with every strategy, reporting encode time, payload size and Gemini image
+tokens per page. Offline, the accuracy proxy is PSNR of the decoded page
+against the lossless render (upscaled back when the encoder downscaled).
+
+With --live (needs a real GEMINI_API_KEY) the bank statement is also run
+through BankStatementChain with the text fast path off, once per strategy,
+and the vision rows are scored against the rows parsed from its text layer.
+
+Usage:
+    python benchmarks/bench_encoder.py [--pdf PATH ...] [--dpi 200] [--live]
+"""
+import argparse
+import math
+import os
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("GEMINI_API_KEY", "AIza-benchmark")
+
+from PIL import Image, ImageChops  # noqa: E402
+
+from processors.image_encoder import EncodedImage, ImageEncoder, image_tokens  # noqa: E402
+
+TESTING_DATA = Path(__file__).resolve().parents[3] / "testingdata"
+DEFAULT_BANK_PDF = TESTING_DATA / "Anil Shah- Father" / "bankstatement_page-0001.pdf"
+
+
+class LegacyEncoder:
+    """JPEG q85 with optimize=True, as pages were encoded before ImageEncoder"""
+
+    def encode(self, image: Image.Image) -> EncodedImage:
+        buffered = BytesIO()
+        image.convert("RGB").save(buffered, format="JPEG", quality=85, optimize=True)
+        return EncodedImage(buffered.getvalue(), "image/jpeg", image.width, image.height, "colour", 85)
+
+
+STRATEGIES = {
+    "legacy": LegacyEncoder,
+    "fixed": lambda: ImageEncoder(auto=False),
+    "auto": lambda: ImageEncoder(),
+    "auto-webp": lambda: ImageEncoder(lossy_format="webp"),
+    "auto-150KB": lambda: ImageEncoder(max_bytes=150_000),
+    "auto-60KB": lambda: ImageEncoder(max_bytes=60_000),
+    "auto-2tiles": lambda: ImageEncoder(max_tokens=2 * 258),
+}
+
+
+def rendered_pages(pdf: Path, dpi: int) -> list:
+    """Pages as the chains render them, before encoding"""
+    from processors.pdf_processor import MAX_IMAGE_SIDE, PDFProcessor
+
+    max_size = (MAX_IMAGE_SIDE, MAX_IMAGE_SIDE)
+    return [PDFProcessor.optimize_image(img, max_size=max_size)
+            for _, img in PDFProcessor.iter_render_pages(str(pdf), 30, dpi, max_size=max_size)]
+
+
+def psnr(reference: Image.Image, encoded: EncodedImage) -> float:
+    """Luma PSNR of the decoded payload against the render, in dB"""
+    decoded = Image.open(BytesIO(encoded.data)).convert("L")
+    if decoded.size != reference.size:
+        decoded = decoded.resize(reference.size, Image.Resampling.LANCZOS)
+    histogram = ImageChops.difference(reference.convert("L"), decoded).histogram()
+    mse = sum(count * value * value for value, count in enumerate(histogram)) / \
+        (reference.width * reference.height)
+    return float("inf") if mse == 0 else 10 * math.log10(255 * 255 / mse)
+
+
+def bench_offline(pdfs: list, dpi: int, repeats: int) -> None:
+    print(f"\nPage encoding @ {dpi} DPI (ms, KB and tokens per page; PSNR vs render)")
+    print(f"{'document':<28} {'strategy':<12} {'ms':>7} {'KB':>7} {'tokens':>7} {'PSNR':>7}  kinds")
+    for pdf in pdfs:
+        pages = rendered_pages(pdf, dpi)
+        if not pages:
+            continue
+        for name, factory in STRATEGIES.items():
+            encoder = factory()
+            start = time.perf_counter()
+            for _ in range(repeats):
+                encoded = [encoder.encode(page) for page in pages]
+            ms = (time.perf_counter() - start) * 1000 / (repeats * len(pages))
+            kb = sum(len(e.data) for e in encoded) / 1024 / len(pages)
+            tokens = sum(image_tokens(e.width, e.height) for e in encoded) / len(pages)
+            quality = sum(psnr(p, e) for p, e in zip(pages, encoded)) / len(pages)
+            kinds = ",".join(sorted({e.kind for e in encoded}))
+            print(f"{pdf.name[:28]:<28} {name:<12} {ms:>7.1f} {kb:>7.1f} {tokens:>7.0f} "
+                  f"{quality:>6.1f}  {kinds}")
+
+
+def bench_live(pdf: Path) -> None:
+    """Vision extraction per strategy, scored against the statement's text layer"""
+    from chains.bank_chain import BankStatementChain
+    from config import Config
+    from processors.bank_text_extractor import BankTextExtractor
+
+    truth = [row.as_transaction()
+             for page in BankTextExtractor.extract(str(pdf)).valid_pages for row in page.rows]
+    if not truth:
+        print(f"\n{pdf.name} has no parseable text layer; nothing to score against")
+        return
+    truth_keys = {BankStatementChain._row_key(row) for row in truth}
+
+    Config.BANK_TEXT_FAST_PATH = False
+    chain = BankStatementChain()
+    prompt = chain._prompt_transactions_only()
+    print(f"\nBank extraction accuracy: {pdf.name} ({len(truth)} text-layer rows)")
+    print(f"{'strategy':<12} {'seconds':>8} {'rows':>6} {'recall':>7} {'precision':>10}")
+    for name, factory in STRATEGIES.items():
+        chain.encoder = factory()
+        start = time.perf_counter()
+        merged, failed = chain._extract_transactions(str(pdf), prompt)
+        elapsed = time.perf_counter() - start
+        keys = {BankStatementChain._row_key(row) for row in merged["transactions"]}
+        hits = len(keys & truth_keys)
+        precision = hits / len(keys) if keys else 0.0
+        note = f"  ({failed} failed batch(es))" if failed else ""
+        print(f"{name:<12} {elapsed:>8.1f} {len(keys):>6} {hits / len(truth_keys):>7.1%} "
+              f"{precision:>10.1%}{note}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pdf", type=Path, nargs="+",
+                        help="PDFs to encode (default: every PDF under testingdata/)")
+    parser.add_argument("--dpi", type=int, default=200)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--live", action="store_true",
+                        help="Also score bank extraction per strategy (calls Gemini)")
+    parser.add_argument("--bank-pdf", type=Path, default=DEFAULT_BANK_PDF)
+    args = parser.parse_args()
+
+    pdfs = args.pdf or sorted(TESTING_DATA.rglob("*.pdf"))
+    if not pdfs:
+        print(f"No PDFs found under {TESTING_DATA}")
+        return
+    bench_offline(pdfs, args.dpi, args.repeats)
+
+    if args.live:
+        if not args.bank_pdf.exists():
+            print(f"Bank statement not found: {args.bank_pdf}")
+            return
+        bench_live(args.bank_pdf)
+
+
+if __name__ == "__main__":
+    main()
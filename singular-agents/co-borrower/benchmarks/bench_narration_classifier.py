@@ -0,0 +1,77 @@
+"""
+Benchmark: per-detector regex passes vs the narration classifier
+
+Tags every narration of a synthetic statement the old way (normalise, then
+salary regex + employer-token loop, EMI regex, and the bounce / transfer
+regexes, each as its own pass) and with NarrationClassifier.classify_batch,
+reporting narrations/s and checking the tags agree.
+
+Usage:
+    python benchmarks/bench_narration_classifier.py [--rows 10000 100000] [--repeats 3]
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("GEMINI_API_KEY", "AIza-benchmark")
+
+from bench_bank_metrics import best_of, synthetic_statement  # noqa: E402
+from narration_classifier import (  # noqa: E402
+    BOUNCE_KEYWORDS, EMI_KEYWORDS, SALARY_KEYWORDS, TRANSFER_KEYWORDS,
+    NarrationClassifier, NarrationTag, employer_tokens, normalize_narration,
+)
+
+EMPLOYER = "Acme Corporation"
+
+
+def separate_passes(narrations, employer_name):
+    """One regex pass per tag, as the detectors did before the classifier"""
+    tokens = employer_tokens(employer_name)
+    salary, emi, employer, bounce, transfer = (int(t) for t in (
+        NarrationTag.SALARY, NarrationTag.EMI, NarrationTag.EMPLOYER,
+        NarrationTag.BOUNCE, NarrationTag.TRANSFER))
+    norms = [normalize_narration(n) for n in narrations]
+    tags = [0] * len(narrations)
+    for i, nar in enumerate(norms):
+        if SALARY_KEYWORDS.search(nar):
+            tags[i] |= salary
+        if tokens and any(tok in nar for tok in tokens):
+            tags[i] |= employer
+    for i, raw in enumerate(narrations):
+        if EMI_KEYWORDS.search(raw or ""):
+            tags[i] |= emi
+    for i, nar in enumerate(norms):
+        if BOUNCE_KEYWORDS.search(nar):
+            tags[i] |= bounce
+        if TRANSFER_KEYWORDS.search(nar):
+            tags[i] |= transfer
+    return tags
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'distinct':>9} {'separate/s':>12} {'classifier/s':>13} {'speed-up':>9}")
+    for rows in args.rows:
+        narrations = [t["narration"] for t in synthetic_statement(rows, seed=rows)]
+        # Compile outside the timed region, as classifier_for() caches it
+        classifier = NarrationClassifier(EMPLOYER)
+        assert classifier.classify_batch(narrations).tolist() == \
+            separate_passes(narrations, EMPLOYER)
+
+        t_old = best_of(lambda: separate_passes(narrations, EMPLOYER), args.repeats)
+        t_new = best_of(lambda: classifier.classify_batch(narrations), args.repeats)
+        print(f"{rows:>8} {len(set(narrations)):>9} {rows / t_old:>12,.0f} "
+              f"{rows / t_new:>13,.0f} {t_old / t_new:>8.1f}x")
+
+    print(f"\nbest of {args.repeats} runs; tags asserted identical")
+
+
+if __name__ == "__main__":
+    main()
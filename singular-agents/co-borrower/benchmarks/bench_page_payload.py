@@ -0,0 +1,126 @@
+"""
+Benchmark: peak memory of page payloads per concurrent request
+
+Compares the old dict payloads (PIL bitmap + base64 string kept per page)
+with PagePayload (JPEG bytes only, base64 built per message). Each run is a
+fresh subprocess in which `--concurrency` threads each render the statement
+(repeated to `--pages` pages), hold the payloads as a chain does and build
+one request message from them. Reports peak RSS above the idle baseline.
+
+Usage:
+    python benchmarks/bench_page_payload.py [--pdf PATH] [--pages 30] [--concurrency 1 4 8]
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+DEFAULT_PDF = Path(__file__).resolve().parents[3] / \
+    "testingdata" / "Anil Shah- Father" / "bankstatement_page-0001.pdf"
+
+LAYOUTS = ["dict", "payload"]
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def statement(pdf: str, pages: int):
+    """The sample statement repeated to `pages` pages, in memory"""
+    import fitz
+    from processors.pdf_source import PDFSource
+
+    with fitz.open(pdf) as src, fitz.open() as doc:
+        while len(doc) < pages:
+            doc.insert_pdf(src, to_page=min(len(src), pages - len(doc)) - 1)
+        return PDFSource.from_bytes("statement.pdf", doc.tobytes())
+
+
+def dict_pages(source, dpi: int) -> list:
+    """Payloads as process_pdf_for_gemini built them before PagePayload"""
+    from processors.pdf_processor import MAX_IMAGE_SIDE, PDFProcessor
+
+    max_size = (MAX_IMAGE_SIDE, MAX_IMAGE_SIDE)
+    out = []
+    for index, img in PDFProcessor.iter_render_pages(source, 1000, dpi, max_size=max_size):
+        img = PDFProcessor.optimize_image(img, max_size=max_size)
+        out.append({"page_number": index + 1, "image": img,
+                    "base64": PDFProcessor.image_to_base64(img, quality=85),
+                    "mime_type": "image/jpeg"})
+    return out
+
+
+def run_layout(pdf: str, layout: str, pages: int, concurrency: int, dpi: int) -> dict:
+    """Child process body: render concurrently, hold payloads, build messages"""
+    from processors.pdf_processor import PDFProcessor
+
+    source = statement(pdf, pages)
+    PDFProcessor.process_pdf_for_gemini(source, max_pages=1, dpi=dpi, render_mode="target")
+    baseline = peak_rss_mb()
+
+    held = threading.Barrier(concurrency)
+
+    def request():
+        if layout == "dict":
+            payloads = dict_pages(source, dpi)
+            message = [f"data:{p['mime_type']};base64,{p['base64']}" for p in payloads]
+        else:
+            payloads = PDFProcessor.process_pdf_for_gemini(
+                source, max_pages=pages, dpi=dpi, render_mode="target")
+            message = [p.data_url() for p in payloads]
+        # Every request holds its pages and message at the same time
+        held.wait()
+        return len(payloads), len(message)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=request) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    peak = peak_rss_mb()
+    return {"seconds": elapsed, "peak_mb": peak - baseline,
+            "per_request_mb": (peak - baseline) / concurrency}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pdf", type=Path, default=DEFAULT_PDF)
+    parser.add_argument("--pages", type=int, default=30)
+    parser.add_argument("--dpi", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--child", nargs=2, metavar=("LAYOUT", "CONCURRENCY"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        layout, concurrency = args.child
+        print(json.dumps(run_layout(str(args.pdf), layout, args.pages, int(concurrency), args.dpi)))
+        return
+
+    if not args.pdf.exists():
+        print(f"Sample PDF not found: {args.pdf}")
+        return
+
+    print(f"\nPage payload memory: {args.pages} pages @ {args.dpi} DPI ({args.pdf.name})")
+    print(f"{'layout':<8} {'requests':>8} {'seconds':>8} {'peak RSS':>10} {'per request':>12}")
+    for concurrency in args.concurrency:
+        for layout in LAYOUTS:
+            out = subprocess.run(
+                [sys.executable, __file__, "--pdf", str(args.pdf), "--pages", str(args.pages),
+                 "--dpi", str(args.dpi), "--child", layout, str(concurrency)],
+                capture_output=True, text=True, check=True)
+            r = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"{layout:<8} {concurrency:>8} {r['seconds']:>8.1f} "
+                  f"{r['peak_mb']:>8.0f}MB {r['per_request_mb']:>10.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark: sequential vs multi-process page rasterisation
+
+Builds statements of increasing page count by repeating the sample bank
+statement in testingdata/, then times PDFProcessor.pdf_to_images with
+different worker counts.
+
+Usage:
+    python benchmarks/bench_render.py [--pdf PATH] [--dpi 300] [--workers 2 4]
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import fitz
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from processors.pdf_processor import PDFProcessor  # noqa: E402
+
+DEFAULT_PDF = Path(__file__).resolve().parents[3] / \
+    "testingdata" / "Anil Shah- Father" / "bankstatement_page-0001.pdf"
+
+
+def build_statement(src: Path, pages: int, out_dir: Path) -> Path:
+    """Repeat the source document until it has the requested page count"""
+    out = out_dir / f"statement_{pages}p.pdf"
+    with fitz.open(src) as source, fitz.open() as doc:
+        while len(doc) < pages:
+            remaining = pages - len(doc)
+            doc.insert_pdf(source, to_page=min(len(source), remaining) - 1)
+        doc.save(out)
+    return out
+
+
+def time_render(pdf: Path, pages: int, dpi: int, workers: int, repeats: int) -> float:
+    runs = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        images = PDFProcessor.pdf_to_images(str(pdf), max_pages=pages, dpi=dpi, workers=workers)
+        runs.append(time.perf_counter() - start)
+        assert len(images) == pages
+    return statistics.median(runs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pdf", type=Path, default=DEFAULT_PDF)
+    parser.add_argument("--dpi", type=int, default=300)
+    parser.add_argument("--pages", type=int, nargs="+", default=[5, 10, 20, 30])
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    if not args.pdf.exists():
+        print(f"Sample PDF not found: {args.pdf}")
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Warm the pool so process start-up is not billed to the first row
+        warm = build_statement(args.pdf, 4, Path(tmp))
+        for w in args.workers:
+            PDFProcessor.pdf_to_images(str(warm), max_pages=4, dpi=72, workers=w)
+
+        header = f"{'pages':>6} {'1 worker':>10}" + "".join(
+            f" {f'{w} workers':>18}" for w in args.workers)
+        print(f"\nRender benchmark @ {args.dpi} DPI ({args.pdf.name})")
+        print(header)
+        print("-" * len(header))
+        for pages in args.pages:
+            pdf = build_statement(args.pdf, pages, Path(tmp))
+            base = time_render(pdf, pages, args.dpi, 1, args.repeats)
+            row = f"{pages:>6} {base:>9.2f}s"
+            for w in args.workers:
+                t = time_render(pdf, pages, args.dpi, w, args.repeats)
+                row += f" {t:>9.2f}s ({base / t:4.1f}x)"
+            print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark: render-then-thumbnail vs render-at-target-size
+
+Each mode runs in a fresh subprocess so peak RSS is measured in isolation.
+Reports per-page time, peak RSS and payload size for
+PDFProcessor.process_pdf_for_gemini.
+
+Usage:
+    python benchmarks/bench_render_modes.py [--pdf PATH] [--dpi 300]
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+DEFAULT_PDF = Path(__file__).resolve().parents[3] / \
+    "testingdata" / "Anil Shah- Father" / "bankstatement_page-0001.pdf"
+
+MODES = [
+    ("thumbnail", False),
+    ("target", False),
+    ("target", True),
+]
+
+
+def run_mode(pdf: str, dpi: int, mode: str, grayscale: bool) -> dict:
+    """Child process body: render once and report timings"""
+    from processors.pdf_processor import PDFProcessor
+
+    start = time.perf_counter()
+    pages = PDFProcessor.process_pdf_for_gemini(
+        pdf, max_pages=30, dpi=dpi, render_mode=mode, grayscale=grayscale)
+    elapsed = time.perf_counter() - start
+    return {
+        "pages": len(pages),
+        "seconds_per_page": elapsed / max(1, len(pages)),
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "payload_kb": sum(p.base64_length for p in pages) / 1024,
+        "size": list(pages[0].size) if pages else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pdf", type=Path, default=DEFAULT_PDF)
+    parser.add_argument("--dpi", type=int, default=300)
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "GRAY"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        mode, gray = args.child
+        print(json.dumps(run_mode(str(args.pdf), args.dpi, mode, gray == "1")))
+        return
+
+    if not args.pdf.exists():
+        print(f"Sample PDF not found: {args.pdf}")
+        return
+
+    print(f"\nRender mode benchmark @ {args.dpi} DPI ({args.pdf.name})")
+    print(f"{'mode':<16} {'pages':>5} {'ms/page':>9} {'peak RSS':>10} {'payload':>10} {'size':>12}")
+    for mode, gray in MODES:
+        out = subprocess.run(
+            [sys.executable, __file__, "--pdf", str(args.pdf), "--dpi", str(args.dpi),
+             "--child", mode, "1" if gray else "0"],
+            capture_output=True, text=True, check=True)
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        label = mode + (" (grey)" if gray else "")
+        print(f"{label:<16} {r['pages']:>5} {r['seconds_per_page'] * 1000:>8.0f} "
+              f"{r['peak_rss_mb']:>8.0f}MB {r['payload_kb']:>8.0f}KB {str(tuple(r['size'])):>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Benchmark: keyed transaction objects vs positional rows as LLM output
+
+Offline (default): serialises synthetic statement pages both ways, as the
+model lays them out, and compares estimated output tokens, the generation
+latency those imply, and local decode time. The token estimate follows
+Gemini's tokenizer loosely (digits are one token each, words about four
+characters per token, punctuation one token); use --live for real counts.
+
+Live (--live, needs a real GEMINI_API_KEY): sends the sample statement in
+testingdata/ with each prompt and reports Gemini's output token usage,
+wall-clock latency and the number of rows decoded.
+
+Usage:
+    python benchmarks/bench_wire_format.py [--rows-per-page 25 40] [--pages 1 5]
+    python benchmarks/bench_wire_format.py --live [--pdf PATH] [--repeats 2]
+"""
+import argparse
+import json
+import math
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("GEMINI_API_KEY", "AIza-benchmark")
+
+from bench_bank_metrics import best_of, synthetic_statement  # noqa: E402
+from chains.wire_format import FORMAT_OBJECTS, FORMAT_ROWS, decode_answer, encode_rows  # noqa: E402
+
+DEFAULT_PDF = Path(__file__).resolve().parents[3] / \
+    "testingdata" / "Anil Shah- Father" / "bankstatement_page-0001.pdf"
+
+HEADER = {
+    "account_holder_name": "ANIL RATILAL SHAH",
+    "bank_name": "STATE BANK OF INDIA",
+    "account_number": "00000012345678901",
+    "account_type": "SAVINGS",
+    "statement_period_start": "2024-04-01",
+    "statement_period_end": "2025-03-31",
+    "opening_balance": 152340.55,
+    "closing_balance": 98310.2,
+}
+
+_PIECES = re.compile(r"\d|[A-Za-z]+|\s+|[^\sA-Za-z\d]")
+
+
+def approx_tokens(text: str) -> int:
+    """Rough Gemini token count (see module docstring)"""
+    total = 0
+    for piece in _PIECES.findall(text):
+        if piece[0].isalpha():
+            total += math.ceil(len(piece) / 4)
+        elif not piece.isspace() or "\n" in piece:
+            total += 1
+    return total
+
+
+def answer_text(transactions, output_format: str) -> str:
+    """An answer as the model writes it: indented header, one row per line"""
+    if output_format == FORMAT_OBJECTS:
+        return json.dumps({**HEADER, "transactions": transactions,
+                           "extraction_confidence": 0.9, "extraction_notes": []}, indent=2)
+    rows = ",\n".join("    " + json.dumps(r) for r in encode_rows(transactions))
+    head = json.dumps(HEADER, indent=2)[:-2]
+    return (f"{head},\n  \"rows\": [\n{rows}\n  ],\n"
+            f"  \"extraction_confidence\": 0.9,\n  \"extraction_notes\": []\n}}")
+
+
+def offline(args):
+    print(f"{'rows/page':>9} {'pages':>5} {'objects tok':>12} {'rows tok':>9} {'saved':>6} "
+          f"{'objects s':>10} {'rows s':>7} {'decode obj':>11} {'decode rows':>12}")
+    for per_page in args.rows_per_page:
+        for pages in args.pages:
+            txns = synthetic_statement(per_page * pages, seed=per_page * pages)
+            texts = {fmt: answer_text(txns, fmt) for fmt in (FORMAT_OBJECTS, FORMAT_ROWS)}
+            tokens = {fmt: approx_tokens(t) for fmt, t in texts.items()}
+            decode = {fmt: best_of(lambda t=t: decode_answer(json.loads(t)), args.repeats)
+                      for fmt, t in texts.items()}
+            assert decode_answer(json.loads(texts[FORMAT_ROWS]))["transactions"] == \
+                json.loads(texts[FORMAT_OBJECTS])["transactions"]
+
+            obj, row = tokens[FORMAT_OBJECTS], tokens[FORMAT_ROWS]
+            print(f"{per_page:>9} {pages:>5} {obj:>12,} {row:>9,} {1 - row / obj:>6.0%} "
+                  f"{obj / args.tokens_per_second:>10.1f} {row / args.tokens_per_second:>7.1f} "
+                  f"{decode[FORMAT_OBJECTS] * 1e3:>9.2f}ms {decode[FORMAT_ROWS] * 1e3:>10.2f}ms")
+    print(f"\nlatency estimated at {args.tokens_per_second:.0f} output tokens/s; "
+          f"decoded rows asserted identical")
+
+
+def live(args):
+    from config import Config
+    from chains.bank_chain import BankStatementChain
+    from processors.pdf_processor import PDFProcessor
+
+    if not args.pdf.exists():
+        print(f"Sample PDF not found: {args.pdf}")
+        return
+    pages = PDFProcessor.process_pdf_for_gemini(
+        str(args.pdf), max_pages=Config.MAX_PDF_PAGES, dpi=Config.PDF_DPI,
+        render_mode=Config.PDF_RENDER_MODE)
+
+    print(f"{args.pdf.name}: {len(pages)} page(s)")
+    print(f"{'format':>8} {'run':>4} {'output tok':>11} {'seconds':>8} {'rows':>5}")
+    for fmt in (FORMAT_OBJECTS, FORMAT_ROWS):
+        Config.BANK_OUTPUT_FORMAT = fmt
+        chain = BankStatementChain()
+        messages = chain.create_gemini_content(chain._prompt_transactions_only(), pages)
+        for run in range(1, args.repeats + 1):
+            start = time.perf_counter()
+            resp = chain.llm.invoke(messages)
+            elapsed = time.perf_counter() - start
+            data, _ = chain._read_response(resp)
+            usage = getattr(resp, "usage_metadata", None) or {}
+            print(f"{fmt:>8} {run:>4} {usage.get('output_tokens', 0):>11,} {elapsed:>8.1f} "
+                  f"{len((data or {}).get('transactions') or []):>5}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows-per-page", type=int, nargs="+", default=[25, 40])
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 5])
+    parser.add_argument("--tokens-per-second", type=float, default=180.0)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--live", action="store_true")
+    parser.add_argument("--pdf", type=Path, default=DEFAULT_PDF)
+    args = parser.parse_args()
+    live(args) if args.live else offline(args)
+
+
+if __name__ == "__main__":
+    main()
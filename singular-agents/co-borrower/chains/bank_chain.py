@@ -3,20 +3,124 @@ Bank Statement Chain - Extracts transactions via LLM, computes metrics determini
 CORRECTED: Fixed JSON parsing regex
 """
 from __future__ import annotations
-import json
+import asyncio
 import logging
-import re
-from pathlib import Path
-from typing import Any, Dict, List
+import threading
+from concurrent.futures import FIRST_COMPLETED, wait
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Dict, Generator, Iterable, Iterator, List
 
 from chains.base_chain import BaseChain
+from chains.batching import BatchBudget, describe, iter_batches, text_tokens
+from chains.llm_output import (RowStream, StreamedAnswer, chunk_text, is_truncated,
+                               parse_json_answer, salvage_json)
+from chains.wire_format import FORMAT_OBJECTS, answer_schema, decode_answer, decode_rows, format_row
 from config import Config
-from processors.pdf_processor import PDFProcessor
+from processors.pdf_processor import PagePayload, PDFProcessor
+from processors.bank_text_extractor import BankTextExtractor
+from processors.pdf_source import PDFInput, source_name
+from scheduler import Overloaded, scheduler
 from schemas import BankStatementData, BankTransaction
+from utils import ProgressCallback, report_progress
 from bank_metrics import compute_bank_metrics
+from bank_state import BankMetricsState, account_key, bank_state_store
 
 logger = logging.getLogger(__name__)
 
+# Text-layer rows are parsed deterministically and balance-verified
+TEXT_LAYER_CONFIDENCE = 0.95
+
+# How far into a continuation to look for rows repeated from the previous answer
+CONTINUATION_OVERLAP_ROWS = 10
+
+# Metrics reported while rows are still streaming in
+PROVISIONAL_METRIC_FIELDS = ("average_monthly_balance", "minimum_balance", "average_monthly_salary",
+                             "average_monthly_emi", "total_credits", "total_debits")
+
+RowsCallback = Callable[[List[Dict[str, Any]]], None]
+
+
+class TransactionStream:
+    """Validated transactions of one streamed answer, delivered as they complete"""
+
+    def __init__(self, on_rows: RowsCallback | None = None):
+        self.parser = RowStream()
+        self.rows: List[Dict[str, Any]] = []
+        self.invalid = 0
+        self.response_metadata: Dict[str, Any] = {}
+        self._on_rows = on_rows
+
+    def add(self, chunk) -> None:
+        """Parse one chunk, validating and passing on the rows it completes"""
+        self.response_metadata.update(getattr(chunk, "response_metadata", None) or {})
+        new: List[Dict[str, Any]] = []
+        for item in self.parser.feed(chunk_text(chunk)):
+            if self.parser.list_key == "rows":
+                decoded, bad = decode_rows([item])
+            else:
+                decoded, bad = ([item], 0) if isinstance(item, dict) else ([], 1)
+            self.invalid += bad
+            for t in decoded:
+                try:
+                    new.append(BankTransaction(**t).model_dump())
+                except Exception:
+                    self.invalid += 1
+        if new:
+            self.rows.extend(new)
+            if self._on_rows:
+                self._on_rows(new)
+
+    def answer(self, error: Exception | None = None) -> StreamedAnswer:
+        """
+        The parsed answer. A stream broken off by an error counts as
+        truncated when it delivered rows, and re-raises the error otherwise.
+        """
+        if error is not None and not self.rows:
+            raise error
+        if not self.parser.started:
+            if error is None and not is_truncated(self):
+                raise ValueError("Could not parse JSON from bank response")
+            return StreamedAnswer(None, True, self.response_metadata)
+
+        data = dict(self.parser.header)
+        data["transactions"] = self.rows
+        notes = data["extraction_notes"] = list(data.get("extraction_notes") or [])
+        skipped = self.invalid + self.parser.skipped
+        if skipped:
+            logger.warning(f"   ⚠️  Skipped {skipped} malformed row(s)")
+            notes.append(f"Skipped {skipped} malformed row(s)")
+        if error is not None:
+            notes.append(f"Response stream broke off after {len(self.rows)} transactions: {error}")
+        return StreamedAnswer(data, not self.parser.complete, self.response_metadata)
+
+
+class ProvisionalMetrics:
+    """Metrics over the rows streamed so far, reported as "bank" progress events"""
+
+    def __init__(self, progress: ProgressCallback, rows: List[Dict[str, Any]] = (),
+                 every: int | None = None):
+        self._progress = progress
+        self._rows = list(rows)
+        self._every = max(1, every or Config.BANK_STREAM_METRICS_EVERY)
+        self._reported = len(self._rows)
+        self._lock = threading.Lock()
+
+    def __call__(self, rows: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._rows.extend(rows)
+            if len(self._rows) - self._reported < self._every:
+                return
+            self._reported = len(self._rows)
+            snapshot = list(self._rows)
+        try:
+            metrics = compute_bank_metrics(snapshot)
+        except Exception as e:
+            logger.warning(f"   ⚠️  Provisional metrics failed: {e}")
+            return
+        report_progress(self._progress, "bank", "progress",
+                        f"{len(snapshot)} transactions so far", transactions=len(snapshot),
+                        provisional_metrics={k: metrics[k] for k in PROVISIONAL_METRIC_FIELDS})
+
 
 class BankStatementChain(BaseChain):
     """
@@ -25,9 +129,45 @@ class BankStatementChain(BaseChain):
     """
 
     def __init__(self):
-        super().__init__(model_name=Config.GEMINI_VISION_MODEL, temperature=0.0)
+        super().__init__(model_name=Config.GEMINI_VISION_MODEL, temperature=0.0,
+                         response_schema=answer_schema(Config.BANK_OUTPUT_FORMAT))
 
     def _prompt_transactions_only(self) -> str:
+        if Config.BANK_OUTPUT_FORMAT == FORMAT_OBJECTS:
+            return self._prompt_transaction_objects()
+        return """You are extracting bank statement data for loan application analysis.
+
+Return ONLY valid JSON with EXACT structure below. Do NOT add markdown fences or extra text.
+
+{
+  "account_holder_name": "string",
+  "bank_name": "string",
+  "account_number": "string",
+  "account_type": "string",
+  "statement_period_start": "YYYY-MM-DD",
+  "statement_period_end": "YYYY-MM-DD",
+  "opening_balance": 0.0,
+  "closing_balance": 0.0,
+  "rows": [
+    ["DD-MM-YYYY", "exact transaction description", 0.0, 0.0, 0.0]
+  ],
+  "extraction_confidence": 0.9,
+  "extraction_notes": ["any observations"]
+}
+
+CRITICAL RULES:
+- "rows" has one array per transaction with exactly 5 values, in this order:
+  date, narration, debit, credit, balance
+- Extract ALL transactions from ALL pages provided
+- Use 0 for an empty debit or credit, "" for empty strings
+- Keep narration exactly as shown (don't summarize)
+- Date format: DD-MM-YYYY preferred
+- Never output null values
+- Return pure JSON only (no markdown fences)"""
+
+    @staticmethod
+    def _prompt_transaction_objects() -> str:
+        """Prompt for one keyed JSON object per transaction (BANK_OUTPUT_FORMAT=objects)"""
         return """You are extracting bank statement data for loan application analysis.
 
 Return ONLY valid JSON with EXACT structure below. Do NOT add markdown fences or extra text.
@@ -63,71 +203,198 @@ CRITICAL RULES:
 - Return pure JSON only (no markdown fences)"""
 
     def _parse_json(self, text: str) -> Dict[str, Any]:
-        """Parse JSON from LLM response with multiple fallback strategies - CORRECTED"""
-        cleaned = (text or "").strip()
-
-        # Strategy 1: direct parse
+        """Parse the JSON answer (bare with structured output; cleaned up otherwise)"""
         try:
-            return json.loads(cleaned)
-        except Exception:
-            pass
+            return parse_json_answer(text)
+        except ValueError as e:
+            logger.warning(f"   ⚠️  JSON parse attempt failed: {e}")
+            raise ValueError("Could not parse JSON from bank response") from e
+
+    def process(self, bank_statement_pdf: PDFInput, employer_name: str | None = None,
+                bypass_cache: bool = False,
+                progress: ProgressCallback | None = None) -> BankStatementData:
+        """
+        Process bank statement PDF and compute precise metrics.
 
-        # Strategy 2: remove fenced block if any - FIXED REGEX
-        matches = re.findall(r"```json\s*(\{.*?\})\s*```", cleaned, re.DOTALL)
-        if matches:
-            try:
-                return json.loads(matches[0].strip())
-            except Exception:
-                pass
+        Args:
+            bank_statement_pdf: Path to bank statement PDF or in-memory PDFSource
+            employer_name: Optional employer name for better salary detection
+            bypass_cache: Force a fresh extraction even if a cached one exists
+            progress: Optional callback receiving "bank" batch i/n events
 
-        # Strategy 2b: Try without json keyword
-        matches = re.findall(r"```\s*(\{.*?\})\s*```", cleaned, re.DOTALL)
-        if matches:
-            try:
-                return json.loads(matches[0].strip())
-            except Exception:
-                pass
-
-        # Strategy 3: find JSON boundaries
-        start = cleaned.find("{")
-        end = cleaned.rfind("}")
-        if start != -1 and end != -1 and start < end:
-            s = cleaned[start:end + 1]
-            # Fix trailing commas
-            s = re.sub(r",(\s*[}\]])", r"\1", s)
-            try:
-                return json.loads(s)
-            except Exception as e:
-                logger.warning(f"   ⚠️  JSON parse attempt failed: {e}")
-                pass
+        Returns:
+            BankStatementData with deterministic metrics
+        """
+        logger.info(
+            f"🏦 Processing bank statement: {source_name(bank_statement_pdf)}")
 
-        raise ValueError("Could not parse JSON from bank response")
+        merged = self._load_or_extract(bank_statement_pdf, bypass_cache, progress)
+        return scheduler.cpu.call(self._build_statement, merged, employer_name)
 
-    def process(self, bank_statement_pdf: str, employer_name: str | None = None) -> BankStatementData:
+    def process_incremental(self, bank_statement_pdf: PDFInput, employer_name: str | None = None,
+                            account_id: str | None = None, bypass_cache: bool = False,
+                            progress: ProgressCallback | None = None) -> BankStatementData:
         """
-        Process bank statement PDF and compute precise metrics.
+        Process one new statement for an account seen before.
+
+        Its rows are merged into the stored per-account state, and the
+        metrics cover every statement merged so far without re-extracting
+        the earlier ones. transactions holds only this statement's rows.
 
         Args:
-            bank_statement_pdf: Path to bank statement PDF
-            employer_name: Optional employer name for better salary detection
+            bank_statement_pdf: Path to bank statement PDF or in-memory PDFSource
+            employer_name: Optional employer name; must match the stored state
+            account_id: State key; defaults to the extracted account number
+            bypass_cache: Force a fresh extraction even if a cached one exists
+            progress: Optional callback receiving "bank" batch i/n events
 
         Returns:
-            BankStatementData with deterministic metrics
+            BankStatementData with metrics for all merged statements
         """
         logger.info(
-            f"🏦 Processing bank statement: {Path(bank_statement_pdf).name}")
+            f"🏦 Processing bank statement incrementally: {source_name(bank_statement_pdf)}")
 
-        # Convert PDF to images
-        images = PDFProcessor.process_pdf_for_gemini(
-            bank_statement_pdf, max_pages=Config.MAX_PDF_PAGES)
-        logger.info(f"   ✅ Loaded {len(images)} pages")
+        merged = self._load_or_extract(bank_statement_pdf, bypass_cache, progress)
+        return self._merge_into_state(merged, employer_name, account_id)
+
+    async def aprocess_incremental(self, bank_statement_pdf: PDFInput,
+                                   employer_name: str | None = None,
+                                   account_id: str | None = None, bypass_cache: bool = False,
+                                   progress: ProgressCallback | None = None) -> BankStatementData:
+        """Async variant of process_incremental; the state merge runs on the cpu pool"""
+        logger.info(
+            f"🏦 Processing bank statement incrementally: {source_name(bank_statement_pdf)}")
+
+        merged = await self._aload_or_extract(bank_statement_pdf, bypass_cache, progress)
+        return await scheduler.cpu.run_admitted(
+            self._merge_into_state, merged, employer_name, account_id)
+
+    def _merge_into_state(self, merged: Dict[str, Any], employer_name: str | None,
+                          account_id: str | None) -> BankStatementData:
+        """Merge one extraction into its account's stored state and report the totals"""
+        key = account_key(account_id or merged["account_number"])
+        if key is None:
+            raise ValueError("Account number not found; pass account_id to merge statements")
+
+        with bank_state_store.locked(key):
+            state = bank_state_store.load(key) or BankMetricsState(key, employer_name)
+            bank = self._build_statement(merged, employer_name, state=state)
+            bank_state_store.save(state)
+        return bank
 
-        # Process in batches to manage API limits
-        batches: List[List[Dict[str, Any]]] = []
-        batch_size = 5
-        for i in range(0, len(images), batch_size):
-            batches.append(images[i:i + batch_size])
+    def _load_or_extract(self, bank_statement_pdf: PDFInput, bypass_cache: bool,
+                         progress: ProgressCallback | None) -> Dict[str, Any]:
+        """Cached extraction, or a fresh one (stored when every batch succeeded)"""
+        prompt = self._prompt_transactions_only()
+
+        # Only the raw extraction is cached - metrics depend on employer_name
+        cache_key, merged = self.cache_lookup(
+            "bank", [bank_statement_pdf], prompt, bypass_cache=bypass_cache)
+        if merged is None:
+            merged, failed_batches = self._extract_transactions(
+                bank_statement_pdf, prompt, progress)
+            if not failed_batches and merged["transactions"]:
+                self.cache_store(cache_key, merged)
+        else:
+            report_progress(progress, "bank", "progress", "Loaded from cache")
+        return merged
+
+    async def aprocess(self, bank_statement_pdf: PDFInput, employer_name: str | None = None,
+                       bypass_cache: bool = False,
+                       progress: ProgressCallback | None = None) -> BankStatementData:
+        """
+        Async variant of process.
+
+        Text-layer parsing, rendering and metrics run on the cpu pool; Gemini
+        batches are awaited concurrently on the event loop.
+        """
+        logger.info(
+            f"🏦 Processing bank statement: {source_name(bank_statement_pdf)}")
 
+        merged = await self._aload_or_extract(bank_statement_pdf, bypass_cache, progress)
+        return await scheduler.cpu.run_admitted(self._build_statement, merged, employer_name)
+
+    async def _aload_or_extract(self, bank_statement_pdf: PDFInput, bypass_cache: bool,
+                                progress: ProgressCallback | None) -> Dict[str, Any]:
+        """Async variant of _load_or_extract"""
+        prompt = self._prompt_transactions_only()
+
+        cache_key, merged = await scheduler.cpu.run(
+            self.cache_lookup, "bank", [bank_statement_pdf], prompt, bypass_cache=bypass_cache)
+        if merged is None:
+            segments, vision_pages, text_result = await scheduler.cpu.run(
+                self._text_segments, bank_statement_pdf, progress)
+
+            batch_errors: List[str] = []
+            if vision_pages is None or vision_pages:
+                batches = self.aprefetch(self._vision_batch_stream(bank_statement_pdf, vision_pages))
+                batch_errors = await self._aextract_batches(prompt, batches, segments, progress)
+
+            merged = self._merge_segments(segments, text_result, batch_errors)
+            if not batch_errors and merged["transactions"]:
+                await scheduler.cpu.run_admitted(self.cache_store, cache_key, merged)
+        else:
+            report_progress(progress, "bank", "progress", "Loaded from cache")
+        return merged
+
+    def _extract_transactions(self, bank_statement_pdf: PDFInput, prompt: str,
+                              progress: ProgressCallback | None = None) -> tuple[Dict[str, Any], int]:
+        """
+        Extract header fields and raw transactions from all pages.
+
+        Pages whose text layer parses and passes the running-balance check are
+        taken as-is; only the remaining pages are sent to Gemini, each batch
+        as soon as its pages are encoded.
+
+        Returns:
+            (merged extraction dict, number of failed batches)
+        """
+        segments, vision_pages, text_result = scheduler.cpu.call(
+            self._text_segments, bank_statement_pdf, progress)
+
+        batch_errors: List[str] = []
+        if vision_pages is None or vision_pages:
+            batches = self.prefetch(self._vision_batch_stream(bank_statement_pdf, vision_pages))
+            batch_errors = self._extract_batches(prompt, batches, segments, progress)
+
+        merged = self._merge_segments(segments, text_result, batch_errors)
+        return merged, len(batch_errors)
+
+    def _text_segments(self, bank_statement_pdf: PDFInput,
+                       progress: ProgressCallback | None = None):
+        """
+        Parse pages from the PDF text layer
+
+        Returns:
+            (segments, pages needing vision - None means every page, text result)
+        """
+        # (first 0-based page, extraction dict) per text page / LLM batch
+        segments: List[tuple[int, Dict[str, Any]]] = []
+        vision_pages = None
+        text_result = None
+
+        if Config.BANK_TEXT_FAST_PATH:
+            text_result = BankTextExtractor.extract(
+                bank_statement_pdf, max_pages=Config.MAX_PDF_PAGES)
+            if text_result.pages:
+                for page in text_result.valid_pages:
+                    if page.rows:
+                        segments.append(
+                            (page.page_number, self._text_segment(page, text_result)))
+                vision_pages = text_result.failed_pages
+                logger.info(
+                    f"   📝 {len(text_result.valid_pages)} page(s) from text layer, "
+                    f"{len(vision_pages)} page(s) need vision extraction")
+                report_progress(
+                    progress, "bank", "progress",
+                    f"{len(text_result.valid_pages)} page(s) parsed from text layer",
+                    text_pages=len(text_result.valid_pages), vision_pages=len(vision_pages))
+
+        return segments, vision_pages, text_result
+
+    def _merge_segments(self, segments: List[tuple[int, Dict[str, Any]]], text_result,
+                        batch_errors: List[str]) -> Dict[str, Any]:
+        """Merge text-layer pages and LLM batches into one extraction dict"""
         # Merged data structure
         merged: Dict[str, Any] = {
             "account_holder_name": "",
@@ -143,53 +410,431 @@ CRITICAL RULES:
             "extraction_notes": [],
         }
 
-        prompt = self._prompt_transactions_only()
+        # Merge in page order so "first"/"last" rules follow the statement
+        segments.sort(key=lambda seg: seg[0])
+        for _, data in segments:
+            self._merge_batch(merged, data)
+
+        if text_result and text_result.pages:
+            # Regex header only fills what the pages above did not provide
+            for k, v in text_result.header.items():
+                if not merged.get(k):
+                    merged[k] = v
+            text_pages = sum(1 for p in text_result.valid_pages if p.rows)
+            if text_pages:
+                merged["extraction_notes"].append(
+                    f"{text_pages} page(s) parsed from PDF text layer (running balance verified)")
+
+        merged["extraction_notes"].extend(batch_errors)
+        return merged
+
+    def _text_segment(self, page, text_result) -> Dict[str, Any]:
+        """Extraction dict for one balance-verified text-layer page"""
+        rows = page.rows
+        data: Dict[str, Any] = {
+            "transactions": [r.as_transaction() for r in rows],
+            "closing_balance": rows[-1].balance,
+            "extraction_confidence": TEXT_LAYER_CONFIDENCE,
+            "extraction_notes": [],
+        }
+        if page.page_number == 0:
+            first = rows[0]
+            opening = text_result.opening_balance
+            if opening is None:
+                opening = first.balance - first.credit + first.debit
+            data["opening_balance"] = round(opening, 2)
+        return data
+
+    def _vision_batch_stream(self, bank_statement_pdf: PDFInput,
+                             page_numbers: List[int] | None) -> Iterator[List[PagePayload]]:
+        """Render the given pages, yielding Gemini request batches as their pages are encoded"""
+        pages = PDFProcessor.iter_pages_for_gemini(
+            bank_statement_pdf, max_pages=Config.MAX_PDF_PAGES, dpi=Config.PDF_DPI,
+            workers=Config.PDF_RENDER_WORKERS,
+            render_mode=Config.PDF_RENDER_MODE, grayscale=Config.PDF_GRAYSCALE,
+            page_numbers=page_numbers, encoder=self.encoder)
+
+        # As many pages per request as the token budget allows
+        budget = BatchBudget(
+            prompt_tokens=text_tokens(self._prompt_transactions_only()),
+            output_tokens_fixed=Config.BANK_OUTPUT_TOKENS_FIXED,
+            output_tokens_per_page=Config.BANK_OUTPUT_TOKENS_PER_PAGE,
+            max_pages=max(0, Config.BANK_BATCH_SIZE))
+        for bi, batch in enumerate(iter_batches(pages, self.limits, budget), start=1):
+            logger.info(f"   📦 Batch {bi} ready: {describe([batch], budget)}")
+            yield batch
+
+    def _extract_batches(self, prompt: str, batches: Iterable[List[PagePayload]],
+                         segments: List[tuple[int, Dict[str, Any]]],
+                         progress: ProgressCallback | None = None) -> List[str]:
+        """
+        Run Gemini over the batches on the io pool, appending to segments
 
-        # Process each batch
-        for bi, batch in enumerate(batches, start=1):
-            logger.info(
-                f"   🤖 Extracting transactions batch {bi}/{len(batches)}...")
+        Batches are sent as the stream produces them. At most
+        BANK_BATCH_CONCURRENCY batches of one statement are in flight at a
+        time, so a long statement does not take the whole pool and rendering
+        stays at most one batch ahead of the requests. When the io pool's
+        queue is full, the next batch waits for one of ours to finish, or is
+        sent from this thread if none is in flight - an admitted analysis
+        never loses finished batches to a busy pool.
 
+        Returns:
+            Error notes, one per failed batch
+        """
+        batch_errors: List[tuple[int, str]] = []
+
+        # Batches are independent requests; segments are merged in page order later
+        workers = max(1, Config.BANK_BATCH_CONCURRENCY)
+        logger.info(f"   🤖 Extracting transactions: up to {workers} batch(es) in flight")
+
+        on_rows = self._provisional_metrics(segments, progress)
+        batches = iter(batches)
+        running: Dict[Any, int] = {}
+        held: tuple[int, List[PagePayload]] | None = None  # refused by a full pool
+        planned = done = 0
+        exhausted = False
+
+        def collect(bi: int, extract: Callable[[], list]) -> None:
+            nonlocal done
+            done += 1
             try:
-                # Create proper multimodal content using BaseChain method
-                messages = self.create_gemini_content(prompt, batch)
-
-                # Invoke Gemini with retry logic
-                resp = self.invoke_with_retry(messages)
-                data = self._parse_json(resp.content)
-
-                # Merge header fields (take first non-empty)
-                for k in ("account_holder_name", "bank_name", "account_number", "account_type",
-                          "statement_period_start", "statement_period_end"):
-                    if not merged.get(k) and data.get(k):
-                        merged[k] = data.get(k)
-
-                # Balances: take first opening, last closing
-                if merged.get("opening_balance", 0.0) == 0.0 and data.get("opening_balance") not in (None, 0, 0.0):
-                    merged["opening_balance"] = data.get(
-                        "opening_balance", 0.0)
-                if data.get("closing_balance") not in (None, 0, 0.0):
-                    merged["closing_balance"] = data.get(
-                        "closing_balance", merged.get("closing_balance", 0.0))
-
-                # Accumulate transactions
-                txns = data.get("transactions") or []
-                merged["transactions"].extend(txns)
-
-                # Track confidence and notes
-                merged["extraction_confidence"] = max(
-                    float(merged.get("extraction_confidence") or 0.0),
-                    float(data.get("extraction_confidence") or 0.0),
-                )
-                merged["extraction_notes"].extend(
-                    data.get("extraction_notes") or [])
-
+                segments.extend(extract())
+                logger.info(f"   ✅ Batch {bi} extracted")
             except Exception as e:
                 logger.error(f"   ❌ Batch {bi} extraction failed: {e}")
-                merged["extraction_notes"].append(
-                    f"Batch {bi} failed: {str(e)}")
-                continue
+                batch_errors.append((bi, f"Batch {bi} failed: {str(e)}"))
+            self._report_batch(progress, done, planned if exhausted else None)
+
+        try:
+            while running or held or not exhausted:
+                while len(running) < workers:
+                    if held is None:
+                        batch = next(batches, None)
+                        if batch is None:
+                            exhausted = True
+                            break
+                        planned += 1
+                        held = (planned, batch)
+                    bi, batch = held
+                    try:
+                        future = scheduler.io.submit(self._extract_batch, prompt, batch, on_rows)
+                    except Overloaded:
+                        if running:
+                            break  # retried once one of ours finishes
+                        logger.warning(f"   ⚠️  io pool full; sending batch {bi} from this thread")
+                        held = None
+                        collect(bi, partial(self._extract_batch, prompt, batch, on_rows))
+                        continue
+                    running[future] = bi
+                    held = None
+                if not running:
+                    continue
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    collect(running.pop(future), future.result)
+        except BaseException:
+            # Rendering failed or ran out of time: drop batches not yet started
+            for future in running:
+                future.cancel()
+            raise
+
+        return [note for _, note in sorted(batch_errors)]
+
+    async def _aextract_batches(self, prompt: str, batches: AsyncIterator[List[PagePayload]],
+                                segments: List[tuple[int, Dict[str, Any]]],
+                                progress: ProgressCallback | None = None) -> List[str]:
+        """Async variant of _extract_batches bounded by a semaphore"""
+        workers = max(1, Config.BANK_BATCH_CONCURRENCY)
+        logger.info(f"   🤖 Extracting transactions: up to {workers} batch(es) in flight")
+        semaphore = asyncio.Semaphore(workers)
+        on_rows = self._provisional_metrics(segments, progress)
+        tasks: List[asyncio.Task] = []
+        finished = 0
+        exhausted = False
+
+        async def run(bi: int, batch: List[PagePayload]):
+            nonlocal finished
+            try:
+                result = await self._aextract_batch(prompt, batch, semaphore, on_rows)
+                logger.info(f"   ✅ Batch {bi} extracted")
+                return result
+            finally:
+                finished += 1
+                self._report_batch(progress, finished, len(tasks) if exhausted else None)
+
+        try:
+            async for batch in batches:
+                tasks.append(asyncio.create_task(run(len(tasks) + 1, batch)))
+                active = [t for t in tasks if not t.done()]
+                if len(active) >= workers:
+                    await asyncio.wait(active, return_when=asyncio.FIRST_COMPLETED)
+            exhausted = True
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        batch_errors: List[str] = []
+        for bi, result in enumerate(results, start=1):
+            if isinstance(result, BaseException):
+                if isinstance(result, asyncio.CancelledError):
+                    raise result
+                logger.error(f"   ❌ Batch {bi} extraction failed: {result}")
+                batch_errors.append(f"Batch {bi} failed: {str(result)}")
+            else:
+                segments.extend(result)
+        return batch_errors
+
+    @staticmethod
+    def _report_batch(progress: ProgressCallback | None, done: int, total: int | None) -> None:
+        """"bank" batch progress; total is None while pages are still rendering"""
+        report_progress(progress, "bank", "progress",
+                        f"Batch {done}/{total} finished" if total else f"Batch {done} finished",
+                        current=done, total=total)
+
+    def _extract_batch(self, prompt: str, batch: List[PagePayload],
+                       on_rows: RowsCallback | None = None) -> List[tuple[int, Dict[str, Any]]]:
+        """
+        Extract one batch of page images
+
+        Args:
+            on_rows: Receives validated rows as they stream in (BANK_STREAMING)
+
+        Returns:
+            (first 0-based page, data) segments - more than one when a
+            truncated batch had to be split
+        """
+        request = self.invoke_with_retry
+        if Config.BANK_STREAMING:
+            request = partial(self._stream_request, on_rows=self._new_rows_only(on_rows))
 
+        steps = self._batch_steps(prompt, batch)
+        try:
+            # Invoke Gemini with retry logic for every request the steps ask for
+            messages = next(steps)
+            while True:
+                messages = steps.send(request(messages))
+        except StopIteration as done:
+            data = done.value
+
+        if data is None:
+            mid = len(batch) // 2
+            return (self._extract_batch(prompt, batch[:mid], on_rows)
+                    + self._extract_batch(prompt, batch[mid:], on_rows))
+        return [(batch[0].page_number - 1, data)]
+
+    async def _aextract_batch(self, prompt: str, batch: List[PagePayload],
+                              semaphore: asyncio.Semaphore,
+                              on_rows: RowsCallback | None = None) -> List[tuple[int, Dict[str, Any]]]:
+        """Async variant of _extract_batch; each request holds the semaphore"""
+        request = self.ainvoke_with_retry
+        if Config.BANK_STREAMING:
+            request = partial(self._astream_request, on_rows=self._new_rows_only(on_rows))
+
+        steps = self._batch_steps(prompt, batch)
+        try:
+            messages = next(steps)
+            while True:
+                async with semaphore:
+                    resp = await request(messages)
+                messages = steps.send(resp)
+        except StopIteration as done:
+            data = done.value
+
+        if data is None:
+            mid = len(batch) // 2
+            halves = await asyncio.gather(
+                self._aextract_batch(prompt, batch[:mid], semaphore, on_rows),
+                self._aextract_batch(prompt, batch[mid:], semaphore, on_rows))
+            return halves[0] + halves[1]
+        return [(batch[0].page_number - 1, data)]
+
+    def _stream_request(self, messages, on_rows: RowsCallback | None = None) -> StreamedAnswer:
+        """Stream one request, parsing and validating rows as they arrive"""
+        stream = TransactionStream(on_rows)
+        try:
+            for chunk in self.stream_with_retry(messages):
+                stream.add(chunk)
+        except Exception as e:
+            logger.warning(f"   ⚠️  Response stream broke off after {len(stream.rows)} rows: {e}")
+            return stream.answer(error=e)
+        return stream.answer()
+
+    async def _astream_request(self, messages,
+                               on_rows: RowsCallback | None = None) -> StreamedAnswer:
+        """Async variant of _stream_request"""
+        stream = TransactionStream(on_rows)
+        try:
+            async for chunk in self.astream_with_retry(messages):
+                stream.add(chunk)
+        except Exception as e:
+            logger.warning(f"   ⚠️  Response stream broke off after {len(stream.rows)} rows: {e}")
+            return stream.answer(error=e)
+        return stream.answer()
+
+    @staticmethod
+    def _provisional_metrics(segments: List[tuple[int, Dict[str, Any]]],
+                             progress: ProgressCallback | None) -> RowsCallback | None:
+        """Row listener reporting provisional metrics, seeded with text-layer rows"""
+        if not (Config.BANK_STREAMING and progress):
+            return None
+        seed = [t for _, data in segments for t in data.get("transactions") or []]
+        return ProvisionalMetrics(progress, seed)
+
+    @staticmethod
+    def _new_rows_only(on_rows: RowsCallback | None) -> RowsCallback | None:
+        """
+        Forward rows to on_rows once per batch, so rows a continuation
+        repeats from the previous answer are not counted twice
+        """
+        if on_rows is None:
+            return None
+        seen = set()
+
+        def forward(rows: List[Dict[str, Any]]) -> None:
+            new = []
+            for row in rows:
+                key = BankStatementChain._row_key(row)
+                if key not in seen:
+                    seen.add(key)
+                    new.append(row)
+            if new:
+                on_rows(new)
+        return forward
+
+    def _batch_steps(self, prompt: str, batch: List[PagePayload]
+                     ) -> Generator[List[Any], Any, Dict[str, Any] | None]:
+        """
+        Requests for one batch, shared by the sync and async drivers.
+
+        Yields request messages and receives each response. A response cut
+        off at the output token limit keeps its complete rows and is followed
+        by a continuation request for the rows after the last one. When
+        nothing usable came back from a multi-page batch, returns None so the
+        driver splits it in half; otherwise returns the batch's data.
+        """
+        resp = yield self.create_gemini_content(prompt, batch)
+        data, truncated = self._read_response(resp)
+        if not truncated:
+            return data
+
+        pages = f"pages {batch[0].page_number}-{batch[-1].page_number}"
+        rows = (data or {}).get("transactions") or []
+        if not rows:
+            if len(batch) > 1:
+                logger.warning(f"   ✂️  Output for {pages} truncated before any row; splitting")
+                return None
+            if data is None:
+                raise ValueError("Response truncated before any usable JSON")
+
+        continuations = 0
+        while truncated and rows and continuations < Config.BANK_MAX_CONTINUATIONS:
+            continuations += 1
+            logger.info(f"   ↪️  Output for {pages} truncated after {len(rows)} rows; continuing")
+            resp = yield self.create_gemini_content(self._continuation_prompt(prompt, rows[-1]), batch)
+            more, truncated = self._read_response(resp)
+            more = more or {}
+            new_rows = self._after_anchor(rows[-1], more.get("transactions") or [])
+            if not new_rows:
+                break
+            rows.extend(new_rows)
+            if more.get("closing_balance") not in (None, 0, 0.0):
+                data["closing_balance"] = more["closing_balance"]
+            data.setdefault("extraction_notes", []).extend(more.get("extraction_notes") or [])
+
+        data["transactions"] = rows
+        if truncated:
+            data.setdefault("extraction_notes", []).append(
+                f"Output for {pages} truncated after {len(rows)} transactions")
+        return data
+
+    def _read_response(self, resp) -> tuple[Dict[str, Any] | None, bool]:
+        """
+        Parse a response; returns (data, truncated)
+
+        A truncated response yields its salvaged complete part (None if
+        nothing was usable). Truncation is a result, not an error, so it is
+        never retried as-is.
+        A streamed answer was already parsed as it arrived.
+        """
+        if isinstance(resp, StreamedAnswer):
+            return resp.data, resp.truncated
+        text = resp.content
+        try:
+            return decode_answer(self._parse_json(text)), False
+        except ValueError:
+            data = salvage_json(text)
+            # Cut off without saying so (e.g. a proxy dropped finish_reason)
+            if data is None and not is_truncated(resp):
+                raise
+        return (decode_answer(data) if data is not None else None), True
+
+    @staticmethod
+    def _continuation_prompt(prompt: str, last_row: Dict[str, Any]) -> str:
+        return (
+            f"{prompt}\n\n"
+            "CONTINUATION: your previous answer was cut off. Its last complete transaction was:\n"
+            f"{format_row(last_row, Config.BANK_OUTPUT_FORMAT)}\n"
+            "Return the same JSON structure holding ONLY the transactions that "
+            "come after that one, in statement order. Header fields may be left empty.")
+
+    @staticmethod
+    def _after_anchor(anchor: Dict[str, Any], rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Drop rows a continuation repeated up to and including the anchor row"""
+        key = BankStatementChain._row_key(anchor)
+        for i, row in enumerate(rows[:CONTINUATION_OVERLAP_ROWS]):
+            if BankStatementChain._row_key(row) == key:
+                return rows[i + 1:]
+        return rows
+
+    @staticmethod
+    def _row_key(row: Dict[str, Any]) -> tuple:
+        def amount(v):
+            try:
+                return round(float(v or 0), 2)
+            except (TypeError, ValueError):
+                return v
+        return (str(row.get("date") or "").strip(),
+                " ".join(str(row.get("narration") or "").split()).upper(),
+                amount(row.get("debit")), amount(row.get("credit")), amount(row.get("balance")))
+
+    @staticmethod
+    def _merge_batch(merged: Dict[str, Any], data: Dict[str, Any]) -> None:
+        """Fold one batch's extraction into the merged statement"""
+        # Merge header fields (take first non-empty)
+        for k in ("account_holder_name", "bank_name", "account_number", "account_type",
+                  "statement_period_start", "statement_period_end"):
+            if not merged.get(k) and data.get(k):
+                merged[k] = data.get(k)
+
+        # Balances: take first opening, last closing
+        if merged.get("opening_balance", 0.0) == 0.0 and data.get("opening_balance") not in (None, 0, 0.0):
+            merged["opening_balance"] = data.get(
+                "opening_balance", 0.0)
+        if data.get("closing_balance") not in (None, 0, 0.0):
+            merged["closing_balance"] = data.get(
+                "closing_balance", merged.get("closing_balance", 0.0))
+
+        # Accumulate transactions
+        txns = data.get("transactions") or []
+        merged["transactions"].extend(txns)
+
+        # Track confidence and notes
+        merged["extraction_confidence"] = max(
+            float(merged.get("extraction_confidence") or 0.0),
+            float(data.get("extraction_confidence") or 0.0),
+        )
+        merged["extraction_notes"].extend(
+            data.get("extraction_notes") or [])
+
+    def _build_statement(self, merged: Dict[str, Any], employer_name: str | None,
+                         state: BankMetricsState | None = None) -> BankStatementData:
+        """
+        Validate extracted rows and compute deterministic metrics.
+        With a state, the rows are merged into it and its metrics reported.
+        """
         # Validate and coerce transactions to BankTransaction schema
         txn_objs = []
         for t in merged["transactions"]:
@@ -202,8 +847,20 @@ CRITICAL RULES:
         logger.info(f"   ✅ Extracted {len(txn_objs)} valid transactions")
 
         # Compute deterministic metrics from transactions
-        logger.info(f"   🧮 Computing deterministic bank metrics...")
-        metrics = compute_bank_metrics(txn_objs, employer_name=employer_name)
+        if state is None:
+            logger.info(f"   🧮 Computing deterministic bank metrics...")
+            metrics = compute_bank_metrics(
+                txn_objs, employer_name=employer_name,
+                period_start=merged["statement_period_start"],
+                period_end=merged["statement_period_end"])
+        else:
+            added = state.apply(
+                txn_objs, employer_name=employer_name,
+                period_start=merged["statement_period_start"],
+                period_end=merged["statement_period_end"])
+            logger.info(f"   🧮 Merged {added} transactions into account state "
+                        f"({state.statements} statements)")
+            metrics = state.metrics()
 
         # Build final BankStatementData with computed metrics
         bank = BankStatementData(
@@ -219,6 +876,7 @@ CRITICAL RULES:
             # Computed metrics (deterministic)
             average_monthly_balance=float(metrics["average_monthly_balance"]),
             minimum_balance=float(metrics["minimum_balance"]),
+            monthly_balances=metrics["monthly_balances"],
             salary_credits_detected=int(metrics["salary_credits_detected"]),
             average_monthly_salary=float(metrics["average_monthly_salary"]),
             salary_consistency_months=int(
@@ -2,12 +2,20 @@
 Base Chain for all extraction chains - PRODUCTION READY with retry logic
 FIXED: Removed deprecated google.generativeai import
 """
+import asyncio
 import logging
-from typing import List
-from langchain_google_genai import ChatGoogleGenerativeAI
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
 from langchain_core.messages import HumanMessage
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+from chains.batching import ModelLimits
+from chains.llm_pool import llm_pool
+from chains.llm_retry import RetryStats, llm_retry
 from config import Config
+from deadline import DeadlineExpired, current_deadline
+from extraction_cache import extraction_cache
+from processors.image_encoder import ImageEncoder
+from processors.pdf_processor import PagePayload
+from processors.pdf_source import PDFInput
+from scheduler import scheduler
 
 logger = logging.getLogger(__name__)
 
@@ -15,19 +23,33 @@ logger = logging.getLogger(__name__)
 class BaseChain:
     """Base class for all extraction chains with proper Gemini Vision support and retry logic"""
 
-    def __init__(self, model_name: str = None, temperature: float = 0.0):
-        """Initialize chain with Gemini model"""
+    def __init__(self, model_name: str = None, temperature: float = 0.0,
+                 response_schema: Optional[Dict[str, Any]] = None):
+        """
+        Initialize chain with Gemini model
+
+        Args:
+            model_name: Gemini model, default Config.GEMINI_VISION_MODEL
+            temperature: Sampling temperature
+            response_schema: JSON schema the answers must follow
+                (used when Config.STRUCTURED_OUTPUT is on)
+        """
         model_name = model_name or Config.GEMINI_VISION_MODEL
+        self.model_name = model_name
+        self.temperature = temperature
+        self.limits = ModelLimits.for_model(model_name)
+        self.retry_stats = RetryStats()
+        self.encoder = ImageEncoder(
+            max_bytes=Config.PAGE_BYTE_BUDGET, max_tokens=Config.PAGE_TOKEN_BUDGET,
+            lossy_format=Config.PAGE_IMAGE_FORMAT, auto=Config.PAGE_ENCODING == "auto")
+
+        self._structured: Dict[str, Any] = {}
+        if response_schema and Config.STRUCTURED_OUTPUT:
+            self._structured = {"response_mime_type": "application/json",
+                                "response_schema": response_schema}
 
         try:
-            self.llm = ChatGoogleGenerativeAI(
-                model=model_name,
-                google_api_key=Config.GEMINI_API_KEY,
-                temperature=temperature,
-                max_output_tokens=8192,
-                timeout=Config.TIMEOUT,
-                max_retries=Config.MAX_RETRIES
-            )
+            self.llm  # create the shared client now so bad settings fail early
             logger.info(
                 f"✅ Initialized {self.__class__.__name__} with {model_name}")
         except Exception as e:
@@ -35,13 +57,56 @@ class BaseChain:
                 f"❌ Failed to initialize {self.__class__.__name__}: {e}")
             raise
 
-    def create_gemini_content(self, prompt: str, images: List[dict]) -> List[HumanMessage]:
+    @property
+    def llm(self):
+        """Shared client from the process pool, bound to this chain's response schema"""
+        llm = llm_pool.client(self.model_name, self.temperature, self.limits.max_output_tokens)
+        return llm.bind(**self._structured) if self._structured else llm
+
+    def cache_lookup(self, namespace: str, pdf_paths: List[PDFInput], prompt: str,
+                     bypass_cache: bool = False) -> tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """
+        Look up a previous extraction of the same documents
+
+        Args:
+            namespace: Cache namespace for this chain
+            pdf_paths: Input PDFs (paths or PDFSource), in submission order
+            prompt: Prompt text used for extraction
+            bypass_cache: Skip the lookup (a fresh result is still stored)
+
+        Returns:
+            (cache_key, cached_payload) - key is None when caching is disabled
+        """
+        if not extraction_cache.enabled:
+            return None, None
+
+        key = extraction_cache.key_for_files(
+            namespace, pdf_paths, prompt, self.model_name, Config.PDF_DPI, self.render_settings())
+        if bypass_cache:
+            return key, None
+
+        cached = extraction_cache.get(key)
+        if cached is not None:
+            logger.info(f"   ⚡ Cache hit for {namespace} extraction ({key[:12]})")
+        return key, cached
+
+    def render_settings(self) -> str:
+        """Page rendering and encoding settings that change what the model sees"""
+        return (f"{Config.PDF_RENDER_MODE}:{'grey' if Config.PDF_GRAYSCALE else 'colour'}"
+                f":{self.encoder.settings}")
+
+    def cache_store(self, key: Optional[str], payload: Dict[str, Any]) -> None:
+        """Store a successful extraction under a key from cache_lookup"""
+        if key:
+            extraction_cache.put(key, payload)
+
+    def create_gemini_content(self, prompt: str, images: List[PagePayload]) -> List[HumanMessage]:
         """
         Create proper content format for Gemini Vision API
 
         Args:
             prompt: Text prompt
-            images: List of dicts with 'base64' and 'mime_type' keys
+            images: Encoded page payloads (base64 is built here, per message)
 
         Returns:
             List containing HumanMessage with multimodal content
@@ -49,25 +114,59 @@ class BaseChain:
         content_parts = [{"type": "text", "text": prompt}]
 
         # Add images in proper format
-        for img_data in images:
+        for page in images:
             content_parts.append({
                 "type": "image_url",
-                "image_url": f"data:{img_data['mime_type']};base64,{img_data['base64']}"
+                "image_url": page.data_url()
             })
 
         return [HumanMessage(content=content_parts)]
 
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=4, max=10),
-        retry=retry_if_exception_type((Exception,)),
-        before_sleep=lambda retry_state: logger.warning(
-            f"⚠️  Retry attempt {retry_state.attempt_number} after error"
-        )
-    )
+    @staticmethod
+    def prefetch(batches: Iterator[List[PagePayload]]) -> Iterator[List[PagePayload]]:
+        """
+        Yield batches from a render stream, producing each next batch on
+        the cpu pool while the caller is sending the current one
+
+        Args:
+            batches: Batch generator (e.g. iter_batches over iter_pages_for_gemini)
+
+        Yields:
+            The stream's batches, in order
+        """
+        pending = scheduler.cpu.submit(next, batches, None)
+        try:
+            while True:
+                batch = pending.result()
+                if batch is None:
+                    return
+                pending = scheduler.cpu.submit(next, batches, None)
+                yield batch
+        finally:
+            # A render step already running finishes on its own
+            pending.cancel()
+
+    @staticmethod
+    async def aprefetch(batches: Iterator[List[PagePayload]]) -> AsyncIterator[List[PagePayload]]:
+        """Async variant of prefetch"""
+        pending = asyncio.ensure_future(scheduler.cpu.run(next, batches, None))
+        try:
+            while True:
+                batch = await pending
+                if batch is None:
+                    return
+                pending = asyncio.ensure_future(scheduler.cpu.run(next, batches, None))
+                yield batch
+        finally:
+            pending.cancel()
+
+    @llm_retry
     def invoke_with_retry(self, messages: List[HumanMessage]):
         """
-        Invoke LLM with exponential backoff retry logic
+        Invoke LLM, retrying transient errors with jittered backoff
+
+        Every attempt's timeout is capped at the time left before the
+        request deadline; past it, DeadlineExpired is raised instead.
 
         Args:
             messages: List of messages to send
@@ -75,11 +174,124 @@ class BaseChain:
         Returns:
             Response from LLM
         """
+        deadline = current_deadline()
+        deadline.check("LLM call")
+        limiter = llm_pool.limiter
+        tokens = limiter.acquire(messages)
         try:
-            return self.llm.invoke(messages)
+            response = self.llm.invoke(messages, timeout=deadline.cap(Config.TIMEOUT))
         except Exception as e:
+            limiter.on_error(e)
             logger.error(f"❌ LLM invocation error: {e}")
+            self._raise_if_expired(deadline, e)
             raise
+        limiter.settle(tokens, getattr(response, "usage_metadata", None))
+        return response
+
+    @llm_retry
+    async def ainvoke_with_retry(self, messages: List[HumanMessage]):
+        """
+        Async variant of invoke_with_retry - backoff sleeps do not block the event loop,
+        and each attempt holds one of the io pool's slots
+
+        Args:
+            messages: List of messages to send
+
+        Returns:
+            Response from LLM
+        """
+        deadline = current_deadline()
+        deadline.check("LLM call")
+        limiter = llm_pool.limiter
+        async with scheduler.io.slot():
+            tokens = await limiter.aacquire(messages)
+            try:
+                response = await self.llm.ainvoke(messages, timeout=deadline.cap(Config.TIMEOUT))
+            except Exception as e:
+                limiter.on_error(e)
+                logger.error(f"❌ LLM invocation error: {e}")
+                self._raise_if_expired(deadline, e)
+                raise
+        limiter.settle(tokens, getattr(response, "usage_metadata", None))
+        return response
+
+    @llm_retry
+    def _open_stream(self, messages: List[HumanMessage]):
+        """Start a streamed response and wait for its first chunk"""
+        deadline = current_deadline()
+        deadline.check("LLM call")
+        limiter = llm_pool.limiter
+        tokens = limiter.acquire(messages)
+        try:
+            stream = iter(self.llm.stream(messages, timeout=deadline.cap(Config.TIMEOUT)))
+            return tokens, next(stream, None), stream
+        except Exception as e:
+            limiter.on_error(e)
+            logger.error(f"❌ LLM stream error: {e}")
+            self._raise_if_expired(deadline, e)
+            raise
+
+    def stream_with_retry(self, messages: List[HumanMessage]) -> Iterator[Any]:
+        """
+        Stream response chunks from the LLM
+
+        Opening the stream is retried like invoke_with_retry; an error after
+        the first chunk reaches the caller, which may already have used the
+        chunks before it. So does DeadlineExpired when the request deadline
+        passes mid-stream.
+
+        Args:
+            messages: List of messages to send
+
+        Yields:
+            Message chunks
+        """
+        tokens, first, stream = self._open_stream(messages)
+        deadline = current_deadline()
+        usage = None
+        chunk = first
+        while chunk is not None:
+            usage = getattr(chunk, "usage_metadata", None) or usage
+            yield chunk
+            deadline.check("LLM stream")
+            chunk = next(stream, None)
+        llm_pool.limiter.settle(tokens, usage)
+
+    @llm_retry
+    async def _aopen_stream(self, messages: List[HumanMessage]):
+        """Async variant of _open_stream"""
+        deadline = current_deadline()
+        deadline.check("LLM call")
+        limiter = llm_pool.limiter
+        tokens = await limiter.aacquire(messages)
+        try:
+            stream = aiter(self.llm.astream(messages, timeout=deadline.cap(Config.TIMEOUT)))
+            return tokens, await anext(stream, None), stream
+        except Exception as e:
+            limiter.on_error(e)
+            logger.error(f"❌ LLM stream error: {e}")
+            self._raise_if_expired(deadline, e)
+            raise
+
+    async def astream_with_retry(self, messages: List[HumanMessage]) -> AsyncIterator[Any]:
+        """Async variant of stream_with_retry; holds an io pool slot until the stream ends"""
+        async with scheduler.io.slot():
+            tokens, first, stream = await self._aopen_stream(messages)
+            deadline = current_deadline()
+            usage = None
+            chunk = first
+            while chunk is not None:
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                yield chunk
+                deadline.check("LLM stream")
+                chunk = await anext(stream, None)
+        llm_pool.limiter.settle(tokens, usage)
+
+    @staticmethod
+    def _raise_if_expired(deadline, error: Exception) -> None:
+        """A call that failed because its deadline-capped timeout ran out is DeadlineExpired"""
+        if deadline.expired:
+            raise DeadlineExpired("LLM call") from error
 
     def safe_invoke(self, messages: List[HumanMessage], fallback_response: str = None):
         """
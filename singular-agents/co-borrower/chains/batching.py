@@ -0,0 +1,143 @@
+"""
+Token-budget batch planning for vision requests.
+Each page image is costed in input tokens (Gemini bills 258 tokens per
+768x768 tile), request bytes and expected output tokens; consecutive pages
+are packed greedily into as few requests as the model limits allow.
+iter_batches packs pages as they are rendered, so the first request can go
+out before the last page.
+"""
+from __future__ import annotations
+import logging
+import math
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List
+
+from config import Config
+from processors.image_encoder import IMAGE_TILE_TOKENS, image_tokens  # noqa: F401 (re-exported)
+from processors.pdf_processor import MAX_IMAGE_SIDE, PagePayload
+
+logger = logging.getLogger(__name__)
+
+# Rough text cost for prompts
+CHARS_PER_TOKEN = 4
+
+# Request overhead per image part besides the base64 payload (JSON framing)
+IMAGE_PART_OVERHEAD_BYTES = 64
+
+
+@dataclass(frozen=True)
+class ModelLimits:
+    """Per-request limits for one model"""
+    max_input_tokens: int
+    max_output_tokens: int
+    max_request_bytes: int
+    max_images: int
+
+    @classmethod
+    def for_model(cls, model_name: str) -> "ModelLimits":
+        """Configured limits, output capped at Config.MAX_OUTPUT_TOKENS"""
+        limits = Config.model_limits(model_name)
+        return cls(
+            max_input_tokens=int(limits["max_input_tokens"]),
+            max_output_tokens=min(int(limits["max_output_tokens"]), Config.MAX_OUTPUT_TOKENS),
+            max_request_bytes=int(limits["max_request_bytes"]),
+            max_images=int(limits["max_images"]),
+        )
+
+
+@dataclass(frozen=True)
+class BatchBudget:
+    """What one request costs besides its pages"""
+    prompt_tokens: int
+    output_tokens_fixed: int = 0      # response JSON independent of page count
+    output_tokens_per_page: int = 0   # e.g. transaction rows on a statement page
+    max_pages: int = 0                # hard cap on pages per request, 0 for none
+
+
+@dataclass(frozen=True)
+class PageCost:
+    input_tokens: int
+    output_tokens: int
+    request_bytes: int
+
+
+def text_tokens(text: str) -> int:
+    """Approximate tokens for prompt text"""
+    return math.ceil(len(text or "") / CHARS_PER_TOKEN)
+
+
+def page_size(page: PagePayload) -> tuple[int, int]:
+    """Pixel size of a page payload; unknown sizes count as the largest render"""
+    if page.width and page.height:
+        return page.width, page.height
+    return MAX_IMAGE_SIDE, MAX_IMAGE_SIDE
+
+
+def page_cost(page: PagePayload, budget: BatchBudget) -> PageCost:
+    """Cost of adding one page payload to a request"""
+    return PageCost(
+        input_tokens=image_tokens(*page_size(page)),
+        output_tokens=budget.output_tokens_per_page,
+        request_bytes=page.base64_length + IMAGE_PART_OVERHEAD_BYTES,
+    )
+
+
+def iter_batches(pages: Iterable[PagePayload], limits: ModelLimits,
+                 budget: BatchBudget) -> Iterator[List[PagePayload]]:
+    """
+    Group a stream of page payloads into request batches as they arrive
+
+    A batch is yielded as soon as it holds the most pages allowed, or the
+    next page would not fit, so it can be sent while later pages are still
+    rendering. A page that exceeds a limit on its own still gets a batch
+    of its own.
+
+    Args:
+        pages: Page payloads in page order
+        limits: Model request limits
+        budget: Prompt and expected output cost
+
+    Yields:
+        Batches of consecutive pages
+    """
+    cap_pages = max(1, min(limits.max_images, budget.max_pages or limits.max_images))
+    prompt_bytes = budget.prompt_tokens * CHARS_PER_TOKEN
+
+    batch: List[PagePayload] = []
+    for page in pages:
+        c = page_cost(page, budget)
+        _warn_if_oversized(page, c, limits, budget)
+        if batch and (tokens_in + c.input_tokens > limits.max_input_tokens
+                      or tokens_out + c.output_tokens > limits.max_output_tokens
+                      or size + c.request_bytes > limits.max_request_bytes):
+            yield batch
+            batch = []
+        if not batch:
+            tokens_in, tokens_out, size = budget.prompt_tokens, budget.output_tokens_fixed, prompt_bytes
+        batch.append(page)
+        tokens_in += c.input_tokens
+        tokens_out += c.output_tokens
+        size += c.request_bytes
+        if len(batch) >= cap_pages:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _warn_if_oversized(page: PagePayload, cost: PageCost,
+                       limits: ModelLimits, budget: BatchBudget) -> None:
+    if (budget.prompt_tokens + cost.input_tokens > limits.max_input_tokens
+            or budget.output_tokens_fixed + cost.output_tokens > limits.max_output_tokens):
+        logger.warning(f"   ⚠️  Page {page.page_number} alone exceeds "
+                       f"the request budget for one call")
+
+
+def describe(batches: List[List[PagePayload]], budget: BatchBudget) -> str:
+    """One-line summary for logs: pages and estimated tokens per batch"""
+    parts = []
+    for batch in batches:
+        tokens = budget.prompt_tokens + sum(page_cost(p, budget).input_tokens for p in batch)
+        parts.append(f"{len(batch)}p/{tokens:,}t")
+    return ", ".join(parts)
+
@@ -2,25 +2,36 @@
 ITR Extraction Chain - PRODUCTION READY
 """
 
+import asyncio
 import logging
-from pathlib import Path
-from typing import List
-import json
-import re
+from typing import Any, Dict, Iterator, List
 
 from chains.base_chain import BaseChain
+from chains.batching import BatchBudget, describe, iter_batches, text_tokens
+from chains.llm_output import parse_json_answer
+from chains.structured_output import response_schema, validate_answer
 from schemas import ITRData
-from processors.pdf_processor import PDFProcessor
+from processors.pdf_processor import PagePayload, PDFProcessor
+from processors.pdf_source import PDFInput, source_name
 from config import Config
+from deadline import DeadlineExpired
+from scheduler import scheduler
 
 logger = logging.getLogger(__name__)
 
+# Values treated as "not found" when merging batch extractions
+_BLANK = (None, "", 0, 0.0, "Unknown", "Not Found")
+
+# Recomputed after a merge rather than taken from a partial view
+_DERIVED_FIELDS = {"average_annual_income", "average_monthly_income", "income_growth_rate"}
+
 
 class ITRChain(BaseChain):
     """Extract structured data from ITR documents"""
 
     def __init__(self):
-        super().__init__(model_name=Config.GEMINI_VISION_MODEL)
+        super().__init__(model_name=Config.GEMINI_VISION_MODEL,
+                         response_schema=response_schema(ITRData))
 
     def create_extraction_prompt(self) -> str:
         """Create detailed ITR extraction prompt"""
@@ -62,96 +73,174 @@ Extract data from TWO YEARS of ITR documents. Return ONLY the JSON object, NO ma
 
 Analyze the ITR documents and return ONLY the JSON:"""
 
-    def process(self, itr_pdfs: List[str]) -> ITRData:
+    def process(self, itr_pdfs: List[PDFInput], bypass_cache: bool = False) -> ITRData:
         """Process ITR documents"""
         logger.info(f"📊 Processing {len(itr_pdfs)} ITR document(s)")
 
         try:
-            # Process all PDFs
-            all_images = []
-            for pdf_path in itr_pdfs:
-                logger.info(f"   📄 Processing: {Path(pdf_path).name}")
-                images = PDFProcessor.process_pdf_for_gemini(
-                    pdf_path, max_pages=10)
-                all_images.extend(images)
-
-            logger.info(f"   ✅ Total pages to analyze: {len(all_images)}")
-
             # Create prompt
             prompt = self.create_extraction_prompt()
 
-            # FIXED: Use proper Gemini content format
-            messages = self.create_gemini_content(prompt, all_images)
+            cache_key, cached = self.cache_lookup(
+                "itr", itr_pdfs, prompt, bypass_cache=bypass_cache)
+            if cached is not None:
+                return ITRData(**cached)
 
-            # Invoke model
+            # Invoke model; a later request's pages render while the previous one is sent
             logger.info("   🤖 Analyzing ITR documents with Gemini...")
-            response = self.llm.invoke(messages)
+            contents = [self.invoke_with_retry(self.create_gemini_content(prompt, batch)).content
+                        for batch in self.prefetch(self._batch_stream(prompt, itr_pdfs))]
+
+            return self._finish(contents, cache_key)
+
+        except DeadlineExpired:
+            raise
+        except Exception as e:
+            return self._failed_result(e)
 
-            # Parse response
-            logger.info("   📝 Parsing structured output...")
-            parsed_data = self._parse_response(response.content)
+    async def aprocess(self, itr_pdfs: List[PDFInput], bypass_cache: bool = False) -> ITRData:
+        """Async variant of process - file I/O and rendering run on the cpu pool"""
+        logger.info(f"📊 Processing {len(itr_pdfs)} ITR document(s)")
 
-            logger.info(f"   ✅ ITR extraction complete!")
-            logger.info(f"      Applicant: {parsed_data.applicant_name}")
-            logger.info(
-                f"      Average Annual Income: ₹{parsed_data.average_annual_income:,.2f}")
-            logger.info(
-                f"      Average Monthly Income: ₹{parsed_data.average_monthly_income:,.2f}")
-            logger.info(
-                f"      Confidence: {parsed_data.extraction_confidence:.0%}")
+        try:
+            prompt = self.create_extraction_prompt()
 
-            return parsed_data
+            cache_key, cached = await scheduler.cpu.run(
+                self.cache_lookup, "itr", itr_pdfs, prompt, bypass_cache=bypass_cache)
+            if cached is not None:
+                return ITRData(**cached)
 
+            logger.info("   🤖 Analyzing ITR documents with Gemini...")
+            requests = []
+            try:
+                # Each request starts as soon as its pages are encoded
+                async for batch in self.aprefetch(self._batch_stream(prompt, itr_pdfs)):
+                    requests.append(asyncio.ensure_future(
+                        self.ainvoke_with_retry(self.create_gemini_content(prompt, batch))))
+            except BaseException:
+                for request in requests:
+                    request.cancel()
+                raise
+            responses = await asyncio.gather(*requests)
+
+            return await scheduler.cpu.run_admitted(
+                self._finish, [r.content for r in responses], cache_key)
+
+        except DeadlineExpired:
+            raise
         except Exception as e:
-            logger.error(f"   ❌ ITR extraction failed: {e}")
-            logger.exception("Full traceback:")
-            # Return minimal structure
-            return ITRData(
-                applicant_name="Extraction Failed",
-                assessment_year_1="2023-24",
-                assessment_year_2="2022-23",
-                gross_total_income_year1=0.0,
-                taxable_income_year1=0.0,
-                gross_total_income_year2=0.0,
-                taxable_income_year2=0.0,
-                average_annual_income=0.0,
-                average_monthly_income=0.0,
-                income_growth_rate=0.0,
-                itr_form_type="Unknown",
-                filing_status="Unknown",
-                extraction_confidence=0.0,
-                extraction_notes=[f"Error: {str(e)}"]
-            )
+            return self._failed_result(e)
+
+    def _iter_pages(self, itr_pdfs: List[PDFInput]) -> Iterator[PagePayload]:
+        """Render every ITR document to Gemini-ready page images, page by page"""
+        total = 0
+        for pdf_path in itr_pdfs:
+            logger.info(f"   📄 Processing: {source_name(pdf_path)}")
+            for page in PDFProcessor.iter_pages_for_gemini(
+                    pdf_path, max_pages=10, dpi=Config.PDF_DPI,
+                    workers=Config.PDF_RENDER_WORKERS,
+                    render_mode=Config.PDF_RENDER_MODE, grayscale=Config.PDF_GRAYSCALE,
+                    encoder=self.encoder):
+                total += 1
+                yield page
+
+        logger.info(f"   ✅ Total pages to analyze: {total}")
+
+    def _batch_stream(self, prompt: str, itr_pdfs: List[PDFInput]) -> Iterator[List[PagePayload]]:
+        """
+        Request batches as their pages are encoded. The pages are split into
+        requests only when one would exceed the model limits; the single JSON
+        answer does not grow with the page count.
+        """
+        budget = BatchBudget(prompt_tokens=text_tokens(prompt),
+                             output_tokens_fixed=Config.ITR_OUTPUT_TOKENS)
+        count = 0
+        for batch in iter_batches(self._iter_pages(itr_pdfs), self.limits, budget):
+            count += 1
+            if count > 1:
+                logger.info(f"   📦 Split off request {count}: {describe([batch], budget)}")
+            yield batch
+        if count == 0:
+            yield []
+
+    def _finish(self, contents: List[str], cache_key) -> ITRData:
+        """Parse the model response(s) and cache the result"""
+        logger.info("   📝 Parsing structured output...")
+        if len(contents) == 1:
+            parsed_data = self._parse_response(contents[0])
+        else:
+            parsed_data = validate_answer(ITRData, self._merge_partials(
+                [self._parse_json(c) for c in contents]))
+        self.cache_store(cache_key, parsed_data.model_dump(mode='json'))
+
+        logger.info(f"   ✅ ITR extraction complete!")
+        logger.info(f"      Applicant: {parsed_data.applicant_name}")
+        logger.info(
+            f"      Average Annual Income: ₹{parsed_data.average_annual_income:,.2f}")
+        logger.info(
+            f"      Average Monthly Income: ₹{parsed_data.average_monthly_income:,.2f}")
+        logger.info(
+            f"      Confidence: {parsed_data.extraction_confidence:.0%}")
+
+        return parsed_data
+
+    def _failed_result(self, e: Exception) -> ITRData:
+        """Minimal ITRData returned when extraction fails"""
+        logger.error(f"   ❌ ITR extraction failed: {e}")
+        logger.exception("Full traceback:")
+        return ITRData(
+            applicant_name="Extraction Failed",
+            assessment_year_1="2023-24",
+            assessment_year_2="2022-23",
+            gross_total_income_year1=0.0,
+            taxable_income_year1=0.0,
+            gross_total_income_year2=0.0,
+            taxable_income_year2=0.0,
+            average_annual_income=0.0,
+            average_monthly_income=0.0,
+            income_growth_rate=0.0,
+            itr_form_type="Unknown",
+            filing_status="Unknown",
+            extraction_confidence=0.0,
+            extraction_notes=[f"Error: {str(e)}"]
+        )
+
+    @staticmethod
+    def _merge_partials(parts: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Combine extractions from page batches: each field is taken from the
+        most confident batch that found it. Averages and growth are
+        re-derived from the merged yearly figures.
+        """
+        parts = sorted(parts, key=lambda d: float(d.get("extraction_confidence") or 0.0),
+                       reverse=True)
+        merged: Dict[str, Any] = {"extraction_notes": []}
+        for data in parts:
+            for k, v in data.items():
+                if k == "extraction_notes":
+                    merged[k].extend(v or [])
+                elif k not in _DERIVED_FIELDS and merged.get(k) in _BLANK and v not in _BLANK:
+                    merged[k] = v
+
+        y1 = float(merged.get("gross_total_income_year1") or 0.0)
+        y2 = float(merged.get("gross_total_income_year2") or 0.0)
+        if y1 or y2:
+            merged["average_annual_income"] = (y1 + y2) / 2
+            merged["average_monthly_income"] = merged["average_annual_income"] / 12
+        if y1 and y2:
+            merged["income_growth_rate"] = round((y1 - y2) / y2 * 100, 2)
+        merged["extraction_notes"].append(f"Extracted from {len(parts)} page batches")
+        return merged
 
     def _parse_response(self, response_text: str) -> ITRData:
         """Parse LLM response into ITRData"""
-        try:
-            # Clean response
-            cleaned = response_text.strip()
-            if cleaned.startswith("```json"):
-                cleaned = cleaned[7:]
-            if cleaned.startswith("```"):
-                cleaned = cleaned[3:]
-            if cleaned.endswith("```"):
-                cleaned = cleaned[:-3]
-            cleaned = cleaned.strip()
-
-            # Extract JSON boundaries
-            start = cleaned.find('{')
-            end = cleaned.rfind('}')
-            if start != -1 and end != -1:
-                cleaned = cleaned[start:end+1]
-
-            # Fix common JSON issues
-            cleaned = re.sub(r',(\s*[}\]])', r'\1', cleaned)
-
-            # Parse JSON
-            data = json.loads(cleaned)
-
-            # Create ITRData object
-            return ITRData(**data)
+        return validate_answer(ITRData, self._parse_json(response_text))
 
-        except Exception as e:
+    def _parse_json(self, response_text: str) -> Dict[str, Any]:
+        """Parse an LLM response into a dict"""
+        try:
+            return parse_json_answer(response_text)
+        except ValueError as e:
             logger.error(f"      ❌ Failed to parse response: {e}")
             logger.error(f"      📝 Response text: {response_text[:500]}...")
             raise
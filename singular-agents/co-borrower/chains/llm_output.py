@@ -0,0 +1,245 @@
+"""
+Helpers for reading LLM responses: JSON parsing, truncation detection,
+salvage of the complete part of a JSON answer that hit the output token
+limit, and incremental parsing of a streamed answer's rows.
+"""
+from __future__ import annotations
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+# finish_reason values meaning the model ran out of output tokens
+_TRUNCATED_REASONS = {"MAX_TOKENS", "LENGTH", "2"}
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+_FENCED = re.compile(r"```(?:json)?\s*(\{.*\})\s*```", re.DOTALL)
+
+# Top-level list fields streamed row by row
+_ROW_LIST_FIELD = re.compile(r'^\s*"(rows|transactions)"\s*:\s*$')
+
+
+def finish_reason(response: Any) -> str:
+    """Normalised finish reason of a LangChain response ("" when unknown)"""
+    meta = getattr(response, "response_metadata", None) or {}
+    reason = meta.get("finish_reason") or ""
+    return str(getattr(reason, "name", reason)).upper()
+
+
+def is_truncated(response: Any) -> bool:
+    """Whether the response stopped because of the output token limit"""
+    return finish_reason(response) in _TRUNCATED_REASONS
+
+
+def parse_json_answer(text: str) -> Dict[str, Any]:
+    """
+    The JSON object in a model answer
+
+    Schema-constrained answers are bare JSON and parse directly. Otherwise
+    markdown fences, text around the object and trailing commas are
+    removed first.
+
+    Raises:
+        ValueError: when no JSON object can be read
+    """
+    cleaned = (text or "").strip()
+    try:
+        data = json.loads(cleaned)
+    except ValueError:
+        fenced = _FENCED.search(cleaned)
+        if fenced:
+            cleaned = fenced.group(1)
+        start, end = cleaned.find("{"), cleaned.rfind("}")
+        if start == -1 or end <= start:
+            raise ValueError("No JSON object in the response")
+        data = json.loads(re.sub(r",(\s*[}\]])", r"\1", cleaned[start:end + 1]))
+    if not isinstance(data, dict):
+        raise ValueError("Response JSON is not an object")
+    return data
+
+
+def _whole_value(stack: List[str]) -> bool:
+    """Whether a value just completed here is a top-level field or list item"""
+    return len(stack) == 1 or (len(stack) == 2 and stack[1] == "[")
+
+
+def salvage_json(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Complete prefix of a JSON object whose text was cut off
+
+    The text is cut after the last complete top-level field or element of
+    a top-level list, and the open brackets are closed, so a truncated
+    transaction list keeps every row that was fully emitted and no partial
+    one.
+
+    Returns:
+        The salvaged object, or None when the object is not truncated
+        (its outer brace closes) or nothing usable was emitted
+    """
+    text = text or ""
+    start = text.find("{")
+    if start == -1:
+        return None
+
+    stack: List[str] = []
+    in_string = escaped = False
+    cut, cut_stack = None, ()
+
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            # The outer object, or a top-level list, may be cut while empty
+            if not stack or (len(stack) == 1 and ch == "["):
+                cut, cut_stack = i + 1, tuple(stack) + (ch,)
+            stack.append(ch)
+        elif ch in "}]":
+            if not stack:
+                return None
+            stack.pop()
+            if not stack:
+                return None  # the outer object is complete
+            if _whole_value(stack):
+                cut, cut_stack = i + 1, tuple(stack)
+        elif ch == ",":
+            if _whole_value(stack):
+                cut, cut_stack = i, tuple(stack)
+
+    if cut is None:
+        return None
+    repaired = text[start:cut] + "".join(_CLOSERS[b] for b in reversed(cut_stack))
+    repaired = re.sub(r",(\s*[}\]])", r"\1", repaired)
+    try:
+        data = json.loads(repaired)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+@dataclass
+class StreamedAnswer:
+    """A streamed response, parsed while it arrived"""
+    data: Optional[Dict[str, Any]]
+    truncated: bool
+    response_metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+def chunk_text(chunk: Any) -> str:
+    """Text of one streamed message chunk"""
+    content = getattr(chunk, "content", chunk)
+    if isinstance(content, str):
+        return content
+    return "".join(p if isinstance(p, str) else p.get("text", "")
+                   for p in content or [] if isinstance(p, (str, dict)))
+
+
+class RowStream:
+    """
+    Incremental parser for a JSON answer arriving in chunks
+
+    feed() returns each element of the top-level "rows" or "transactions"
+    list as soon as it is complete; the other top-level fields collect in
+    header. Only the unfinished element is buffered, so memory stays flat
+    however long the answer, and an element that fails to parse is
+    counted in skipped without affecting the ones around it.
+    """
+
+    def __init__(self):
+        self.header: Dict[str, Any] = {}
+        self.list_key: Optional[str] = None
+        self.skipped = 0
+        self.started = False    # the outer "{" was seen
+        self.complete = False   # ... and closed
+        self._buf = ""
+        self._stack: List[str] = []
+        self._in_string = self._escaped = False
+        self._in_list = False
+        self._mark: Optional[int] = None   # start of the current field / element
+
+    def feed(self, text: str) -> List[Any]:
+        """Add a chunk; returns the list elements it completed"""
+        items: List[Any] = []
+        if self.complete or not text:
+            return items
+        scanned = len(self._buf)
+        buf = self._buf = self._buf + text
+        stack = self._stack
+
+        for i in range(scanned, len(buf)):
+            ch = buf[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if not self.started:
+                if ch == "{":
+                    self.started = True
+                    stack.append(ch)
+                    self._mark = i + 1
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                if len(stack) == 1 and ch == "[" and self._mark is not None:
+                    key = _ROW_LIST_FIELD.match(buf[self._mark:i])
+                    if key:
+                        self.list_key, self._in_list = key.group(1), True
+                        self._mark = i + 1
+                stack.append(ch)
+            elif ch in "}]":
+                if len(stack) == 2 and self._in_list:
+                    self._item(buf[self._mark:i], items)
+                    self._in_list, self._mark = False, None
+                elif len(stack) == 1:
+                    self._field(buf, i)
+                    self.complete = True
+                    self._buf, self._mark = "", None
+                    return items
+                stack.pop()
+            elif ch == ",":
+                if len(stack) == 1:
+                    self._field(buf, i)
+                    self._mark = i + 1
+                elif len(stack) == 2 and self._in_list:
+                    self._item(buf[self._mark:i], items)
+                    self._mark = i + 1
+
+        # Drop everything before the unfinished field or element
+        keep = len(buf) if self._mark is None else self._mark
+        self._buf = buf[keep:]
+        if self._mark is not None:
+            self._mark = 0
+        return items
+
+    def _field(self, buf: str, end: int) -> None:
+        """A complete top-level field (not the row list) into header"""
+        if self._mark is None or not buf[self._mark:end].strip():
+            return
+        try:
+            self.header.update(json.loads("{" + buf[self._mark:end] + "}"))
+        except ValueError:
+            pass
+
+    def _item(self, text: str, items: List[Any]) -> None:
+        if not text.strip():
+            return
+        try:
+            items.append(json.loads(text))
+        except ValueError:
+            self.skipped += 1
@@ -0,0 +1,244 @@
+"""
+Process-wide Gemini clients and request rate limiting.
+All chains share one client per model setting (and so its connection
+pool) and one limiter holding the process's share of the project quota:
+a token bucket for requests per minute and one for input tokens per
+minute. A 429 pauses every chain in the process for the server's retry
+hint instead of letting each retry on its own schedule. Clients are
+rebuilt in a forked child, which must not reuse the parent's connections.
+"""
+from __future__ import annotations
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from chains.batching import image_tokens, text_tokens
+from config import Config
+from deadline import DeadlineExpired, current_deadline
+from processors.pdf_processor import MAX_IMAGE_SIDE
+
+logger = logging.getLogger(__name__)
+
+# Pause applied on a 429 that carries no retry hint
+DEFAULT_RATE_LIMIT_PAUSE = 10.0
+# Longest server retry hint honoured as-is
+MAX_RETRY_HINT_SECONDS = 60.0
+
+_RETRY_DELAY = re.compile(r"retry(?:Delay|[ _-]after| in)['\"]?\s*[:=]?\s*['\"]?(\d+(?:\.\d+)?)\s*s",
+                          re.IGNORECASE)
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    """Whether an LLM error (or its cause) is a 429 / quota error"""
+    while exc is not None:
+        code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+        if code == 429 or "RESOURCE_EXHAUSTED" in str(exc) or "RateLimit" in type(exc).__name__:
+            return True
+        exc = exc.__cause__
+    return False
+
+
+def retry_hint(exc: BaseException) -> Optional[float]:
+    """Seconds the server asked to wait before retrying, if it said"""
+    while exc is not None:
+        response = getattr(exc, "response", None)
+        header = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+        if header:
+            try:
+                return float(header)
+            except ValueError:
+                pass
+        match = _RETRY_DELAY.search(str(exc))
+        if match:
+            return float(match.group(1))
+        exc = exc.__cause__
+    return None
+
+
+def request_tokens(messages: List[Any]) -> int:
+    """Input tokens of a request, estimated before sending it"""
+    total = 0
+    for message in messages:
+        content = getattr(message, "content", message)
+        if isinstance(content, str):
+            total += text_tokens(content)
+            continue
+        for part in content:
+            if isinstance(part, str):
+                total += text_tokens(part)
+            elif part.get("type") == "text":
+                total += text_tokens(part.get("text"))
+            else:
+                # Page sizes are not known here; settle() corrects the estimate
+                total += image_tokens(MAX_IMAGE_SIDE, MAX_IMAGE_SIDE)
+    return total
+
+
+class TokenBucket:
+    """Per-minute budget refilled continuously; reservations may go into debt"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.stamp = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Take amount now; returns the seconds to wait until it is covered"""
+        self._refill(now)
+        self.level -= amount
+        return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def refund(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.level = min(self.capacity, self.level + amount)
+
+
+class RateLimiter:
+    """
+    Requests- and tokens-per-minute limiter shared by the chains in a process
+
+    acquire() / aacquire() wait for a slot before each request; settle()
+    replaces the token estimate with the usage the response reported.
+    A limit of 0 disables that bucket.
+    """
+
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0):
+        self._lock = threading.Lock()
+        self._requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self._tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self._paused_until = 0.0
+        self.waited = 0.0        # total seconds callers were held back
+        self.rate_limited = 0    # 429s seen
+
+    @classmethod
+    def from_config(cls) -> "RateLimiter":
+        """This process's share of the project quota (split over API_WORKERS)"""
+        workers = max(1, Config.API_WORKERS)
+        return cls(Config.GEMINI_RPM / workers, Config.GEMINI_TPM / workers)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"waited_seconds": round(self.waited, 2), "rate_limited": self.rate_limited}
+
+    def reserve(self, tokens: int) -> float:
+        """Reserve one request of the given input tokens; returns the wait"""
+        with self._lock:
+            now = time.monotonic()
+            wait = self._paused_until - now
+            if self._requests:
+                wait = max(wait, self._requests.reserve(1, now))
+            if self._tokens:
+                wait = max(wait, self._tokens.reserve(tokens, now))
+            wait = max(0.0, wait)
+            self.waited += wait
+            return wait
+
+    def release(self, tokens: int, wait: float) -> None:
+        """Give back a reservation that will not be used"""
+        with self._lock:
+            now = time.monotonic()
+            if self._requests:
+                self._requests.refund(1, now)
+            if self._tokens:
+                self._tokens.refund(tokens, now)
+            self.waited -= wait
+
+    def _slot(self, messages: List[Any]) -> tuple[int, float]:
+        """Reserve a request slot, unless waiting for it would pass the deadline"""
+        tokens = request_tokens(messages)
+        wait = self.reserve(tokens)
+        if wait > current_deadline().remaining():
+            self.release(tokens, wait)
+            raise DeadlineExpired("rate limit wait")
+        if wait > 0:
+            logger.info(f"   ⏳ Rate limit: waiting {wait:.1f}s")
+        return tokens, wait
+
+    def acquire(self, messages: List[Any]) -> int:
+        """Wait for a request slot; returns the reserved token estimate"""
+        tokens, wait = self._slot(messages)
+        if wait > 0:
+            time.sleep(wait)
+        return tokens
+
+    async def aacquire(self, messages: List[Any]) -> int:
+        """Async variant of acquire"""
+        tokens, wait = self._slot(messages)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return tokens
+
+    def settle(self, estimated: int, usage: Optional[Dict[str, Any]]) -> None:
+        """Correct a reservation with the input tokens the response reported"""
+        actual = (usage or {}).get("input_tokens")
+        if self._tokens is None or actual is None:
+            return
+        with self._lock:
+            self._tokens.refund(estimated - int(actual), time.monotonic())
+
+    def on_error(self, exc: BaseException) -> None:
+        """On a 429, hold every caller back for the server's retry hint"""
+        if not is_rate_limited(exc):
+            return
+        pause = min(retry_hint(exc) or DEFAULT_RATE_LIMIT_PAUSE, MAX_RETRY_HINT_SECONDS)
+        with self._lock:
+            self.rate_limited += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+        logger.warning(f"   🚦 Rate limited by Gemini; pausing requests for {pause:.1f}s")
+
+
+class LLMPool:
+    """Gemini clients shared by every chain in the process, one per model setting"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._clients: Dict[tuple, ChatGoogleGenerativeAI] = {}
+        self.limiter = RateLimiter.from_config()
+
+    def client(self, model_name: str, temperature: float,
+               max_output_tokens: int) -> ChatGoogleGenerativeAI:
+        """Shared client for the given settings, created on first use"""
+        key = (model_name, temperature, max_output_tokens)
+        with self._lock:
+            if self._pid != os.getpid():
+                self._clear()
+            llm = self._clients.get(key)
+            if llm is None:
+                llm = self._clients[key] = ChatGoogleGenerativeAI(
+                    model=model_name,
+                    google_api_key=Config.GEMINI_API_KEY,
+                    temperature=temperature,
+                    max_output_tokens=max_output_tokens,
+                    timeout=Config.TIMEOUT,
+                    # One attempt per call: chains.llm_retry owns retries
+                    max_retries=1,
+                )
+            return llm
+
+    def _clear(self) -> None:
+        """Drop clients and limiter state inherited from another process"""
+        self._pid = os.getpid()
+        self._clients = {}
+        self.limiter = RateLimiter.from_config()
+
+    def _after_fork(self) -> None:
+        # The parent's lock may have been held by a thread that does not exist here
+        self._lock = threading.Lock()
+        self._clear()
+
+
+llm_pool = LLMPool()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=llm_pool._after_fork)
@@ -0,0 +1,192 @@
+"""
+Retry policy for LLM calls.
+Only transient failures - timeouts, connection errors, 5xx and 429 - are
+retried, with jittered exponential backoff (or the server's retry hint for
+a 429) inside a per-request budget of attempts and waiting time, and never
+past the request deadline. Bad requests, auth errors and anything else fail
+on the first attempt. The Gemini client itself is left to make a single
+attempt, so the attempts here are the only ones. Each chain keeps
+RetryStats of what this cost.
+"""
+from __future__ import annotations
+import asyncio
+import logging
+import threading
+from typing import Any, Dict
+
+from tenacity import retry, wait_random_exponential
+from tenacity.wait import wait_base
+
+from chains.llm_pool import MAX_RETRY_HINT_SECONDS, is_rate_limited, retry_hint
+from config import Config
+from deadline import DeadlineExpired, current_deadline
+
+logger = logging.getLogger(__name__)
+
+# HTTP statuses worth another attempt besides 429
+_TRANSIENT_STATUS = {408, 500, 502, 503, 504}
+
+# Error type names of timeouts / dropped connections across httpx, aiohttp,
+# google-api-core and the langchain wrappers
+_TRANSIENT_NAMES = ("Timeout", "ConnectError", "ConnectionError", "RemoteProtocolError",
+                    "ReadError", "WriteError", "ServiceUnavailable", "ServerError",
+                    "DeadlineExceeded", "InternalServerError")
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Whether another attempt at the same request could succeed"""
+    if is_rate_limited(exc):
+        return True
+    while exc is not None:
+        if isinstance(exc, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+            return True
+        code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+        if code in _TRANSIENT_STATUS:
+            return True
+        if any(name in type(exc).__name__ for name in _TRANSIENT_NAMES):
+            return True
+        exc = exc.__cause__
+    return False
+
+
+class RetryStats:
+    """Attempts and retry time of one chain's LLM requests; thread-safe"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0           # calls made
+        self.attempts = 0           # attempts, first ones included
+        self.retries = 0
+        self.retry_seconds = 0.0    # backoff slept between attempts
+        self.failed_fast = 0        # permanent errors, not retried
+        self.exhausted = 0          # transient errors still failing at the end
+        self.deadline_expired = 0   # requests cut short by the request deadline
+
+    def attempt(self, first: bool) -> None:
+        with self._lock:
+            self.attempts += 1
+            if first:
+                self.requests += 1
+
+    def retry(self, sleep: float) -> None:
+        with self._lock:
+            self.retries += 1
+            self.retry_seconds += sleep
+
+    def failure(self, transient: bool) -> None:
+        with self._lock:
+            if transient:
+                self.exhausted += 1
+            else:
+                self.failed_fast += 1
+
+    def expired(self) -> None:
+        with self._lock:
+            self.deadline_expired += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "attempts": self.attempts,
+                "retries": self.retries,
+                "retry_seconds": round(self.retry_seconds, 2),
+                "failed_fast": self.failed_fast,
+                "exhausted": self.exhausted,
+                "deadline_expired": self.deadline_expired,
+            }
+
+
+class wait_for_retry_hint(wait_base):
+    """Tenacity wait: the server's retry hint for 429s, else the fallback"""
+
+    def __init__(self, fallback: wait_base):
+        self.fallback = fallback
+
+    def __call__(self, retry_state) -> float:
+        exc = retry_state.outcome.exception() if retry_state.outcome else None
+        hint = retry_hint(exc) if exc is not None and is_rate_limited(exc) else None
+        if hint is None:
+            return self.fallback(retry_state)
+        return min(hint, MAX_RETRY_HINT_SECONDS)
+
+
+def _stats(retry_state) -> RetryStats | None:
+    """RetryStats of the chain whose method is being retried"""
+    owner = retry_state.args[0] if retry_state.args else None
+    return getattr(owner, "retry_stats", None)
+
+
+def _before_attempt(retry_state) -> None:
+    stats = _stats(retry_state)
+    if stats is not None:
+        stats.attempt(first=retry_state.attempt_number == 1)
+
+
+def _before_sleep(retry_state) -> None:
+    stats = _stats(retry_state)
+    if stats is not None:
+        stats.retry(retry_state.upcoming_sleep)
+    logger.warning(
+        f"⚠️  Retry attempt {retry_state.attempt_number} after "
+        f"{type(retry_state.outcome.exception()).__name__}; "
+        f"waiting {retry_state.upcoming_sleep:.1f}s")
+
+
+def _retry_transient(retry_state) -> bool:
+    """Retry transient errors; a permanent one is recorded and raised as is"""
+    exc = retry_state.outcome.exception()
+    if exc is None:
+        return False
+    stats = _stats(retry_state)
+    if isinstance(exc, DeadlineExpired):
+        if stats is not None:
+            stats.expired()
+        return False
+    if is_transient(exc):
+        return True
+    logger.error(f"❌ Not retrying {type(exc).__name__}: failure is permanent")
+    if stats is not None:
+        stats.failure(transient=False)
+    return False
+
+
+def _past_deadline(retry_state) -> bool:
+    """Whether the next attempt could not start before the request deadline"""
+    return (retry_state.upcoming_sleep or 0.0) >= current_deadline().remaining()
+
+
+def _out_of_budget(retry_state) -> bool:
+    """Stop at LLM_MAX_ATTEMPTS, or when the next wait would overrun the budget or deadline"""
+    if retry_state.attempt_number >= max(1, Config.LLM_MAX_ATTEMPTS):
+        return True
+    if _past_deadline(retry_state):
+        return True
+    waited = retry_state.idle_for + (retry_state.upcoming_sleep or 0.0)
+    return waited > Config.LLM_RETRY_BUDGET_SECONDS
+
+
+def _give_up(retry_state) -> Any:
+    """Record a transient failure that ran out of budget and re-raise it"""
+    stats = _stats(retry_state)
+    exc = retry_state.outcome.exception()
+    if _past_deadline(retry_state):
+        if stats is not None:
+            stats.expired()
+        raise DeadlineExpired("LLM retry") from exc
+    if stats is not None:
+        stats.failure(transient=True)
+    raise exc
+
+
+def llm_retry(fn):
+    """Retry a chain's LLM call on transient errors (see module docstring)"""
+    policy = retry(
+        retry=_retry_transient,
+        stop=_out_of_budget,
+        wait=wait_for_retry_hint(wait_random_exponential(multiplier=1, max=10)),
+        before=_before_attempt,
+        before_sleep=_before_sleep,
+        retry_error_callback=_give_up,
+    )
+    return policy(fn)
@@ -3,14 +3,17 @@ Salary Slip Extraction Chain - PRODUCTION READY
 """
 
 import logging
-from pathlib import Path
-import json
-import re
+from typing import List
 
 from chains.base_chain import BaseChain
+from chains.llm_output import parse_json_answer
+from chains.structured_output import response_schema, validate_answer
 from schemas import SalarySlipData, EmploymentType
-from processors.pdf_processor import PDFProcessor
+from processors.pdf_processor import PagePayload, PDFProcessor
+from processors.pdf_source import PDFInput, source_name
 from config import Config
+from deadline import DeadlineExpired
+from scheduler import scheduler
 
 logger = logging.getLogger(__name__)
 
@@ -19,7 +22,8 @@ class SalarySlipChain(BaseChain):
     """Extract structured data from salary slips"""
 
     def __init__(self):
-        super().__init__(model_name=Config.GEMINI_VISION_MODEL)
+        super().__init__(model_name=Config.GEMINI_VISION_MODEL,
+                         response_schema=response_schema(SalarySlipData))
 
     def create_extraction_prompt(self) -> str:
         """Create detailed salary slip extraction prompt"""
@@ -75,97 +79,118 @@ Extract data from 3 months of salary slips. Return ONLY the JSON object, NO mark
 
 Analyze the salary slip pages and return ONLY the JSON:"""
 
-    def process(self, salary_slip_pdf: str) -> SalarySlipData:
+    def process(self, salary_slip_pdf: PDFInput, bypass_cache: bool = False) -> SalarySlipData:
         """Process salary slips PDF"""
-        logger.info(f"💼 Processing salary slips: {Path(salary_slip_pdf).name}")
+        logger.info(f"💼 Processing salary slips: {source_name(salary_slip_pdf)}")
 
         try:
-            # Process PDF to images
-            images = PDFProcessor.process_pdf_for_gemini(
-                salary_slip_pdf, max_pages=15)
-            logger.info(f"   ✅ Loaded {len(images)} pages")
-
             # Create prompt
             prompt = self.create_extraction_prompt()
 
-            # FIXED: Use proper Gemini content format
-            messages = self.create_gemini_content(prompt, images)
+            cache_key, cached = self.cache_lookup(
+                "salary", [salary_slip_pdf], prompt, bypass_cache=bypass_cache)
+            if cached is not None:
+                return SalarySlipData(**cached)
+
+            messages = self.create_gemini_content(
+                prompt, scheduler.cpu.call(self._load_pages, salary_slip_pdf))
 
             # Invoke model
             logger.info("   🤖 Analyzing salary slips with Gemini...")
-            response = self.llm.invoke(messages)
+            response = self.invoke_with_retry(messages)
+
+            return self._finish(response, cache_key)
 
-            # Parse response
-            logger.info("   📝 Parsing structured output...")
-            parsed_data = self._parse_response(response.content)
+        except DeadlineExpired:
+            raise
+        except Exception as e:
+            return self._failed_result(e)
 
-            logger.info(f"   ✅ Salary slip extraction complete!")
-            logger.info(f"      Employee: {parsed_data.employee_name}")
-            logger.info(f"      Employer: {parsed_data.employer_name}")
-            logger.info(
-                f"      Average Net Salary: ₹{parsed_data.average_net_salary:,.2f}")
-            logger.info(
-                f"      Confidence: {parsed_data.extraction_confidence:.0%}")
+    async def aprocess(self, salary_slip_pdf: PDFInput, bypass_cache: bool = False) -> SalarySlipData:
+        """Async variant of process - file I/O and rendering run on the cpu pool"""
+        logger.info(f"💼 Processing salary slips: {source_name(salary_slip_pdf)}")
 
-            return parsed_data
+        try:
+            prompt = self.create_extraction_prompt()
 
+            cache_key, cached = await scheduler.cpu.run(
+                self.cache_lookup, "salary", [salary_slip_pdf], prompt, bypass_cache=bypass_cache)
+            if cached is not None:
+                return SalarySlipData(**cached)
+
+            images = await scheduler.cpu.run(self._load_pages, salary_slip_pdf)
+            messages = self.create_gemini_content(prompt, images)
+
+            logger.info("   🤖 Analyzing salary slips with Gemini...")
+            response = await self.ainvoke_with_retry(messages)
+
+            return await scheduler.cpu.run_admitted(self._finish, response, cache_key)
+
+        except DeadlineExpired:
+            raise
         except Exception as e:
-            logger.error(f"   ❌ Salary slip extraction failed: {e}")
-            logger.exception("Full traceback:")
-            # Return minimal structure
-            return SalarySlipData(
-                employee_name="Extraction Failed",
-                employer_name="Unknown",
-                employment_type=EmploymentType.SALARIED,
-                month_1_date="2024-06",
-                month_1_gross=0.0,
-                month_1_deductions=0.0,
-                month_1_net=0.0,
-                month_2_date="2024-05",
-                month_2_gross=0.0,
-                month_2_deductions=0.0,
-                month_2_net=0.0,
-                month_3_date="2024-04",
-                month_3_gross=0.0,
-                month_3_deductions=0.0,
-                month_3_net=0.0,
-                average_gross_salary=0.0,
-                average_net_salary=0.0,
-                average_deductions=0.0,
-                basic_salary=0.0,
-                salary_consistency=0.0,
-                has_salary_growth=False,
-                extraction_confidence=0.0,
-                extraction_notes=[f"Error: {str(e)}"]
-            )
+            return self._failed_result(e)
+
+    def _load_pages(self, salary_slip_pdf: PDFInput) -> List[PagePayload]:
+        """Render salary slip pages to Gemini-ready images"""
+        images = PDFProcessor.process_pdf_for_gemini(
+            salary_slip_pdf, max_pages=15, dpi=Config.PDF_DPI,
+            workers=Config.PDF_RENDER_WORKERS,
+            render_mode=Config.PDF_RENDER_MODE, grayscale=Config.PDF_GRAYSCALE,
+            encoder=self.encoder)
+        logger.info(f"   ✅ Loaded {len(images)} pages")
+        return images
+
+    def _finish(self, response, cache_key) -> SalarySlipData:
+        """Parse the model response and cache the result"""
+        logger.info("   📝 Parsing structured output...")
+        parsed_data = self._parse_response(response.content)
+        self.cache_store(cache_key, parsed_data.model_dump(mode='json'))
+
+        logger.info(f"   ✅ Salary slip extraction complete!")
+        logger.info(f"      Employee: {parsed_data.employee_name}")
+        logger.info(f"      Employer: {parsed_data.employer_name}")
+        logger.info(
+            f"      Average Net Salary: ₹{parsed_data.average_net_salary:,.2f}")
+        logger.info(
+            f"      Confidence: {parsed_data.extraction_confidence:.0%}")
+
+        return parsed_data
+
+    def _failed_result(self, e: Exception) -> SalarySlipData:
+        """Minimal SalarySlipData returned when extraction fails"""
+        logger.error(f"   ❌ Salary slip extraction failed: {e}")
+        logger.exception("Full traceback:")
+        return SalarySlipData(
+            employee_name="Extraction Failed",
+            employer_name="Unknown",
+            employment_type=EmploymentType.SALARIED,
+            month_1_date="2024-06",
+            month_1_gross=0.0,
+            month_1_deductions=0.0,
+            month_1_net=0.0,
+            month_2_date="2024-05",
+            month_2_gross=0.0,
+            month_2_deductions=0.0,
+            month_2_net=0.0,
+            month_3_date="2024-04",
+            month_3_gross=0.0,
+            month_3_deductions=0.0,
+            month_3_net=0.0,
+            average_gross_salary=0.0,
+            average_net_salary=0.0,
+            average_deductions=0.0,
+            basic_salary=0.0,
+            salary_consistency=0.0,
+            has_salary_growth=False,
+            extraction_confidence=0.0,
+            extraction_notes=[f"Error: {str(e)}"]
+        )
 
     def _parse_response(self, response_text: str) -> SalarySlipData:
-        """Parse LLM response into SalarySlipData with robust error handling"""
+        """Parse LLM response into SalarySlipData, repairing fields that do not validate"""
         try:
-            # Clean response
-            cleaned = response_text.strip()
-            if cleaned.startswith("```json"):
-                cleaned = cleaned[7:]
-            if cleaned.startswith("```"):
-                cleaned = cleaned[3:]
-            if cleaned.endswith("```"):
-                cleaned = cleaned[:-3]
-            cleaned = cleaned.strip()
-
-            # Extract JSON boundaries
-            start = cleaned.find('{')
-            end = cleaned.rfind('}')
-            if start != -1 and end != -1:
-                cleaned = cleaned[start:end+1]
-
-            # Fix common JSON issues
-            cleaned = re.sub(r',(\s*[}\]])', r'\1', cleaned)  # Trailing commas
-
-            # Parse JSON
-            data = json.loads(cleaned)
-
-            # Create SalarySlipData object
-            return SalarySlipData(**data)
+            return validate_answer(SalarySlipData, parse_json_answer(response_text))
 
         except Exception as e:
             logger.error(f"      ❌ Failed to parse response: {e}")
@@ -0,0 +1,143 @@
+"""
+Schema-constrained output for the extraction chains.
+Gemini is given a JSON schema derived from the pydantic models, so it
+answers with bare JSON of the expected shape instead of free text to be
+cleaned up; validate_answer() repairs the rare answer that still fails
+validation locally rather than asking the model again.
+"""
+from __future__ import annotations
+import logging
+from functools import lru_cache
+from typing import Any, Dict, Sequence, Type, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+logger = logging.getLogger(__name__)
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+# JSON-schema keys Gemini does not need (defaults are the models' business)
+_DROP_KEYS = {"title", "default", "$defs"}
+
+_UNREPAIRABLE = object()
+
+
+def _inline(node: Any, defs: Dict[str, Any]) -> Any:
+    """Schema node with $refs resolved and Optional[X] reduced to X"""
+    if isinstance(node, list):
+        return [_inline(n, defs) for n in node]
+    if not isinstance(node, dict):
+        return node
+    if "$ref" in node:
+        return _inline(defs[node["$ref"].rsplit("/", 1)[-1]], defs)
+
+    variants = [v for v in node.get("anyOf", ()) if v.get("type") != "null"]
+    if len(variants) == 1:
+        node = {**{k: v for k, v in node.items() if k != "anyOf"}, **variants[0]}
+
+    out = {}
+    for k, v in node.items():
+        if k in _DROP_KEYS:
+            continue
+        if k == "properties":
+            out[k] = {name: _inline(prop, defs) for name, prop in v.items()}
+        else:
+            out[k] = _inline(v, defs)
+    return out
+
+
+@lru_cache(maxsize=None)
+def _schema(model: Type[BaseModel], fields: tuple | None) -> Dict[str, Any]:
+    schema = model.model_json_schema()
+    defs = schema.get("$defs", {})
+    props = schema["properties"]
+    names = fields or tuple(props)
+
+    def nullable(name: str) -> bool:
+        return any(v.get("type") == "null" for v in props[name].get("anyOf", ()))
+
+    return {
+        "type": "object",
+        "properties": {n: _inline(props[n], defs) for n in names},
+        "required": [n for n in names if not nullable(n)],
+    }
+
+
+def response_schema(model: Type[BaseModel], fields: Sequence[str] | None = None) -> Dict[str, Any]:
+    """
+    JSON schema for Gemini's structured output, derived from a model
+
+    Args:
+        model: Pydantic model the answer is validated against
+        fields: Only these fields, in this order (default: all)
+
+    Returns:
+        Self-contained schema; every non-Optional field is required
+    """
+    return _schema(model, tuple(fields) if fields else None)
+
+
+def _repair(value: Any, prop: Dict[str, Any]) -> Any:
+    """Nearest valid value for one field, or _UNREPAIRABLE"""
+    kind = prop.get("type")
+    if "enum" in prop:
+        if not isinstance(value, str):
+            return _UNREPAIRABLE
+        key = "_".join(value.strip().lower().replace("-", " ").split())
+        return next((v for v in prop["enum"] if str(v).lower() == key), _UNREPAIRABLE)
+
+    if kind in ("number", "integer"):
+        if isinstance(value, str):
+            try:
+                value = float(value.replace(",", "").strip())
+            except ValueError:
+                value = None
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            value = 0
+        value = min(max(value, prop.get("minimum", value)), prop.get("maximum", value))
+        return int(value) if kind == "integer" else float(value)
+
+    if value is None:
+        return {"string": "", "boolean": False, "array": []}.get(kind, _UNREPAIRABLE)
+    if kind == "string" and isinstance(value, (int, float)):
+        return str(value)
+    if kind == "array" and isinstance(value, str):
+        return [value]
+    return _UNREPAIRABLE
+
+
+def validate_answer(model: Type[ModelT], data: Dict[str, Any]) -> ModelT:
+    """
+    Validate an answer, repairing it locally when it does not fit
+
+    Missing or null required fields get their type's empty value, numbers
+    sent as strings are parsed, bounded numbers are clamped and enum values
+    matched loosely ("Self-Employed" -> "self_employed"). Repaired fields
+    are listed in extraction_notes.
+
+    Raises:
+        ValidationError: when the answer cannot be repaired
+    """
+    try:
+        return model(**data)
+    except ValidationError as e:
+        errors = e.errors()
+
+    props = response_schema(model)["properties"]
+    repaired = dict(data)
+    fixed = []
+    for err in errors:
+        name = err["loc"][0] if err["loc"] else None
+        if name not in props or name in fixed:
+            continue
+        value = _repair(repaired.get(name), props[name])
+        if value is not _UNREPAIRABLE:
+            repaired[name] = value
+            fixed.append(name)
+
+    if fixed:
+        logger.warning(f"      🔧 Repaired fields: {', '.join(fixed)}")
+        notes = repaired.get("extraction_notes")
+        repaired["extraction_notes"] = (notes if isinstance(notes, list) else []) + \
+            [f"Repaired fields: {', '.join(fixed)}"]
+    return model(**repaired)
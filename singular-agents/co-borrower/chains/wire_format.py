@@ -0,0 +1,122 @@
+"""
+Compact wire format for extracted transactions.
+Instead of one keyed object per transaction, the model answers with the
+statement header plus "rows": positional arrays in ROW_COLUMNS order. Keys
+are not repeated on every row, which cuts the output tokens - and with
+them the latency - of a dense statement page by about a third.
+"""
+from __future__ import annotations
+import json
+import logging
+from typing import Any, Dict, List, Sequence
+
+from chains.structured_output import response_schema
+from schemas import BankStatementData, BankTransaction
+
+logger = logging.getLogger(__name__)
+
+ROW_COLUMNS = ("date", "narration", "debit", "credit", "balance")
+_AMOUNT_COLUMNS = ("debit", "credit", "balance")
+
+# Output formats understood by the bank chain
+FORMAT_ROWS = "rows"
+FORMAT_OBJECTS = "objects"
+
+# Statement fields the model reports besides the transactions
+HEADER_FIELDS = ("account_holder_name", "bank_name", "account_number", "account_type",
+                 "statement_period_start", "statement_period_end",
+                 "opening_balance", "closing_balance")
+_TRAILER_FIELDS = ("extraction_confidence", "extraction_notes")
+
+
+def encode_rows(transactions: Sequence[Dict[str, Any]]) -> List[list]:
+    """Transaction dicts as positional rows"""
+    return [[t.get(c, "" if c in ("date", "narration") else 0.0) for c in ROW_COLUMNS]
+            for t in transactions]
+
+
+def _amount(value: Any) -> float:
+    if value in (None, "", "-"):
+        return 0.0
+    if isinstance(value, str):
+        value = value.replace(",", "").strip()
+    return float(value)
+
+
+def decode_rows(rows: Sequence[Any]) -> tuple[List[Dict[str, Any]], int]:
+    """
+    Positional rows back to transaction dicts
+
+    Rows of the wrong length or with unreadable amounts - such as the
+    partial last row of a truncated answer - are skipped.
+
+    Returns:
+        (transactions, number of rows skipped)
+    """
+    out: List[Dict[str, Any]] = []
+    skipped = 0
+    for row in rows or []:
+        if not isinstance(row, (list, tuple)) or len(row) != len(ROW_COLUMNS):
+            skipped += 1
+            continue
+        txn = dict(zip(ROW_COLUMNS, row))
+        try:
+            for c in _AMOUNT_COLUMNS:
+                txn[c] = _amount(txn[c])
+        except (TypeError, ValueError):
+            skipped += 1
+            continue
+        txn["date"] = str(txn["date"] or "")
+        txn["narration"] = str(txn["narration"] or "")
+        out.append(txn)
+    return out, skipped
+
+
+def decode_answer(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Normalise a parsed answer to the keyed "transactions" form, in place
+
+    Answers already using "transactions" objects pass through unchanged,
+    so either format can be decoded whatever the prompt asked for.
+    """
+    if "rows" not in data:
+        return data
+    rows = data.pop("rows")
+    data.pop("columns", None)
+    transactions, skipped = decode_rows(rows)
+    data["transactions"] = (data.get("transactions") or []) + transactions
+    if skipped:
+        logger.warning(f"   ⚠️  Skipped {skipped} malformed row(s)")
+        data.setdefault("extraction_notes", []).append(f"Skipped {skipped} malformed row(s)")
+    return data
+
+
+def answer_schema(output_format: str) -> Dict[str, Any]:
+    """Structured-output schema of a bank answer in the given format"""
+    schema = response_schema(BankStatementData, HEADER_FIELDS + _TRAILER_FIELDS)
+    if output_format == FORMAT_ROWS:
+        list_key = "rows"
+        rows = {
+            "type": "array",
+            "items": {
+                "type": "array",
+                "prefixItems": [{"type": "string"}, {"type": "string"},
+                                {"type": "number"}, {"type": "number"}, {"type": "number"}],
+                "minItems": len(ROW_COLUMNS),
+                "maxItems": len(ROW_COLUMNS),
+            },
+        }
+    else:
+        list_key = "transactions"
+        rows = {"type": "array", "items": response_schema(BankTransaction)}
+    properties = dict(schema["properties"])
+    trailer = {k: properties.pop(k) for k in _TRAILER_FIELDS}
+    properties = {**properties, list_key: rows, **trailer}
+    return {"type": "object", "properties": properties, "required": list(properties)}
+
+
+def format_row(transaction: Dict[str, Any], output_format: str) -> str:
+    """One transaction as it appears in answers of the given format"""
+    if output_format == FORMAT_ROWS:
+        return json.dumps(encode_rows([transaction])[0], ensure_ascii=False)
+    return json.dumps(transaction, ensure_ascii=False)
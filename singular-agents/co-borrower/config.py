@@ -1,6 +1,7 @@
 """
 Production Configuration for Loan Approval AI - CORRECTED
 """
+import json
 import os
 from pathlib import Path
 from dotenv import load_dotenv
@@ -14,6 +15,13 @@ if not env_path.exists():
 load_dotenv()
 
 
+def _with_overrides(limits: dict, overrides: str) -> dict:
+    """Merge a JSON object of per-model overrides into the built-in limits"""
+    for name, values in (json.loads(overrides) if overrides else {}).items():
+        limits.setdefault(name, {}).update(values)
+    return limits
+
+
 class Config:
     """Centralized configuration"""
 
@@ -31,7 +39,28 @@ class Config:
     GEMINI_VISION_MODEL = os.getenv("GEMINI_VISION_MODEL", "gemini-1.5-flash")
     TEMPERATURE = float(os.getenv("TEMPERATURE", "0.0"))
     MAX_RETRIES = int(os.getenv("MAX_RETRIES", "3"))
+    # Attempts per LLM request (transient errors only) and the most time
+    # one request may spend waiting between them
+    LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", str(MAX_RETRIES)))
+    LLM_RETRY_BUDGET_SECONDS = float(os.getenv("LLM_RETRY_BUDGET_SECONDS", "30"))
     TIMEOUT = int(os.getenv("TIMEOUT_SECONDS", "120"))
+    # Response length cap for every chain (also bounded by the model's own limit)
+    MAX_OUTPUT_TOKENS = int(os.getenv("MAX_OUTPUT_TOKENS", "8192"))
+    # Project quota shared by all chains, split evenly over API_WORKERS
+    # processes (0 = no limit); 429s pause every chain for the server's hint
+    GEMINI_RPM = float(os.getenv("GEMINI_RPM", "0"))
+    GEMINI_TPM = float(os.getenv("GEMINI_TPM", "0"))
+    # Constrain answers to JSON schemas derived from the result models
+    STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "true").lower() == "true"
+
+    # Per-request limits used to plan vision batches, matched by model name
+    # prefix; MODEL_LIMITS (JSON, same shape) overrides or adds entries
+    MODEL_LIMITS = _with_overrides({
+        "default": {"max_input_tokens": 1_048_576, "max_output_tokens": 8_192,
+                    "max_request_bytes": 20 * 1024 * 1024, "max_images": 3_000},
+        "gemini-1.5-pro": {"max_input_tokens": 2_097_152},
+        "gemini-2.5": {"max_output_tokens": 65_536},
+    }, os.getenv("MODEL_LIMITS", ""))
 
     # ========== DIRECTORIES ==========
     BASE_DIR = Path(__file__).parent
@@ -49,6 +78,8 @@ class Config:
     MAX_FILE_SIZE_MB = int(os.getenv("MAX_FILE_SIZE_MB", "50"))
     MAX_FILE_SIZE_BYTES = MAX_FILE_SIZE_MB * 1024 * 1024
     ALLOWED_EXTENSIONS = {'.pdf'}
+    # Keep uploads in memory (streamed, checked and hashed once) instead of UPLOAD_DIR
+    ZERO_DISK_UPLOADS = os.getenv("ZERO_DISK_UPLOADS", "true").lower() == "true"
 
     # ========== FOIR THRESHOLDS ==========
     MAX_FOIR_ACCEPTABLE = 65.0
@@ -67,11 +98,58 @@ class Config:
     # ========== PROCESSING LIMITS ==========
     MAX_PDF_PAGES = int(os.getenv("MAX_PDF_PAGES", "30"))
     PDF_DPI = int(os.getenv("PDF_DPI", "200"))
+    # Render processes per API worker (1 disables parallel rasterisation)
+    PDF_RENDER_WORKERS = int(os.getenv(
+        "PDF_RENDER_WORKERS", str(min(4, os.cpu_count() or 1))))
+    # "target" renders pages straight at the Gemini image size, "thumbnail" downscales
+    PDF_RENDER_MODE = os.getenv("PDF_RENDER_MODE", "target")
+    PDF_GRAYSCALE = os.getenv("PDF_GRAYSCALE", "false").lower() == "true"
+    # "fixed" sends every page as a colour PAGE_IMAGE_FORMAT image; "auto" sends
+    # text-only pages as palette PNGs and colourless ones in grey (score it with
+    # benchmarks/bench_encoder.py --live before switching)
+    PAGE_ENCODING = os.getenv("PAGE_ENCODING", "fixed").lower()
+    PAGE_IMAGE_FORMAT = os.getenv("PAGE_IMAGE_FORMAT", "jpeg").lower()
+    # Per-page budgets met by lowering quality, then size (0 = no limit)
+    PAGE_BYTE_BUDGET = int(os.getenv("PAGE_BYTE_BUDGET", "300000"))
+    PAGE_TOKEN_BUDGET = int(os.getenv("PAGE_TOKEN_BUDGET", "0"))
+    # Parse digital bank statements from the text layer; Gemini only sees failed pages
+    BANK_TEXT_FAST_PATH = os.getenv("BANK_TEXT_FAST_PATH", "true").lower() == "true"
+    # Bank pages per Gemini request are planned from token estimates;
+    # BANK_BATCH_SIZE > 0 additionally caps them
+    BANK_BATCH_SIZE = int(os.getenv("BANK_BATCH_SIZE", "0"))
+    BANK_BATCH_CONCURRENCY = int(os.getenv("BANK_BATCH_CONCURRENCY", "4"))
+    # "rows" (positional arrays, fewer output tokens) or "objects" (keyed JSON)
+    BANK_OUTPUT_FORMAT = os.getenv("BANK_OUTPUT_FORMAT", "rows").lower()
+    # Stream bank responses, parsing rows as they arrive; provisional metrics
+    # are reported as progress every BANK_STREAM_METRICS_EVERY rows
+    BANK_STREAMING = os.getenv("BANK_STREAMING", "false").lower() == "true"
+    BANK_STREAM_METRICS_EVERY = int(os.getenv("BANK_STREAM_METRICS_EVERY", "200"))
+    # Expected response tokens: transaction rows per statement page, and the
+    # header / single JSON object around them
+    BANK_OUTPUT_TOKENS_PER_PAGE = int(os.getenv("BANK_OUTPUT_TOKENS_PER_PAGE", "1400"))
+    BANK_OUTPUT_TOKENS_FIXED = int(os.getenv("BANK_OUTPUT_TOKENS_FIXED", "512"))
+    ITR_OUTPUT_TOKENS = int(os.getenv("ITR_OUTPUT_TOKENS", "1024"))
+    # Follow-up requests for a bank batch whose answer hit the output token limit
+    BANK_MAX_CONTINUATIONS = int(os.getenv("BANK_MAX_CONTINUATIONS", "4"))
 
     # ========== API SETTINGS ==========
     API_HOST = os.getenv("API_HOST", "0.0.0.0")
     API_PORT = int(os.getenv("API_PORT", "8000"))
     API_WORKERS = int(os.getenv("API_WORKERS", "2"))
+    # Overall time budget of one analysis (0 = none); a client may ask for less
+    # with the X-Request-Timeout header or the timeout_seconds form field.
+    # DEADLINE_RESERVE_SECONDS of it are kept for FOIR/CIBIL and the result.
+    REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "300"))
+    DEADLINE_RESERVE_SECONDS = float(os.getenv("DEADLINE_RESERVE_SECONDS", "5"))
+
+    # ========== WORK POOLS & ADMISSION ==========
+    # Shared worker pools: "cpu" renders, encodes and computes metrics, "io"
+    # bounds Gemini calls; each refuses work with POOL_MAX_QUEUE waiting.
+    # Beyond MAX_CONCURRENT_ANALYSES in flight, requests get 429 (0 = no cap)
+    CPU_POOL_WORKERS = int(os.getenv("CPU_POOL_WORKERS", str(os.cpu_count() or 1)))
+    IO_POOL_WORKERS = int(os.getenv("IO_POOL_WORKERS", "16"))
+    POOL_MAX_QUEUE = int(os.getenv("POOL_MAX_QUEUE", "64"))
+    MAX_CONCURRENT_ANALYSES = int(os.getenv("MAX_CONCURRENT_ANALYSES", "8"))
 
     # ========== CORS SETTINGS ==========
     CORS_ORIGINS = os.getenv("CORS_ORIGINS", "*").split(",")
@@ -79,6 +157,21 @@ class Config:
     # ========== CACHING ==========
     ENABLE_CACHING = os.getenv("ENABLE_CACHING", "false").lower() == "true"
     CACHE_TTL = int(os.getenv("CACHE_TTL", "3600"))
+    CACHE_MAX_SIZE_MB = int(os.getenv("CACHE_MAX_SIZE_MB", "256"))
+    CACHE_MAX_SIZE_BYTES = CACHE_MAX_SIZE_MB * 1024 * 1024
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1000"))
+
+    # ========== BACKGROUND JOBS ==========
+    # "memory" (per worker process) or "sqlite" (shared by all workers on a host);
+    # defaults to sqlite with more than one API worker so every worker sees every job
+    JOB_STORE = os.getenv("JOB_STORE", "sqlite" if API_WORKERS > 1 else "memory").lower()
+    JOB_DB_PATH = Path(os.getenv("JOB_DB_PATH", str(CACHE_DIR / "jobs.sqlite3")))
+    JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", "3600"))
+    JOB_MAX_JOBS = int(os.getenv("JOB_MAX_JOBS", "500"))
+
+    # ========== INCREMENTAL BANK METRICS ==========
+    # Per-account metric state kept between monthly statements
+    BANK_STATE_DIR = Path(os.getenv("BANK_STATE_DIR", str(CACHE_DIR / "bank_state")))
 
     # ========== LOGGING ==========
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
@@ -100,6 +193,15 @@ class Config:
         print(f"   Vision Model: {cls.GEMINI_VISION_MODEL}")
         print(f"   Environment: {cls.ENVIRONMENT}")
 
+    @classmethod
+    def model_limits(cls, model_name: str) -> dict:
+        """Request limits for a model: defaults plus the longest matching prefix entry"""
+        limits = dict(cls.MODEL_LIMITS["default"])
+        prefixes = [p for p in cls.MODEL_LIMITS if p != "default" and model_name.startswith(p)]
+        if prefixes:
+            limits.update(cls.MODEL_LIMITS[max(prefixes, key=len)])
+        return limits
+
     @classmethod
     def get_summary(cls):
         """Get configuration summary"""
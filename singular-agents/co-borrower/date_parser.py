@@ -0,0 +1,192 @@
+"""
+Fast statement date parsing.
+A statement prints every row's date the same way, so the format is sniffed
+from a sample once and rows are parsed with a precompiled regex instead of
+trying strptime formats until one stops raising. Repeated strings are
+memoised; anything the fast path cannot handle goes through strptime.
+"""
+from __future__ import annotations
+import calendar
+import re
+from dataclasses import dataclass
+from datetime import datetime, date
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+# Sample size used to pick the primary format
+SNIFF_SAMPLE_SIZE = 64
+
+# Same patterns datetime.strptime builds for these directives
+_DIRECTIVES = {
+    "d": r"(?P<d>3[01]|[12]\d|0[1-9]|[1-9]| [1-9])",
+    "m": r"(?P<m>1[0-2]|0[1-9]|[1-9])",
+    "Y": r"(?P<Y>\d\d\d\d)",
+    "y": r"(?P<y>\d\d)",
+    "b": r"(?P<b>{})",
+    "B": r"(?P<B>{})",
+}
+
+
+def _month_lookup(names: Sequence[str]) -> Dict[str, int]:
+    return {name.lower(): idx for idx, name in enumerate(names) if name}
+
+
+def _alternation(lookup: Dict[str, int]) -> str:
+    # Longest first, as strptime does
+    return "|".join(re.escape(n) for n in sorted(lookup, key=len, reverse=True))
+
+
+@dataclass(frozen=True)
+class CompiledFormat:
+    """strptime format translated to a regex plus a field-to-date builder"""
+
+    fmt: str
+    regex: "re.Pattern[str]"
+    build: Callable[[Dict[str, str]], Optional[date]]
+
+    def parse(self, s: str) -> Optional[date]:
+        m = self.regex.match(s)
+        if m is None or m.end() != len(s):
+            return None
+        return self.build(m.groupdict())
+
+
+def compile_format(fmt: str) -> Optional[CompiledFormat]:
+    """
+    Translate a strptime date format into an equivalent regex
+
+    Returns:
+        CompiledFormat, or None when fmt uses a directive without a fast path
+    """
+    abbr = _month_lookup(calendar.month_abbr)
+    full = _month_lookup(calendar.month_name)
+
+    parts: List[str] = []
+    seen = set()
+    i = 0
+    while i < len(fmt):
+        ch = fmt[i]
+        if ch == "%":
+            directive = fmt[i + 1:i + 2]
+            if directive not in _DIRECTIVES or directive in seen:
+                return None
+            seen.add(directive)
+            pattern = _DIRECTIVES[directive]
+            if directive == "b":
+                pattern = pattern.format(_alternation(abbr))
+            elif directive == "B":
+                pattern = pattern.format(_alternation(full))
+            parts.append(pattern)
+            i += 2
+        elif ch.isspace():
+            while i < len(fmt) and fmt[i].isspace():
+                i += 1
+            parts.append(r"\s+")
+        else:
+            parts.append(re.escape(ch))
+            i += 1
+
+    if not ({"Y", "y"} & seen and {"m", "b", "B"} & seen and "d" in seen):
+        return None
+
+    def build(fields: Dict[str, str]) -> Optional[date]:
+        if "Y" in fields:
+            year = int(fields["Y"])
+        else:
+            # strptime's pivot: 69-99 -> 19xx, 00-68 -> 20xx
+            year = int(fields["y"])
+            year += 1900 if year >= 69 else 2000
+        if "m" in fields:
+            month = int(fields["m"])
+        else:
+            month = (abbr if "b" in fields else full).get(
+                (fields.get("b") or fields["B"]).lower())
+            if month is None:
+                return None
+        try:
+            return date(year, month, int(fields["d"]))
+        except ValueError:
+            return None
+
+    return CompiledFormat(fmt, re.compile("".join(parts), re.IGNORECASE), build)
+
+
+def strptime_date(s: str, formats: Iterable[str]) -> Optional[date]:
+    """Reference parser: first format strptime accepts"""
+    for fmt in formats:
+        try:
+            return datetime.strptime(s, fmt).date()
+        except Exception:
+            pass
+    return None
+
+
+class DateParser:
+    """
+    Memoising parser for one statement's dates.
+    Results always equal the first of `formats` that strptime accepts.
+    """
+
+    def __init__(self, formats: Sequence[str], primary: Optional[str] = None):
+        self.formats = list(formats)
+        self._compiled = [(fmt, compile_format(fmt)) for fmt in self.formats]
+        self._fast = all(c is not None for _, c in self._compiled)
+        self.primary = primary if primary in self.formats else None
+        self._primary: Optional[CompiledFormat] = None
+        self._shadowing: List[CompiledFormat] = []
+        if self.primary is not None:
+            idx = self.formats.index(self.primary)
+            self._primary = self._compiled[idx][1]
+            # Earlier formats win in strptime order, so they must not match
+            self._shadowing = [c for _, c in self._compiled[:idx] if c is not None]
+        self._memo: Dict[str, Optional[date]] = {}
+        self.fallbacks = 0
+
+    @classmethod
+    def sniff(cls, formats: Sequence[str], samples: Iterable[str]) -> "DateParser":
+        """Build a parser whose primary format is the one most samples use"""
+        parser = cls(formats)
+        counts: Dict[str, int] = {}
+        seen = 0
+        for s in samples:
+            if not s:
+                continue
+            s = s.strip()
+            for fmt, compiled in parser._compiled:
+                if compiled is not None and compiled.parse(s) is not None:
+                    counts[fmt] = counts.get(fmt, 0) + 1
+                    break
+            seen += 1
+            if seen >= SNIFF_SAMPLE_SIZE:
+                break
+        if not counts:
+            return parser
+        # Ties go to the earlier format
+        best = max(parser.formats, key=lambda f: counts.get(f, 0))
+        return cls(formats, primary=best)
+
+    def parse(self, s: str) -> Optional[date]:
+        """Parse one date cell; blank or unrecognised -> None"""
+        try:
+            return self._memo[s]
+        except KeyError:
+            pass
+        d = self._memo[s] = self._parse(s) if s else None
+        return d
+
+    __call__ = parse
+
+    def _parse(self, s: str) -> Optional[date]:
+        s = s.strip()
+        primary = self._primary
+        if primary is not None:
+            d = primary.parse(s)
+            if d is not None and not any(c.regex.match(s) for c in self._shadowing):
+                return d
+        if self._fast:
+            for _, compiled in self._compiled:
+                d = compiled.parse(s)
+                if d is not None:
+                    return d
+        # Outliers (or formats without a fast path) take the strptime route
+        self.fallbacks += 1
+        return strptime_date(s, self.formats)
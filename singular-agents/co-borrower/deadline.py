@@ -0,0 +1,107 @@
+"""
+Request-scoped deadlines for the loan pipeline.
+A Deadline is set once per analysis (from the API or REQUEST_DEADLINE_SECONDS)
+and carried in a context variable, so rendering, every LLM call and every
+retry see the time left without it being passed through each signature.
+asyncio tasks and the scheduler's pools inherit it; work submitted to any
+other ThreadPoolExecutor must be wrapped with in_context().
+"""
+from __future__ import annotations
+import contextvars
+import math
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+# Shortest timeout handed to a client call; some treat 0 as "no timeout"
+MIN_CALL_TIMEOUT = 0.01
+
+
+class DeadlineExpired(Exception):
+    """Work was started, or waited for, past the request deadline"""
+
+    def __init__(self, what: str = "request"):
+        super().__init__(f"Request deadline reached during {what}")
+        self.what = what
+
+
+class Deadline:
+    """A point in time (time.monotonic) by which the work must finish"""
+
+    def __init__(self, expires_at: Optional[float] = None, name: str = "request"):
+        self.expires_at = expires_at
+        self.name = name
+
+    @classmethod
+    def after(cls, seconds: Optional[float], name: str = "request") -> "Deadline":
+        """Deadline seconds from now; None or <= 0 means none"""
+        if not seconds or seconds <= 0:
+            return cls(None, name)
+        return cls(time.monotonic() + seconds, name)
+
+    @property
+    def bounded(self) -> bool:
+        return self.expires_at is not None
+
+    def remaining(self) -> float:
+        """Seconds left (inf when unbounded, never negative)"""
+        if self.expires_at is None:
+            return math.inf
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def check(self, what: str = "request") -> None:
+        """Raise DeadlineExpired if no time is left"""
+        if self.expired:
+            raise DeadlineExpired(what)
+
+    def cap(self, seconds: float) -> float:
+        """A timeout of at most seconds that also ends at the deadline"""
+        return max(MIN_CALL_TIMEOUT, min(seconds, self.remaining()))
+
+    def timeout(self, extra: float = 0.0) -> Optional[float]:
+        """Time to wait for work bound by this deadline (None = no limit)"""
+        return None if self.expires_at is None else self.remaining() + extra
+
+    def stage(self, name: str, reserve: float = 0.0) -> "Deadline":
+        """Budget for one stage: this deadline less reserve seconds kept for later stages"""
+        if self.expires_at is None:
+            return Deadline(None, name)
+        return Deadline(self.expires_at - reserve, name)
+
+    def __repr__(self) -> str:
+        left = "unbounded" if self.expires_at is None else f"{self.remaining():.1f}s left"
+        return f"Deadline({self.name}, {left})"
+
+
+_current: contextvars.ContextVar[Deadline] = contextvars.ContextVar(
+    "request_deadline", default=Deadline())
+
+
+def current_deadline() -> Deadline:
+    """Deadline of the work running in this context (unbounded outside a request)"""
+    return _current.get()
+
+
+def check_deadline(what: str = "request") -> None:
+    """Raise DeadlineExpired if the current deadline has passed"""
+    _current.get().check(what)
+
+
+@contextmanager
+def deadline_scope(deadline: Deadline) -> Iterator[Deadline]:
+    """Make deadline the current one inside the block"""
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def in_context(fn: Callable, *args, **kwargs) -> Callable[[], object]:
+    """fn bound to a copy of this context, for running in a pool thread"""
+    ctx = contextvars.copy_context()
+    return lambda: ctx.run(fn, *args, **kwargs)
@@ -0,0 +1,216 @@
+"""
+Content-addressed extraction cache for the co-borrower chains.
+Keys are derived from the SHA-256 of the PDF bytes plus prompt, model, DPI and
+page render/encoding settings, so re-submitting the same document skips
+rendering and Gemini entirely.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+from config import Config
+from processors.pdf_source import PDFSource
+from utils import calculate_file_hash
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionCache:
+    """Persistent JSON cache with TTL expiry and size-bounded LRU eviction"""
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        ttl_seconds: int = 3600,
+        max_size_bytes: int = 256 * 1024 * 1024,
+        max_entries: int = 1000,
+        enabled: bool = True,
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(exist_ok=True, parents=True)
+        self.ttl_seconds = ttl_seconds
+        self.max_size_bytes = max_size_bytes
+        self.max_entries = max_entries
+        self.enabled = enabled
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(namespace: str, file_hashes: Iterable[str], prompt: str,
+                 model_name: str, dpi: int, render: str = "") -> str:
+        """
+        Build a cache key from document hashes and extraction parameters
+
+        Args:
+            namespace: Chain namespace (itr, bank, salary)
+            file_hashes: SHA-256 of each input PDF, in submission order
+            prompt: Full prompt text sent to the model
+            model_name: Gemini model name
+            dpi: Render resolution
+            render: Other settings that change the page images sent to the model
+
+        Returns:
+            str: Hex digest key
+        """
+        h = hashlib.sha256()
+        parts = [namespace, *file_hashes,
+                 hashlib.sha256(prompt.encode("utf-8")).hexdigest(),
+                 model_name, str(dpi), render]
+        for part in parts:
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def key_for_files(self, namespace: str, pdf_paths: Iterable, prompt: str,
+                      model_name: str, dpi: int, render: str = "") -> str:
+        """Hash the given PDFs (paths or PDFSource) and build their cache key"""
+        # In-memory uploads were hashed while streaming
+        hashes = [p.sha256 if isinstance(p, PDFSource) else calculate_file_hash(str(p))
+                  for p in pdf_paths]
+        return self.make_key(namespace, hashes, prompt, model_name, dpi, render)
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached extraction
+
+        Returns:
+            Cached payload, or None on miss/expiry
+        """
+        if not self.enabled:
+            return None
+
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            self._count_miss()
+            return None
+        except Exception as e:
+            logger.warning(f"⚠️  Dropping unreadable cache entry {key[:12]}: {e}")
+            self._unlink(path)
+            self._count_miss()
+            return None
+
+        if time.time() - float(entry.get("created_at", 0)) > self.ttl_seconds:
+            self._unlink(path)
+            self._count_miss()
+            return None
+
+        # mtime doubles as last-access time for LRU ordering
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        with self._lock:
+            self.hits += 1
+        return entry.get("data")
+
+    def put(self, key: str, data: Dict[str, Any]) -> None:
+        """Store an extraction payload and evict if over budget"""
+        if not self.enabled:
+            return
+
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        entry = {"created_at": time.time(), "data": data}
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False, default=str)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"⚠️  Failed to write cache entry {key[:12]}: {e}")
+            self._unlink(tmp_path)
+            return
+
+        self._evict()
+
+    def _evict(self) -> None:
+        """Remove expired entries, then least-recently-used ones until within limits"""
+        with self._lock:
+            now = time.time()
+            entries = []
+            for p in self.cache_dir.glob("*.json"):
+                try:
+                    st = p.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, p))
+
+            entries.sort(key=lambda e: e[0])
+            total_size = sum(e[1] for e in entries)
+            count = len(entries)
+
+            for mtime, size, p in entries:
+                expired = now - mtime > self.ttl_seconds
+                over = total_size > self.max_size_bytes or count > self.max_entries
+                if not expired and not over:
+                    # Entries are LRU-ordered, so nothing older remains to drop
+                    break
+                self._unlink(p)
+                total_size -= size
+                count -= 1
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Delete all cache entries"""
+        with self._lock:
+            for p in self.cache_dir.glob("*.json"):
+                self._unlink(p)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current footprint"""
+        files = list(self.cache_dir.glob("*.json"))
+        size = 0
+        for p in files:
+            try:
+                size += p.stat().st_size
+            except FileNotFoundError:
+                continue
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(files),
+            "size_mb": round(size / (1024 * 1024), 2),
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+    def _count_miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+
+    @staticmethod
+    def _unlink(path: Path) -> None:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.debug(f"   Could not delete cache file {path.name}: {e}")
+
+
+# Process-wide instance used by all chains
+extraction_cache = ExtractionCache(
+    cache_dir=Config.CACHE_DIR / "extractions",
+    ttl_seconds=Config.CACHE_TTL,
+    max_size_bytes=Config.CACHE_MAX_SIZE_BYTES,
+    max_entries=Config.CACHE_MAX_ENTRIES,
+    enabled=Config.ENABLE_CACHING,
+)
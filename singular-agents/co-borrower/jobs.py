@@ -0,0 +1,389 @@
+"""
+Job store for asynchronous loan analyses.
+Submitted analyses run in the background; clients poll status/result or follow
+per-stage progress over Server-Sent Events. Jobs live in a bounded store with
+TTL - in memory by default, or SQLite so every API worker sees the same jobs.
+"""
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from enum import Enum
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+TERMINAL_STATUSES = {JobStatus.COMPLETED, JobStatus.FAILED}
+
+
+class JobStoreFull(Exception):
+    """Every slot is held by an unfinished job"""
+
+
+@dataclass
+class Job:
+    """One submitted analysis"""
+    job_id: str
+    status: JobStatus = JobStatus.QUEUED
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    events: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+    def summary(self) -> Dict[str, Any]:
+        """Status payload - latest event per stage, without the result body"""
+        stages: Dict[str, Dict[str, Any]] = {}
+        for event in self.events:
+            if event.get("stage"):
+                stages[event["stage"]] = event
+        return {
+            "job_id": self.job_id,
+            "status": self.status.value,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "stages": stages,
+            "error": self.error,
+        }
+
+
+class MemoryJobStore:
+    """Process-local job store bounded by entry count and TTL"""
+
+    def __init__(self, max_jobs: int = 500, ttl_seconds: int = 3600):
+        self.max_jobs = max_jobs
+        self.ttl_seconds = ttl_seconds
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self) -> Job:
+        with self._lock:
+            self._purge()
+            if len(self._jobs) >= self.max_jobs:
+                raise JobStoreFull(f"{len(self._jobs)} jobs still running")
+            job = Job(job_id=uuid.uuid4().hex)
+            self._jobs[job.job_id] = job
+            return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or self._expired(job, time.time()):
+                return None
+            # Events are appended from worker threads; hand out a snapshot
+            return Job(job.job_id, job.status, job.created_at, job.updated_at,
+                       job.result, job.error, list(job.events))
+
+    def events_since(self, job_id: str, seq: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return list(job.events[seq:]) if job else []
+
+    def add_event(self, job_id: str, event: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return event
+            event = {"seq": len(job.events) + 1, **event}
+            job.events.append(event)
+            job.updated_at = time.time()
+            return event
+
+    def set_status(self, job_id: str, status: JobStatus,
+                   result: Optional[Dict[str, Any]] = None, error: Optional[str] = None) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.status = status
+            job.result = result if result is not None else job.result
+            job.error = error
+            job.updated_at = time.time()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job.status.value] = counts.get(job.status.value, 0) + 1
+            return {"backend": "memory", "jobs": len(self._jobs),
+                    "max_jobs": self.max_jobs, "by_status": counts}
+
+    def _expired(self, job: Job, now: float) -> bool:
+        return job.finished and now - job.updated_at > self.ttl_seconds
+
+    def _purge(self) -> None:
+        """Drop expired jobs, then the oldest finished ones while over capacity"""
+        now = time.time()
+        for job_id in [j for j, job in self._jobs.items() if self._expired(job, now)]:
+            del self._jobs[job_id]
+        if len(self._jobs) < self.max_jobs:
+            return
+        for job_id in [j for j, job in self._jobs.items() if job.finished]:
+            del self._jobs[job_id]
+            if len(self._jobs) < self.max_jobs:
+                break
+
+
+class SQLiteJobStore:
+    """
+    SQLite-backed job store - shared by all API workers on one host
+
+    Each call opens a short-lived connection, so the store is safe to use
+    from the event loop and from extraction threads alike.
+    """
+
+    def __init__(self, db_path: Path, max_jobs: int = 500, ttl_seconds: int = 3600):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(exist_ok=True, parents=True)
+        self.max_jobs = max_jobs
+        self.ttl_seconds = ttl_seconds
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    result TEXT,
+                    error TEXT
+                );
+                CREATE TABLE IF NOT EXISTS job_events (
+                    job_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    payload TEXT NOT NULL,
+                    PRIMARY KEY (job_id, seq)
+                );
+            """)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+        finally:
+            conn.close()
+
+    def create(self) -> Job:
+        job = Job(job_id=uuid.uuid4().hex)
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._purge(conn)
+            (count,) = conn.execute("SELECT COUNT(*) FROM jobs").fetchone()
+            if count >= self.max_jobs:
+                conn.execute("ROLLBACK")
+                raise JobStoreFull(f"{count} jobs still running")
+            conn.execute(
+                "INSERT INTO jobs (job_id, status, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (job.job_id, job.status.value, job.created_at, job.updated_at))
+            conn.execute("COMMIT")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT status, created_at, updated_at, result, error FROM jobs WHERE job_id = ?",
+                (job_id,)).fetchone()
+            if row is None:
+                return None
+            events = [json.loads(p) for (p,) in conn.execute(
+                "SELECT payload FROM job_events WHERE job_id = ? ORDER BY seq", (job_id,))]
+        status, created_at, updated_at, result, error = row
+        job = Job(job_id, JobStatus(status), created_at, updated_at,
+                  json.loads(result) if result else None, error, events)
+        if job.finished and time.time() - job.updated_at > self.ttl_seconds:
+            return None
+        return job
+
+    def events_since(self, job_id: str, seq: int) -> List[Dict[str, Any]]:
+        with self._connect() as conn:
+            return [json.loads(p) for (p,) in conn.execute(
+                "SELECT payload FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq",
+                (job_id, seq))]
+
+    def add_event(self, job_id: str, event: Dict[str, Any]) -> Dict[str, Any]:
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            (last,) = conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM job_events WHERE job_id = ?",
+                (job_id,)).fetchone()
+            event = {"seq": last + 1, **event}
+            conn.execute("INSERT INTO job_events (job_id, seq, payload) VALUES (?, ?, ?)",
+                         (job_id, event["seq"], json.dumps(event, default=str)))
+            conn.execute("UPDATE jobs SET updated_at = ? WHERE job_id = ?",
+                         (time.time(), job_id))
+            conn.execute("COMMIT")
+        return event
+
+    def set_status(self, job_id: str, status: JobStatus,
+                   result: Optional[Dict[str, Any]] = None, error: Optional[str] = None) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ?, error = ?, "
+                "result = COALESCE(?, result) WHERE job_id = ?",
+                (status.value, time.time(), error,
+                 json.dumps(result, default=str) if result is not None else None, job_id))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._connect() as conn:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+        return {"backend": "sqlite", "jobs": sum(counts.values()),
+                "max_jobs": self.max_jobs, "by_status": counts}
+
+    def _purge(self, conn: sqlite3.Connection) -> None:
+        """Drop expired jobs, then the oldest finished ones while over capacity"""
+        terminal = tuple(s.value for s in TERMINAL_STATUSES)
+        cutoff = time.time() - self.ttl_seconds
+        conn.execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (*terminal, cutoff))
+        (count,) = conn.execute("SELECT COUNT(*) FROM jobs").fetchone()
+        excess = count - self.max_jobs + 1
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM jobs WHERE job_id IN (SELECT job_id FROM jobs WHERE status IN (?, ?) "
+                "ORDER BY updated_at LIMIT ?)", (*terminal, excess))
+        conn.execute("DELETE FROM job_events WHERE job_id NOT IN (SELECT job_id FROM jobs)")
+
+
+class JobManager:
+    """
+    Wraps a store with in-process wake-ups for SSE listeners
+
+    Progress events may be reported from extraction threads; listeners on the
+    event loop are woken with call_soon_threadsafe. Listeners also poll, so
+    events written by another worker process (SQLite) are still delivered.
+
+    Store calls may block (SQLite), so coroutines use the a* methods: events
+    and status changes are written in order by one writer thread, reads run
+    in asyncio.to_thread.
+    """
+
+    def __init__(self, store, poll_interval: float = 1.0):
+        self.store = store
+        self.poll_interval = poll_interval
+        self._waiters: Dict[str, List[tuple]] = {}
+        self._lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-store")
+
+    def create(self) -> Job:
+        return self.store.create()
+
+    async def acreate(self) -> Job:
+        return await asyncio.to_thread(self.store.create)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.store.get(job_id)
+
+    async def aget(self, job_id: str) -> Optional[Job]:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def aevents_since(self, job_id: str, seq: int) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self.store.events_since, job_id, seq)
+
+    def report(self, job_id: str, stage: str, status: str, message: str = "", **detail) -> None:
+        """Queue a progress event for the writer thread; safe to call from any thread or the loop"""
+        event = {"stage": stage, "status": status, "message": message,
+                 "timestamp": time.time(), **detail}
+        self._writer.submit(self._record, job_id, event)
+
+    def _record(self, job_id: str, event: Dict[str, Any]) -> None:
+        try:
+            self.store.add_event(job_id, event)
+        except Exception as e:
+            logger.warning(f"⚠️  Could not record progress for job {job_id[:8]}: {e}")
+        self._wake(job_id)
+
+    def set_status(self, job_id: str, status: JobStatus, result: Optional[Dict[str, Any]] = None,
+                   error: Optional[str] = None) -> None:
+        """Change a job's status, waiting until it is written; not for use on the event loop"""
+        self._submit_status(job_id, status, result, error).result()
+
+    async def aset_status(self, job_id: str, status: JobStatus,
+                          result: Optional[Dict[str, Any]] = None,
+                          error: Optional[str] = None) -> None:
+        """Async variant of set_status"""
+        await asyncio.wrap_future(self._submit_status(job_id, status, result, error))
+
+    def _submit_status(self, job_id: str, status: JobStatus, result: Optional[Dict[str, Any]],
+                       error: Optional[str]) -> Future:
+        # Same writer as report(), so the status lands after every event queued before it
+        def write():
+            self.store.set_status(job_id, status, result=result, error=error)
+            self._record(job_id, {"stage": "job", "status": status.value, "message": error or "",
+                                  "timestamp": time.time()})
+        return self._writer.submit(write)
+
+    def progress_callback(self, job_id: str):
+        """Callback in the shape LoanApprovalEngine expects"""
+        def callback(stage: str, status: str, message: str = "", **detail):
+            self.report(job_id, stage, status, message, **detail)
+        return callback
+
+    async def wait(self, job_id: str, after_seq: int) -> List[Dict[str, Any]]:
+        """Events after after_seq, waiting up to poll_interval for new ones"""
+        events = await self.aevents_since(job_id, after_seq)
+        if events:
+            return events
+
+        loop = asyncio.get_running_loop()
+        wake = asyncio.Event()
+        with self._lock:
+            self._waiters.setdefault(job_id, []).append((loop, wake))
+        try:
+            # Re-check after registering so a concurrent report is not missed
+            events = await self.aevents_since(job_id, after_seq)
+            if not events:
+                try:
+                    await asyncio.wait_for(wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                events = await self.aevents_since(job_id, after_seq)
+            return events
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(job_id, [])
+                if (loop, wake) in waiters:
+                    waiters.remove((loop, wake))
+                if not waiters:
+                    self._waiters.pop(job_id, None)
+
+    def _wake(self, job_id: str) -> None:
+        with self._lock:
+            waiters = list(self._waiters.get(job_id, []))
+        for loop, wake in waiters:
+            try:
+                loop.call_soon_threadsafe(wake.set)
+            except RuntimeError:
+                # Loop already closed
+                pass
+
+
+def create_job_store():
+    """Build the store selected by JOB_STORE"""
+    if Config.JOB_STORE == "sqlite":
+        return SQLiteJobStore(Config.JOB_DB_PATH, max_jobs=Config.JOB_MAX_JOBS,
+                              ttl_seconds=Config.JOB_TTL_SECONDS)
+    return MemoryJobStore(max_jobs=Config.JOB_MAX_JOBS, ttl_seconds=Config.JOB_TTL_SECONDS)
@@ -2,30 +2,41 @@
 Main Orchestration Engine for Loan Approval AI - ANALYTICS ONLY
 Processes all documents in parallel - NO ELIGIBILITY DECISIONS
 """
+import asyncio
 import logging
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 import time
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from functools import partial
 
 from chains.bank_chain import BankStatementChain
 from chains.itr_chain import ITRChain
 from chains.salary_chain import SalarySlipChain
 from chains.foir_chain import FOIRChain
 from chains.cibil_chain import CIBILChain
-from schemas import LoanApplicationAnalysis
+from chains.llm_pool import llm_pool
+from processors.pdf_source import PDFInput, PDFSource
+from schemas import BankStatementData, LoanApplicationAnalysis
 from utils import (
     save_json, create_session_id, validate_pdf,
-    calculate_confidence_score, setup_logging
+    calculate_confidence_score, setup_logging,
+    ProgressCallback, report_progress
 )
 from config import Config
+from deadline import Deadline, DeadlineExpired, deadline_scope
+from scheduler import scheduler
 
 # Setup logging
 setup_logging(Config.LOG_LEVEL)
 logger = logging.getLogger(__name__)
 
 
+# Time allowed past the extraction deadline for chains to hand back what they have
+EXTRACTION_GRACE_SECONDS = 1.0
+
+
 class LoanApprovalEngine:
     """Main orchestration engine for loan application analysis - ANALYTICS ONLY"""
 
@@ -39,29 +50,48 @@ class LoanApprovalEngine:
         self.cibil_chain = CIBILChain()
         logger.info("✅ All chains initialized")
 
+    def llm_stats(self) -> Dict[str, Any]:
+        """Per-chain LLM retry counters and rate limiter totals"""
+        return {
+            "itr": self.itr_chain.retry_stats.as_dict(),
+            "bank": self.bank_chain.retry_stats.as_dict(),
+            "salary": self.salary_chain.retry_stats.as_dict(),
+            "rate_limiter": llm_pool.limiter.stats(),
+        }
+
     def process_loan_application(
         self,
-        salary_slip_pdf: str,
-        bank_statement_pdf: str,
-        itr_pdf_1: str,
-        itr_pdf_2: Optional[str] = None,
-        form16_pdf: Optional[str] = None
+        salary_slip_pdf: PDFInput,
+        bank_statement_pdf: PDFInput,
+        itr_pdf_1: PDFInput,
+        itr_pdf_2: Optional[PDFInput] = None,
+        form16_pdf: Optional[PDFInput] = None,
+        bypass_cache: bool = False,
+        progress: Optional[ProgressCallback] = None,
+        deadline: Optional[Deadline] = None
     ) -> LoanApplicationAnalysis:
         """
         Process complete loan application - RETURNS DATA ONLY, NO DECISIONS
 
         Args:
-            salary_slip_pdf: Path to salary slips (3 months)
+            salary_slip_pdf: Path to salary slips (3 months); every document
+                may also be an in-memory PDFSource
             bank_statement_pdf: Path to bank statement (6 months)
             itr_pdf_1: Path to ITR document 1
             itr_pdf_2: Path to ITR document 2 (optional)
             form16_pdf: Path to Form 16 (optional)
+            bypass_cache: Re-extract documents even if cached results exist
+            progress: Optional callback receiving per-stage progress events
+            deadline: When the analysis must be done (default
+                REQUEST_DEADLINE_SECONDS from now); extractions still running
+                at the deadline are abandoned and a partial result returned
 
         Returns:
             LoanApplicationAnalysis: Complete analysis (data + FOIR + CIBIL only)
         """
         session_id = create_session_id()
         start_time = time.time()
+        deadline = deadline or Deadline.after(Config.REQUEST_DEADLINE_SECONDS)
 
         logger.info(f"\n{'='*80}")
         logger.info(f"💰 LOAN APPLICATION ANALYSIS - Session: {session_id}")
@@ -70,174 +100,386 @@ class LoanApprovalEngine:
         errors = []
 
         try:
-            # Validate all PDFs
-            logger.info("📋 Step 1: Validating input documents...")
-            pdf_files = {
-                "Salary Slip": salary_slip_pdf,
-                "Bank Statement": bank_statement_pdf,
-                "ITR 1": itr_pdf_1
-            }
-
-            if itr_pdf_2:
-                pdf_files["ITR 2"] = itr_pdf_2
-            if form16_pdf:
-                pdf_files["Form 16"] = form16_pdf
-
-            for doc_name, pdf_path in pdf_files.items():
-                if not validate_pdf(pdf_path):
-                    raise ValueError(f"Invalid PDF: {doc_name}")
-
-            logger.info("   ✅ All documents validated\n")
+            itr_pdfs = self._validate_inputs(
+                salary_slip_pdf, bank_statement_pdf, itr_pdf_1, itr_pdf_2, form16_pdf,
+                progress)
 
             # Process documents in parallel
             logger.info(
                 "📊 Step 2: Extracting data from all documents (parallel processing)...")
 
-            itr_data = None
-            bank_data = None
-            salary_data = None
-
-            with ThreadPoolExecutor(max_workers=3) as executor:
-                # Submit all tasks
-                futures = {}
-
-                # ITR extraction
-                itr_pdfs = [itr_pdf_1]
-                if itr_pdf_2:
-                    itr_pdfs.append(itr_pdf_2)
-                if form16_pdf:
-                    itr_pdfs.append(form16_pdf)
-                futures['itr'] = executor.submit(
-                    self.itr_chain.process, itr_pdfs)
-
-                # Bank statement extraction
-                futures['bank'] = executor.submit(
-                    self.bank_chain.process, bank_statement_pdf)
-
-                # Salary slip extraction
-                futures['salary'] = executor.submit(
-                    self.salary_chain.process, salary_slip_pdf)
-
-                # Wait for all to complete
-                for name, future in futures.items():
-                    try:
-                        if name == 'itr':
-                            itr_data = future.result()
-                        elif name == 'bank':
-                            bank_data = future.result()
-                        elif name == 'salary':
-                            salary_data = future.result()
-                    except Exception as e:
-                        logger.error(
-                            f"   ❌ {name.upper()} extraction failed: {e}")
-                        errors.append(f"{name} extraction failed: {str(e)}")
+            extraction = deadline.stage("extraction", reserve=Config.DEADLINE_RESERVE_SECONDS)
+            outcomes = {}
+            with deadline_scope(extraction):
+                # ITR and salary on the shared io pool; the bank chain stays on
+                # this thread because it fans its own batches out to that pool
+                futures = {
+                    "itr": scheduler.io.submit(
+                        self._tracked, "itr", progress,
+                        self.itr_chain.process, itr_pdfs, bypass_cache=bypass_cache),
+                    "salary": scheduler.io.submit(
+                        self._tracked, "salary", progress,
+                        self.salary_chain.process, salary_slip_pdf, bypass_cache=bypass_cache),
+                }
+                try:
+                    outcomes["bank"] = self._tracked(
+                        "bank", progress, partial(self.bank_chain.process, progress=progress),
+                        bank_statement_pdf, bypass_cache=bypass_cache)
+                except Exception as e:
+                    outcomes["bank"] = e
+            # Abandoned extractions are not waited for; they stop at their next deadline check
+            done, _ = wait(futures.values(), timeout=extraction.timeout(EXTRACTION_GRACE_SECONDS))
+            for name, future in futures.items():
+                outcomes[name] = (future.exception() or future.result()) if future in done \
+                    else self._abandoned(name, progress)
+
+            extracted, timed_out = {}, []
+            for name in ("itr", "bank", "salary"):
+                extracted[name] = self._extraction_result(name, outcomes[name], errors, timed_out)
 
             logger.info("   ✅ All extractions completed\n")
 
-            # Calculate FOIR
-            logger.info("💵 Step 3: Calculating FOIR...")
-            foir_result = None
-            try:
-                foir_result = self.foir_chain.calculate_foir(
-                    itr_data, bank_data, salary_data)
-                logger.info("   ✅ FOIR calculated\n")
-            except Exception as e:
-                logger.error(f"   ❌ FOIR calculation failed: {e}")
-                errors.append(f"FOIR calculation failed: {str(e)}")
-
-            # Estimate CIBIL
-            logger.info("🎯 Step 4: Estimating CIBIL score...")
-            cibil_estimate = None
+            return self._assemble_result(
+                session_id, start_time, extracted["itr"], extracted["bank"],
+                extracted["salary"], errors, progress, timed_out)
+
+        except Exception as e:
+            return self._failed_result(session_id, start_time, e)
+
+    async def aprocess_loan_application(
+        self,
+        salary_slip_pdf: PDFInput,
+        bank_statement_pdf: PDFInput,
+        itr_pdf_1: PDFInput,
+        itr_pdf_2: Optional[PDFInput] = None,
+        form16_pdf: Optional[PDFInput] = None,
+        bypass_cache: bool = False,
+        progress: Optional[ProgressCallback] = None,
+        deadline: Optional[Deadline] = None
+    ) -> LoanApplicationAnalysis:
+        """
+        Async variant of process_loan_application.
+
+        Gemini calls are awaited on the event loop and blocking work (PDF
+        validation, rendering, metrics, result persistence) runs on the
+        shared cpu pool, so one API worker can serve many analyses concurrently.
+        Extractions still running at the deadline are cancelled.
+        """
+        session_id = create_session_id()
+        start_time = time.time()
+        deadline = deadline or Deadline.after(Config.REQUEST_DEADLINE_SECONDS)
+
+        logger.info(f"\n{'='*80}")
+        logger.info(f"💰 LOAN APPLICATION ANALYSIS - Session: {session_id}")
+        logger.info(f"{'='*80}\n")
+
+        errors = []
+
+        try:
+            itr_pdfs = await scheduler.cpu.run(
+                self._validate_inputs,
+                salary_slip_pdf, bank_statement_pdf, itr_pdf_1, itr_pdf_2, form16_pdf,
+                progress)
+
+            logger.info(
+                "📊 Step 2: Extracting data from all documents (concurrent)...")
+
+            extraction = deadline.stage("extraction", reserve=Config.DEADLINE_RESERVE_SECONDS)
+            # Tasks copy the current context, so each runs under the extraction deadline
+            with deadline_scope(extraction):
+                tasks = {
+                    "itr": asyncio.ensure_future(self._atracked("itr", progress, self.itr_chain.aprocess(
+                        itr_pdfs, bypass_cache=bypass_cache))),
+                    "bank": asyncio.ensure_future(self._atracked("bank", progress, self.bank_chain.aprocess(
+                        bank_statement_pdf, bypass_cache=bypass_cache, progress=progress))),
+                    "salary": asyncio.ensure_future(self._atracked("salary", progress, self.salary_chain.aprocess(
+                        salary_slip_pdf, bypass_cache=bypass_cache))),
+                }
             try:
-                cibil_estimate = self.cibil_chain.estimate_cibil(
-                    bank_data, foir_result)
-                logger.info("   ✅ CIBIL estimated\n")
-            except Exception as e:
-                logger.error(f"   ❌ CIBIL estimation failed: {e}")
-                errors.append(f"CIBIL estimation failed: {str(e)}")
-
-            # Calculate overall confidence
-            confidence_scores = []
-            if itr_data:
-                confidence_scores.append(itr_data.extraction_confidence)
-            if bank_data:
-                confidence_scores.append(bank_data.extraction_confidence)
-            if salary_data:
-                confidence_scores.append(salary_data.extraction_confidence)
-
-            overall_confidence = calculate_confidence_score(confidence_scores)
-
-            # Determine data sources used
-            data_sources = []
-            missing_data = []
-
-            if itr_data and itr_data.extraction_confidence > 0.5:
-                data_sources.append("ITR Documents")
-            else:
-                missing_data.append("ITR Documents")
-
-            if bank_data and bank_data.extraction_confidence > 0.5:
-                data_sources.append("Bank Statement")
-            else:
-                missing_data.append("Bank Statement")
-
-            if salary_data and salary_data.extraction_confidence > 0.5:
-                data_sources.append("Salary Slips")
-            else:
-                missing_data.append("Salary Slips")
-
-            # Processing time
-            processing_time = time.time() - start_time
-
-            # Determine status (simple: success/partial/failed)
-            if errors:
-                status = "failed" if len(errors) >= 3 else "partial"
-            elif missing_data:
-                status = "partial"
-            else:
-                status = "success"
-
-            # Create final result - DATA ONLY, NO DECISIONS
-            result = LoanApplicationAnalysis(
-                session_id=session_id,
-                timestamp=datetime.now(),
-                itr_data=itr_data,
-                bank_data=bank_data,
-                salary_data=salary_data,
-                foir_result=foir_result,
-                cibil_estimate=cibil_estimate,
-                overall_confidence=overall_confidence,
-                data_sources_used=data_sources,
-                missing_data=missing_data,
-                processing_time_seconds=processing_time,
-                status=status,
-                errors=errors
-            )
-
-            # Save result
-            output_path = Config.RESULTS_DIR / \
-                f"loan_analysis_{session_id}.json"
-            save_json(result.model_dump(mode='json'), str(output_path))
-
-            # Print summary
-            self._print_summary(result)
-
-            return result
+                done, pending = await asyncio.wait(
+                    tasks.values(), timeout=extraction.timeout(EXTRACTION_GRACE_SECONDS))
+            except asyncio.CancelledError:
+                for task in tasks.values():
+                    task.cancel()
+                raise
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+            extracted, timed_out = {}, []
+            for name, task in tasks.items():
+                if task in pending:
+                    outcome = self._abandoned(name, progress)
+                elif task.cancelled():
+                    raise asyncio.CancelledError()
+                else:
+                    outcome = task.exception() or task.result()
+                extracted[name] = self._extraction_result(name, outcome, errors, timed_out)
+
+            logger.info("   ✅ All extractions completed\n")
+
+            return await scheduler.cpu.run_admitted(
+                self._assemble_result, session_id, start_time,
+                extracted["itr"], extracted["bank"], extracted["salary"], errors, progress,
+                timed_out)
+
+        except Exception as e:
+            return self._failed_result(session_id, start_time, e)
+
+    async def aupdate_bank_statement(
+        self,
+        bank_statement_pdf: PDFInput,
+        account_id: Optional[str] = None,
+        employer_name: Optional[str] = None,
+        bypass_cache: bool = False,
+        progress: Optional[ProgressCallback] = None,
+        deadline: Optional[Deadline] = None
+    ) -> BankStatementData:
+        """
+        Merge one more bank statement (e.g. the latest month) into the
+        account's stored metrics state, extracting only this statement
+
+        Args:
+            bank_statement_pdf: Path to the new statement or in-memory PDFSource
+            account_id: State key (default: the extracted account number)
+            employer_name: Employer for salary detection; must match the stored state
+            bypass_cache: Re-extract the statement even if a cached result exists
+            progress: Optional callback receiving bank progress events
+            deadline: When the update must be done (default REQUEST_DEADLINE_SECONDS from now)
+
+        Returns:
+            BankStatementData: this statement's rows, metrics over every merged statement
 
+        Raises:
+            ValueError: invalid PDF, no account number, or a different employer name
+            DeadlineExpired: the deadline passed before the extraction finished
+        """
+        deadline = deadline or Deadline.after(Config.REQUEST_DEADLINE_SECONDS)
+        if not isinstance(bank_statement_pdf, PDFSource) and \
+                not await scheduler.cpu.run(validate_pdf, bank_statement_pdf):
+            raise ValueError("Invalid PDF: Bank Statement")
+
+        with deadline_scope(deadline):
+            return await self._atracked("bank", progress, self.bank_chain.aprocess_incremental(
+                bank_statement_pdf, employer_name=employer_name, account_id=account_id,
+                bypass_cache=bypass_cache, progress=progress))
+
+    def _validate_inputs(
+        self,
+        salary_slip_pdf: PDFInput,
+        bank_statement_pdf: PDFInput,
+        itr_pdf_1: PDFInput,
+        itr_pdf_2: Optional[PDFInput],
+        form16_pdf: Optional[PDFInput],
+        progress: Optional[ProgressCallback] = None
+    ) -> List[PDFInput]:
+        """Validate all PDFs and return the ITR document list"""
+        logger.info("📋 Step 1: Validating input documents...")
+        report_progress(progress, "validation", "running")
+        pdf_files = {
+            "Salary Slip": salary_slip_pdf,
+            "Bank Statement": bank_statement_pdf,
+            "ITR 1": itr_pdf_1
+        }
+
+        if itr_pdf_2:
+            pdf_files["ITR 2"] = itr_pdf_2
+        if form16_pdf:
+            pdf_files["Form 16"] = form16_pdf
+
+        for doc_name, pdf_path in pdf_files.items():
+            # In-memory uploads were size/signature checked while streaming
+            if isinstance(pdf_path, PDFSource):
+                continue
+            if not validate_pdf(pdf_path):
+                report_progress(progress, "validation", "failed", f"Invalid PDF: {doc_name}")
+                raise ValueError(f"Invalid PDF: {doc_name}")
+
+        logger.info("   ✅ All documents validated\n")
+        report_progress(progress, "validation", "done", f"{len(pdf_files)} document(s)")
+
+        itr_pdfs = [itr_pdf_1]
+        if itr_pdf_2:
+            itr_pdfs.append(itr_pdf_2)
+        if form16_pdf:
+            itr_pdfs.append(form16_pdf)
+        return itr_pdfs
+
+    def _assemble_result(
+        self,
+        session_id: str,
+        start_time: float,
+        itr_data,
+        bank_data,
+        salary_data,
+        errors: List[str],
+        progress: Optional[ProgressCallback] = None,
+        timed_out: Optional[List[str]] = None
+    ) -> LoanApplicationAnalysis:
+        """Run FOIR/CIBIL on the extracted data and build the saved analysis"""
+        # Calculate FOIR
+        logger.info("💵 Step 3: Calculating FOIR...")
+        report_progress(progress, "foir", "running")
+        foir_result = None
+        try:
+            foir_result = self.foir_chain.calculate_foir(
+                itr_data, bank_data, salary_data)
+            logger.info("   ✅ FOIR calculated\n")
+            report_progress(progress, "foir", "done")
+        except Exception as e:
+            logger.error(f"   ❌ FOIR calculation failed: {e}")
+            errors.append(f"FOIR calculation failed: {str(e)}")
+            report_progress(progress, "foir", "failed", str(e))
+
+        # Estimate CIBIL
+        logger.info("🎯 Step 4: Estimating CIBIL score...")
+        report_progress(progress, "cibil", "running")
+        cibil_estimate = None
+        try:
+            cibil_estimate = self.cibil_chain.estimate_cibil(
+                bank_data, foir_result)
+            logger.info("   ✅ CIBIL estimated\n")
+            report_progress(progress, "cibil", "done")
+        except Exception as e:
+            logger.error(f"   ❌ CIBIL estimation failed: {e}")
+            errors.append(f"CIBIL estimation failed: {str(e)}")
+            report_progress(progress, "cibil", "failed", str(e))
+
+        # Calculate overall confidence
+        confidence_scores = []
+        if itr_data:
+            confidence_scores.append(itr_data.extraction_confidence)
+        if bank_data:
+            confidence_scores.append(bank_data.extraction_confidence)
+        if salary_data:
+            confidence_scores.append(salary_data.extraction_confidence)
+
+        overall_confidence = calculate_confidence_score(confidence_scores)
+
+        # Determine data sources used
+        data_sources = []
+        missing_data = []
+
+        if itr_data and itr_data.extraction_confidence > 0.5:
+            data_sources.append("ITR Documents")
+        else:
+            missing_data.append("ITR Documents")
+
+        if bank_data and bank_data.extraction_confidence > 0.5:
+            data_sources.append("Bank Statement")
+        else:
+            missing_data.append("Bank Statement")
+
+        if salary_data and salary_data.extraction_confidence > 0.5:
+            data_sources.append("Salary Slips")
+        else:
+            missing_data.append("Salary Slips")
+
+        # Processing time
+        processing_time = time.time() - start_time
+
+        # Determine status (simple: success/partial/failed)
+        if errors:
+            status = "failed" if len(errors) >= 3 else "partial"
+        elif missing_data:
+            status = "partial"
+        else:
+            status = "success"
+
+        # Create final result - DATA ONLY, NO DECISIONS
+        result = LoanApplicationAnalysis(
+            session_id=session_id,
+            timestamp=datetime.now(),
+            itr_data=itr_data,
+            bank_data=bank_data,
+            salary_data=salary_data,
+            foir_result=foir_result,
+            cibil_estimate=cibil_estimate,
+            overall_confidence=overall_confidence,
+            data_sources_used=data_sources,
+            missing_data=missing_data,
+            processing_time_seconds=processing_time,
+            status=status,
+            errors=errors,
+            timed_out_stages=timed_out or []
+        )
+
+        # Save result
+        output_path = Config.RESULTS_DIR / \
+            f"loan_analysis_{session_id}.json"
+        save_json(result.model_dump(mode='json'), str(output_path))
+
+        # Print summary
+        self._print_summary(result)
+
+        return result
+
+    @staticmethod
+    def _tracked(stage: str, progress: Optional[ProgressCallback], fn, *args, **kwargs):
+        """Run one extraction, reporting its start and outcome"""
+        report_progress(progress, stage, "running")
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            report_progress(progress, stage, "failed", str(e))
+            raise
+        report_progress(progress, stage, "done", **LoanApprovalEngine._outcome(result))
+        return result
+
+    @staticmethod
+    async def _atracked(stage: str, progress: Optional[ProgressCallback], coro):
+        """Async variant of _tracked"""
+        report_progress(progress, stage, "running")
+        try:
+            result = await coro
         except Exception as e:
-            logger.error(f"\n❌ CRITICAL ERROR: {e}", exc_info=True)
-
-            # Return error result
-            return LoanApplicationAnalysis(
-                session_id=session_id,
-                timestamp=datetime.now(),
-                overall_confidence=0.0,
-                data_sources_used=[],
-                missing_data=["All documents"],
-                processing_time_seconds=time.time() - start_time,
-                status="failed",
-                errors=[str(e)]
-            )
+            report_progress(progress, stage, "failed", str(e))
+            raise
+        report_progress(progress, stage, "done", **LoanApprovalEngine._outcome(result))
+        return result
+
+    @staticmethod
+    def _abandoned(stage: str, progress: Optional[ProgressCallback]) -> DeadlineExpired:
+        """Outcome of an extraction still running when the deadline passed"""
+        e = DeadlineExpired(f"{stage} extraction")
+        report_progress(progress, stage, "failed", str(e))
+        return e
+
+    @staticmethod
+    def _extraction_result(stage: str, outcome, errors: List[str], timed_out: List[str]):
+        """Data of one extraction, or None with the failure noted"""
+        if isinstance(outcome, DeadlineExpired):
+            logger.warning(f"   ⏱️  {stage.upper()} extraction stopped: {outcome}")
+            errors.append(f"{stage} extraction stopped: {outcome}")
+            timed_out.append(stage)
+            return None
+        if isinstance(outcome, BaseException):
+            logger.error(f"   ❌ {stage.upper()} extraction failed: {outcome}")
+            errors.append(f"{stage} extraction failed: {str(outcome)}")
+            return None
+        return outcome
+
+    @staticmethod
+    def _outcome(result) -> dict:
+        """Progress detail for a finished extraction"""
+        confidence = getattr(result, "extraction_confidence", None)
+        return {"confidence": confidence} if confidence is not None else {}
+
+    def _failed_result(self, session_id: str, start_time: float,
+                       e: Exception) -> LoanApplicationAnalysis:
+        """Error result when the pipeline cannot complete"""
+        logger.error(f"\n❌ CRITICAL ERROR: {e}", exc_info=True)
+
+        return LoanApplicationAnalysis(
+            session_id=session_id,
+            timestamp=datetime.now(),
+            overall_confidence=0.0,
+            data_sources_used=[],
+            missing_data=["All documents"],
+            processing_time_seconds=time.time() - start_time,
+            status="failed",
+            errors=[str(e)]
+        )
 
     def _print_summary(self, result: LoanApplicationAnalysis):
         """Print analysis summary - DATA ONLY"""
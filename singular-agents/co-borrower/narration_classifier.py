@@ -0,0 +1,167 @@
+"""
+Transaction narration classifier.
+One literal prefilter pass finds which keyword families (salary, EMI/NACH/ECS,
+bounce, transfer, employer name) can occur in a narration; only those
+families' compiled regexes then run to confirm the tags. Most narrations
+contain no keyword at all and never reach a regex.
+"""
+from __future__ import annotations
+import re
+from enum import IntFlag
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+SALARY_PATTERN = r"\bSALARY\b|\bPAYROLL\b"
+EMI_PATTERN = r"\bEMI\b|NACH|ECS|ACH|AUTO\s*DEBIT|INSTAL|INSTALL|LOAN|FINANCE|HOME\s*FIN|PL\b|HL\b"
+BOUNCE_PATTERN = (r"BOUNCE|DISHONOU?R|\bRETURN(?:ED)?\b|\bRTN\b|\bREJECT(?:ED)?\b"
+                  r"|INSUFF(?:ICIENT)?\s*(?:FUNDS?|BAL)")
+TRANSFER_PATTERN = r"\bNEFT\b|\bIMPS\b|\bRTGS\b|\bUPI\b|\bTRANSFER\b|\bTRF\b|\bIFT\b"
+
+SALARY_KEYWORDS = re.compile(SALARY_PATTERN, re.IGNORECASE)
+EMI_KEYWORDS = re.compile(EMI_PATTERN, re.IGNORECASE)
+BOUNCE_KEYWORDS = re.compile(BOUNCE_PATTERN, re.IGNORECASE)
+TRANSFER_KEYWORDS = re.compile(TRANSFER_PATTERN, re.IGNORECASE)
+
+
+class NarrationTag(IntFlag):
+    """What a narration looks like; a narration can carry several tags"""
+    NONE = 0
+    SALARY = 1      # SALARY / PAYROLL keyword
+    EMI = 2         # EMI, NACH, ECS, loan and instalment debits
+    EMPLOYER = 4    # contains a token of the applicant's employer name
+    BOUNCE = 8      # returned / dishonoured / insufficient funds
+    TRANSFER = 16   # NEFT, IMPS, RTGS, UPI and other transfers
+
+
+# Either tag makes a credit a salary credit
+SALARY_TAGS = NarrationTag.SALARY | NarrationTag.EMPLOYER
+
+# (tag, regex, upper-case literals every match of the regex contains)
+_FAMILIES: Tuple[Tuple[NarrationTag, "re.Pattern[str]", Tuple[str, ...]], ...] = (
+    (NarrationTag.SALARY, SALARY_KEYWORDS, ("SALARY", "PAYROLL")),
+    (NarrationTag.EMI, EMI_KEYWORDS,
+     ("EMI", "ACH", "ECS", "AUTO", "INSTAL", "LOAN", "FINANCE", "HOME", "PL", "HL")),
+    (NarrationTag.BOUNCE, BOUNCE_KEYWORDS,
+     ("BOUNCE", "DISHONO", "RETURN", "RTN", "REJECT", "INSUFF")),
+    (NarrationTag.TRANSFER, TRANSFER_KEYWORDS,
+     ("NEFT", "IMPS", "RTGS", "UPI", "TRANSFER", "TRF", "IFT")),
+)
+
+# Upper-case ASCII text needs no case folding, which makes the regexes cheaper
+_UPPER_REGEX = {tag: re.compile(regex.pattern) for tag, regex, _ in _FAMILIES}
+
+# Plain ints for hot loops (enum member access is comparatively slow)
+_EMI_BIT = int(NarrationTag.EMI)
+_EMPLOYER_BIT = int(NarrationTag.EMPLOYER)
+
+
+def normalize_narration(s: str) -> str:
+    """Collapse whitespace and upper-case, as used for matching"""
+    return re.sub(r"\s+", " ", (s or "")).strip().upper()
+
+
+def employer_tokens(employer_name: Optional[str]) -> List[str]:
+    """Meaningful employer-name tokens to match in narrations"""
+    if not employer_name:
+        return []
+    toks = [t for t in re.split(
+        r"[^A-Za-z0-9]+", employer_name.upper()) if len(t) >= 4]
+    return toks[:6]
+
+
+class NarrationClassifier:
+    """
+    Tags narrations for one employer.
+
+    Tags equal those of the individual patterns: salary, bounce, transfer and
+    employer tokens are matched on the normalised narration, EMI keywords on
+    the raw one. For ASCII text the two are equivalent, so the prefilter and
+    confirming regexes work on the normalised text; anything else is checked
+    pattern by pattern.
+    """
+
+    def __init__(self, employer_name: Optional[str] = None):
+        self.employer_tokens = tuple(employer_tokens(employer_name))
+
+        literals: List[Tuple[str, int]] = [
+            (lit, int(tag)) for tag, _, lits in _FAMILIES for lit in lits]
+        # Employer tokens are plain substrings, so a prefilter hit is final
+        literals += [(tok, _EMPLOYER_BIT) for tok in self.employer_tokens]
+        self._literals = tuple(literals)
+        self._confirm = tuple((int(tag), _UPPER_REGEX[tag].search) for tag, _, _ in _FAMILIES)
+
+    def classify(self, narration: str, norm: Optional[str] = None) -> NarrationTag:
+        """
+        Tag one narration
+
+        Args:
+            narration: Raw narration text
+            norm: normalize_narration(narration), if already computed
+        """
+        return NarrationTag(self._bits(narration or "", norm))
+
+    def classify_batch(self, narrations: Sequence[str],
+                       norms: Optional[Sequence[str]] = None) -> np.ndarray:
+        """
+        Tag many narrations; repeated texts are classified once
+
+        Returns:
+            uint8 array of NarrationTag bits, aligned with narrations
+        """
+        memo: Dict[str, int] = {}
+        bits = []
+        for i, raw in enumerate(narrations):
+            raw = raw or ""
+            b = memo.get(raw)
+            if b is None:
+                b = memo[raw] = self._bits(raw, norms[i] if norms is not None else None)
+            bits.append(b)
+        return np.array(bits, dtype=np.uint8)
+
+    def _bits(self, raw: str, norm: Optional[str]) -> int:
+        if norm is None:
+            norm = normalize_narration(raw)
+        if not raw.isascii():
+            return self._bits_exact(raw, norm)
+
+        candidates = 0
+        for lit, tag in self._literals:
+            if not candidates & tag and lit in norm:
+                candidates |= tag
+        if not candidates:
+            return 0
+
+        bits = candidates & _EMPLOYER_BIT
+        for tag, search in self._confirm:
+            if candidates & tag and search(norm):
+                bits |= tag
+        return bits
+
+    def _bits_exact(self, raw: str, norm: str) -> int:
+        """Reference path: every pattern on its own"""
+        bits = 0
+        for tag, regex, _ in _FAMILIES:
+            if regex.search(raw if tag == _EMI_BIT else norm):
+                bits |= int(tag)
+        if any(tok in norm for tok in self.employer_tokens):
+            bits |= _EMPLOYER_BIT
+        return bits
+
+
+@lru_cache(maxsize=64)
+def _classifier(tokens: Tuple[str, ...]) -> NarrationClassifier:
+    return NarrationClassifier(" ".join(tokens) or None)
+
+
+def classifier_for(employer_name: Optional[str] = None) -> NarrationClassifier:
+    """Compiled classifier for an employer, shared across statements"""
+    return _classifier(tuple(employer_tokens(employer_name)))
+
+
+def classify_narrations(narrations: Iterable[str],
+                        employer_name: Optional[str] = None) -> List[NarrationTag]:
+    """Batch API returning NarrationTag values"""
+    narrations = list(narrations)
+    return [NarrationTag(int(b)) for b in classifier_for(employer_name).classify_batch(narrations)]
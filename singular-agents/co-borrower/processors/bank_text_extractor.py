@@ -0,0 +1,508 @@
+"""
+Deterministic bank statement extraction from the PDF text layer.
+Net-banking PDFs carry real text, so rows can be parsed directly and
+verified with a running-balance check - only pages that fail go to Gemini.
+"""
+from __future__ import annotations
+import logging
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, date
+from typing import Dict, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+from processors.pdf_source import PDFInput, open_pdf
+
+logger = logging.getLogger(__name__)
+
+# Pages with less text than this are treated as scans
+MIN_TEXT_CHARS = 50
+
+# Rupee amounts are printed to 2 decimals; allow for float noise only
+BALANCE_TOLERANCE = 0.011
+
+ROW_DATE_FORMATS = [
+    "%d-%m-%Y", "%d/%m/%Y", "%d.%m.%Y", "%Y-%m-%d",
+    "%d-%b-%Y", "%d %b %Y", "%d-%b-%y", "%d %b %y",
+    "%d/%m/%y", "%d-%m-%y", "%d.%m.%y", "%d %B %Y",
+]
+
+DATE_TOKEN = re.compile(
+    r"^\d{1,2}[-/.\s](?:\d{1,2}|[A-Za-z]{3,9})[-/.\s,]*\d{2,4}$|^\d{4}-\d{2}-\d{2}$")
+AMOUNT_TOKEN = re.compile(r"^-?[₹]?\d[\d,]*(?:\.\d{1,2})?(?:\s*(?:CR|DR|Cr|Dr|cr|dr))?$")
+DRCR_TOKEN = re.compile(r"^(?:CR|DR|Cr|Dr|cr|dr)\.?$")
+
+# Column header keywords, checked in order
+COLUMN_KEYWORDS = {
+    "date": ("txn date", "transaction date", "tran date", "date"),
+    "narration": ("narration", "particulars", "description", "details", "remarks", "transaction"),
+    "debit": ("withdrawal", "debit", "dr amount", "paid out"),
+    "credit": ("deposit", "credit", "cr amount", "paid in"),
+    "balance": ("balance",),
+    "amount": ("amount",),
+    "type": ("dr/cr", "cr/dr", "type"),
+}
+
+KNOWN_BANKS = [
+    ("STATE BANK OF INDIA", "State Bank of India"), ("HDFC BANK", "HDFC Bank"),
+    ("ICICI BANK", "ICICI Bank"), ("AXIS BANK", "Axis Bank"),
+    ("KOTAK MAHINDRA", "Kotak Mahindra Bank"), ("PUNJAB NATIONAL BANK", "Punjab National Bank"),
+    ("BANK OF BARODA", "Bank of Baroda"), ("CANARA BANK", "Canara Bank"),
+    ("UNION BANK OF INDIA", "Union Bank of India"), ("IDFC FIRST", "IDFC First Bank"),
+    ("INDUSIND", "IndusInd Bank"), ("YES BANK", "Yes Bank"),
+    ("BANK OF INDIA", "Bank of India"), ("INDIAN BANK", "Indian Bank"),
+    ("FEDERAL BANK", "Federal Bank"), ("SBI", "State Bank of India"),
+]
+
+ACCOUNT_NO = re.compile(
+    r"(?:A/?C|ACCOUNT)\s*(?:NO|NUMBER|#)\.?\s*[:\-]?\s*([0-9Xx*]{6,20})", re.IGNORECASE)
+HOLDER_NAME = re.compile(
+    r"(?:ACCOUNT\s*HOLDER(?:\s*NAME)?|CUSTOMER\s*NAME|NAME)\s*[:\-]\s*([A-Za-z][A-Za-z .]{2,60})",
+    re.IGNORECASE)
+ACCOUNT_TYPE = re.compile(r"\b(SAVINGS|CURRENT|SALARY|OVERDRAFT|CASH\s*CREDIT)\b", re.IGNORECASE)
+PERIOD = re.compile(
+    r"(?:FROM|PERIOD)\s*:?\s*(\S+(?:\s\w{3}\s\d{4})?)\s*(?:TO|-)\s*(\S+(?:\s\w{3}\s\d{4})?)",
+    re.IGNORECASE)
+OPENING_BALANCE = re.compile(
+    r"OPENING\s*BALANCE\s*[:\-]?\s*(?:INR|RS\.?|₹)?\s*(-?[\d,]+\.\d{1,2}\s*(?:CR|DR)?)",
+    re.IGNORECASE)
+
+
+def parse_row_date(s: str) -> Optional[date]:
+    """Parse a statement date cell, including 2-digit-year formats"""
+    s = re.sub(r"\s+", " ", (s or "").strip().rstrip(","))
+    if not s:
+        return None
+    for fmt in ROW_DATE_FORMATS:
+        try:
+            return datetime.strptime(s, fmt).date()
+        except ValueError:
+            pass
+    return None
+
+
+def parse_amount(s) -> Optional[float]:
+    """
+    Parse an amount cell ("1,23,456.78", "2,000.00 Cr", "500 Dr").
+    Dr-suffixed values are negative (overdrawn balances).
+
+    Returns:
+        float, or None when the cell is blank / not numeric
+    """
+    if s is None:
+        return None
+    t = str(s).replace("₹", "").replace("INR", "").strip()
+    if t in ("", "-", "--"):
+        return None
+    sign = 1.0
+    m = re.search(r"\s*(CR|DR)\.?$", t, re.IGNORECASE)
+    if m:
+        if m.group(1).upper() == "DR":
+            sign = -1.0
+        t = t[:m.start()].strip()
+    t = t.replace(",", "")
+    try:
+        return sign * float(t)
+    except ValueError:
+        return None
+
+
+@dataclass
+class TextRow:
+    """Transaction row parsed from the text layer"""
+    txn_date: date
+    narration: str
+    debit: float
+    credit: float
+    balance: float
+
+    def as_transaction(self) -> Dict:
+        return {
+            "date": self.txn_date.strftime("%d-%m-%Y"),
+            "narration": self.narration,
+            "debit": round(self.debit, 2),
+            "credit": round(self.credit, 2),
+            "balance": round(self.balance, 2),
+        }
+
+
+@dataclass
+class TextPage:
+    """Per-page parse result"""
+    page_number: int  # 0-based
+    rows: List[TextRow] = field(default_factory=list)
+    valid: bool = False
+    reason: str = ""
+
+
+@dataclass
+class TextExtraction:
+    """Statement-level parse result"""
+    header: Dict[str, str] = field(default_factory=dict)
+    pages: List[TextPage] = field(default_factory=list)
+    opening_balance: Optional[float] = None
+
+    @property
+    def failed_pages(self) -> List[int]:
+        return [p.page_number for p in self.pages if not p.valid]
+
+    @property
+    def valid_pages(self) -> List[TextPage]:
+        return [p for p in self.pages if p.valid]
+
+
+class BankTextExtractor:
+    """Parse digital bank statements without the vision model"""
+
+    @staticmethod
+    def extract(pdf_path: PDFInput, max_pages: int = 30) -> TextExtraction:
+        """
+        Parse every page's rows and validate them with a running-balance check
+
+        Args:
+            pdf_path: Path to bank statement PDF or in-memory PDFSource
+            max_pages: Maximum pages to parse
+
+        Returns:
+            TextExtraction - pages that failed validation are listed in failed_pages
+        """
+        result = TextExtraction()
+        try:
+            pdf_document = open_pdf(pdf_path)
+        except Exception as e:
+            logger.warning(f"   ⚠️  Could not open PDF for text extraction: {e}")
+            return result
+
+        with pdf_document:
+            page_texts = [pdf_document[page_num].get_text()
+                          for page_num in range(min(len(pdf_document), max_pages))]
+            if page_texts:
+                BankTextExtractor._parse_pages(result, pdf_document, page_texts)
+        return result
+
+    @staticmethod
+    def _parse_pages(result: TextExtraction, pdf_document: "fitz.Document",
+                     page_texts: List[str]) -> None:
+        """Fill result from the already-extracted page texts"""
+        first_text = next((t for t in page_texts if t.strip()), "")
+        result.header = BankTextExtractor._parse_header(first_text)
+        opening = OPENING_BALANCE.search(first_text)
+        if opening:
+            result.opening_balance = parse_amount(opening.group(1))
+
+        prev_balance = result.opening_balance
+        for page_num, text in enumerate(page_texts):
+            page = TextPage(page_number=page_num)
+            result.pages.append(page)
+
+            if len(text.strip()) < MIN_TEXT_CHARS:
+                page.reason = "no text layer"
+                prev_balance = None
+                continue
+
+            try:
+                rows, page_opening = BankTextExtractor._parse_page(
+                    pdf_document[page_num], prev_balance)
+            except Exception as e:
+                page.reason = f"parse error: {e}"
+                prev_balance = None
+                continue
+
+            if page_opening is not None and prev_balance is None:
+                prev_balance = page_opening
+
+            if not rows:
+                if BankTextExtractor._looks_transactional(text):
+                    page.reason = "rows not recognised"
+                    prev_balance = None
+                else:
+                    # Summary / terms page with no transactions
+                    page.valid = True
+                continue
+
+            ok, reason = BankTextExtractor._check_running_balance(rows, prev_balance)
+            page.rows = rows
+            page.valid = ok
+            page.reason = reason
+            # A broken chain cannot anchor the next page's first row
+            prev_balance = rows[-1].balance if ok else None
+
+        logger.info(
+            f"   📝 Text layer: {len(result.valid_pages)}/{len(result.pages)} pages parsed")
+
+    # ------------------------------------------------------------------ header
+
+    @staticmethod
+    def _parse_header(text: str) -> Dict[str, str]:
+        header: Dict[str, str] = {}
+        upper = text.upper()
+
+        for needle, name in KNOWN_BANKS:
+            if needle in upper:
+                header["bank_name"] = name
+                break
+
+        m = ACCOUNT_NO.search(text)
+        if m:
+            header["account_number"] = m.group(1)
+        m = HOLDER_NAME.search(text)
+        if m:
+            # Stop at the next label on the same line
+            name = re.split(r"\s{2,}|\s+(?:ACCOUNT|A/C|BRANCH|ADDRESS|IFSC|CIF)\b",
+                            m.group(1), flags=re.IGNORECASE)[0]
+            header["account_holder_name"] = name.strip()
+        m = ACCOUNT_TYPE.search(text)
+        if m:
+            header["account_type"] = m.group(1).title()
+        m = PERIOD.search(text)
+        if m:
+            start, end = parse_row_date(m.group(1)), parse_row_date(m.group(2))
+            if start and end:
+                header["statement_period_start"] = start.isoformat()
+                header["statement_period_end"] = end.isoformat()
+        return header
+
+    # ------------------------------------------------------------------- pages
+
+    @staticmethod
+    def _looks_transactional(text: str) -> bool:
+        """Does the page contain any 'date ... amount' line?"""
+        for line in text.splitlines():
+            tokens = line.split()
+            if len(tokens) >= 2 and DATE_TOKEN.match(tokens[0]) and AMOUNT_TOKEN.match(tokens[-1]):
+                return True
+        return bool(re.search(r"\d{1,2}[-/]\d{1,2}[-/]\d{2,4}.*\d+\.\d{2}", text))
+
+    @staticmethod
+    def _parse_page(page: "fitz.Page", prev_balance: Optional[float]) -> Tuple[List[TextRow], Optional[float]]:
+        """
+        Parse one page: PyMuPDF table detection first, visual lines as fallback
+
+        Returns:
+            (rows, opening balance found on this page)
+        """
+        rows, opening = BankTextExtractor._parse_tables(page, prev_balance)
+        if rows:
+            return rows, opening
+        return BankTextExtractor._parse_lines(page, prev_balance)
+
+    @staticmethod
+    def _map_columns(header: List[str]) -> Dict[str, int]:
+        cols: Dict[str, int] = {}
+        names = [re.sub(r"\s+", " ", (h or "")).strip().lower() for h in header]
+        for key, keywords in COLUMN_KEYWORDS.items():
+            for kw in keywords:
+                for idx, name in enumerate(names):
+                    if idx in cols.values():
+                        continue
+                    if kw in name and not (key == "date" and "value" in name):
+                        cols[key] = idx
+                        break
+                if key in cols:
+                    break
+        return cols
+
+    @staticmethod
+    def _parse_tables(page: "fitz.Page", prev_balance: Optional[float]) -> Tuple[List[TextRow], Optional[float]]:
+        rows: List[TextRow] = []
+        opening = None
+        try:
+            tables = page.find_tables().tables
+        except Exception as e:
+            logger.debug(f"   Table detection failed on page {page.number + 1}: {e}")
+            return rows, opening
+
+        for table in tables:
+            data = table.extract()
+            if not data:
+                continue
+
+            # Header: detected header row, else the first row of the table
+            cols = BankTextExtractor._map_columns(
+                [h or "" for h in (table.header.names or [])])
+            body = data if table.header.external else data[1:]
+            if not {"date", "balance"} <= cols.keys():
+                cols = BankTextExtractor._map_columns([c or "" for c in data[0]])
+                body = data[1:]
+            if not {"date", "balance"} <= cols.keys():
+                continue
+            if not ({"debit", "credit"} <= cols.keys() or "amount" in cols):
+                continue
+
+            running = rows[-1].balance if rows else prev_balance
+            for cells in body:
+                def cell(key):
+                    idx = cols.get(key)
+                    return cells[idx] if idx is not None and idx < len(cells) else None
+
+                narration = re.sub(r"\s+", " ", cell("narration") or "").strip()
+                d = parse_row_date(cell("date") or "")
+                balance = parse_amount(cell("balance"))
+
+                if d is None:
+                    # Wrapped narration continues the previous row
+                    if rows and narration and balance is None:
+                        rows[-1].narration = f"{rows[-1].narration} {narration}".strip()
+                    continue
+                if balance is None:
+                    continue
+                if "OPENING BALANCE" in narration.upper():
+                    opening = balance
+                    running = balance
+                    continue
+
+                if "amount" in cols and not {"debit", "credit"} <= cols.keys():
+                    debit, credit = BankTextExtractor._split_amount(
+                        cell("amount"), cell("type"), balance, running)
+                    if debit is None:
+                        return [], opening
+                else:
+                    debit = abs(parse_amount(cell("debit")) or 0.0)
+                    credit = abs(parse_amount(cell("credit")) or 0.0)
+
+                rows.append(TextRow(d, narration, debit, credit, balance))
+                running = balance
+        return rows, opening
+
+    @staticmethod
+    def _split_amount(amount_cell, type_cell, balance: float,
+                      running: Optional[float]) -> Tuple[Optional[float], Optional[float]]:
+        """Resolve a single amount column into (debit, credit)"""
+        raw = str(amount_cell or "").strip()
+        amount = parse_amount(raw)
+        if amount is None:
+            return None, None
+        kind = (type_cell or "").strip().upper()
+        if not kind:
+            m = re.search(r"(CR|DR)\.?$", raw, re.IGNORECASE)
+            kind = m.group(1).upper() if m else ""
+        amount = abs(amount)
+        if kind.startswith("D"):
+            return amount, 0.0
+        if kind.startswith("C"):
+            return 0.0, amount
+        if running is None:
+            return None, None
+        # No marker: direction follows the balance movement
+        return (amount, 0.0) if balance < running else (0.0, amount)
+
+    @staticmethod
+    def _visual_lines(page: "fitz.Page") -> List[List[tuple]]:
+        """Group words into visual lines (top-to-bottom, left-to-right)"""
+        words = page.get_text("words")
+        words.sort(key=lambda w: ((w[1] + w[3]) / 2, w[0]))
+        lines: List[List[tuple]] = []
+        for w in words:
+            mid = (w[1] + w[3]) / 2
+            height = max(1.0, w[3] - w[1])
+            if lines:
+                last = lines[-1]
+                last_mid = (last[0][1] + last[0][3]) / 2
+                if abs(mid - last_mid) <= height * 0.5:
+                    last.append(w)
+                    continue
+            lines.append([w])
+        for line in lines:
+            line.sort(key=lambda w: w[0])
+        return lines
+
+    @staticmethod
+    def _parse_lines(page: "fitz.Page", prev_balance: Optional[float]) -> Tuple[List[TextRow], Optional[float]]:
+        """
+        Fallback for tables without ruling lines:
+        'date [value date] narration ... [debit] [credit] balance'
+        """
+        rows: List[TextRow] = []
+        opening = None
+        running = prev_balance
+        narration_x = None
+        amounts_x = None
+
+        for line in BankTextExtractor._visual_lines(page):
+            tokens = [w[4] for w in line]
+            text = " ".join(tokens)
+
+            if "OPENING BALANCE" in text.upper():
+                m = re.search(r"(-?[\d,]+\.\d{1,2}(?:\s*(?:CR|DR))?)\s*$", text, re.IGNORECASE)
+                if m:
+                    opening = parse_amount(m.group(1))
+                    running = opening
+                continue
+
+            d, used = BankTextExtractor._leading_date(tokens)
+            if d is None:
+                # Wrapped narration line sitting inside the narration column
+                if rows and narration_x is not None and amounts_x is not None \
+                        and line[0][0] >= narration_x - 2 and line[-1][2] <= amounts_x \
+                        and not AMOUNT_TOKEN.match(tokens[-1]):
+                    rows[-1].narration = f"{rows[-1].narration} {text}".strip()
+                continue
+
+            # A value date often follows the transaction date
+            _, used2 = BankTextExtractor._leading_date(tokens[used:])
+            used += used2
+
+            # Trailing amounts (a "Cr"/"Dr" marker may be its own word)
+            amounts: List[str] = []
+            i = len(tokens)
+            while i > used:
+                tok = tokens[i - 1]
+                if DRCR_TOKEN.match(tok) and i - 2 >= used and AMOUNT_TOKEN.match(tokens[i - 2]):
+                    amounts.insert(0, f"{tokens[i - 2]} {tok}")
+                    i -= 2
+                elif AMOUNT_TOKEN.match(tok) and ("." in tok or "," in tok):
+                    amounts.insert(0, tok)
+                    i -= 1
+                else:
+                    break
+            if len(amounts) < 2 or i <= used:
+                continue
+
+            narration = " ".join(tokens[used:i])
+            balance = parse_amount(amounts[-1])
+            if len(amounts) >= 3:
+                debit = abs(parse_amount(amounts[-3]) or 0.0)
+                credit = abs(parse_amount(amounts[-2]) or 0.0)
+            else:
+                debit, credit = BankTextExtractor._split_amount(
+                    amounts[0], None, balance, running)
+                if debit is None:
+                    # Direction unknowable without a prior balance
+                    return [], opening
+
+            rows.append(TextRow(d, narration, debit, credit, balance))
+            running = balance
+            narration_x = line[used][0]
+            amounts_x = line[i][0] if i < len(line) else None
+        return rows, opening
+
+    @staticmethod
+    def _leading_date(tokens: List[str]) -> Tuple[Optional[date], int]:
+        """Match a date made of the first 1-3 tokens"""
+        for n in (1, 3, 2):
+            if len(tokens) >= n:
+                d = parse_row_date(" ".join(tokens[:n]))
+                if d:
+                    return d, n
+        return None, 0
+
+    # -------------------------------------------------------------- validation
+
+    @staticmethod
+    def _check_running_balance(rows: List[TextRow], prev_balance: Optional[float]) -> Tuple[bool, str]:
+        """
+        Every row must move the balance by exactly its debit/credit.
+        The first row can only be checked against a known prior balance.
+        """
+        if prev_balance is None and len(rows) < 2:
+            return False, "single row without prior balance"
+
+        prev = prev_balance
+        for idx, r in enumerate(rows):
+            if r.debit < 0 or r.credit < 0 or (r.debit == 0 and r.credit == 0):
+                return False, f"row {idx + 1}: no debit/credit amount"
+            if prev is not None and abs(prev - r.debit + r.credit - r.balance) > BALANCE_TOLERANCE:
+                return False, f"row {idx + 1}: balance mismatch"
+            prev = r.balance
+        return True, "running balance verified"
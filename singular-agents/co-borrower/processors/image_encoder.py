@@ -0,0 +1,227 @@
+"""
+Byte-budgeted page image encoding for Gemini.
+Each rendered page is encoded to fit a per-page byte budget, and through
+its pixel size a token budget, with as little loss as that allows:
+
+- bitonal pages (printed or scanned text: nearly every pixel is ink or
+  paper) become a few-level grey palette PNG, which keeps text edges, is a
+  fraction of a JPEG's size and is quick to write;
+- pages without colour are encoded in greyscale;
+- the rest use the lossy format (JPEG or WebP) at the highest quality that
+  fits, found by binary search. A page too big even at MIN_QUALITY is
+  downscaled and tried again.
+"""
+from __future__ import annotations
+import logging
+import math
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Optional, Tuple
+
+from PIL import Image, ImageChops, features
+
+logger = logging.getLogger(__name__)
+
+# Gemini image cost: small images are one tile, larger ones are tiled
+IMAGE_TILE_TOKENS = 258
+IMAGE_TILE_SIDE = 768
+SMALL_IMAGE_SIDE = 384
+
+# A pixel whose channels differ by more than this is coloured; a page with
+# at least COLOUR_MIN_SHARE coloured pixels is encoded in colour
+COLOUR_SPREAD = 24
+COLOUR_MIN_SHARE = 0.01
+# Colour is checked on the page box-reduced by this factor (text stays grey)
+COLOUR_REDUCE = 4
+
+# Pixels in this grey band are neither ink nor paper; a bitonal page has at
+# most BITONAL_MAX_MIDTONES of them (anti-aliased text edges)
+MIDTONE_BAND = (64, 192)
+BITONAL_MAX_MIDTONES = 0.12
+
+# Grey levels in the palette PNG of a bitonal page (2 bits per pixel)
+PALETTE_LEVELS = 4
+# zlib level for palette PNGs; above 3 costs twice the time for ~5% smaller files
+PNG_COMPRESS_LEVEL = 3
+
+DEFAULT_QUALITY = 85
+MIN_QUALITY = 30
+# libwebp effort: 0 is fastest, 6 smallest; 2 keeps encoding near JPEG speed
+WEBP_METHOD = 2
+# Downscale rounds tried when MIN_QUALITY still exceeds the byte budget
+MAX_DOWNSCALES = 3
+
+LOSSY_FORMATS = {"jpeg": ("JPEG", "image/jpeg"), "webp": ("WEBP", "image/webp")}
+
+KIND_BITONAL = "bitonal"
+KIND_GREY = "grey"
+KIND_COLOUR = "colour"
+
+
+def image_tokens(width: int, height: int) -> int:
+    """Input tokens for one image of the given pixel size"""
+    if width <= SMALL_IMAGE_SIDE and height <= SMALL_IMAGE_SIDE:
+        return IMAGE_TILE_TOKENS
+    tiles = math.ceil(width / IMAGE_TILE_SIDE) * math.ceil(height / IMAGE_TILE_SIDE)
+    return tiles * IMAGE_TILE_TOKENS
+
+
+def classify(image: Image.Image) -> str:
+    """KIND_BITONAL, KIND_GREY or KIND_COLOUR for a rendered page"""
+    if image.mode == "RGB":
+        reduced = image.reduce(COLOUR_REDUCE) if min(image.size) >= COLOUR_REDUCE else image
+        r, g, b = reduced.split()
+        spread = ImageChops.lighter(
+            ImageChops.lighter(ImageChops.difference(r, g), ImageChops.difference(g, b)),
+            ImageChops.difference(r, b))
+        coloured = sum(spread.histogram()[COLOUR_SPREAD:]) / (reduced.width * reduced.height)
+        if coloured >= COLOUR_MIN_SHARE:
+            return KIND_COLOUR
+    pixels = image.width * image.height or 1
+    histogram = image.convert("L").histogram()
+    midtones = sum(histogram[MIDTONE_BAND[0]:MIDTONE_BAND[1]]) / pixels
+    return KIND_BITONAL if midtones <= BITONAL_MAX_MIDTONES else KIND_GREY
+
+
+@dataclass(frozen=True, slots=True)
+class EncodedImage:
+    """One encoded page and how it was encoded"""
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+    kind: str
+    quality: Optional[int] = None  # lossy quality used; None for PNG
+
+
+class ImageEncoder:
+    """
+    Encodes page images to a per-page byte and token budget
+
+    Args:
+        max_bytes: Largest encoded page in bytes (0 = no limit)
+        max_tokens: Most Gemini input tokens per page, met by downscaling (0 = no limit)
+        lossy_format: "jpeg" or "webp"
+        auto: Pick bitonal / grey / colour encoding per page; False always
+            encodes colour with the lossy format
+        quality: Lossy quality when it fits the budget (the search's upper bound)
+        min_quality: Lowest quality the budget search may pick
+    """
+
+    def __init__(self, max_bytes: int = 0, max_tokens: int = 0, lossy_format: str = "jpeg",
+                 auto: bool = True, quality: int = DEFAULT_QUALITY,
+                 min_quality: int = MIN_QUALITY):
+        if lossy_format not in LOSSY_FORMATS:
+            raise ValueError(f"Unknown page image format {lossy_format!r}; "
+                             f"use {' or '.join(LOSSY_FORMATS)}")
+        if lossy_format == "webp" and not features.check("webp"):
+            logger.warning("⚠️  Pillow was built without WebP; encoding pages as JPEG")
+            lossy_format = "jpeg"
+        self.max_bytes = max(0, max_bytes)
+        self.max_tokens = max(0, max_tokens)
+        self.format, self.mime_type = LOSSY_FORMATS[lossy_format]
+        self.auto = auto
+        self.quality = quality
+        self.min_quality = min(min_quality, quality)
+
+    @property
+    def settings(self) -> str:
+        """Everything that changes this encoder's output, e.g. for cache keys"""
+        return (f"{self.format}:{'auto' if self.auto else 'fixed'}:q{self.quality}-{self.min_quality}"
+                f":{self.max_bytes}B:{self.max_tokens}T")
+
+    def encode(self, image: Image.Image) -> EncodedImage:
+        """Encode one page within the budget (or as close as MAX_DOWNSCALES gets)"""
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image = self._fit_tokens(image)
+
+        kind = classify(image) if self.auto else KIND_COLOUR
+        if kind == KIND_BITONAL:
+            data = self._palette_png(image)
+            if self._fits(data):
+                return EncodedImage(data, "image/png", image.width, image.height, kind)
+            kind = KIND_GREY
+        if kind == KIND_GREY and image.mode != "L":
+            image = image.convert("L")
+        return self._lossy(image, kind)
+
+    def _fits(self, data: bytes) -> bool:
+        return not self.max_bytes or len(data) <= self.max_bytes
+
+    def _fit_tokens(self, image: Image.Image) -> Image.Image:
+        """Downscale until the page costs at most max_tokens"""
+        if not self.max_tokens:
+            return image
+        width, height = image.size
+        scale = 1.0
+        while (image_tokens(round(width * scale), round(height * scale)) > self.max_tokens
+               and max(width, height) * scale > SMALL_IMAGE_SIDE):
+            scale *= 0.95
+        return self._scaled(image, scale)
+
+    @staticmethod
+    def _scaled(image: Image.Image, scale: float) -> Image.Image:
+        if scale >= 1:
+            return image
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        return image.resize(size, Image.Resampling.LANCZOS)
+
+    def _lossy(self, image: Image.Image, kind: str) -> EncodedImage:
+        """Highest quality that fits, downscaling when even min_quality does not"""
+        for downscales in range(MAX_DOWNSCALES + 1):
+            data, quality = self._search_quality(image)
+            if self._fits(data) or downscales == MAX_DOWNSCALES:
+                break
+            # Shrink by the area the budget needs, with some headroom
+            image = self._scaled(image, min(0.9, math.sqrt(self.max_bytes / len(data)) * 0.95))
+        if not self._fits(data):
+            logger.warning(f"   ⚠️  Page image is {len(data) / 1024:.0f}KB at quality {quality}, "
+                           f"over the {self.max_bytes / 1024:.0f}KB budget")
+        return EncodedImage(data, self.mime_type, image.width, image.height, kind, quality)
+
+    def _search_quality(self, image: Image.Image) -> Tuple[bytes, int]:
+        """
+        Highest quality whose encoding fits max_bytes, by binary search
+
+        Returns the min_quality encoding when nothing fits.
+        """
+        data = self._save(image, self.quality)
+        if self._fits(data):
+            return data, self.quality
+
+        best: Optional[Tuple[bytes, int]] = None
+        smallest = (data, self.quality)
+        lo, hi = self.min_quality, self.quality - 1
+        while lo <= hi:
+            quality = (lo + hi) // 2
+            data = self._save(image, quality)
+            if self._fits(data):
+                best = (data, quality)
+                lo = quality + 1
+            else:
+                smallest = (data, quality)
+                hi = quality - 1
+        return best or smallest
+
+    def _save(self, image: Image.Image, quality: int) -> bytes:
+        buffered = BytesIO()
+        if self.format == "WEBP":
+            image.save(buffered, format="WEBP", quality=quality, method=WEBP_METHOD)
+        else:
+            image.save(buffered, format="JPEG", quality=quality)
+        return buffered.getvalue()
+
+    @staticmethod
+    def _palette_png(image: Image.Image) -> bytes:
+        """Quantise to PALETTE_LEVELS evenly spaced greys and write a low-bit PNG"""
+        grey = image if image.mode == "L" else image.convert("L")
+        step = 256 // PALETTE_LEVELS
+        levels = grey.point([min(PALETTE_LEVELS - 1, v // step) for v in range(256)])
+        palette = Image.frombytes("P", levels.size, levels.tobytes())
+        shade = 255 // (PALETTE_LEVELS - 1)
+        palette.putpalette([i * shade for i in range(PALETTE_LEVELS) for _ in range(3)])
+        buffered = BytesIO()
+        palette.save(buffered, format="PNG", bits=max(1, math.ceil(math.log2(PALETTE_LEVELS))),
+                     compress_level=PNG_COMPRESS_LEVEL)
+        return buffered.getvalue()
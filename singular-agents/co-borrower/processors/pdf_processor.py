@@ -4,81 +4,380 @@ Much faster and no external dependencies needed!
 """
 import fitz  # PyMuPDF
 from PIL import Image
+import atexit
 import base64
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from dataclasses import dataclass
 from io import BytesIO
+from multiprocessing import shared_memory
 from pathlib import Path
-from typing import List, Tuple
+from typing import Iterator, List, Optional, Tuple
 import logging
 
+from deadline import DeadlineExpired, check_deadline, current_deadline
+from processors.image_encoder import ImageEncoder
+from processors.pdf_source import PDFInput, PDFSource, open_pdf, source_name
+
 logger = logging.getLogger(__name__)
 
+# Longest side of page images sent to Gemini
+MAX_IMAGE_SIDE = 1536
+
+# Below this many pages, process start-up and pickling cost more than they save
+PARALLEL_MIN_PAGES = 4
+
+# Pages per render task: small enough that the first pages come back early
+RENDER_SLICE_PAGES = 4
+
+
+
+@dataclass(frozen=True, slots=True)
+class PagePayload:
+    """
+    One encoded page image (JPEG, WebP or PNG) for a Gemini request
+
+    Holds only the compressed image bytes and their metadata - no decoded
+    bitmap and no base64 copy. The base64 text is built with the request
+    message (data_url) and released with it.
+    """
+    page_number: int  # 1-based page in the source document
+    data: bytes
+    width: int = 0
+    height: int = 0
+    mime_type: str = "image/jpeg"
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.width, self.height
+
+    @property
+    def base64(self) -> str:
+        return base64.b64encode(self.data).decode()
+
+    @property
+    def base64_length(self) -> int:
+        """Length of the base64 text, without building it"""
+        return 4 * ((len(self.data) + 2) // 3)
+
+    def data_url(self) -> str:
+        """Inline image URL for a multimodal message part"""
+        return f"data:{self.mime_type};base64,{self.base64}"
+
+
+_render_pool: Optional[ProcessPoolExecutor] = None
+_render_pool_lock = threading.Lock()
+
+
+def _get_render_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    The shared render pool (spawned, so it is safe under threads)
+
+    Created once, sized by the first caller's `workers` (PDF_RENDER_WORKERS
+    in the service), and only shut down at exit: a render still submitting
+    slices must never find the pool replaced under it. Each call limits its
+    own slices in flight instead.
+    """
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            _render_pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"))
+        return _render_pool
+
+
+@atexit.register
+def _shutdown_render_pool():
+    if _render_pool is not None:
+        _render_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _render_matrix(page: "fitz.Page", dpi: int,
+                   max_size: Optional[Tuple[int, int]] = None) -> "fitz.Matrix":
+    """
+    Zoom matrix for a page: `dpi`, capped so the pixmap fits inside `max_size`
+
+    Rendering straight at the final size avoids rasterising pixels that
+    a later thumbnail() would only throw away.
+    """
+    zoom = dpi / 72
+    if max_size:
+        rect = page.rect
+        if rect.width > 0 and rect.height > 0:
+            zoom = min(zoom, max_size[0] / rect.width, max_size[1] / rect.height)
+    return fitz.Matrix(zoom, zoom)
+
+
+def _render_page(page: "fitz.Page", dpi: int, max_size: Optional[Tuple[int, int]] = None,
+                 grayscale: bool = False) -> "fitz.Pixmap":
+    """Render one page to an RGB (or single-channel grey) pixmap"""
+    return page.get_pixmap(
+        matrix=_render_matrix(page, dpi, max_size),
+        colorspace=fitz.csGRAY if grayscale else fitz.csRGB,
+        alpha=False)
+
+
+def _pixmap_to_image(pix: "fitz.Pixmap") -> Image.Image:
+    return Image.frombytes("L" if pix.n == 1 else "RGB", (pix.width, pix.height), pix.samples)
+
+
+@dataclass(frozen=True)
+class _SharedPDF:
+    """An in-memory PDF copied once into shared memory for every render slice"""
+    shm_name: str
+    size: int
+
+    @classmethod
+    def create(cls, source: PDFSource) -> Tuple["_SharedPDF", shared_memory.SharedMemory]:
+        """Copy the source's bytes into a new block; the caller unlinks it"""
+        shm = shared_memory.SharedMemory(create=True, size=source.size_bytes)
+        shm.buf[:source.size_bytes] = source.data
+        return cls(shm.name, source.size_bytes), shm
+
+    def open(self) -> fitz.Document:
+        """Worker side: open the document from the shared block"""
+        shm = shared_memory.SharedMemory(name=self.shm_name)
+        try:
+            data = bytes(shm.buf[:self.size])
+        finally:
+            shm.close()
+        return fitz.open(stream=data, filetype="pdf")
+
+
+def _unlink_when_done(shm: shared_memory.SharedMemory, futures: List) -> None:
+    """
+    Free a _SharedPDF block once none of `futures` can still attach to it
+
+    Slices already handed to a worker cannot be cancelled; unlinking under
+    them would fail their attach and leave the resource tracker warning.
+    """
+    unfinished = [f for f in futures if not f.done()]
+    left = len(unfinished)
+    lock = threading.Lock()
+
+    def release(_future=None):
+        nonlocal left
+        with lock:
+            left -= 1
+            if left > 0:
+                return
+        shm.close()
+        shm.unlink()
+
+    if not unfinished:
+        release()
+    for future in unfinished:
+        future.add_done_callback(release)
+
+
+def _render_page_range(pdf_path: "PDFInput | _SharedPDF", page_numbers: List[int], dpi: int,
+                       max_size: Optional[Tuple[int, int]] = None,
+                       grayscale: bool = False) -> List[tuple]:
+    """
+    Worker: open a private fitz document and render a slice of pages
+
+    Returns:
+        List of (page_num, mode, width, height, samples, error) tuples
+    """
+    out = []
+    opened = pdf_path.open() if isinstance(pdf_path, _SharedPDF) else open_pdf(pdf_path)
+    with opened as pdf_document:
+        for page_num in page_numbers:
+            try:
+                pix = _render_page(pdf_document[page_num], dpi, max_size, grayscale)
+                mode = "L" if pix.n == 1 else "RGB"
+                out.append((page_num, mode, pix.width, pix.height, pix.samples, None))
+            except Exception as e:
+                out.append((page_num, None, 0, 0, None, str(e)))
+    return out
+
 
 class PDFProcessor:
     """Convert PDFs to images using PyMuPDF (fitz)"""
 
     @staticmethod
-    def pdf_to_images(pdf_path: str, max_pages: int = 20, dpi: int = 300) -> List[Image.Image]:
+    def pdf_to_images(pdf_path: PDFInput, max_pages: int = 20, dpi: int = 300,
+                      workers: int = 1, max_size: Optional[Tuple[int, int]] = None,
+                      grayscale: bool = False,
+                      page_numbers: Optional[List[int]] = None) -> List[Image.Image]:
         """
         Convert PDF to list of PIL Images using PyMuPDF
 
+        See render_pages for arguments; pages that fail to render are skipped.
+        """
+        return [img for _, img in PDFProcessor.render_pages(
+            pdf_path, max_pages, dpi, workers, max_size, grayscale, page_numbers)]
+
+    @staticmethod
+    def render_pages(pdf_path: PDFInput, max_pages: int = 20, dpi: int = 300,
+                     workers: int = 1, max_size: Optional[Tuple[int, int]] = None,
+                     grayscale: bool = False,
+                     page_numbers: Optional[List[int]] = None) -> List[Tuple[int, Image.Image]]:
+        """
+        Render PDF pages to PIL Images, keeping each page's 0-based index
+
         Args:
-            pdf_path: Path to PDF file
+            pdf_path: Path to PDF file or in-memory PDFSource
             max_pages: Maximum pages to process (cost control)
             dpi: Resolution (300 is good quality)
+            workers: Render processes to use (1 = render in this thread)
+            max_size: Render each page directly to fit (width, height), never above dpi
+            grayscale: Render single-channel grey pixmaps ("L" images)
+            page_numbers: Render only these 0-based pages (default: from the start)
 
         Returns:
-            List of PIL Image objects
+            List of (page_index, PIL Image) in page order
+
+        Raises:
+            DeadlineExpired: the request deadline passed before every page was rendered
+        """
+        return list(PDFProcessor.iter_render_pages(
+            pdf_path, max_pages, dpi, workers, max_size, grayscale, page_numbers))
+
+    @staticmethod
+    def iter_render_pages(pdf_path: PDFInput, max_pages: int = 20, dpi: int = 300,
+                          workers: int = 1, max_size: Optional[Tuple[int, int]] = None,
+                          grayscale: bool = False,
+                          page_numbers: Optional[List[int]] = None
+                          ) -> Iterator[Tuple[int, Image.Image]]:
+        """
+        Streaming variant of render_pages: yields (page_index, PIL Image) in
+        page order as soon as each page is rendered
         """
         try:
-            logger.info(f"Converting PDF to images: {pdf_path}")
+            logger.info(f"Converting PDF to images: {source_name(pdf_path)}")
 
             # Open PDF
-            pdf_document = fitz.open(pdf_path)
+            pdf_document = open_pdf(pdf_path)
             total_pages = len(pdf_document)
-            pages_to_process = min(total_pages, max_pages)
+            page_list = PDFProcessor._select_pages(total_pages, max_pages, page_numbers)
+            pages_to_process = len(page_list)
 
             logger.info(
                 f"   Total pages: {total_pages}, Processing: {pages_to_process}")
 
-            images = []
+            if workers > 1 and pages_to_process >= PARALLEL_MIN_PAGES:
+                pdf_document.close()
+                yield from PDFProcessor._iter_render_parallel(
+                    pdf_path, page_list, dpi, workers, max_size, grayscale)
+                return
 
-            # Calculate zoom for desired DPI
-            # fitz default is 72 DPI, so zoom = desired_dpi / 72
-            zoom = dpi / 72
-            mat = fitz.Matrix(zoom, zoom)
+            converted = 0
 
-            for page_num in range(pages_to_process):
-                try:
-                    # Get page
-                    page = pdf_document[page_num]
+            deadline = current_deadline()
+            try:
+                for done, page_num in enumerate(page_list, 1):
+                    if deadline.expired:
+                        raise DeadlineExpired("rendering")
+                    try:
+                        # Get page
+                        page = pdf_document[page_num]
 
-                    # Render page to pixmap
-                    pix = page.get_pixmap(matrix=mat, alpha=False)
+                        # Render page to pixmap
+                        # fitz default is 72 DPI, so zoom = desired_dpi / 72
+                        pix = _render_page(page, dpi, max_size, grayscale)
 
-                    # Convert to PIL Image
-                    img = Image.frombytes(
-                        "RGB", [pix.width, pix.height], pix.samples)
+                        # Convert to PIL Image
+                        img = _pixmap_to_image(pix)
 
-                    images.append(img)
+                    except Exception as e:
+                        logger.error(
+                            f"   ❌ Error processing page {page_num + 1}: {e}")
+                        continue
 
-                    if (page_num + 1) % 5 == 0:
-                        logger.info(
-                            f"   Processed {page_num + 1}/{pages_to_process} pages")
+                    converted += 1
+                    yield page_num, img
 
-                except Exception as e:
-                    logger.error(
-                        f"   ❌ Error processing page {page_num + 1}: {e}")
-                    continue
-
-            pdf_document.close()
+                    if done % 5 == 0:
+                        logger.info(
+                            f"   Processed {done}/{pages_to_process} pages")
+            finally:
+                pdf_document.close()
 
-            logger.info(f"   ✅ Converted {len(images)} pages successfully")
-            return images
+            logger.info(f"   ✅ Converted {converted} pages successfully")
 
+        except DeadlineExpired:
+            raise
         except Exception as e:
             logger.error(f"❌ PDF conversion error: {e}")
             raise
 
+    @staticmethod
+    def _select_pages(total_pages: int, max_pages: int,
+                      page_numbers: Optional[List[int]] = None) -> List[int]:
+        """0-based pages to render, capped at max_pages"""
+        if page_numbers is None:
+            return list(range(min(total_pages, max_pages)))
+        return [p for p in page_numbers if 0 <= p < total_pages][:max_pages]
+
+    @staticmethod
+    def _iter_render_parallel(pdf_path: PDFInput, page_list: List[int], dpi: int,
+                              workers: int, max_size: Optional[Tuple[int, int]] = None,
+                              grayscale: bool = False) -> Iterator[Tuple[int, Image.Image]]:
+        """
+        Render pages across a process pool in contiguous slices of up to
+        RENDER_SLICE_PAGES, yielding (page_index, PIL Image) in page order
+
+        Only workers + 1 slices are in flight at once, so pages the caller
+        has not consumed yet do not pile up in memory. In-memory sources are
+        copied into shared memory once; each slice carries only its name.
+        """
+        pool = _get_render_pool(workers)
+        pages_to_process = len(page_list)
+        workers = min(workers, pages_to_process)
+
+        # Contiguous slices keep each worker's page access sequential
+        chunk = min(RENDER_SLICE_PAGES, -(-pages_to_process // workers))
+        slices = [page_list[start:start + chunk]
+                  for start in range(0, pages_to_process, chunk)]
+        shared = None
+        if isinstance(pdf_path, PDFSource):
+            target, shared = _SharedPDF.create(pdf_path)
+        else:
+            target = str(pdf_path)
+
+        deadline = current_deadline()
+        futures = deque()
+        converted = 0
+        try:
+            for pages in slices:
+                futures.append(pool.submit(_render_page_range, target, pages, dpi,
+                                           max_size, grayscale))
+                if len(futures) <= workers:
+                    continue
+                converted += yield from PDFProcessor._rendered_slice(futures.popleft(), deadline)
+            while futures:
+                converted += yield from PDFProcessor._rendered_slice(futures.popleft(), deadline)
+        finally:
+            # Abandoned by the caller or past the deadline: drop queued slices
+            for pending in futures:
+                pending.cancel()
+            if shared is not None:
+                _unlink_when_done(shared, list(futures))
+
+        logger.info(
+            f"   ✅ Converted {converted} pages successfully ({workers} workers)")
+
+    @staticmethod
+    def _rendered_slice(future, deadline) -> Iterator[Tuple[int, Image.Image]]:
+        """Yield the pages of one render task; returns how many rendered"""
+        try:
+            pages = future.result(timeout=deadline.timeout())
+        except FutureTimeout:
+            raise DeadlineExpired("rendering")
+        converted = 0
+        for page_num, mode, width, height, samples, error in pages:
+            if error:
+                logger.error(
+                    f"   ❌ Error processing page {page_num + 1}: {error}")
+                continue
+            converted += 1
+            yield page_num, Image.frombytes(mode, (width, height), samples)
+        return converted
+
     @staticmethod
     def optimize_image(image: Image.Image, max_size: Tuple[int, int] = (1024, 1024)) -> Image.Image:
         """
@@ -94,12 +393,28 @@ class PDFProcessor:
         # Resize if too large (maintain aspect ratio)
         image.thumbnail(max_size, Image.Resampling.LANCZOS)
 
-        # Convert to RGB if needed
-        if image.mode != 'RGB':
+        # Convert to RGB if needed (greyscale renders stay single-channel JPEGs)
+        if image.mode not in ('RGB', 'L'):
             image = image.convert('RGB')
 
         return image
 
+    @staticmethod
+    def image_to_bytes(image: Image.Image, quality: int = 85) -> bytes:
+        """
+        Encode PIL Image as JPEG
+
+        Args:
+            image: PIL Image
+            quality: JPEG quality (1-100)
+
+        Returns:
+            JPEG bytes
+        """
+        buffered = BytesIO()
+        image.save(buffered, format="JPEG", quality=quality, optimize=True)
+        return buffered.getvalue()
+
     @staticmethod
     def image_to_base64(image: Image.Image, quality: int = 85) -> str:
         """
@@ -112,53 +427,87 @@ class PDFProcessor:
         Returns:
             Base64 encoded string
         """
-        buffered = BytesIO()
-        image.save(buffered, format="JPEG", quality=quality, optimize=True)
-        return base64.b64encode(buffered.getvalue()).decode()
+        return base64.b64encode(PDFProcessor.image_to_bytes(image, quality)).decode()
 
     @staticmethod
     def process_pdf_for_gemini(
-        pdf_path: str,
+        pdf_path: PDFInput,
         max_pages: int = 20,
         dpi: int = 200,
-        optimize: bool = True
-    ) -> List[dict]:
+        optimize: bool = True,
+        workers: int = 1,
+        render_mode: str = "thumbnail",
+        grayscale: bool = False,
+        page_numbers: Optional[List[int]] = None,
+        encoder: Optional[ImageEncoder] = None
+    ) -> List[PagePayload]:
         """
         Process PDF and prepare for Gemini Vision API
+
+        render_mode "thumbnail" renders at `dpi` and downscales to the size
+        budget; "target" sizes each page's zoom so the pixmap comes out at the
+        budget directly. encoder picks each page's format and quality (default:
+        colour JPEG at quality 85); the rendered bitmaps are not kept.
+        page_numbers restricts rendering to those 0-based pages; each
+        payload's page_number is the 1-based page in the source document.
         """
-        logger.info(f"📄 Processing PDF: {Path(pdf_path).name}")
+        processed_images = list(PDFProcessor.iter_pages_for_gemini(
+            pdf_path, max_pages, dpi, optimize, workers, render_mode, grayscale, page_numbers,
+            encoder))
+        logger.info(
+            f"   ✅ Processed {len(processed_images)} images for Gemini")
+        return processed_images
+
+    @staticmethod
+    def iter_pages_for_gemini(
+        pdf_path: PDFInput,
+        max_pages: int = 20,
+        dpi: int = 200,
+        optimize: bool = True,
+        workers: int = 1,
+        render_mode: str = "thumbnail",
+        grayscale: bool = False,
+        page_numbers: Optional[List[int]] = None,
+        encoder: Optional[ImageEncoder] = None
+    ) -> Iterator[PagePayload]:
+        """
+        Streaming variant of process_pdf_for_gemini: each page payload is
+        yielded as soon as it is encoded, while later pages are still to be
+        rendered, so a caller can send the first pages before the last render
+        """
+        logger.info(f"📄 Processing PDF: {source_name(pdf_path)}")
+
+        max_size = (MAX_IMAGE_SIDE, MAX_IMAGE_SIDE)
+        render_size = max_size if optimize and render_mode == "target" else None
+        encoder = encoder or ImageEncoder(auto=False)
 
         # Convert to images
-        images = PDFProcessor.pdf_to_images(pdf_path, max_pages, dpi)
+        pages = PDFProcessor.iter_render_pages(
+            pdf_path, max_pages, dpi, workers=workers,
+            max_size=render_size, grayscale=grayscale, page_numbers=page_numbers)
 
-        processed_images = []
-        for idx, img in enumerate(images, 1):
+        for page_index, img in pages:
+            idx = page_index + 1
+            check_deadline("image encoding")
             try:
-                # Optimize if requested
+                # Optimize if requested (a no-op resize for target renders)
                 if optimize:
-                    img = PDFProcessor.optimize_image(
-                        img, max_size=(1536, 1536))
-
-                # Convert to base64
-                base64_img = PDFProcessor.image_to_base64(img, quality=85)
+                    img = PDFProcessor.optimize_image(img, max_size=max_size)
 
-                processed_images.append({
-                    "page_number": idx,
-                    "image": img,  # Keep for reference
-                    "base64": base64_img,  # Base64 string
-                    "mime_type": "image/jpeg"
-                })
+                encoded = encoder.encode(img)
+                payload = PagePayload(idx, encoded.data, encoded.width, encoded.height,
+                                      encoded.mime_type)
 
             except Exception as e:
                 logger.error(f"   ❌ Error processing page {idx}: {e}")
                 continue
 
-        logger.info(
-            f"   ✅ Processed {len(processed_images)} images for Gemini")
-        return processed_images
+            # Only the encoded bytes outlive this step
+            del img
+            yield payload
 
     @staticmethod
-    def extract_text_from_pdf(pdf_path: str, max_pages: int = None) -> str:
+    def extract_text_from_pdf(pdf_path: PDFInput, max_pages: int = None) -> str:
         """
         Extract raw text from PDF (useful for fallback)
 
@@ -169,30 +518,44 @@ class PDFProcessor:
         Returns:
             str: Extracted text
         """
+        text_content = []
+        for page_num, text in enumerate(PDFProcessor.extract_page_texts(pdf_path, max_pages)):
+            if text.strip():
+                text_content.append(f"--- Page {page_num + 1} ---\n{text}")
+
+        return "\n\n".join(text_content)
+
+    @staticmethod
+    def extract_page_texts(pdf_path: PDFInput, max_pages: int = None) -> List[str]:
+        """
+        Extract the text layer page by page
+
+        Args:
+            pdf_path: Path to PDF
+            max_pages: Maximum pages to extract
+
+        Returns:
+            List[str]: One entry per page ("" for pages without text)
+        """
         try:
-            pdf_document = fitz.open(pdf_path)
+            pdf_document = open_pdf(pdf_path)
             total_pages = len(pdf_document)
             pages_to_process = min(
                 total_pages, max_pages) if max_pages else total_pages
 
-            text_content = []
-
-            for page_num in range(pages_to_process):
-                page = pdf_document[page_num]
-                text = page.get_text()
-                if text.strip():
-                    text_content.append(f"--- Page {page_num + 1} ---\n{text}")
+            texts = [pdf_document[page_num].get_text()
+                     for page_num in range(pages_to_process)]
 
             pdf_document.close()
 
-            return "\n\n".join(text_content)
+            return texts
 
         except Exception as e:
             logger.error(f"❌ Text extraction error: {e}")
-            return ""
+            return []
 
     @staticmethod
-    def get_pdf_info(pdf_path: str) -> dict:
+    def get_pdf_info(pdf_path: PDFInput) -> dict:
         """
         Get PDF metadata
 
@@ -203,12 +566,14 @@ class PDFProcessor:
             dict: PDF information
         """
         try:
-            pdf_document = fitz.open(pdf_path)
+            pdf_document = open_pdf(pdf_path)
+            size_bytes = (pdf_path.size_bytes if isinstance(pdf_path, PDFSource)
+                          else Path(pdf_path).stat().st_size)
 
             info = {
-                "filename": Path(pdf_path).name,
+                "filename": source_name(pdf_path),
                 "total_pages": len(pdf_document),
-                "file_size_mb": Path(pdf_path).stat().st_size / (1024 * 1024),
+                "file_size_mb": size_bytes / (1024 * 1024),
                 "metadata": pdf_document.metadata,
                 "is_encrypted": pdf_document.is_encrypted,
                 "is_pdf": pdf_document.is_pdf
@@ -250,7 +615,7 @@ def test_processor():
 
     print(f"\n✅ Processed {len(processed)} pages")
     for page in processed:
-        print(f"   Page {page['page_number']}: {page['image'].size}")
+        print(f"   Page {page.page_number}: {page.size}")
 
     # Extract text (optional)
     print(f"\n📝 Extracting text...")
@@ -0,0 +1,98 @@
+"""
+In-memory PDF documents for the zero-disk upload path.
+Uploads are read once, checked and hashed while streaming, and handed to the
+chains as bytes - PyMuPDF opens them with fitz.open(stream=...).
+"""
+from __future__ import annotations
+import hashlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Union
+
+import fitz  # PyMuPDF
+
+PDF_SIGNATURE = b"%PDF"
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class PDFValidationError(ValueError):
+    """Upload is not an acceptable PDF"""
+
+
+@dataclass(frozen=True)
+class PDFSource:
+    """PDF bytes plus the SHA-256 computed while they were received"""
+
+    name: str
+    data: bytes
+    sha256: str
+
+    @classmethod
+    def from_bytes(cls, name: str, data: bytes) -> "PDFSource":
+        """Wrap bytes already in memory, hashing them once"""
+        return cls(name=name, data=data, sha256=hashlib.sha256(data).hexdigest())
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self.data)
+
+    def open(self) -> fitz.Document:
+        """Open the document from memory"""
+        return fitz.open(stream=self.data, filetype="pdf")
+
+    def __str__(self) -> str:
+        return self.name
+
+
+# Anything the processors and chains accept as a document
+PDFInput = Union[str, Path, PDFSource]
+
+
+def open_pdf(source: PDFInput) -> fitz.Document:
+    """Open a path or an in-memory PDFSource with PyMuPDF"""
+    if isinstance(source, PDFSource):
+        return source.open()
+    return fitz.open(source)
+
+
+def source_name(source: PDFInput) -> str:
+    """Display name for logs"""
+    if isinstance(source, PDFSource):
+        return source.name
+    return Path(source).name
+
+
+class StreamingPDFReader:
+    """
+    Accumulates an upload chunk by chunk, enforcing the size limit and PDF
+    signature and hashing as it goes, so the body is only ever read once
+    """
+
+    def __init__(self, name: str, max_bytes: int):
+        self.name = name
+        self.max_bytes = max_bytes
+        self._hash = hashlib.sha256()
+        self._buffer = bytearray()
+
+    def feed(self, chunk: bytes) -> None:
+        """Add the next chunk; raises PDFValidationError as soon as a check fails"""
+        if not chunk:
+            return
+        if len(self._buffer) + len(chunk) > self.max_bytes:
+            raise PDFValidationError(
+                f"File too large. Max size: {self.max_bytes // (1024 * 1024)}MB")
+
+        self._buffer += chunk
+        self._hash.update(chunk)
+
+        if len(self._buffer) >= len(PDF_SIGNATURE) and not self._buffer.startswith(PDF_SIGNATURE):
+            raise PDFValidationError("Invalid PDF file format")
+
+    def finish(self) -> PDFSource:
+        """Validate the complete upload and return it as a PDFSource"""
+        if not self._buffer:
+            raise PDFValidationError("File is empty")
+        if not self._buffer.startswith(PDF_SIGNATURE):
+            raise PDFValidationError("Invalid PDF file format")
+        return PDFSource(name=self.name, data=bytes(self._buffer),
+                         sha256=self._hash.hexdigest())
@@ -0,0 +1,295 @@
+"""
+Process-wide scheduler for the loan pipeline.
+Work runs on two shared, bounded pools instead of per-request threads:
+"cpu" for rendering, encoding, metrics and disk work, and "io" for Gemini
+calls (blocking calls run on its threads; coroutines hold one of its slots
+instead). Each pool rejects work once its queue is full, and records how
+long work waited to start. Admission control caps the analyses in flight
+so a saturated process turns requests away (429 / 503) instead of
+queueing them behind work it cannot finish in time.
+
+Pool work must not submit to the pool it runs on (io work may use cpu):
+a full pool waiting on its own queue would deadlock.
+"""
+from __future__ import annotations
+import asyncio
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict
+
+from config import Config
+from deadline import in_context
+
+logger = logging.getLogger(__name__)
+
+# Queue waits kept for the percentiles reported in stats()
+WAIT_WINDOW = 1000
+
+
+class Overloaded(Exception):
+    """Work refused because the process is saturated"""
+
+    def __init__(self, message: str, status_code: int = 503, retry_after: int = 5):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class WaitStats:
+    """Queue wait times over the last WAIT_WINDOW tasks; thread-safe"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=WAIT_WINDOW)
+        self.count = 0
+        self.total = 0.0
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._recent.append(seconds)
+            self.count += 1
+            self.total += seconds
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            recent = sorted(self._recent)
+            count, total = self.count, self.total
+
+        def pct(p: float) -> float:
+            return round(recent[min(len(recent) - 1, int(p * len(recent)))], 4) if recent else 0.0
+
+        return {
+            "count": count,
+            "mean_seconds": round(total / count, 4) if count else 0.0,
+            "p50_seconds": pct(0.50),
+            "p95_seconds": pct(0.95),
+            "max_seconds": round(recent[-1], 4) if recent else 0.0,
+        }
+
+
+class WorkPool:
+    """
+    Shared thread pool with a bounded queue
+
+    submit() copies the caller's context into the task, so the request
+    deadline follows the work. slot() bounds coroutines the same way
+    without using a thread.
+    """
+
+    def __init__(self, name: str, workers: int, max_queue: int):
+        self.name = name
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self._lock = threading.Lock()
+        self._executor = self._new_executor()
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = \
+            weakref.WeakKeyDictionary()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.waits = WaitStats()
+
+    def _new_executor(self) -> ThreadPoolExecutor:
+        return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"{self.name}-pool")
+
+    def _waiting(self) -> int:
+        """Tasks that cannot start until a worker frees up"""
+        return max(0, self.queued + self.running - self.workers)
+
+    @property
+    def saturated(self) -> bool:
+        """Whether new work would be refused"""
+        return self._waiting() >= self.max_queue
+
+    def _enqueue(self, bounded: bool = True) -> float:
+        """Count one more task, or refuse it when max_queue are already waiting"""
+        with self._lock:
+            if bounded and self._waiting() >= self.max_queue:
+                self.rejected += 1
+                raise Overloaded(f"{self.name} pool queue is full ({self.max_queue} waiting)")
+            self.queued += 1
+        return time.monotonic()
+
+    def _started(self, enqueued: float) -> None:
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+        self.waits.record(time.monotonic() - enqueued)
+
+    def _finished(self) -> None:
+        with self._lock:
+            self.running -= 1
+            self.completed += 1
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """
+        Run fn on the pool
+
+        Raises:
+            Overloaded: the queue is full
+        """
+        return self._submit(self._enqueue(), fn, args, kwargs)
+
+    def _submit(self, enqueued: float, fn: Callable, args, kwargs) -> Future:
+        def task():
+            self._started(enqueued)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._finished()
+
+        try:
+            future = self._executor.submit(in_context(task))
+        except RuntimeError:
+            with self._lock:
+                self.queued -= 1
+            raise
+        # A task cancelled before it started never reaches _started()
+        future.add_done_callback(self._dequeue_cancelled)
+        return future
+
+    def _dequeue_cancelled(self, future: Future) -> None:
+        if future.cancelled():
+            with self._lock:
+                self.queued -= 1
+
+    def call(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run fn on the pool and wait for its result"""
+        return self.submit(fn, *args, **kwargs).result()
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Await fn run on the pool (replaces asyncio.to_thread)"""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    async def run_admitted(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Await fn run on the pool even when its queue is full
+
+        For an admitted analysis finishing up after its Gemini calls
+        (assembling, caching, saving the result): refusing that work would
+        throw the extraction away. Admission already caps how much of it
+        can pile up.
+        """
+        return await asyncio.wrap_future(self._submit(self._enqueue(bounded=False), fn, args, kwargs))
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold one of the pool's `workers` slots from a coroutine"""
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.workers)
+
+        enqueued = self._enqueue()
+        try:
+            await semaphore.acquire()
+        except BaseException:
+            with self._lock:
+                self.queued -= 1
+            raise
+        self._started(enqueued)
+        try:
+            yield
+        finally:
+            semaphore.release()
+            self._finished()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = {"workers": self.workers, "max_queue": self.max_queue,
+                      "queued": self.queued, "running": self.running,
+                      "completed": self.completed, "rejected": self.rejected}
+        return {**counts, "queue_wait": self.waits.summary()}
+
+    def _after_fork(self) -> None:
+        # The parent's threads do not exist in the child
+        self._lock = threading.Lock()
+        self._executor = self._new_executor()
+        self._semaphores = weakref.WeakKeyDictionary()
+        self.queued = self.running = 0
+
+
+class Admission:
+    """One admitted analysis; release() (or leaving the with block) frees its place"""
+
+    def __init__(self, scheduler: "Scheduler"):
+        self._scheduler = scheduler
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._scheduler._release()
+
+    def __enter__(self) -> "Admission":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+class Scheduler:
+    """The process's cpu and io pools plus admission control for analyses"""
+
+    def __init__(self, cpu_workers: int, io_workers: int, max_queue: int, max_analyses: int):
+        self.cpu = WorkPool("cpu", cpu_workers, max_queue)
+        self.io = WorkPool("io", io_workers, max_queue)
+        self.max_analyses = max_analyses
+        self._lock = threading.Lock()
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_config(cls) -> "Scheduler":
+        return cls(Config.CPU_POOL_WORKERS, Config.IO_POOL_WORKERS,
+                   Config.POOL_MAX_QUEUE, Config.MAX_CONCURRENT_ANALYSES)
+
+    def admit(self) -> Admission:
+        """
+        Admit one analysis
+
+        Raises:
+            Overloaded: 429 when MAX_CONCURRENT_ANALYSES are in flight,
+                503 when a pool queue is already full
+        """
+        with self._lock:
+            if self.max_analyses > 0 and self.active >= self.max_analyses:
+                self.rejected += 1
+                raise Overloaded(f"{self.active} analyses in progress", status_code=429,
+                                 retry_after=30)
+            full = [p.name for p in (self.cpu, self.io) if p.saturated]
+            if full:
+                self.rejected += 1
+                raise Overloaded(f"{', '.join(full)} pool queue is full", status_code=503)
+            self.active += 1
+            self.admitted += 1
+        return Admission(self)
+
+    def _release(self) -> None:
+        with self._lock:
+            self.active -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            analyses = {"active": self.active, "max": self.max_analyses,
+                        "admitted": self.admitted, "rejected": self.rejected}
+        return {"analyses": analyses, "cpu": self.cpu.stats(), "io": self.io.stats()}
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
+        self.active = 0
+        self.cpu._after_fork()
+        self.io._after_fork()
+
+
+scheduler = Scheduler.from_config()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=scheduler._after_fork)
@@ -127,6 +127,10 @@ class BankStatementData(BaseModel):
     closing_balance: float = 0.0
     average_monthly_balance: float = 0.0
     minimum_balance: float = 0.0
+    monthly_balances: List[Dict] = Field(
+        default_factory=list,
+        description="Per-month average/minimum/percentile/closing end-of-day balances"
+    )
 
     salary_credits_detected: int = 0
     average_monthly_salary: float = 0.0
@@ -282,4 +286,6 @@ class LoanApplicationAnalysis(BaseModel):
     # Processing info
     processing_time_seconds: float
     status: str  # success, partial, failed
-    errors: List[str] = Field(default_factory=list)
\ No newline at end of file
+    errors: List[str] = Field(default_factory=list)
+    # Extractions cut short by the request deadline (status is then partial)
+    timed_out_stages: List[str] = Field(default_factory=list)
\ No newline at end of file
@@ -0,0 +1,104 @@
+"""
+Row-at-a-time reference engine for bank_metrics.compute_bank_metrics
+
+The original implementation, kept outside the service as the oracle the
+columnar engine is checked against (tests and benchmarks/bench_bank_metrics.py).
+"""
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from balance_series import DailyBalanceSeries
+from bank_metrics import (
+    PeriodBound, Txn, _emi_fields, _empty_metrics, _month_key, _norm_text, _period_date,
+    _to_txns, detect_emi_debits, detect_salary_credits,
+)
+
+
+def compute_bank_metrics_rows(
+    raw_transactions: List[Dict],
+    employer_name: Optional[str] = None,
+    period_start: PeriodBound = None,
+    period_end: PeriodBound = None,
+) -> Dict:
+    """
+    Row-at-a-time reference implementation of compute_bank_metrics.
+    CORRECTED: Added validation and edge case handling
+    """
+    txns = _to_txns(raw_transactions)
+
+    # Handle empty transactions
+    if not txns:
+        return _empty_metrics()
+
+    totals = {
+        "total_credits": round(sum(t.credit for t in txns), 2),
+        "total_debits": round(sum(t.debit for t in txns), 2),
+        "credit_count": sum(1 for t in txns if t.credit > 0),
+        "debit_count": sum(1 for t in txns if t.debit > 0),
+    }
+
+    balances = DailyBalanceSeries.from_transactions(
+        np.array([t.txn_date.toordinal() for t in txns], dtype=np.int64),
+        np.array([t.debit for t in txns], dtype=np.float64),
+        np.array([t.credit for t in txns], dtype=np.float64),
+        np.array([t.balance for t in txns], dtype=np.float64),
+        _period_date(period_start), _period_date(period_end),
+    ).summary()
+
+    # Salary detection
+    salary_hits = detect_salary_credits(txns, employer_name=employer_name)
+    salary_by_month: Dict[str, List[Txn]] = defaultdict(list)
+    for t in salary_hits:
+        salary_by_month[_month_key(t.txn_date)].append(t)
+
+    salary_months = sorted(salary_by_month.keys())
+    salary_amounts = []
+    last_salary_date = None
+    for m in salary_months:
+        # Choose the largest credit in that month as the salary credit
+        mx = max(salary_by_month[m], key=lambda x: x.credit)
+        salary_amounts.append(mx.credit)
+        last_salary_date = mx.txn_date
+
+    avg_monthly_salary = round(
+        sum(salary_amounts) / len(salary_amounts), 2) if salary_amounts else 0.0
+
+    # EMI detection
+    emi_hits = detect_emi_debits(txns)
+
+    # Use statement months in data for averaging
+    all_months = sorted({_month_key(t.txn_date) for t in txns})
+
+    # Spending = non-EMI debits average per month
+    emi_keys = {
+        (t.txn_date, int(round(t.debit)), _norm_text(t.narration))
+        for t in emi_hits
+    }
+    non_emi_debits = [
+        t for t in txns
+        if t.debit > 0 and (t.txn_date, int(round(t.debit)), _norm_text(t.narration)) not in emi_keys
+    ]
+    spend_by_month: Dict[str, float] = defaultdict(float)
+    for t in non_emi_debits:
+        spend_by_month[_month_key(t.txn_date)] += t.debit
+
+    avg_monthly_spending = round(
+        (sum(spend_by_month.get(m, 0.0)
+         for m in all_months) / len(all_months)) if all_months else 0.0, 2
+    )
+
+    return {
+        **totals,
+        **balances,
+
+        "salary_credits_detected": sum(len(v) for v in salary_by_month.values()),
+        "average_monthly_salary": avg_monthly_salary,
+        "salary_consistency_months": len(salary_months),
+        "last_salary_date": last_salary_date.isoformat() if last_salary_date else None,
+
+        **_emi_fields(emi_hits, all_months),
+
+        "average_monthly_spending": avg_monthly_spending,
+    }
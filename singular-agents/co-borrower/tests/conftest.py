@@ -0,0 +1,31 @@
+"""
+Shared pytest setup - makes the service modules importable and lets
+config.py load without a real Gemini key. Also holds the fake LLM
+response and statement-row helpers the bank chain tests share.
+"""
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("GEMINI_API_KEY", "AIza-test-key")
+
+from chains.wire_format import encode_rows  # noqa: E402
+
+
+class FakeResponse:
+    def __init__(self, content, finish_reason="STOP"):
+        self.content = content
+        self.response_metadata = {"finish_reason": finish_reason}
+
+
+def row(n):
+    return {"date": f"{n:02d}-01-2024", "narration": f"UPI/{n}", "debit": float(n),
+            "credit": 0.0, "balance": 1000.0 - n}
+
+
+def answer(rows, positional=False, **header):
+    """Bank chain answer for rows; positional=True sends them as wire-format rows"""
+    body = {"rows": encode_rows(rows)} if positional else {"transactions": rows}
+    return {"bank_name": "BANK", "opening_balance": 1000.0, "closing_balance": 0.0,
+            **body, "extraction_confidence": 0.9, "extraction_notes": [], **header}
@@ -0,0 +1,74 @@
+"""
+Unit tests for the daily balance series
+"""
+from datetime import date
+
+import numpy as np
+import pytest
+
+from balance_series import DailyBalanceSeries
+from bank_metrics import compute_bank_metrics
+from bank_metrics_reference import compute_bank_metrics_rows
+
+
+def txn(d, debit=0.0, credit=0.0, balance=0.0, narration="x"):
+    return {"date": d, "narration": narration, "debit": debit, "credit": credit, "balance": balance}
+
+
+STATEMENT = [
+    txn("03-01-2024", credit=1000, balance=1500),   # opening 500
+    txn("03-01-2024", debit=200, balance=1300),     # end of 3 Jan
+    txn("10-01-2024", debit=300, balance=1000),
+    txn("02-02-2024", credit=2000, balance=3000),
+]
+
+
+def series_for(rows, start=None, end=None):
+    days = np.array([date(*map(int, reversed(r["date"].split("-")))).toordinal() for r in rows])
+    col = lambda k: np.array([float(r[k]) for r in rows])  # noqa: E731
+    return DailyBalanceSeries.from_transactions(days, col("debit"), col("credit"), col("balance"),
+                                                start, end)
+
+
+def test_forward_fills_end_of_day_over_period():
+    s = series_for(STATEMENT, date(2024, 1, 1), date(2024, 2, 29))
+    assert s.start == date(2024, 1, 1).toordinal()
+    assert len(s) == 60
+    assert s.balance[:2].tolist() == [500.0, 500.0]         # before the first row
+    assert s.balance[2] == 1300.0                           # last row of the day wins
+    assert s.balance[9:32].tolist() == [1000.0] * 23        # 10 Jan .. 1 Feb
+    assert s.balance[-1] == 3000.0                          # carried to period end
+
+    jan, feb = s.monthly()
+    assert jan["month"] == "2024-01" and jan["days"] == 31
+    assert jan["average_balance"] == round((2 * 500 + 7 * 1300 + 22 * 1000) / 31, 2)
+    assert jan["minimum_balance"] == 500.0 and jan["closing_balance"] == 1000.0
+    assert feb["days"] == 29 and feb["minimum_balance"] == 1000.0
+
+    summary = s.summary()
+    assert summary["average_monthly_balance"] == round(
+        ((2 * 500 + 7 * 1300 + 22 * 1000) / 31 + (1000 + 28 * 3000) / 29) / 2, 2)
+    assert summary["minimum_balance"] == 500.0
+
+
+def test_implausible_period_is_ignored():
+    s = series_for(STATEMENT, date(1970, 1, 1), date(2030, 1, 1))
+    assert s.start == date(2024, 1, 3).toordinal()
+    assert s.end == date(2024, 2, 2).toordinal()
+
+
+def test_percentiles_match_numpy():
+    rng = np.random.default_rng(3)
+    days = np.sort(rng.integers(date(2024, 1, 1).toordinal(), date(2024, 6, 30).toordinal(), 400))
+    bal = rng.uniform(-5000, 50000, 400)
+    s = DailyBalanceSeries.from_transactions(days, np.zeros(400), np.zeros(400), bal)
+    months = np.array([str(date.fromordinal(s.start + i))[:7] for i in range(len(s))])
+    for row in s.monthly():
+        values = s.balance[months == row["month"]]
+        for p in (10, 50, 90):
+            assert row[f"p{p}_balance"] == pytest.approx(np.percentile(values, p), abs=0.01)
+
+
+def test_engines_agree_with_period():
+    kwargs = dict(period_start="2024-01-01", period_end=date(2024, 2, 29))
+    assert compute_bank_metrics(STATEMENT, **kwargs) == compute_bank_metrics_rows(STATEMENT, **kwargs)
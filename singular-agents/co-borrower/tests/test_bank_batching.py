@@ -0,0 +1,184 @@
+"""
+Concurrent batch dispatch in BankStatementChain
+"""
+import asyncio
+import json
+import threading
+import time
+from base64 import b64decode
+
+import pytest
+
+from chains import bank_chain
+from chains.bank_chain import BankStatementChain
+from config import Config
+from processors.pdf_processor import PagePayload
+from conftest import FakeResponse
+
+
+@pytest.fixture
+def chain(monkeypatch):
+    monkeypatch.setattr(Config, "BANK_TEXT_FAST_PATH", False)
+    monkeypatch.setattr(Config, "BANK_BATCH_SIZE", 5)
+    monkeypatch.setattr(Config, "BANK_BATCH_CONCURRENCY", 4)
+    monkeypatch.setattr(
+        bank_chain.PDFProcessor, "iter_pages_for_gemini",
+        staticmethod(lambda *a, **kw: iter([PagePayload(n, str(n).encode()) for n in range(1, 21)])))
+    return BankStatementChain()
+
+
+def first_page_of(messages):
+    return int(b64decode(messages[0].content[1]["image_url"].rsplit(",", 1)[1]))
+
+
+def batch_reply(first_page):
+    """One batch's JSON; later batches answer faster so completion order is reversed"""
+    batch = (first_page - 1) // 5
+    return {
+        "account_holder_name": "" if batch == 0 else f"HOLDER {batch}",
+        "bank_name": "BANK",
+        "opening_balance": 1000.0 * (batch + 1),
+        "closing_balance": 0.0 if batch == 3 else 2000.0 * (batch + 1),
+        "transactions": [{"date": f"0{batch + 1}-01-2024", "narration": f"B{batch}",
+                          "debit": 0.0, "credit": 1.0, "balance": 1.0}],
+        "extraction_confidence": 0.8,
+        "extraction_notes": [],
+    }
+
+
+def test_batches_run_concurrently_and_merge_in_page_order(chain, monkeypatch):
+    in_flight = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def fake_invoke(messages):
+        nonlocal in_flight, peak
+        first_page = first_page_of(messages)
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.2 - 0.04 * (first_page // 5))
+        with lock:
+            in_flight -= 1
+        return FakeResponse(json.dumps(batch_reply(first_page)))
+
+    monkeypatch.setattr(chain, "invoke_with_retry", fake_invoke)
+
+    start = time.perf_counter()
+    merged, failed = chain._extract_transactions("statement.pdf", "prompt")
+    elapsed = time.perf_counter() - start
+
+    assert failed == 0
+    assert peak == 4
+    assert elapsed < 0.5
+    assert [t["narration"] for t in merged["transactions"]] == ["B0", "B1", "B2", "B3"]
+    assert merged["account_holder_name"] == "HOLDER 1"
+    assert merged["opening_balance"] == 1000.0
+    assert merged["closing_balance"] == 6000.0
+
+
+def test_in_flight_limit_and_failed_batch(chain, monkeypatch):
+    monkeypatch.setattr(Config, "BANK_BATCH_CONCURRENCY", 2)
+    in_flight = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def fake_invoke(messages):
+        nonlocal in_flight, peak
+        first_page = first_page_of(messages)
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.05)
+        with lock:
+            in_flight -= 1
+        if first_page == 6:
+            raise RuntimeError("quota")
+        return FakeResponse(json.dumps(batch_reply(first_page)))
+
+    monkeypatch.setattr(chain, "invoke_with_retry", fake_invoke)
+    merged, failed = chain._extract_transactions("statement.pdf", "prompt")
+
+    assert peak == 2
+    assert failed == 1
+    assert [t["narration"] for t in merged["transactions"]] == ["B0", "B2", "B3"]
+    assert merged["extraction_notes"] == ["Batch 2 failed: quota"]
+
+
+@pytest.mark.parametrize("max_queue", [0, 1])
+def test_full_io_pool_delays_batches_instead_of_failing(chain, monkeypatch, max_queue):
+    from scheduler import Scheduler, WorkPool
+
+    busy = Scheduler(cpu_workers=2, io_workers=1, max_queue=8, max_analyses=0)
+    # 0: every submit is refused, so batches run on the calling thread;
+    # 1: the third batch waits for a running one instead
+    busy.io = WorkPool("io", workers=1, max_queue=max_queue)
+    monkeypatch.setattr(bank_chain, "scheduler", busy)
+
+    def fake_invoke(messages):
+        time.sleep(0.02)
+        return FakeResponse(json.dumps(batch_reply(first_page_of(messages))))
+
+    monkeypatch.setattr(chain, "invoke_with_retry", fake_invoke)
+    merged, failed = chain._extract_transactions("statement.pdf", "prompt")
+
+    assert failed == 0
+    assert [t["narration"] for t in merged["transactions"]] == ["B0", "B1", "B2", "B3"]
+    assert busy.io.stats()["rejected"] > 0
+
+
+@pytest.mark.asyncio
+async def test_async_batches_merge_in_page_order(chain, monkeypatch):
+    monkeypatch.setattr(Config, "BANK_BATCH_CONCURRENCY", 2)
+    in_flight = 0
+    peak = 0
+
+    async def fake_ainvoke(messages):
+        nonlocal in_flight, peak
+        first_page = first_page_of(messages)
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.1 - 0.02 * (first_page // 5))
+        in_flight -= 1
+        return FakeResponse(json.dumps(batch_reply(first_page)))
+
+    monkeypatch.setattr(chain, "ainvoke_with_retry", fake_ainvoke)
+    batches = chain.aprefetch(chain._vision_batch_stream("statement.pdf", None))
+    segments = []
+    errors = await chain._aextract_batches("prompt", batches, segments)
+    merged = chain._merge_segments(segments, None, errors)
+
+    assert errors == []
+    assert peak == 2
+    assert [t["narration"] for t in merged["transactions"]] == ["B0", "B1", "B2", "B3"]
+    assert merged["opening_balance"] == 1000.0
+    assert merged["closing_balance"] == 6000.0
+
+
+def test_first_batch_is_sent_while_later_pages_render(chain, monkeypatch):
+    encoded = []
+
+    def slow_pages(*args, **kwargs):
+        for n in range(1, 21):
+            time.sleep(0.01)
+            encoded.append(n)
+            yield PagePayload(n, str(n).encode())
+
+    monkeypatch.setattr(bank_chain.PDFProcessor, "iter_pages_for_gemini", staticmethod(slow_pages))
+    sent_at = {}
+
+    def fake_invoke(messages):
+        first_page = first_page_of(messages)
+        sent_at[first_page] = len(encoded)
+        time.sleep(0.05)
+        return FakeResponse(json.dumps(batch_reply(first_page)))
+
+    monkeypatch.setattr(chain, "invoke_with_retry", fake_invoke)
+    events = []
+    merged, failed = chain._extract_transactions(
+        "statement.pdf", "prompt", progress=lambda *a, **kw: events.append(kw))
+
+    assert failed == 0
+    assert sent_at[1] < 20
+    assert [t["narration"] for t in merged["transactions"]] == ["B0", "B1", "B2", "B3"]
+    assert events[-1] == {"current": 4, "total": 4}
@@ -0,0 +1,233 @@
+"""
+Incremental bank metrics must match a full recomputation
+"""
+import json
+import multiprocessing
+import random
+import time
+from datetime import date, timedelta
+
+import pytest
+
+from bank_metrics import compute_bank_metrics
+from bank_state import BankMetricsState, BankStateStore, account_key
+
+EMPLOYER = "Acme Corporation"
+
+
+def statement(months=6, seed=1):
+    """Date-ordered rows with a consistent running balance, split per month"""
+    rng = random.Random(seed)
+    balance = 50_000.0
+    day = date(2024, 1, 1)
+    per_month = {}
+    while (day.year - 2024) * 12 + day.month <= months:
+        for _ in range(rng.randrange(0, 4)):
+            kind = rng.random()
+            debit = credit = 0.0
+            if day.day == 1 and kind < 0.9:
+                credit, narration = rng.choice([85_000.0, 85_000.5]), "NEFT SALARY ACME CORP"
+            elif day.day == 5:
+                debit, narration = 12_000.0, "NACH DR HDFC LOAN"
+            elif kind < 0.05:
+                debit, narration = 999.0, "ECS INSURANCE PREMIUM"
+            elif kind < 0.3:
+                credit, narration = round(rng.uniform(10, 5_000), 2), "UPI/CR/FRIEND"
+            else:
+                debit, narration = round(rng.uniform(1, 3_000), 2), "POS GROCERY"
+            balance = round(balance + credit - debit, 2)
+            per_month.setdefault(day.month, []).append({
+                "date": day.strftime("%d-%m-%Y"), "narration": narration,
+                "debit": debit, "credit": credit, "balance": balance})
+        day += timedelta(days=1)
+    return [per_month.get(m, []) for m in range(1, months + 1)]
+
+
+def period(month):
+    start = date(2024, month, 1)
+    end = (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return start, end
+
+
+def incremental(parts):
+    state = BankMetricsState("123", EMPLOYER)
+    for m, rows in enumerate(parts, start=1):
+        start, end = period(m)
+        state.apply(rows, EMPLOYER, period_start=start, period_end=end)
+    return state
+
+
+def assert_same(got, want):
+    assert got["average_monthly_spending"] == pytest.approx(want["average_monthly_spending"], abs=0.011)
+    got = {k: v for k, v in got.items() if k != "average_monthly_spending"}
+    want = {k: v for k, v in want.items() if k != "average_monthly_spending"}
+    assert got == want
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_appending_months_matches_full_recompute(seed):
+    parts = statement(seed=seed)
+    full = compute_bank_metrics([r for p in parts for r in p], EMPLOYER,
+                                period_start=period(1)[0], period_end=period(6)[1])
+    assert full["salary_consistency_months"] and full["emi_transactions"]
+    assert_same(incremental(parts).metrics(), full)
+
+
+def test_metrics_after_each_month():
+    parts = statement(seed=4)
+    state = BankMetricsState("123", EMPLOYER)
+    for m in range(1, len(parts) + 1):
+        start, end = period(m)
+        state.apply(parts[m - 1], EMPLOYER, period_start=start, period_end=end)
+        full = compute_bank_metrics([r for p in parts[:m] for r in p], EMPLOYER,
+                                    period_start=period(1)[0], period_end=end)
+        assert_same(state.metrics(), full)
+
+
+def test_overlapping_statement_rows_are_merged_once():
+    parts = statement(seed=5)
+    overlap = [dict(r) for r in parts[0][-3:]] + parts[1]
+    state = incremental([parts[0]])
+    added = state.apply(overlap, EMPLOYER, period_end=period(2)[1])
+    assert added == len(parts[1])
+    assert state.apply(parts[1], EMPLOYER) == 0
+    assert state.statements == 2
+    full = compute_bank_metrics(parts[0] + parts[1], EMPLOYER,
+                                period_start=period(1)[0], period_end=period(2)[1])
+    assert_same(state.metrics(), full)
+
+
+def test_state_round_trips_through_store(tmp_path):
+    parts = statement(seed=6)
+    store = BankStateStore(tmp_path)
+    state = incremental(parts[:3])
+    store.save(state)
+
+    loaded = store.load("123")
+    assert json.dumps(loaded.to_dict()) == json.dumps(state.to_dict())
+    for m in (4, 5, 6):
+        start, end = period(m)
+        loaded.apply(parts[m - 1], EMPLOYER, period_start=start, period_end=end)
+    assert loaded.metrics() == incremental(parts).metrics()
+
+    assert "123" not in "".join(p.name for p in tmp_path.iterdir())
+    assert store.delete("123") and store.load("123") is None
+
+
+def test_employer_mismatch_and_empty_state():
+    state = BankMetricsState("123")
+    assert state.metrics() == compute_bank_metrics([])
+    state.apply(statement(seed=7)[0], EMPLOYER)
+    state.apply([], None)  # the stored employer is kept
+    with pytest.raises(ValueError):
+        state.apply([], "Other Employer Ltd")
+
+
+def test_account_key():
+    assert account_key(" 1234 5678 ") == "12345678"
+    assert account_key("Not Found") is None and account_key(None) is None
+
+
+def test_chain_merges_statements_per_account(tmp_path, monkeypatch):
+    from chains import bank_chain
+
+    parts = statement(seed=8)
+    extractions = iter(
+        {"account_holder_name": "A", "bank_name": "B", "account_number": "12 34",
+         "account_type": "SAVINGS", "statement_period_start": period(m)[0].isoformat(),
+         "statement_period_end": period(m)[1].isoformat(), "opening_balance": 0.0,
+         "closing_balance": 0.0, "transactions": parts[m - 1],
+         "extraction_confidence": 0.9, "extraction_notes": []}
+        for m in (1, 2, 3))
+    monkeypatch.setattr(bank_chain, "bank_state_store", BankStateStore(tmp_path))
+    chain = bank_chain.BankStatementChain()
+    monkeypatch.setattr(chain, "_load_or_extract", lambda *a, **kw: next(extractions))
+
+    for _ in range(3):
+        bank = chain.process_incremental("statement.pdf", EMPLOYER)
+    assert len(bank.transactions) == len(parts[2])
+
+    full = compute_bank_metrics(parts[0] + parts[1] + parts[2], EMPLOYER,
+                                period_start=period(1)[0], period_end=period(3)[1])
+    assert bank.average_monthly_balance == full["average_monthly_balance"]
+    assert bank.monthly_balances == full["monthly_balances"]
+    assert bank.average_monthly_emi == full["average_monthly_emi"]
+    assert bank.salary_consistency_months == 3
+    assert BankStateStore(tmp_path).load("1234").statements == 3
+
+
+def _apply_month_locked(state_dir, rows, month):
+    store = BankStateStore(state_dir)
+    with store.locked("123"):
+        state = store.load("123") or BankMetricsState("123", EMPLOYER)
+        time.sleep(0.05)  # widen the load / save window
+        start, end = period(month)
+        state.apply(rows, EMPLOYER, period_start=start, period_end=end)
+        store.save(state)
+
+
+def test_lock_serialises_worker_processes(tmp_path):
+    parts = statement(months=4, seed=9)
+    ctx = multiprocessing.get_context("fork")
+    workers = [ctx.Process(target=_apply_month_locked, args=(tmp_path, rows, m))
+               for m, rows in enumerate(parts, start=1)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join(10)
+    assert [w.exitcode for w in workers] == [0] * 4
+    assert BankStateStore(tmp_path).load("123").statements == 4
+
+
+def test_state_file_holds_no_account_number(tmp_path):
+    store = BankStateStore(tmp_path)
+    state = BankMetricsState("50100012345678", EMPLOYER)
+    rows = [{"date": f"05-0{m}-2024", "narration": "NACH DR HDFC LOAN 50100012345678",
+             "debit": 12_000.0, "credit": 0.0, "balance": 100_000.0 - m * 12_000}
+            for m in (1, 2, 3)]
+    state.apply(rows, EMPLOYER)
+    store.save(state)
+
+    [path] = tmp_path.iterdir()
+    assert "12345678" not in path.read_text()
+    loaded = store.load("50100012345678")
+    assert loaded.account_id == "50100012345678"
+    assert [t["narration"] for t in loaded.metrics()["emi_transactions"]] == \
+        ["NACH DR HDFC LOAN XXXXXXXXXX5678"] * 3
+    with pytest.raises(ValueError):
+        BankMetricsState.from_dict(state.to_dict(), "999")
+
+
+def test_api_merges_an_appended_statement(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    import app as app_module
+    from chains import bank_chain
+    from processors.bank_text_extractor import BankTextExtractor
+    from test_bank_text_extractor import PAGE_1, PAGE_2, make_statement
+
+    monkeypatch.setattr(bank_chain, "bank_state_store", BankStateStore(tmp_path / "state"))
+    first = make_statement(tmp_path / "april_1.pdf", [PAGE_1])
+    # The next statement re-sends the first one's rows
+    second = make_statement(tmp_path / "april_2.pdf", [PAGE_1, PAGE_2])
+
+    def post(path, **form):
+        with open(path, "rb") as f:
+            return client.post("/api/bank/statements", data=form,
+                               files={"bank_statement_pdf": ("statement.pdf", f.read())})
+
+    with TestClient(app_module.app) as client:
+        assert post(first, employer_name=EMPLOYER).status_code == 200
+        resp = post(second, employer_name=EMPLOYER)
+        assert resp.status_code == 200
+        bank = resp.json()["bank_statement"]
+
+        assert post(second, employer_name="Other Employer Ltd").status_code == 422
+
+    rows = [r.as_transaction() for p in BankTextExtractor.extract(second).pages for r in p.rows]
+    full = compute_bank_metrics(rows, EMPLOYER, period_start=date(2024, 4, 1),
+                                period_end=date(2024, 6, 30))
+    assert bank["total_credits"] == full["total_credits"]
+    assert bank["total_debits"] == full["total_debits"]
+    assert bank["average_monthly_balance"] == full["average_monthly_balance"]
+    assert bank["salary_credits_detected"] == 1
+    assert BankStateStore(tmp_path / "state").load("50100123456789").statements == 2
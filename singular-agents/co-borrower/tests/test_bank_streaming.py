@@ -0,0 +1,151 @@
+"""
+Streamed bank responses: incremental row parsing and provisional metrics
+"""
+import json
+
+import pytest
+
+from chains.bank_chain import BankStatementChain
+from chains.llm_output import RowStream
+from chains.wire_format import encode_rows
+from config import Config
+from processors.pdf_processor import PagePayload
+
+
+class FakeChunk:
+    def __init__(self, content, finish_reason=None):
+        self.content = content
+        self.response_metadata = {"finish_reason": finish_reason} if finish_reason else {}
+
+
+def row(n):
+    return {"date": f"{n:02d}-01-2024", "narration": f"UPI/{n}", "debit": float(n),
+            "credit": 0.0, "balance": 1000.0 - n}
+
+
+def answer_text(rows, **header):
+    return json.dumps({"bank_name": "BANK", "opening_balance": 1000.0, "closing_balance": 0.0,
+                       "rows": encode_rows(rows), "extraction_confidence": 0.9,
+                       "extraction_notes": [], **header})
+
+
+def chunks(text, size=7, finish_reason="STOP"):
+    parts = [FakeChunk(text[i:i + size]) for i in range(0, len(text), size)]
+    parts.append(FakeChunk("", finish_reason))
+    return parts
+
+
+def pages(n):
+    return [PagePayload(i, str(i).encode()) for i in range(1, n + 1)]
+
+
+@pytest.fixture
+def chain(monkeypatch):
+    monkeypatch.setattr(Config, "BANK_STREAMING", True)
+    monkeypatch.setattr(Config, "BANK_OUTPUT_FORMAT", "rows")
+    return BankStatementChain()
+
+
+@pytest.mark.parametrize("size", [1, 5, 64, 10_000])
+def test_row_stream_any_chunking(size):
+    text = "```json\n" + json.dumps({
+        "bank_name": 'A "quoted" [bank], {x}', "rows": [["01", "a,]}", 1, 0, 2], ["02", "b", 0, 1, 3]],
+        "extraction_notes": ["n"]}) + "\n```"
+    parser = RowStream()
+    items, longest = [], 0
+    for i in range(0, len(text), size):
+        items += parser.feed(text[i:i + size])
+        longest = max(longest, len(parser._buf))
+    assert items == [["01", "a,]}", 1, 0, 2], ["02", "b", 0, 1, 3]]
+    assert parser.header == {"bank_name": 'A "quoted" [bank], {x}', "extraction_notes": ["n"]}
+    assert parser.list_key == "rows" and parser.complete
+    assert longest <= max(size, 40)                       # only the open element is kept
+
+
+def test_row_stream_skips_malformed_element():
+    parser = RowStream()
+    items = parser.feed('{"transactions": [{"a": 1}, {"a" 2}, {"a": 3}], "x": 1}')
+    assert items == [{"a": 1}, {"a": 3}]
+    assert parser.skipped == 1 and parser.header == {"x": 1}
+
+
+def test_rows_arrive_while_streaming(chain, monkeypatch):
+    rows = [row(n) for n in range(1, 6)]
+    consumed, seen = [], []
+
+    def fake_stream(messages):
+        for i, c in enumerate(chunks(answer_text(rows))):
+            consumed.append(i)
+            yield c
+
+    monkeypatch.setattr(chain, "stream_with_retry", fake_stream)
+    [(_, data)] = chain._extract_batch("prompt", pages(1),
+                                       on_rows=lambda new: seen.append((len(consumed), new)))
+
+    assert data["transactions"] == rows
+    assert data["bank_name"] == "BANK" and data["extraction_notes"] == []
+    assert [r for _, new in seen for r in new] == rows
+    assert seen[0][0] < len(consumed) // 2                # first row long before the end
+
+
+def test_broken_stream_keeps_rows_and_continues(chain, monkeypatch):
+    rows = [row(n) for n in range(1, 7)]
+    calls, seen = [], []
+
+    def fake_stream(messages):
+        calls.append(messages[0].content[0]["text"])
+        if len(calls) == 1:
+            text = answer_text(rows[:5])
+            yield from chunks(text[:text.index('"UPI/4"')])[:-1]
+            raise ConnectionError("stream reset")
+        yield from chunks(answer_text(rows[2:], closing_balance=994.0))
+
+    monkeypatch.setattr(chain, "stream_with_retry", fake_stream)
+    [(_, data)] = chain._extract_batch("prompt", pages(1), on_rows=seen.extend)
+
+    assert len(calls) == 2 and "CONTINUATION" in calls[1]
+    assert data["transactions"] == rows
+    assert data["closing_balance"] == 994.0
+    assert seen == rows                                    # repeated anchor rows not re-sent
+    assert data["extraction_notes"] == [
+        "Response stream broke off after 3 transactions: stream reset"]
+
+
+def test_stream_failing_before_rows_raises(chain, monkeypatch):
+    def fake_stream(messages):
+        yield FakeChunk('{"bank_name": "BANK", ')
+        raise ConnectionError("stream reset")
+
+    monkeypatch.setattr(chain, "stream_with_retry", fake_stream)
+    with pytest.raises(ConnectionError):
+        chain._extract_batch("prompt", pages(1))
+
+
+def test_provisional_metrics_reported(chain, monkeypatch):
+    monkeypatch.setattr(Config, "BANK_STREAM_METRICS_EVERY", 2)
+    events = []
+    monkeypatch.setattr(chain, "stream_with_retry",
+                        lambda messages: iter(chunks(answer_text([row(n) for n in range(1, 6)]))))
+
+    segments = []
+    errors = chain._extract_batches("prompt", [pages(1)], segments,
+                                    progress=lambda *a, **kw: events.append(kw))
+
+    assert errors == [] and len(segments) == 1
+    provisional = [e for e in events if "provisional_metrics" in e]
+    assert [e["transactions"] for e in provisional] == [2, 4]
+    assert provisional[-1]["provisional_metrics"]["total_debits"] == 10.0
+
+
+@pytest.mark.asyncio
+async def test_async_streaming(chain, monkeypatch):
+    import asyncio
+
+    async def fake_astream(messages):
+        for c in chunks(answer_text([row(1), row(2)]) + "\n", size=3):
+            yield c
+
+    monkeypatch.setattr(chain, "astream_with_retry", fake_astream)
+    seen = []
+    [(_, data)] = await chain._aextract_batch("prompt", pages(1), asyncio.Semaphore(1), seen.extend)
+    assert data["transactions"] == seen == [row(1), row(2)]
@@ -0,0 +1,113 @@
+"""
+Unit tests for the text-layer bank statement extractor
+"""
+import fitz
+import pytest
+
+from processors.bank_text_extractor import BankTextExtractor, parse_amount, parse_row_date
+
+COLUMNS = [40, 110, 330, 410, 490, 570]
+
+PAGE_1 = [("UPI/1234/GROCERY", 500.0, 0.0),
+          ("NEFT SALARY ACME CORP", 0.0, 50000.0),
+          ("EMI HDFC LOAN", 12000.0, 0.0)]
+PAGE_2 = [("ATM WDL", 2000.0, 0.0),
+          ("IMPS FROM FRIEND", 0.0, 1500.0)]
+
+
+def make_statement(path, pages, ruled=True, opening=10000.0, corrupt_page=None):
+    """Write a synthetic digital statement, one table per page"""
+    doc = fitz.open()
+    balance = opening
+    day = 1
+    for page_index, rows in enumerate(pages):
+        page = doc.new_page()
+        if page_index == 0:
+            page.insert_text((40, 20), "Customer Name: ANIL R SHAH   Account Type: Savings", fontsize=8)
+            page.insert_text((40, 30), "HDFC BANK LTD  Account No: 50100123456789  "
+                             "Statement From : 01/04/2024 To 30/06/2024", fontsize=8)
+        cells = [("Date", "Narration", "Withdrawal", "Deposit", "Balance")]
+        if page_index == 0:
+            cells.append(("01/04/2024", "Opening Balance", "", "", f"{balance:,.2f}"))
+        for narration, debit, credit in rows:
+            balance = balance - debit + credit
+            day += 1
+            shown = balance + 1 if page_index == corrupt_page else balance
+            cells.append((f"{day:02d}/04/2024", narration,
+                          f"{debit:,.2f}" if debit else "",
+                          f"{credit:,.2f}" if credit else "",
+                          f"{shown:,.2f}"))
+        y = 40
+        for row in cells:
+            for i, text in enumerate(row):
+                page.insert_text((COLUMNS[i] + 2, y + 12), text, fontsize=8)
+            if ruled:
+                page.draw_rect(fitz.Rect(COLUMNS[0], y, COLUMNS[-1], y + 16))
+                for x in COLUMNS:
+                    page.draw_line((x, y), (x, y + 16))
+            y += 16
+    doc.save(path)
+    return str(path)
+
+
+@pytest.mark.parametrize("ruled", [True, False])
+def test_parses_and_verifies_digital_statement(tmp_path, ruled):
+    pdf = make_statement(tmp_path / "statement.pdf", [PAGE_1, PAGE_2], ruled=ruled)
+    result = BankTextExtractor.extract(pdf)
+
+    assert result.failed_pages == []
+    assert result.opening_balance == 10000.0
+    rows = [r.as_transaction() for p in result.pages for r in p.rows]
+    assert len(rows) == 5
+    assert rows[0] == {"date": "02-04-2024", "narration": "UPI/1234/GROCERY",
+                       "debit": 500.0, "credit": 0.0, "balance": 9500.0}
+    assert rows[1]["credit"] == 50000.0
+    assert rows[-1]["balance"] == 47000.0
+
+
+def test_header_fields(tmp_path):
+    pdf = make_statement(tmp_path / "statement.pdf", [PAGE_1])
+    header = BankTextExtractor.extract(pdf).header
+    assert header["bank_name"] == "HDFC Bank"
+    assert header["account_number"] == "50100123456789"
+    assert header["account_holder_name"] == "ANIL R SHAH"
+    assert header["account_type"] == "Savings"
+    assert header["statement_period_start"] == "2024-04-01"
+    assert header["statement_period_end"] == "2024-06-30"
+
+
+def test_balance_mismatch_fails_only_that_page(tmp_path):
+    pdf = make_statement(tmp_path / "statement.pdf", [PAGE_1, PAGE_2, PAGE_2], corrupt_page=1)
+    result = BankTextExtractor.extract(pdf)
+    # Page 2 is broken; page 3 still verifies internally
+    assert result.failed_pages == [1]
+
+
+def test_scanned_page_needs_vision(tmp_path):
+    digital = make_statement(tmp_path / "digital.pdf", [PAGE_1, PAGE_2])
+    mixed = fitz.open()
+    with fitz.open(digital) as src:
+        mixed.insert_pdf(src, to_page=0)
+        page = mixed.new_page()
+        page.insert_image(page.rect, pixmap=src[1].get_pixmap())
+    mixed.save(tmp_path / "mixed.pdf")
+
+    result = BankTextExtractor.extract(str(tmp_path / "mixed.pdf"))
+    assert result.failed_pages == [1]
+    assert result.pages[1].reason == "no text layer"
+
+
+def test_parse_amount():
+    assert parse_amount("1,23,456.78") == 123456.78
+    assert parse_amount("2,000.00 Cr") == 2000.0
+    assert parse_amount("500.00 Dr") == -500.0
+    assert parse_amount("") is None
+    assert parse_amount("-") is None
+    assert parse_amount("abc") is None
+
+
+def test_parse_row_date():
+    assert parse_row_date("05/04/24").isoformat() == "2024-04-05"
+    assert parse_row_date("05 Apr 2024").isoformat() == "2024-04-05"
+    assert parse_row_date("05-Apr-2024").isoformat() == "2024-04-05"
+    assert parse_row_date("not a date") is None
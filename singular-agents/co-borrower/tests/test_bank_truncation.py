@@ -0,0 +1,133 @@
+"""
+Truncated LLM output: salvage, continuation and batch splitting
+"""
+import json
+from base64 import b64decode
+
+import pytest
+
+from chains.bank_chain import BankStatementChain
+from chains.llm_output import is_truncated, salvage_json
+from config import Config
+from processors.pdf_processor import PagePayload
+from conftest import FakeResponse, answer, row
+
+
+def cut(data, after_rows):
+    """JSON text cut off half-way through the row after the first after_rows"""
+    text = json.dumps(data)
+    marker = json.dumps(data["transactions"][after_rows])
+    pos = text.index(marker) + len(marker) // 2
+    return FakeResponse(text[:pos], "MAX_TOKENS")
+
+
+def pages(n):
+    return [PagePayload(i, str(i).encode()) for i in range(1, n + 1)]
+
+
+def page_range(messages):
+    parts = messages[0].content[1:]
+    return [int(b64decode(p["image_url"].rsplit(",", 1)[1])) for p in parts]
+
+
+def test_salvage_keeps_complete_rows_only():
+    data = answer([row(1), row(2), row(3)])
+    text = json.dumps(data)
+    salvaged = salvage_json(text[:text.index('"UPI/3"')])
+    assert salvaged["transactions"] == [row(1), row(2)]
+    assert salvaged["bank_name"] == "BANK"
+    assert salvage_json(text) is None                       # not truncated
+    assert salvage_json('{"bank_name": "BA') == {}
+    assert salvage_json("no json") is None
+    assert salvage_json('{"n": "a \\" , [ {", "transactions": [{"x": 1}, {"x"') == \
+        {"n": 'a " , [ {', "transactions": [{"x": 1}]}
+
+
+def test_finish_reason_detection():
+    assert is_truncated(FakeResponse("", "MAX_TOKENS"))
+    assert not is_truncated(FakeResponse("", "STOP"))
+    assert not is_truncated(object())
+
+
+@pytest.fixture
+def chain(monkeypatch):
+    # These answers use keyed transaction objects; rows are in test_wire_format
+    monkeypatch.setattr(Config, "BANK_OUTPUT_FORMAT", "objects")
+    return BankStatementChain()
+
+
+def test_truncated_answer_is_continued(chain, monkeypatch):
+    rows = [row(n) for n in range(1, 9)]
+    calls = []
+
+    def fake_invoke(messages):
+        calls.append(messages[0].content[0]["text"])
+        if len(calls) == 1:
+            return cut(answer(rows[:5]), 3)                 # rows 1-3 complete
+        # The continuation repeats its anchor row before the new ones
+        assert json.dumps(rows[2]) in calls[-1]
+        return FakeResponse(json.dumps(answer(rows[2:], closing_balance=992.0)))
+
+    monkeypatch.setattr(chain, "invoke_with_retry", fake_invoke)
+    [(first, data)] = chain._extract_batch("prompt", pages(3))
+
+    assert len(calls) == 2
+    assert first == 0
+    assert data["transactions"] == rows
+    assert data["closing_balance"] == 992.0
+    assert data["extraction_notes"] == []
+
+
+def test_batch_without_rows_is_split(chain, monkeypatch):
+    seen = []
+
+    def fake_invoke(messages):
+        got = page_range(messages)
+        seen.append(got)
+        if len(got) > 2:
+            return FakeResponse('{"bank_name": "BANK", "transactions": [{"date": "01', "MAX_TOKENS")
+        return FakeResponse(json.dumps(answer([row(p) for p in got])))
+
+    monkeypatch.setattr(chain, "invoke_with_retry", fake_invoke)
+    segments = chain._extract_batch("prompt", pages(5))
+
+    assert seen == [[1, 2, 3, 4, 5], [1, 2], [3, 4, 5], [3], [4, 5]]
+    assert [first for first, _ in segments] == [0, 2, 3]
+    assert [r["debit"] for _, d in segments for r in d["transactions"]] == [1, 2, 3, 4, 5]
+
+
+def test_continuations_are_bounded(chain, monkeypatch):
+    monkeypatch.setattr(Config, "BANK_MAX_CONTINUATIONS", 2)
+    calls = 0
+
+    def fake_invoke(messages):
+        nonlocal calls
+        calls += 1
+        start = 1 + 2 * (calls - 1)
+        return cut(answer([row(n) for n in range(start, start + 3)]), 2)
+
+    monkeypatch.setattr(chain, "invoke_with_retry", fake_invoke)
+    [(_, data)] = chain._extract_batch("prompt", pages(1))
+
+    assert calls == 3
+    assert [r["debit"] for r in data["transactions"]] == [1, 2, 3, 4, 5, 6]
+    assert data["extraction_notes"] == ["Output for pages 1-1 truncated after 6 transactions"]
+
+
+@pytest.mark.asyncio
+async def test_async_continuation_and_split(chain, monkeypatch):
+    import asyncio
+
+    async def fake_ainvoke(messages):
+        got = page_range(messages)
+        if len(got) > 1:
+            return FakeResponse('{"transactions": [', "MAX_TOKENS")
+        text = messages[0].content[0]["text"]
+        if "CONTINUATION" in text:
+            return FakeResponse(json.dumps(answer([row(got[0] * 10 + 1)])))
+        return cut(answer([row(got[0] * 10), row(got[0] * 10 + 1)]), 1)
+
+    monkeypatch.setattr(chain, "ainvoke_with_retry", fake_ainvoke)
+    segments = await chain._aextract_batch("prompt", pages(2), asyncio.Semaphore(2))
+
+    assert [[r["debit"] for r in d["transactions"]] for _, d in segments] == [[10, 11], [20, 21]]
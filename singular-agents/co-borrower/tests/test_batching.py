@@ -0,0 +1,119 @@
+"""
+Token-budget batch planning for vision chains
+"""
+import pytest
+
+from chains.batching import (
+    IMAGE_TILE_TOKENS, BatchBudget, ModelLimits, image_tokens, iter_batches, page_cost,
+)
+from config import Config
+from processors.pdf_processor import PagePayload
+
+LIMITS = ModelLimits(max_input_tokens=100_000, max_output_tokens=8_192,
+                     max_request_bytes=20 * 1024 * 1024, max_images=3_000)
+
+
+def pages(n, width=1536, height=1536, size=150_000):
+    # 150,000 bytes is 200,000 characters of base64
+    return [PagePayload(i, b"x" * size, width, height) for i in range(1, n + 1)]
+
+
+def sizes(pages, limits, budget):
+    return [len(b) for b in iter_batches(pages, limits, budget)]
+
+
+@pytest.mark.parametrize("size, tiles", [
+    ((300, 384), 1), ((768, 768), 1), ((769, 768), 2), ((1536, 1086), 4), ((1086, 1536), 4),
+])
+def test_image_tokens_per_tile(size, tiles):
+    assert image_tokens(*size) == tiles * IMAGE_TILE_TOKENS
+
+
+def test_output_budget_sets_pages_per_request():
+    budget = BatchBudget(prompt_tokens=500, output_tokens_fixed=512, output_tokens_per_page=1400)
+    batches = list(iter_batches(pages(20), LIMITS, budget))
+    # (8192 - 512) // 1400 = 5 pages fit; 20 pages need 4 requests
+    assert [len(b) for b in batches] == [5, 5, 5, 5]
+    assert [p.page_number for b in batches for p in b] == list(range(1, 21))
+
+
+def test_input_bytes_and_page_caps():
+    budget = BatchBudget(prompt_tokens=100)
+    tight = ModelLimits(max_input_tokens=100 + 10 * 4 * IMAGE_TILE_TOKENS, max_output_tokens=8_192,
+                        max_request_bytes=20 * 1024 * 1024, max_images=3_000)
+    assert sizes(pages(30), tight, budget) == [10, 10, 10]
+
+    small = ModelLimits(max_input_tokens=10**6, max_output_tokens=8_192,
+                        max_request_bytes=1_000_000, max_images=3_000)
+    assert sizes(pages(12), small, budget) == [4, 4, 4]
+
+    capped = BatchBudget(prompt_tokens=100, max_pages=3)
+    assert sizes(pages(7), LIMITS, capped) == [3, 3, 1]
+
+
+def test_oversized_page_gets_its_own_batch():
+    budget = BatchBudget(prompt_tokens=100)
+    tiny = ModelLimits(max_input_tokens=500, max_output_tokens=100,
+                       max_request_bytes=10**9, max_images=100)
+    assert sizes(pages(3), tiny, budget) == [1, 1, 1]
+    assert sizes([], LIMITS, budget) == []
+
+
+def test_page_size_or_default():
+    budget = BatchBudget(prompt_tokens=0)
+    assert page_cost(PagePayload(1, b"", 300, 300), budget).input_tokens == IMAGE_TILE_TOKENS
+    assert page_cost(PagePayload(1, b"abc"), budget).input_tokens == 4 * IMAGE_TILE_TOKENS
+    assert page_cost(PagePayload(1, b"abcd"), budget).request_bytes == 8 + 64
+
+
+def test_model_limits_by_prefix(monkeypatch):
+    assert Config.model_limits("gemini-1.5-pro-002")["max_input_tokens"] == 2_097_152
+    assert Config.model_limits("gemini-2.5-flash")["max_output_tokens"] == 65_536
+    assert ModelLimits.for_model("gemini-2.5-flash").max_output_tokens == Config.MAX_OUTPUT_TOKENS
+    monkeypatch.setitem(Config.MODEL_LIMITS, "my-model", {"max_images": 2})
+    assert ModelLimits.for_model("my-model-latest").max_images == 2
+
+
+def test_itr_partials_merge_by_confidence():
+    from chains.itr_chain import ITRChain
+    from chains.structured_output import validate_answer
+    from schemas import ITRData
+    merged = ITRChain._merge_partials([
+        {"applicant_name": "A", "assessment_year_1": "2023-24", "gross_total_income_year1": 0.0,
+         "gross_total_income_year2": 800_000.0, "average_annual_income": 800_000.0,
+         "extraction_confidence": 0.6, "extraction_notes": ["year 2 only"]},
+        {"applicant_name": "Applicant", "gross_total_income_year1": 1_000_000.0,
+         "itr_form_type": "ITR-1", "extraction_confidence": 0.9, "extraction_notes": []},
+    ])
+    assert merged["applicant_name"] == "Applicant"
+    assert merged["gross_total_income_year1"] == 1_000_000.0
+    assert merged["gross_total_income_year2"] == 800_000.0
+    assert merged["income_growth_rate"] == 25.0
+    assert merged["extraction_confidence"] == 0.9
+    assert merged["extraction_notes"][0] == "year 2 only"
+    itr = validate_answer(ITRData, merged)
+    assert itr.average_annual_income == 900_000.0
+    assert itr.average_monthly_income == 75_000.0
+    assert itr.income_growth_rate == 25.0
+
+
+def test_streamed_batches_go_out_before_the_last_page():
+    budget = BatchBudget(prompt_tokens=500, output_tokens_fixed=512, output_tokens_per_page=1400)
+    pulled = []
+
+    def rendered():
+        for page in pages(11):
+            pulled.append(page.page_number)
+            yield page
+
+    stream = iter_batches(rendered(), LIMITS, budget)
+    assert [p.page_number for p in next(stream)] == [1, 2, 3, 4, 5]
+    # Only the page that did not fit was rendered ahead
+    assert pulled == [1, 2, 3, 4, 5, 6]
+    # Packed greedily: the last batch takes what is left
+    assert [len(b) for b in stream] == [5, 1]
+
+    # A batch at the page cap is released without waiting for the next page
+    pulled.clear()
+    capped = iter_batches(rendered(), LIMITS, BatchBudget(prompt_tokens=100, max_pages=3))
+    assert len(next(capped)) == 3 and pulled == [1, 2, 3]
@@ -0,0 +1,61 @@
+"""
+DateParser must agree with the strptime format loop it replaces
+"""
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from bank_metrics import DATE_FORMATS, _parse_date
+from date_parser import DateParser, compile_format, strptime_date
+from processors.bank_text_extractor import ROW_DATE_FORMATS
+
+AWKWARD = [
+    "", "   ", "31/02/2024", "29/02/2024", "29/02/2023", "N/A", "05-03-2024 ",
+    "5-3-2024", "2024-3-5", "2024-03- 5", "05 mar   2024", "05 MAR 2024", "05-Sept-2024",
+    "05-Sep-2024", "0000-01-01", "05/03/24", "05-03-2024x", "32-01-2024", "00-01-2024",
+    "05 May 2024", "05 May 24", "01-13-2024", "٠٥-٠٣-٢٠٢٤", "05\t-03-2024",
+]
+
+
+def random_dates(n, formats, seed):
+    rng = random.Random(seed)
+    start = date(1995, 1, 1)
+    return [(start + timedelta(days=rng.randrange(15_000))).strftime(rng.choice(formats))
+            for _ in range(n)]
+
+
+@pytest.mark.parametrize("formats", [DATE_FORMATS, ROW_DATE_FORMATS])
+@pytest.mark.parametrize("primary", [None, *DATE_FORMATS, "%d %B %Y"])
+def test_matches_strptime(formats, primary):
+    parser = DateParser(formats, primary=primary)
+    for s in AWKWARD + random_dates(500, formats, seed=len(formats)):
+        assert parser.parse(s) == strptime_date(s.strip(), formats), s
+
+
+def test_bank_metrics_reference_agrees():
+    samples = AWKWARD + random_dates(300, DATE_FORMATS, seed=1)
+    parser = DateParser.sniff(DATE_FORMATS, samples)
+    assert [parser(s) for s in samples] == [_parse_date(s) for s in samples]
+
+
+def test_sniff_picks_dominant_format():
+    samples = ["01 Apr 2024", "bad", "02-04-2024"] + ["03 Apr 2024"] * 10
+    parser = DateParser.sniff(DATE_FORMATS, samples)
+    assert parser.primary == "%d %b %Y"
+    assert DateParser.sniff(DATE_FORMATS, ["", "junk"]).primary is None
+
+
+def test_memoises_and_counts_fallbacks():
+    parser = DateParser.sniff(DATE_FORMATS, ["05-03-2024"])
+    assert parser("05-03-2024") == date(2024, 3, 5)
+    assert parser("junk") is None
+    assert parser("junk") is None
+    assert parser.fallbacks == 1
+
+
+def test_unsupported_directive_falls_back_to_strptime():
+    assert compile_format("%d-%m-%Y %H:%M") is None
+    parser = DateParser(["%d-%m-%Y %H:%M", "%d-%m-%Y"])
+    assert parser("05-03-2024 10:30") == date(2024, 3, 5)
+    assert parser("05-03-2024") == date(2024, 3, 5)
@@ -0,0 +1,205 @@
+"""
+Request deadlines: propagation to LLM calls and retries, partial results
+"""
+import asyncio
+import math
+import threading
+import time
+from types import SimpleNamespace
+
+import fitz
+import pytest
+from fastapi import HTTPException
+
+from app import request_deadline
+from chains.base_chain import BaseChain
+from chains.llm_pool import RateLimiter, llm_pool
+from config import Config
+from deadline import (Deadline, DeadlineExpired, check_deadline, current_deadline,
+                      deadline_scope, in_context)
+from main import LoanApprovalEngine
+
+
+class RecordingLLM:
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.timeouts = []
+
+    def invoke(self, messages, timeout=None):
+        self.timeouts.append(timeout)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return SimpleNamespace(content=outcome, usage_metadata=None)
+
+
+@pytest.fixture
+def chain(monkeypatch):
+    monkeypatch.setattr(BaseChain.invoke_with_retry.retry, "sleep", lambda s: None)
+    monkeypatch.setattr(Config, "LLM_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(Config, "LLM_RETRY_BUDGET_SECONDS", 120.0)
+    # A 429 here must not pause the process-wide limiter for other tests
+    monkeypatch.setattr(llm_pool, "limiter", RateLimiter())
+    return BaseChain(model_name="gemini-1.5-flash")
+
+
+def use(monkeypatch, llm):
+    monkeypatch.setattr(BaseChain, "llm", property(lambda self: llm))
+    return llm
+
+
+def test_deadline_budgets():
+    assert Deadline.after(None).remaining() == math.inf
+    assert Deadline.after(0).timeout() is None
+
+    deadline = Deadline.after(10)
+    assert 9 < deadline.remaining() <= 10
+    assert deadline.cap(120) <= 10
+    assert deadline.cap(3) == 3
+    assert deadline.stage("extraction", reserve=4).remaining() == pytest.approx(6, abs=0.1)
+
+    expired = Deadline(time.monotonic() - 1)
+    assert expired.expired and expired.cap(120) > 0
+    with pytest.raises(DeadlineExpired, match="rendering"):
+        expired.check("rendering")
+
+
+def test_deadline_follows_context_into_pool_threads():
+    seen = []
+    with deadline_scope(Deadline.after(5, "outer")):
+        runner = in_context(lambda: seen.append(current_deadline().name))
+    assert not current_deadline().bounded
+
+    thread = threading.Thread(target=runner)
+    thread.start()
+    thread.join()
+    assert seen == ["outer"]
+
+
+def test_llm_timeout_is_capped_at_the_deadline(chain, monkeypatch):
+    llm = use(monkeypatch, RecordingLLM("{}"))
+    with deadline_scope(Deadline.after(2)):
+        chain.invoke_with_retry(["hi"])
+    assert llm.timeouts[0] <= 2
+
+    llm.outcomes.append("{}")
+    chain.invoke_with_retry(["hi"])
+    assert llm.timeouts[1] == Config.TIMEOUT
+
+
+def test_expired_deadline_skips_the_call(chain, monkeypatch):
+    llm = use(monkeypatch, RecordingLLM("{}"))
+    with deadline_scope(Deadline(time.monotonic() - 1)):
+        with pytest.raises(DeadlineExpired):
+            chain.invoke_with_retry(["hi"])
+    assert llm.timeouts == []
+    assert chain.retry_stats.deadline_expired == 1
+    assert chain.retry_stats.failed_fast == 0
+
+
+def test_retry_is_not_scheduled_past_the_deadline(chain, monkeypatch):
+    # The server asks for a 30s wait; only 5s remain
+    llm = use(monkeypatch, RecordingLLM(RuntimeError("RESOURCE_EXHAUSTED, retry in 30s"), "{}"))
+    with deadline_scope(Deadline.after(5)):
+        with pytest.raises(DeadlineExpired, match="LLM retry"):
+            chain.invoke_with_retry(["hi"])
+    assert len(llm.timeouts) == 1
+    assert chain.retry_stats.as_dict()["deadline_expired"] == 1
+
+
+def test_rate_limit_wait_past_the_deadline_is_refused():
+    limiter = RateLimiter(requests_per_minute=1)
+    limiter.acquire(["first"])
+    with deadline_scope(Deadline.after(5)):
+        with pytest.raises(DeadlineExpired, match="rate limit"):
+            limiter.acquire(["second"])
+    # The refused reservation was given back
+    assert limiter.reserve(0) == pytest.approx(60, abs=1)
+
+
+@pytest.fixture
+def pdf(tmp_path):
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "statement")
+    path = tmp_path / "doc.pdf"
+    doc.save(path)
+    return str(path)
+
+
+@pytest.fixture
+def engine(monkeypatch, tmp_path):
+    monkeypatch.setattr(Config, "RESULTS_DIR", tmp_path)
+    monkeypatch.setattr(Config, "DEADLINE_RESERVE_SECONDS", 0.0)
+    monkeypatch.setattr("main.EXTRACTION_GRACE_SECONDS", 0.1)
+    return LoanApprovalEngine()
+
+
+def test_sync_pipeline_returns_partial_result_at_deadline(engine, pdf, monkeypatch):
+    release = threading.Event()
+    seen = {}
+
+    def stuck_salary(*args, **kwargs):
+        seen["salary"] = current_deadline().bounded
+        release.wait(5)
+        check_deadline("salary extraction")
+
+    monkeypatch.setattr(engine.itr_chain, "process", lambda *a, **k: None)
+    monkeypatch.setattr(engine.bank_chain, "process", lambda *a, **k: None)
+    monkeypatch.setattr(engine.salary_chain, "process", stuck_salary)
+
+    start = time.perf_counter()
+    result = engine.process_loan_application(pdf, pdf, pdf, deadline=Deadline.after(0.3))
+    elapsed = time.perf_counter() - start
+    release.set()
+
+    assert elapsed < 2
+    assert seen["salary"]
+    assert result.status == "partial"
+    assert result.timed_out_stages == ["salary"]
+    assert any("deadline" in e for e in result.errors)
+
+
+@pytest.mark.asyncio
+async def test_async_pipeline_cancels_extractions_at_deadline(engine, pdf, monkeypatch):
+    cancelled = asyncio.Event()
+
+    async def quick(*args, **kwargs):
+        return None
+
+    async def stuck(*args, **kwargs):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    async def expired(*args, **kwargs):
+        await asyncio.sleep(0.05)
+        check_deadline("salary extraction")
+
+    monkeypatch.setattr(engine.itr_chain, "aprocess", quick)
+    monkeypatch.setattr(engine.bank_chain, "aprocess", stuck)
+    monkeypatch.setattr(engine.salary_chain, "aprocess", expired)
+
+    start = time.perf_counter()
+    result = await engine.aprocess_loan_application(pdf, pdf, pdf, deadline=Deadline.after(0.01))
+    assert time.perf_counter() - start < 2
+    assert cancelled.is_set()
+    assert result.status == "partial"
+    assert sorted(result.timed_out_stages) == ["bank", "salary"]
+
+
+def test_request_deadline_from_client(monkeypatch):
+    monkeypatch.setattr(Config, "REQUEST_DEADLINE_SECONDS", 60.0)
+    assert request_deadline(None, None).remaining() == pytest.approx(60, abs=1)
+    assert request_deadline("10", 20.0).remaining() == pytest.approx(10, abs=1)
+    # A client cannot extend the server's deadline
+    assert request_deadline("600", None).remaining() == pytest.approx(60, abs=1)
+
+    with pytest.raises(HTTPException):
+        request_deadline("soon", None)
+    with pytest.raises(HTTPException):
+        request_deadline(None, 0)
+
+    monkeypatch.setattr(Config, "REQUEST_DEADLINE_SECONDS", 0.0)
+    assert not request_deadline(None, None).bounded
@@ -0,0 +1,113 @@
+"""
+Async LoanApprovalEngine path - analyses share one event loop without blocking it
+"""
+import asyncio
+import threading
+import time
+
+import fitz
+import pytest
+
+from config import Config
+from main import LoanApprovalEngine
+from scheduler import Scheduler
+
+LLM_LATENCY = 0.3
+
+
+@pytest.fixture
+def engine(monkeypatch, tmp_path):
+    monkeypatch.setattr(Config, "RESULTS_DIR", tmp_path)
+    engine = LoanApprovalEngine()
+
+    async def slow_extract(*args, **kwargs):
+        await asyncio.sleep(LLM_LATENCY)
+        return None
+
+    for chain in (engine.itr_chain, engine.bank_chain, engine.salary_chain):
+        monkeypatch.setattr(chain, "aprocess", slow_extract)
+    return engine
+
+
+@pytest.fixture
+def pdf(tmp_path):
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "statement")
+    path = tmp_path / "doc.pdf"
+    doc.save(path)
+    return str(path)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_analyses_do_not_block_loop(engine, pdf):
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    tick_task = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    results = await asyncio.gather(*(
+        engine.aprocess_loan_application(pdf, pdf, pdf) for _ in range(5)))
+    elapsed = time.perf_counter() - start
+    tick_task.cancel()
+
+    # Five analyses x three chains overlap instead of running back to back
+    assert elapsed < 3 * LLM_LATENCY
+    assert ticks > 10
+    assert len({r.session_id for r in results}) == 5
+    assert all(r.missing_data for r in results)
+
+
+@pytest.mark.asyncio
+async def test_invalid_pdf_returns_failed_result(engine, pdf, tmp_path):
+    missing = tmp_path / "missing.pdf"
+    result = await engine.aprocess_loan_application(pdf, str(missing), pdf)
+    assert result.status == "failed"
+    assert "Bank Statement" in result.errors[0]
+
+
+@pytest.mark.asyncio
+async def test_full_cpu_queue_does_not_discard_extractions(engine, pdf, monkeypatch):
+    pools = Scheduler(cpu_workers=1, io_workers=1, max_queue=1, max_analyses=0)
+    monkeypatch.setattr("main.scheduler", pools)
+    release = threading.Event()
+
+    async def extract_then_fill_cpu_pool(*args, **kwargs):
+        if not pools.cpu.saturated:
+            pools.cpu.submit(release.wait, 5)
+            pools.cpu.submit(lambda: None)
+        return None
+
+    for chain in (engine.itr_chain, engine.bank_chain, engine.salary_chain):
+        monkeypatch.setattr(chain, "aprocess", extract_then_fill_cpu_pool)
+
+    asyncio.get_running_loop().call_later(0.1, release.set)
+    result = await engine.aprocess_loan_application(pdf, pdf, pdf)
+    assert result.status != "failed"
+    assert pools.cpu.stats()["rejected"] == 0
+
+
+def test_sync_engine_reports_progress(engine, pdf, monkeypatch):
+    calls = {}
+
+    def extract(stage):
+        def process(*args, **kwargs):
+            calls[stage] = kwargs
+            return None
+        return process
+
+    for stage in ("itr", "bank", "salary"):
+        monkeypatch.setattr(getattr(engine, f"{stage}_chain"), "process", extract(stage))
+
+    events = []
+    result = engine.process_loan_application(
+        pdf, pdf, pdf, progress=lambda stage, status, message="", **detail: events.append((stage, status)))
+
+    assert not any("extraction failed" in e for e in result.errors)
+    assert calls["bank"]["progress"] is not None
+    for stage in ("itr", "bank", "salary"):
+        assert (stage, "running") in events and (stage, "done") in events
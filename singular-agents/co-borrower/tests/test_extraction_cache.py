@@ -0,0 +1,88 @@
+"""
+Unit tests for the extraction cache
+"""
+import os
+import time
+
+import pytest
+
+from extraction_cache import ExtractionCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ExtractionCache(tmp_path, ttl_seconds=60, max_size_bytes=10_000, max_entries=3)
+
+
+def test_key_depends_on_every_component():
+    base = ExtractionCache.make_key("bank", ["abc"], "prompt", "model", 200)
+    assert base == ExtractionCache.make_key("bank", ["abc"], "prompt", "model", 200)
+    assert base != ExtractionCache.make_key("itr", ["abc"], "prompt", "model", 200)
+    assert base != ExtractionCache.make_key("bank", ["abd"], "prompt", "model", 200)
+    assert base != ExtractionCache.make_key("bank", ["abc"], "prompt2", "model", 200)
+    assert base != ExtractionCache.make_key("bank", ["abc"], "prompt", "model2", 200)
+    assert base != ExtractionCache.make_key("bank", ["abc"], "prompt", "model", 300)
+    assert base != ExtractionCache.make_key("bank", ["abc"], "prompt", "model", 200, "target:grey")
+
+
+def test_key_for_files_hashes_content(tmp_path, cache):
+    a = tmp_path / "a.pdf"
+    b = tmp_path / "b.pdf"
+    a.write_bytes(b"%PDF-1.4 same")
+    b.write_bytes(b"%PDF-1.4 same")
+    assert cache.key_for_files("itr", [a], "p", "m", 200) == \
+        cache.key_for_files("itr", [b], "p", "m", 200)
+    b.write_bytes(b"%PDF-1.4 different")
+    assert cache.key_for_files("itr", [a], "p", "m", 200) != \
+        cache.key_for_files("itr", [b], "p", "m", 200)
+
+
+def test_hit_and_miss_counters(cache):
+    assert cache.get("k1") is None
+    cache.put("k1", {"value": 1})
+    assert cache.get("k1") == {"value": 1}
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["entries"] == 1
+
+
+def test_ttl_expiry(tmp_path):
+    cache = ExtractionCache(tmp_path, ttl_seconds=0)
+    cache.put("k", {"value": 1})
+    time.sleep(0.01)
+    assert cache.get("k") is None
+    assert not (tmp_path / "k.json").exists()
+
+
+def test_lru_eviction_by_entry_count(cache, tmp_path):
+    for i, key in enumerate(["a", "b", "c"]):
+        cache.put(key, {"i": i})
+        past = time.time() - 10 + i
+        os.utime(tmp_path / f"{key}.json", (past, past))
+
+    # Touch "a" so "b" becomes least recently used
+    assert cache.get("a") == {"i": 0}
+    cache.put("d", {"i": 3})
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("d") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_eviction_by_size(tmp_path):
+    cache = ExtractionCache(tmp_path, max_size_bytes=300, max_entries=100)
+    cache.put("old", {"blob": "x" * 200})
+    past = time.time() - 10
+    os.utime(tmp_path / "old.json", (past, past))
+    cache.put("new", {"blob": "y" * 200})
+    assert cache.get("old") is None
+    assert cache.get("new") == {"blob": "y" * 200}
+
+
+def test_disabled_cache_is_inert(tmp_path):
+    cache = ExtractionCache(tmp_path, enabled=False)
+    cache.put("k", {"value": 1})
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
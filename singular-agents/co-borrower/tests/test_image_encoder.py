@@ -0,0 +1,109 @@
+"""
+Byte-budgeted page image encoding
+"""
+import io
+import random
+
+import pytest
+from PIL import Image, ImageDraw, features
+
+from processors.image_encoder import (
+    KIND_BITONAL, KIND_COLOUR, KIND_GREY, ImageEncoder, classify, image_tokens,
+)
+from processors.pdf_processor import PDFProcessor
+
+
+def text_page():
+    image = Image.new("RGB", (1086, 1536), "white")
+    draw = ImageDraw.Draw(image)
+    for y in range(40, 1500, 24):
+        draw.text((40, y), "01-04-2024  NEFT SALARY ACME LTD  85,000.00  1,52,340.55", fill="black")
+    return image
+
+
+def photo(mode="RGB", size=(800, 800), seed=7):
+    """Noisy gradient: incompressible enough to exercise the quality search"""
+    rng = random.Random(seed)
+    image = Image.new("RGB", size)
+    image.putdata([(x % 256, (x * y) % 256, rng.randrange(256))
+                   for y in range(size[1]) for x in range(size[0])])
+    return image.convert(mode)
+
+
+def test_classify_pages():
+    assert classify(text_page()) == KIND_BITONAL
+    assert classify(photo("L").convert("RGB")) == KIND_GREY
+    assert classify(photo()) == KIND_COLOUR
+
+
+def test_text_page_becomes_palette_png():
+    page = text_page()
+    encoded = ImageEncoder().encode(page)
+    assert encoded.kind == KIND_BITONAL
+    assert encoded.mime_type == "image/png" and encoded.quality is None
+    assert Image.open(io.BytesIO(encoded.data)).mode == "P"
+    assert len(encoded.data) < len(ImageEncoder(auto=False).encode(page).data)
+
+
+def test_colourless_page_is_encoded_in_grey():
+    encoded = ImageEncoder().encode(photo("L").convert("RGB"))
+    assert encoded.kind == KIND_GREY
+    assert Image.open(io.BytesIO(encoded.data)).mode == "L"
+
+
+def test_quality_search_picks_highest_quality_that_fits():
+    image = photo()
+    full = len(ImageEncoder(auto=False).encode(image).data)
+    encoder = ImageEncoder(max_bytes=full // 2, auto=False)
+    encoded = encoder.encode(image)
+
+    assert len(encoded.data) <= full // 2
+    assert (encoded.width, encoded.height) == image.size
+    assert encoder.min_quality <= encoded.quality < 85
+    assert len(encoder._save(image, encoded.quality + 1)) > full // 2
+
+
+def test_page_too_big_at_min_quality_is_downscaled():
+    image = photo()
+    encoded = ImageEncoder(max_bytes=20_000, auto=False).encode(image)
+    assert len(encoded.data) <= 20_000
+    assert encoded.width < image.width
+
+
+def test_token_budget_downscales():
+    encoded = ImageEncoder(max_tokens=2 * 258).encode(text_page())
+    assert image_tokens(encoded.width, encoded.height) <= 2 * 258
+    assert encoded.width < 1086
+
+
+@pytest.mark.skipif(not features.check("webp"), reason="Pillow without WebP")
+def test_webp_format():
+    encoded = ImageEncoder(lossy_format="webp").encode(photo())
+    assert encoded.mime_type == "image/webp"
+    assert Image.open(io.BytesIO(encoded.data)).format == "WEBP"
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        ImageEncoder(lossy_format="gif")
+
+
+def test_payloads_carry_the_encoder_mime_type(tmp_path):
+    import fitz
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "Opening balance 1,52,340.55")
+    path = tmp_path / "statement.pdf"
+    doc.save(path)
+
+    [page] = PDFProcessor.process_pdf_for_gemini(str(path), max_pages=1, render_mode="target",
+                                                 encoder=ImageEncoder())
+    assert page.mime_type == "image/png"
+    assert page.data_url().startswith("data:image/png;base64,")
+
+
+def test_settings_tell_encoders_apart():
+    settings = {ImageEncoder().settings, ImageEncoder(auto=False).settings,
+                ImageEncoder(lossy_format="webp").settings, ImageEncoder(max_bytes=60_000).settings,
+                ImageEncoder(max_tokens=516).settings}
+    assert len(settings) == 5
+    assert ImageEncoder().settings == ImageEncoder().settings
@@ -0,0 +1,268 @@
+"""
+Background job store and /api/jobs endpoints
+"""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+import fitz
+import pytest
+
+from config import Config
+from jobs import JobManager, JobStatus, JobStoreFull, MemoryJobStore, SQLiteJobStore
+from schemas import LoanApplicationAnalysis
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    def make(**kwargs):
+        if request.param == "sqlite":
+            return SQLiteJobStore(tmp_path / "jobs.sqlite3", **kwargs)
+        return MemoryJobStore(**kwargs)
+    return make
+
+
+def test_lifecycle_and_events(make_store):
+    store = make_store()
+    job = store.create()
+    assert store.get(job.job_id).status == JobStatus.QUEUED
+
+    store.add_event(job.job_id, {"stage": "bank", "status": "progress", "current": 1, "total": 2})
+    store.add_event(job.job_id, {"stage": "bank", "status": "progress", "current": 2, "total": 2})
+    store.set_status(job.job_id, JobStatus.COMPLETED, result={"status": "success"})
+
+    got = store.get(job.job_id)
+    assert got.status == JobStatus.COMPLETED
+    assert got.result == {"status": "success"}
+    assert [e["seq"] for e in got.events] == [1, 2]
+    assert got.summary()["stages"]["bank"]["current"] == 2
+    assert [e["seq"] for e in store.events_since(job.job_id, 1)] == [2]
+    assert store.get("missing") is None
+
+
+def test_capacity_evicts_finished_then_rejects(make_store):
+    store = make_store(max_jobs=2)
+    first = store.create()
+    store.set_status(first.job_id, JobStatus.COMPLETED, result={})
+    store.create()
+    store.create()  # evicts the finished job
+    assert store.get(first.job_id) is None
+    with pytest.raises(JobStoreFull):
+        store.create()
+
+
+def test_finished_jobs_expire(make_store):
+    store = make_store(ttl_seconds=0)
+    running = store.create()
+    done = store.create()
+    store.set_status(done.job_id, JobStatus.FAILED, error="boom")
+    time.sleep(0.01)
+    assert store.get(done.job_id) is None
+    assert store.get(running.job_id) is not None
+
+
+@pytest.mark.asyncio
+async def test_manager_wakes_waiters_from_threads():
+    manager = JobManager(MemoryJobStore(), poll_interval=5)
+    job = manager.create()
+    callback = manager.progress_callback(job.job_id)
+
+    threading.Timer(0.05, callback, args=("itr", "done")).start()
+    start = time.perf_counter()
+    events = await manager.wait(job.job_id, 0)
+    assert time.perf_counter() - start < 1
+    assert events[0]["stage"] == "itr"
+
+
+class LoopCheckingStore(MemoryJobStore):
+    """Records whether each store call ran on the event loop thread"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls_on_loop = []
+
+    def _check(self):
+        try:
+            asyncio.get_running_loop()
+            self.calls_on_loop.append(True)
+        except RuntimeError:
+            self.calls_on_loop.append(False)
+
+    def create(self):
+        self._check()
+        return super().create()
+
+    def get(self, job_id):
+        self._check()
+        return super().get(job_id)
+
+    def events_since(self, job_id, seq):
+        self._check()
+        return super().events_since(job_id, seq)
+
+    def add_event(self, job_id, event):
+        self._check()
+        return super().add_event(job_id, event)
+
+    def set_status(self, job_id, status, **kwargs):
+        self._check()
+        return super().set_status(job_id, status, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_manager_keeps_store_calls_off_the_loop():
+    store = LoopCheckingStore()
+    manager = JobManager(store, poll_interval=0.05)
+    job = await manager.acreate()
+    manager.report(job.job_id, "itr", "done")
+    await manager.aset_status(job.job_id, JobStatus.COMPLETED, result={})
+
+    assert (await manager.aget(job.job_id)).finished
+    events = await manager.wait(job.job_id, 0)
+    assert [(e["stage"], e["status"]) for e in events] == [("itr", "done"), ("job", "completed")]
+    assert store.calls_on_loop and not any(store.calls_on_loop)
+
+
+@pytest.mark.parametrize("workers, store", [("1", "memory"), ("2", "sqlite")])
+def test_job_store_default_follows_worker_count(workers, store):
+    env = {k: v for k, v in os.environ.items() if k != "JOB_STORE"}
+    env["API_WORKERS"] = workers
+    out = subprocess.run([sys.executable, "-c", "from config import Config; print(Config.JOB_STORE)"],
+                         cwd=Config.BASE_DIR, env=env, capture_output=True, text=True, check=True)
+    assert out.stdout.split()[-1] == store
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    from fastapi.testclient import TestClient
+    import app as app_module
+
+    monkeypatch.setattr(app_module.Config, "RESULTS_DIR", tmp_path)
+    monkeypatch.setattr(app_module, "job_manager",
+                        JobManager(MemoryJobStore(max_jobs=1), poll_interval=0.05))
+
+    class FakeEngine:
+        async def aprocess_loan_application(self, bypass_cache=False, progress=None, **documents):
+            progress = progress or (lambda *args, **kwargs: None)
+            for stage in ("validation", "itr", "salary"):
+                progress(stage, "done")
+            for i in (1, 2):
+                await asyncio.sleep(0.05)
+                progress("bank", "progress", f"Batch {i}/2 finished", current=i, total=2)
+            return LoanApplicationAnalysis(
+                session_id="s", timestamp=datetime.now(), overall_confidence=0.9,
+                data_sources_used=[], missing_data=[], processing_time_seconds=0.1,
+                status="success", errors=[])
+
+    with TestClient(app_module.app) as client:
+        monkeypatch.setattr(app_module, "engine", FakeEngine())
+        yield client
+
+
+def pdf_bytes():
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "document")
+    return doc.tobytes()
+
+
+def test_submit_stream_and_fetch_result(client):
+    pdf = pdf_bytes()
+    files = {name: (f"{name}.pdf", pdf) for name in
+             ("salary_slips_pdf", "bank_statement_pdf", "itr_pdf_1")}
+    resp = client.post("/api/jobs", files=files)
+    assert resp.status_code == 202
+    job_id = resp.json()["job_id"]
+
+    # Only one slot and it is still running
+    assert client.post("/api/jobs", files=files).status_code == 429
+
+    with client.stream("GET", f"/api/jobs/{job_id}/events") as stream:
+        body = "".join(stream.iter_text())
+    events = [json.loads(line[len("data: "):]) for line in body.splitlines()
+              if line.startswith("data: ")]
+    stages = [(e["stage"], e["status"]) for e in events]
+    assert ("bank", "progress") in stages
+    assert [e["current"] for e in events if e["stage"] == "bank"] == [1, 2]
+    assert stages[-1] == ("job", "completed")
+
+    result = client.get(f"/api/jobs/{job_id}/result")
+    assert result.status_code == 200
+    assert result.json()["job_id"] == job_id
+    assert result.json()["quality"]["overall_confidence"] == 90.0
+
+    # Resume after the last event: nothing left to send
+    with client.stream("GET", f"/api/jobs/{job_id}/events",
+                       headers={"Last-Event-ID": str(events[-1]["seq"])}) as stream:
+        assert "data:" not in "".join(stream.iter_text())
+
+    assert client.get("/api/jobs/unknown").status_code == 404
+
+
+def test_failed_upload_frees_job_and_admission(client, monkeypatch):
+    import app as app_module
+
+    files = {name: (f"{name}.pdf", pdf_bytes()) for name in
+             ("salary_slips_pdf", "bank_statement_pdf", "itr_pdf_1")}
+    receive = app_module.receive_documents
+
+    async def disk_full(*args, **kwargs):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(app_module, "receive_documents", disk_full)
+    resp = client.post("/api/jobs", files=files)
+    assert resp.status_code == 500
+    failed = client.get(f"/api/jobs/{resp.json()['job_id']}").json()
+    assert failed["status"] == JobStatus.FAILED.value
+    assert app_module.scheduler.stats()["analyses"]["active"] == 0
+
+    # The only job slot is free again
+    monkeypatch.setattr(app_module, "receive_documents", receive)
+    assert client.post("/api/jobs", files=files).status_code == 202
+
+
+def test_unsaved_result_still_completes(client, monkeypatch):
+    import app as app_module
+
+    def disk_full(*args, **kwargs):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(app_module, "save_json", disk_full)
+    files = {name: (f"{name}.pdf", pdf_bytes()) for name in
+             ("salary_slips_pdf", "bank_statement_pdf", "itr_pdf_1")}
+
+    analysis = client.post("/api/analyze", files=files)
+    assert analysis.status_code == 200
+    assert analysis.json()["quality"]["overall_confidence"] == 90.0
+
+    job_id = client.post("/api/jobs", files=files).json()["job_id"]
+    with client.stream("GET", f"/api/jobs/{job_id}/events") as stream:
+        assert '"completed"' in "".join(stream.iter_text())
+    assert client.get(f"/api/jobs/{job_id}/result").status_code == 200
+
+
+def test_disk_uploads_are_saved_off_the_event_loop(client, monkeypatch, tmp_path):
+    import app as app_module
+
+    monkeypatch.setattr(app_module.Config, "ZERO_DISK_UPLOADS", False)
+    monkeypatch.setattr(app_module.Config, "UPLOAD_DIR", tmp_path)
+    on_loop = []
+    save_upload = app_module.save_upload
+
+    def tracked_save(*args):
+        try:
+            on_loop.append(asyncio.get_running_loop() is not None)
+        except RuntimeError:
+            on_loop.append(False)
+        return save_upload(*args)
+
+    monkeypatch.setattr(app_module, "save_upload", tracked_save)
+    files = {name: (f"{name}.pdf", pdf_bytes()) for name in
+             ("salary_slips_pdf", "bank_statement_pdf", "itr_pdf_1")}
+    assert client.post("/api/analyze", files=files).status_code == 200
+    assert on_loop == [False] * 3
+    assert not list(tmp_path.glob("*.pdf"))
@@ -0,0 +1,115 @@
+"""
+Shared Gemini clients, rate limiting and 429 retry hints
+"""
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from chains.bank_chain import BankStatementChain
+from chains.itr_chain import ITRChain
+from chains.llm_pool import (LLMPool, RateLimiter, is_rate_limited, request_tokens,
+                             retry_hint)
+from chains.llm_retry import wait_for_retry_hint
+from config import Config
+from processors.pdf_processor import PagePayload
+
+
+class FakeClientError(Exception):
+    def __init__(self, message, code=429, headers=None):
+        super().__init__(message)
+        self.code = code
+        self.response = SimpleNamespace(headers=headers or {})
+
+
+def rate_limit_error(message, **kw):
+    """A LangChain error wrapping the client error, as the Gemini client raises it"""
+    try:
+        raise RuntimeError("Error calling model (RESOURCE_EXHAUSTED)") from FakeClientError(message, **kw)
+    except RuntimeError as e:
+        return e
+
+
+def test_requests_per_minute():
+    limiter = RateLimiter(requests_per_minute=60)
+    waits = [limiter.reserve(0) for _ in range(62)]
+    assert waits[:60] == [0.0] * 60
+    assert waits[60] == pytest.approx(1.0, abs=0.05)
+    assert waits[61] == pytest.approx(2.0, abs=0.05)
+
+
+def test_tokens_per_minute_settled_with_usage():
+    limiter = RateLimiter(tokens_per_minute=6000)
+    assert limiter.reserve(5000) == 0.0
+    assert limiter.reserve(2000) == pytest.approx(10.0, abs=0.1)
+    limiter.settle(7000, {"input_tokens": 1000})             # over-estimated by 6000
+    assert limiter.reserve(4000) == 0.0
+    limiter.settle(1, None)                                  # no usage: nothing to settle
+
+
+def test_unlimited_by_default():
+    limiter = RateLimiter()
+    assert all(limiter.reserve(10**9) == 0.0 for _ in range(100))
+
+
+def test_rate_limit_pauses_every_caller():
+    limiter = RateLimiter()
+    limiter.on_error(ValueError("bad request"))
+    assert limiter.reserve(1) == 0.0
+    limiter.on_error(rate_limit_error("Quota exceeded. Please retry in 7.5s."))
+    assert limiter.reserve(1) == pytest.approx(7.5, abs=0.1)
+    assert limiter.rate_limited == 1
+
+
+def test_retry_hints():
+    assert retry_hint(rate_limit_error("x", headers={"retry-after": "12"})) == 12.0
+    assert retry_hint(FakeClientError("{'@type': 'RetryInfo', 'retryDelay': '17s'}")) == 17.0
+    assert retry_hint(FakeClientError("no hint")) is None
+    assert is_rate_limited(rate_limit_error("x"))
+    assert is_rate_limited(FakeClientError("x"))
+    assert not is_rate_limited(FakeClientError("x", code=500))
+
+
+def test_tenacity_wait_uses_hint():
+    wait = wait_for_retry_hint(lambda state: 4.0)
+
+    def state(exc):
+        return SimpleNamespace(outcome=SimpleNamespace(exception=lambda: exc))
+
+    assert wait(state(FakeClientError("retry in 3s"))) == 3.0
+    assert wait(state(FakeClientError("retry in 900s"))) == 60.0
+    assert wait(state(FakeClientError("retry in 3s", code=500))) == 4.0
+    assert wait(state(FakeClientError("quota"))) == 4.0
+
+
+def test_request_tokens():
+    messages = BankStatementChain().create_gemini_content(
+        "x" * 400, [PagePayload(1, b"img")] * 2)
+    assert request_tokens(messages) == 100 + 2 * 258 * 4
+
+
+def test_chains_share_clients():
+    bank, itr = BankStatementChain(), ITRChain()
+    assert bank.llm.bound is itr.llm.bound
+    assert bank.llm.kwargs["response_schema"] != itr.llm.kwargs["response_schema"]
+
+
+def test_pool_rebuilt_in_another_process(monkeypatch):
+    monkeypatch.setattr(Config, "GEMINI_RPM", 10.0)
+    pool = LLMPool()
+    client = pool.client("gemini-1.5-flash", 0.0, 1024)
+    limiter = pool.limiter
+    assert pool.client("gemini-1.5-flash", 0.0, 1024) is client
+    assert pool.client("gemini-1.5-flash", 0.5, 1024) is not client
+
+    pool._pid = os.getpid() + 1                              # as if inherited over fork
+    assert pool.client("gemini-1.5-flash", 0.0, 1024) is not client
+    assert pool.limiter is not limiter
+
+
+def test_process_share_of_quota(monkeypatch):
+    monkeypatch.setattr(Config, "GEMINI_RPM", 120.0)
+    monkeypatch.setattr(Config, "API_WORKERS", 2)
+    limiter = RateLimiter.from_config()
+    waits = [limiter.reserve(0) for _ in range(61)]
+    assert waits[59] == 0.0 and waits[60] > 0
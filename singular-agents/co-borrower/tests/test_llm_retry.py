@@ -0,0 +1,114 @@
+"""
+Classified LLM retries: transient vs permanent errors, budget and stats
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from chains.base_chain import BaseChain
+from chains.llm_pool import llm_pool
+from chains.llm_retry import is_transient
+from config import Config
+
+
+class StatusError(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+class FakeLLM:
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def _next(self):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return SimpleNamespace(content=outcome, usage_metadata=None)
+
+    def invoke(self, messages, **kwargs):
+        return self._next()
+
+    async def ainvoke(self, messages, **kwargs):
+        return self._next()
+
+
+@pytest.fixture
+def chain(monkeypatch):
+    monkeypatch.setattr(BaseChain.invoke_with_retry.retry, "sleep", lambda s: None)
+
+    async def no_sleep(s):
+        return None
+    monkeypatch.setattr(BaseChain.ainvoke_with_retry.retry, "sleep", no_sleep)
+    monkeypatch.setattr(Config, "LLM_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(Config, "LLM_RETRY_BUDGET_SECONDS", 30.0)
+    return BaseChain(model_name="gemini-1.5-flash")
+
+
+def use(monkeypatch, llm):
+    monkeypatch.setattr(BaseChain, "llm", property(lambda self: llm))
+    return llm
+
+
+@pytest.mark.parametrize("exc, transient", [
+    (TimeoutError(), True),
+    (ConnectionResetError(), True),
+    (StatusError(503), True),
+    (StatusError(429), True),
+    (type("ReadTimeout", (Exception,), {})(), True),
+    (StatusError(400), False),
+    (StatusError(401), False),
+    (ValueError("bad schema"), False),
+])
+def test_classification(exc, transient):
+    assert is_transient(exc) is transient
+    wrapped = RuntimeError("wrapped")
+    wrapped.__cause__ = exc
+    assert is_transient(wrapped) is transient
+
+
+def test_transient_error_is_retried(chain, monkeypatch):
+    llm = use(monkeypatch, FakeLLM(TimeoutError(), StatusError(503), "ok"))
+    assert chain.invoke_with_retry([]).content == "ok"
+    assert llm.calls == 3
+    stats = chain.retry_stats.as_dict()
+    assert stats["requests"] == 1 and stats["attempts"] == 3 and stats["retries"] == 2
+    assert stats["retry_seconds"] >= 0 and stats["exhausted"] == 0
+
+
+def test_permanent_error_fails_fast(chain, monkeypatch):
+    llm = use(monkeypatch, FakeLLM(StatusError(400), "never"))
+    with pytest.raises(StatusError):
+        chain.invoke_with_retry([])
+    assert llm.calls == 1
+    assert chain.retry_stats.as_dict()["failed_fast"] == 1
+
+
+def test_attempts_are_bounded(chain, monkeypatch):
+    llm = use(monkeypatch, FakeLLM(*[TimeoutError()] * 5))
+    with pytest.raises(TimeoutError):                      # the original error, not RetryError
+        chain.invoke_with_retry([])
+    assert llm.calls == 3
+    assert chain.retry_stats.as_dict()["exhausted"] == 1
+
+
+def test_retry_budget(chain, monkeypatch):
+    monkeypatch.setattr(Config, "LLM_RETRY_BUDGET_SECONDS", 0.0)
+    llm = use(monkeypatch, FakeLLM(TimeoutError(), "ok"))
+    with pytest.raises(TimeoutError):
+        chain.invoke_with_retry([])
+    assert llm.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_async_retries(chain, monkeypatch):
+    llm = use(monkeypatch, FakeLLM(StatusError(502), "ok"))
+    assert (await chain.ainvoke_with_retry([])).content == "ok"
+    assert llm.calls == 2 and chain.retry_stats.as_dict()["retries"] == 1
+
+
+def test_client_makes_single_attempt():
+    assert llm_pool.client("gemini-1.5-flash", 0.0, 1024).max_retries == 1
@@ -0,0 +1,90 @@
+"""
+Narration classifier tags must equal the individual keyword patterns
+"""
+import random
+import re
+
+import pytest
+
+from narration_classifier import (
+    BOUNCE_KEYWORDS, EMI_KEYWORDS, SALARY_KEYWORDS, TRANSFER_KEYWORDS,
+    NarrationClassifier, NarrationTag, classifier_for, classify_narrations,
+    employer_tokens, normalize_narration,
+)
+
+EMPLOYER = "Achievers Finance Payroll Services Pvt Ltd"
+
+FRAGMENTS = [
+    "SALARY", "salary", "PAYROLL", "SAL", "EMI", "PREMIUM", "NACH", "ach", "ECS", "AUTO",
+    "DEBIT", "INSTAL", "LOAN", "FINANCE", "HOME", "FIN", "PL", "HL", "APPLE", "BOUNCE",
+    "DISHONOUR", "RETURN", "RETURNED", "RTN", "REJECT", "INSUFF", "FUNDS", "BAL", "NEFT",
+    "IMPS", "RTGS", "UPI", "TRANSFER", "TRF", "IFT", "GIFT", "ACHIEVERS", "SERVICES",
+    "/", "-", " ", "  ", "\t", "_", "1234", "X", "é", "ſ", "ﬁnance",
+]
+
+
+def reference_tags(narration, employer_name=None):
+    """The pre-classifier matching rules, one pattern at a time"""
+    nar = normalize_narration(narration)
+    tags = NarrationTag.NONE
+    if SALARY_KEYWORDS.search(nar):
+        tags |= NarrationTag.SALARY
+    if EMI_KEYWORDS.search(narration or ""):
+        tags |= NarrationTag.EMI
+    if any(tok in nar for tok in employer_tokens(employer_name)):
+        tags |= NarrationTag.EMPLOYER
+    if BOUNCE_KEYWORDS.search(nar):
+        tags |= NarrationTag.BOUNCE
+    if TRANSFER_KEYWORDS.search(nar):
+        tags |= NarrationTag.TRANSFER
+    return tags
+
+
+def random_narrations(n, seed):
+    rng = random.Random(seed)
+    return ["".join(rng.choice(FRAGMENTS) for _ in range(rng.randrange(1, 6)))
+            for _ in range(n)]
+
+
+@pytest.mark.parametrize("employer", [None, EMPLOYER])
+def test_matches_individual_patterns(employer):
+    clf = NarrationClassifier(employer)
+    narrations = random_narrations(3000, seed=7) + ["", None]
+    batch = clf.classify_batch(narrations)
+    for nar, bits in zip(narrations, batch):
+        expected = reference_tags(nar, employer)
+        assert clf.classify(nar) == expected, nar
+        assert bits == expected, nar
+
+
+@pytest.mark.parametrize("narration, tags", [
+    ("NEFT SALARY ACME CORP", NarrationTag.SALARY | NarrationTag.TRANSFER),
+    ("NACH DR HDFC LOAN 123", NarrationTag.EMI),
+    ("ECS RETURN INSUFFICIENT FUNDS", NarrationTag.EMI | NarrationTag.BOUNCE),
+    ("CHQ DISHONOURED", NarrationTag.BOUNCE),
+    ("UPI/9876/SWIGGY", NarrationTag.TRANSFER),
+    ("POS 1234 AMAZON", NarrationTag.NONE),
+    ("ﬁnance charges", NarrationTag.NONE),  # upper-cases to FINANCE, raw text has no EMI keyword
+])
+def test_examples(narration, tags):
+    assert classifier_for().classify(narration) == tags
+
+
+def test_employer_tokens_overlapping_keywords():
+    tags = classifier_for(EMPLOYER).classify("NEFT ACHIEVERS FIN")
+    assert tags == NarrationTag.EMI | NarrationTag.EMPLOYER | NarrationTag.TRANSFER
+
+
+def test_classifier_cached_per_employer():
+    assert classifier_for("Acme Corp Ltd") is classifier_for("ACME-CORP")
+    assert classifier_for("Acme Corp Ltd") is not classifier_for(None)
+    assert classify_narrations(["SALARY", "x"]) == [NarrationTag.SALARY, NarrationTag.NONE]
+
+
+def test_prefilter_literals_cover_every_alternative():
+    # Each family's literal must appear in every text its regex can match
+    from narration_classifier import _FAMILIES
+    for _, regex, literals in _FAMILIES:
+        for alternative in re.split(r"\|(?![^(]*\))", regex.pattern):
+            sample = re.sub(r"\\b|\\s\*|\(\?:|\)\??|[?]", "", alternative).replace("U?", "")
+            assert any(lit in sample.upper() for lit in literals), alternative
@@ -0,0 +1,140 @@
+"""
+In-memory PDF sources for the zero-disk upload path
+"""
+import fitz
+import pytest
+
+from extraction_cache import ExtractionCache
+from processors.bank_text_extractor import BankTextExtractor
+from processors.pdf_processor import MAX_IMAGE_SIDE, PDFProcessor
+from processors.pdf_source import PDFSource, PDFValidationError, StreamingPDFReader
+from utils import calculate_file_hash
+
+from test_bank_text_extractor import PAGE_1, PAGE_2, make_statement
+
+
+def read_in_chunks(data: bytes, name: str = "statement.pdf", max_bytes: int = 10 * 1024 * 1024,
+                   chunk: int = 1000) -> PDFSource:
+    reader = StreamingPDFReader(name, max_bytes)
+    for i in range(0, len(data), chunk):
+        reader.feed(data[i:i + chunk])
+    return reader.finish()
+
+
+@pytest.fixture
+def statement(tmp_path):
+    return make_statement(tmp_path / "statement.pdf", [PAGE_1, PAGE_2])
+
+
+def test_streamed_hash_matches_file_hash(statement):
+    with open(statement, "rb") as f:
+        source = read_in_chunks(f.read())
+    assert source.sha256 == calculate_file_hash(statement)
+    assert source == PDFSource.from_bytes("statement.pdf", source.data)
+
+
+def test_cache_key_is_identical_for_path_and_source(statement, tmp_path):
+    with open(statement, "rb") as f:
+        source = read_in_chunks(f.read())
+    cache = ExtractionCache(tmp_path / "cache")
+    key_path = cache.key_for_files("bank", [statement], "prompt", "model", 200)
+    key_mem = cache.key_for_files("bank", [source], "prompt", "model", 200)
+    assert key_path == key_mem
+
+
+@pytest.mark.parametrize("data, message", [
+    (b"", "File is empty"),
+    (b"GIF89a" + b"x" * 5000, "Invalid PDF file format"),
+    (b"%PDF" + b"x" * 5000, "File too large"),
+])
+def test_reader_rejects_bad_uploads(data, message):
+    with pytest.raises(PDFValidationError, match=message):
+        read_in_chunks(data, max_bytes=4096)
+
+
+def test_signature_checked_on_first_chunk():
+    reader = StreamingPDFReader("x.pdf", 10 * 1024 * 1024)
+    with pytest.raises(PDFValidationError):
+        reader.feed(b"<html>")
+
+
+def test_processors_accept_in_memory_source(statement):
+    with open(statement, "rb") as f:
+        source = PDFSource.from_bytes("statement.pdf", f.read())
+
+    from_disk = PDFProcessor.process_pdf_for_gemini(statement, max_pages=2, render_mode="target")
+    from_memory = PDFProcessor.process_pdf_for_gemini(source, max_pages=2, render_mode="target")
+    assert [p.data for p in from_memory] == [p.data for p in from_disk]
+
+    parsed = BankTextExtractor.extract(source)
+    assert parsed.failed_pages == []
+    assert sum(len(p.rows) for p in parsed.pages) == 5
+    assert PDFProcessor.get_pdf_info(source)["total_pages"] == 2
+
+
+def test_parallel_render_from_memory(statement):
+    with fitz.open(statement) as doc:
+        for _ in range(3):
+            doc.insert_pdf(fitz.open(statement))
+        data = doc.tobytes()
+    source = PDFSource.from_bytes("big.pdf", data)
+    pages = PDFProcessor.render_pages(source, max_pages=8, dpi=50, workers=2)
+    assert [i for i, _ in pages] == list(range(8))
+
+
+def test_parallel_render_sends_memory_sources_once(statement, monkeypatch):
+    import pickle
+    from multiprocessing import shared_memory
+    from processors import pdf_processor
+
+    with fitz.open(statement) as doc:
+        for _ in range(7):
+            doc.insert_pdf(fitz.open(statement))
+        data = doc.tobytes()
+    source = PDFSource.from_bytes("big.pdf", data)
+
+    pool = pdf_processor._get_render_pool(2)
+    sent = []
+
+    class RecordingPool:
+        def submit(self, fn, *args):
+            sent.append(args[0])
+            return pool.submit(fn, *args)
+
+    monkeypatch.setattr(pdf_processor, "_get_render_pool", lambda workers: RecordingPool())
+    pages = PDFProcessor.render_pages(source, max_pages=16, dpi=50, workers=2)
+
+    assert [i for i, _ in pages] == list(range(16))
+    assert len(sent) == 4 and len(set(sent)) == 1
+    assert len(pickle.dumps(sent[0])) < 200 < len(data)
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=sent[0].shm_name)
+
+
+def test_concurrent_parallel_renders_share_one_pool(statement):
+    with fitz.open(statement) as doc:
+        for _ in range(19):
+            doc.insert_pdf(fitz.open(statement))
+        data = doc.tobytes()
+    source = PDFSource.from_bytes("big.pdf", data)
+    # Different page counts used to rebuild the pool under a render in flight
+    renders = {n: PDFProcessor.iter_render_pages(source, max_pages=n, dpi=50, workers=6)
+               for n in (40, 5, 7)}
+    out = {n: [] for n in renders}
+    while renders:
+        for n, render in list(renders.items()):
+            page = next(render, None)
+            if page is None:
+                del renders[n]
+            else:
+                out[n].append(page[0])
+    assert out == {n: list(range(n)) for n in (40, 5, 7)}
+
+
+def test_page_payload_keeps_only_encoded_bytes(statement):
+    [page] = PDFProcessor.process_pdf_for_gemini(statement, max_pages=1, render_mode="target")
+    assert not hasattr(page, "__dict__") and not hasattr(page, "image")
+    assert page.data[:2] == b"\xff\xd8"  # JPEG
+    assert max(page.size) == MAX_IMAGE_SIDE
+    assert page.base64_length == len(page.base64)
+    assert page.data_url() == f"data:image/jpeg;base64,{page.base64}"
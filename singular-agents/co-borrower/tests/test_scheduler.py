@@ -0,0 +1,139 @@
+"""
+Shared work pools: bounded queues, context propagation, admission control
+"""
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from deadline import Deadline, current_deadline, deadline_scope
+from scheduler import Overloaded, Scheduler, WorkPool
+
+
+def test_full_queue_rejects_work():
+    pool = WorkPool("test", workers=1, max_queue=1)
+    release = threading.Event()
+    running = pool.submit(release.wait, 5)
+    waiting = pool.submit(lambda: "done")
+
+    with pytest.raises(Overloaded) as info:
+        pool.submit(lambda: None)
+    assert info.value.status_code == 503
+    assert pool.saturated
+
+    release.set()
+    assert running.result(timeout=5) and waiting.result(timeout=5) == "done"
+    stats = pool.stats()
+    assert stats["rejected"] == 1
+    assert stats["completed"] == 2
+    assert stats["queued"] == stats["running"] == 0
+    assert stats["queue_wait"]["count"] == 2
+    assert stats["queue_wait"]["max_seconds"] > 0
+
+
+@pytest.mark.asyncio
+async def test_admitted_work_runs_past_a_full_queue():
+    pool = WorkPool("test", workers=1, max_queue=1)
+    release = threading.Event()
+    running = pool.submit(release.wait, 5)
+    waiting = pool.submit(lambda: "queued")
+    with pytest.raises(Overloaded):
+        pool.submit(lambda: None)
+
+    finishing = asyncio.ensure_future(pool.run_admitted(lambda: "saved"))
+    await asyncio.sleep(0.05)
+    assert not finishing.done()
+    release.set()
+    assert await finishing == "saved"
+    assert running.result(timeout=5) and waiting.result(timeout=5) == "queued"
+    assert pool.stats()["rejected"] == 1
+
+
+def test_cancelled_work_leaves_the_queue():
+    pool = WorkPool("test", workers=1, max_queue=2)
+    release = threading.Event()
+    running = pool.submit(release.wait, 5)
+    pool.submit(lambda: None).cancel()
+    assert pool.stats()["queued"] == 0
+
+    release.set()
+    running.result(timeout=5)
+
+
+def test_deadline_follows_submitted_work():
+    pool = WorkPool("test", workers=2, max_queue=4)
+    with deadline_scope(Deadline.after(5, "outer")):
+        assert pool.call(lambda: current_deadline().name) == "outer"
+    assert pool.call(lambda: current_deadline().bounded) is False
+
+
+@pytest.mark.asyncio
+async def test_run_and_slot_bound_concurrency():
+    pool = WorkPool("test", workers=2, max_queue=8)
+    assert await pool.run(sum, [1, 2, 3]) == 6
+
+    active = peak = 0
+
+    async def work():
+        nonlocal active, peak
+        async with pool.slot():
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.02)
+            active -= 1
+
+    await asyncio.gather(*(work() for _ in range(6)))
+    assert peak == 2
+    assert pool.stats()["completed"] == 7
+
+
+def test_admission_is_capped_and_released():
+    scheduler = Scheduler(cpu_workers=1, io_workers=1, max_queue=4, max_analyses=2)
+    first = scheduler.admit()
+    with scheduler.admit():
+        with pytest.raises(Overloaded) as info:
+            scheduler.admit()
+        assert info.value.status_code == 429
+        assert info.value.retry_after > 0
+
+    first.release()
+    first.release()  # idempotent
+    stats = scheduler.stats()["analyses"]
+    assert stats == {"active": 0, "max": 2, "admitted": 2, "rejected": 1}
+
+
+def test_saturated_pool_refuses_admission():
+    scheduler = Scheduler(cpu_workers=1, io_workers=1, max_queue=1, max_analyses=0)
+    release = threading.Event()
+    running = scheduler.cpu.submit(release.wait, 5)
+    waiting = scheduler.cpu.submit(lambda: None)
+    with pytest.raises(Overloaded) as info:
+        scheduler.admit()
+    assert info.value.status_code == 503
+
+    release.set()
+    running.result(timeout=5)
+    waiting.result(timeout=5)
+    scheduler.admit().release()
+
+
+def test_api_rejects_analyses_beyond_the_limit(monkeypatch):
+    from fastapi.testclient import TestClient
+    import app as app_module
+
+    files = {name: (f"{name}.pdf", b"%PDF") for name in
+             ("salary_slips_pdf", "bank_statement_pdf", "itr_pdf_1")}
+    busy = Scheduler(cpu_workers=1, io_workers=1, max_queue=4, max_analyses=1)
+    monkeypatch.setattr(app_module, "scheduler", busy)
+    with TestClient(app_module.app) as client:
+        monkeypatch.setattr(app_module, "engine", SimpleNamespace(llm_stats=dict))
+        with busy.admit():
+            resp = client.post("/api/analyze", files=files)
+            assert resp.status_code == 429
+            assert resp.headers["Retry-After"] == "30"
+
+            resp = client.post("/api/jobs", files=files)
+            assert resp.status_code == 429
+
+        assert client.get("/health").json()["scheduler"]["analyses"]["rejected"] == 2
@@ -0,0 +1,101 @@
+"""
+Schema-constrained output: schemas, JSON parsing and local repair
+"""
+import json
+
+import pytest
+from pydantic import ValidationError
+
+from chains.llm_output import parse_json_answer
+from chains.salary_chain import SalarySlipChain
+from chains.structured_output import response_schema, validate_answer
+from chains.wire_format import answer_schema
+from config import Config
+from schemas import ITRData, SalarySlipData
+
+
+def itr_answer(**overrides):
+    data = {"applicant_name": "A", "pan_number": None, "assessment_year_1": "2023-24",
+            "assessment_year_2": "2022-23", "gross_total_income_year1": 1200000.0,
+            "taxable_income_year1": 1000000.0, "gross_total_income_year2": 1000000.0,
+            "taxable_income_year2": 900000.0, "itr_form_type": "ITR-1",
+            "filing_status": "e-verified", "extraction_confidence": 0.9,
+            "extraction_notes": []}
+    data.update(overrides)
+    return data
+
+
+def test_schema_is_self_contained():
+    schema = response_schema(SalarySlipData)
+    text = json.dumps(schema)
+    assert "$ref" not in text and "$defs" not in text and '"title"' not in text
+    props = schema["properties"]
+    assert props["employment_type"]["enum"][0] == "salaried"
+    assert props["employee_id"] == {"type": "string"}           # Optional[str]
+    assert "employee_id" not in schema["required"]
+    assert "employee_name" in schema["required"]
+    assert props["extraction_confidence"]["maximum"] == 1
+
+
+def test_bank_answer_schema():
+    rows = answer_schema("rows")
+    assert list(rows["properties"])[-3:] == ["rows", "extraction_confidence", "extraction_notes"]
+    assert rows["properties"]["rows"]["items"]["maxItems"] == 5
+    objects = answer_schema("objects")
+    assert objects["properties"]["transactions"]["items"]["required"] == [
+        "date", "narration", "debit", "credit", "balance"]
+    assert set(rows["required"]) == set(rows["properties"])
+
+
+@pytest.mark.parametrize("text", [
+    '{"a": 1}',
+    '```json\n{"a": 1}\n```',
+    'Here you go:\n```\n{"a": 1,}\n```\nDone.',
+    'Result: {"a": 1, } thanks',
+])
+def test_parse_json_answer(text):
+    assert parse_json_answer(text) == {"a": 1}
+
+
+def test_parse_json_answer_rejects_non_objects():
+    for text in ("", "no json", "[1, 2]", '{"a": }'):
+        with pytest.raises(ValueError):
+            parse_json_answer(text)
+
+
+def test_valid_answer_is_untouched():
+    itr = validate_answer(ITRData, itr_answer())
+    assert itr.extraction_notes == []
+    assert itr.gross_total_income_year1 == 1200000.0
+
+
+def test_invalid_answer_is_repaired_locally():
+    data = itr_answer(extraction_confidence=1.4, filing_status=None,
+                      gross_total_income_year1="12,00,000")
+    del data["itr_form_type"]
+    itr = validate_answer(ITRData, data)
+    assert itr.extraction_confidence == 1.0
+    assert itr.filing_status == "" and itr.itr_form_type == ""
+    assert itr.gross_total_income_year1 == 1200000.0
+    assert itr.extraction_notes[0].startswith("Repaired fields: ")
+    assert set(itr.extraction_notes[0][17:].split(", ")) == {
+        "extraction_confidence", "filing_status", "itr_form_type", "gross_total_income_year1"}
+
+
+def test_enum_matched_loosely():
+    base = {"employee_name": "A", "employer_name": "B", "extraction_confidence": 0.8,
+            **{f"month_{i}_{k}": 1.0 for i in (1, 2, 3) for k in ("gross", "deductions", "net")},
+            **{f"month_{i}_date": "2024-0{i}" for i in (1, 2, 3)}}
+    assert validate_answer(SalarySlipData, {**base, "employment_type": "Self-Employed"}) \
+        .employment_type.value == "self_employed"
+    with pytest.raises(ValidationError):
+        validate_answer(SalarySlipData, {**base, "employment_type": "astronaut"})
+
+
+def test_chain_requests_structured_output(monkeypatch):
+    llm = SalarySlipChain().llm
+    assert llm.kwargs["response_mime_type"] == "application/json"
+    assert llm.kwargs["response_schema"] == response_schema(SalarySlipData)
+
+    monkeypatch.setattr(Config, "STRUCTURED_OUTPUT", False)
+    assert not hasattr(SalarySlipChain().llm, "kwargs")
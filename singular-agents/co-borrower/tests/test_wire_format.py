@@ -0,0 +1,73 @@
+"""
+Positional row output: encoding, decoding and truncation
+"""
+import json
+
+from chains.bank_chain import BankStatementChain
+from chains.llm_output import salvage_json
+from chains.wire_format import FORMAT_OBJECTS, FORMAT_ROWS, decode_answer, decode_rows, encode_rows, format_row
+from config import Config
+from processors.pdf_processor import PagePayload
+from conftest import FakeResponse, answer, row
+
+
+def test_rows_round_trip():
+    rows = [row(1), row(2)]
+    assert encode_rows(rows) == [["01-01-2024", "UPI/1", 1.0, 0.0, 999.0],
+                                 ["02-01-2024", "UPI/2", 2.0, 0.0, 998.0]]
+    assert decode_rows(encode_rows(rows)) == (rows, 0)
+    assert format_row(row(1), FORMAT_ROWS) == '["01-01-2024", "UPI/1", 1.0, 0.0, 999.0]'
+    assert json.loads(format_row(row(1), FORMAT_OBJECTS)) == row(1)
+
+
+def test_malformed_rows_are_skipped():
+    decoded, skipped = decode_rows([
+        ["01-01-2024", "NEFT", "1,234.50", "", 100],
+        ["02-01-2024", "SHORT", 1.0],
+        ["03-01-2024", "BAD", "n/a", 0, 0],
+        {"date": "04-01-2024"},
+    ])
+    assert decoded == [{"date": "01-01-2024", "narration": "NEFT", "debit": 1234.5,
+                        "credit": 0.0, "balance": 100.0}]
+    assert skipped == 3
+
+
+def test_decode_answer():
+    data = decode_answer(answer([row(1)], positional=True) | {"columns": ["date"]})
+    assert data["transactions"] == [row(1)]
+    assert "rows" not in data and "columns" not in data
+
+    keyed = {"transactions": [row(1)], "extraction_notes": []}
+    assert decode_answer(dict(keyed)) == keyed
+
+    data = decode_answer({"rows": [["01-01-2024", "X"]]})
+    assert data["transactions"] == []
+    assert data["extraction_notes"] == ["Skipped 1 malformed row(s)"]
+
+
+def test_truncated_rows_salvage_complete_rows_only():
+    text = json.dumps(answer([row(1), row(2), row(3)], positional=True))
+    salvaged = salvage_json(text[:text.index('"UPI/3"') + 3])
+    assert decode_answer(salvaged)["transactions"] == [row(1), row(2)]
+
+
+def test_rows_continuation(monkeypatch):
+    monkeypatch.setattr(Config, "BANK_OUTPUT_FORMAT", FORMAT_ROWS)
+    chain = BankStatementChain()
+    rows = [row(n) for n in range(1, 7)]
+    calls = []
+
+    def fake_invoke(messages):
+        calls.append(messages[0].content[0]["text"])
+        if len(calls) == 1:
+            text = json.dumps(answer(rows[:4], positional=True))
+            return FakeResponse(text[:text.index('"UPI/4"')], "MAX_TOKENS")
+        assert format_row(rows[2], FORMAT_ROWS) in calls[-1]
+        return FakeResponse(json.dumps(answer(rows[2:], positional=True)))
+
+    monkeypatch.setattr(chain, "invoke_with_retry", fake_invoke)
+    [(_, data)] = chain._extract_batch(chain._prompt_transactions_only(), [
+        PagePayload(1, b"1")])
+
+    assert '"rows"' in calls[0]
+    assert data["transactions"] == rows
@@ -5,7 +5,7 @@ import json
 import hashlib
 import logging
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Callable, Dict, Optional
 from datetime import datetime
 import time
 
@@ -134,6 +134,30 @@ def create_session_id() -> str:
     return f"{timestamp}_{random_suffix}"
 
 
+# progress(stage, status, message="", **detail) - see report_progress
+ProgressCallback = Callable[..., None]
+
+
+def report_progress(progress: Optional[ProgressCallback], stage: str, status: str,
+                    message: str = "", **detail) -> None:
+    """
+    Send a pipeline progress event, never letting a listener break the pipeline
+
+    Args:
+        progress: Callback or None
+        stage: validation, itr, bank, salary, foir, cibil
+        status: running, progress, done or failed
+        message: Human-readable detail
+        **detail: Extra fields (e.g. current/total for bank batches)
+    """
+    if progress is None:
+        return
+    try:
+        progress(stage, status, message, **detail)
+    except Exception as e:
+        logger.warning(f"⚠️  Progress callback failed for {stage}: {e}")
+
+
 def validate_pdf(filepath: str) -> bool:
     """
     Validate PDF file